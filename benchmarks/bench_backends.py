@@ -0,0 +1,112 @@
+"""
+Память и процессорное время на подключение: IRCClient
+(поток на подключение) против AsyncIRCClient (один asyncio-цикл).
+Локальный сервер отправляет каждому клиенту пачку PRIVMSG.
+
+    python -m benchmarks.bench_backends [connections] [lines]
+"""
+import asyncio
+import sys
+import threading
+import time
+from source.irc_async import AsyncIRCClient, EventLoopThread
+from source.irc_client import IRCClient
+
+
+def rss_kb():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+class BurstServer:
+    """
+    Сервер в отдельном потоке: после регистрации шлет
+    каждому клиенту lines строк PRIVMSG.
+    """
+
+    def __init__(self, lines):
+        self.payload = b"".join(
+            b":bot!u@h PRIVMSG #bench :message number %d\r\n" % i
+            for i in range(lines))
+        self.loop = asyncio.new_event_loop()
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        server = self.loop.run_until_complete(
+            asyncio.start_server(self._handle, "127.0.0.1", 0))
+        self.port = server.sockets[0].getsockname()[1]
+        self.ready.set()
+        self.loop.run_forever()
+
+    async def _handle(self, reader, writer):
+        await reader.readline()
+        await reader.readline()
+        writer.write(self.payload)
+        await writer.drain()
+        await reader.read()
+        writer.close()
+
+
+def counting(cls):
+    class Counting(cls):
+        def __init__(self, *args):
+            super().__init__(*args)
+            self.count = 0
+
+        def handle_lines(self, lines):
+            self.count += len(lines)
+            super().handle_lines(lines)
+
+    return Counting
+
+
+def run(name, factory, connections, lines, server):
+    base_rss = rss_kb()
+    base_threads = threading.active_count()
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    clients = [factory() for _ in range(connections)]
+    for client in clients:
+        result = client.connect("127.0.0.1", server.port, "bench")
+        if result is not None:
+            result.result(10)
+    threads = threading.active_count() - base_threads
+    while any(client.count < lines for client in clients):
+        time.sleep(0.005)
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    rss = rss_kb() - base_rss
+    for client in clients:
+        client.disconnect()
+        if client.read_thread is not None:
+            client.read_thread.join()
+    while any(getattr(client, "transport", None) is not None
+              for client in clients):
+        time.sleep(0.005)
+    print(f"{name:<8} threads +{threads:<4} "
+          f"RSS +{rss / connections:8.1f} KB/conn  "
+          f"CPU {cpu * 1000 / connections:7.2f} ms/conn  "
+          f"wall {wall:6.2f} s")
+
+
+def main():
+    connections = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    server = BurstServer(lines)
+    loop_thread = EventLoopThread()
+    print(f"{connections} connections x {lines} lines")
+    run("thread", counting(IRCClient), connections, lines, server)
+    run("asyncio", lambda: counting(AsyncIRCClient)(loop_thread),
+        connections, lines, server)
+    loop_thread.stop()
+
+
+if __name__ == "__main__":
+    main()
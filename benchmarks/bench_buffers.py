@@ -0,0 +1,56 @@
+"""
+Сеть с 200 каналами: сколько времени GUI-поток тратит на пачку
+строк, когда все строки идут в один общий чат (как раньше), и когда
+у каждого канала свой буфер, а на экране только один из них.
+
+    python -m benchmarks.bench_buffers
+"""
+import os
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from benchmarks.bench_scrollback import make_lines  # noqa: E402
+from PyQt6.QtWidgets import QApplication  # noqa: E402
+from source.irc_buffers import BufferSet  # noqa: E402
+from source.irc_gui import NetworkView  # noqa: E402
+
+CHANNELS = 200
+BATCHES = 200
+
+
+def run(app, channel_of):
+    view = NetworkView("bench", lambda index: None)
+    view.source = BufferSet()
+    view.chat_page.resize(700, 400)
+    view.chat_page.show()
+    for channel in range(CHANNELS):
+        view.buffer(f"#c{channel}")
+    app.processEvents()
+    spent = 0.0
+    for number in range(BATCHES):
+        batch = make_lines(number * 1000)
+        counts = {}
+        for i, record in enumerate(batch):
+            name = channel_of(i)
+            view.source.append(name, (record,))
+            count = counts.setdefault(name, [0, 0])
+            count[0] += 1
+        began = time.perf_counter()
+        view.on_lines(counts)
+        app.processEvents()
+        spent += time.perf_counter() - began
+    view.close()
+    return spent / BATCHES * 1000
+
+
+def main():
+    app = QApplication.instance() or QApplication([])
+    single = run(app, lambda i: "#c0")
+    spread = run(app, lambda i: f"#c{i % CHANNELS}")
+    print(f"one shared view, 1000 lines/batch   {single:7.2f} ms/batch")
+    print(f"{CHANNELS} buffers, 1 visible, same lines  {spread:7.2f} ms/batch")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Передача большого файла DCC SEND через loopback: скорость, время
+процессора на мегабайт и насколько передача задерживает поток
+чтения IRC (поток-"тикер" просыпается каждые TICK секунд, как
+поток чтения на PING, и меряет свое опоздание).
+
+DccManager (sendfile + recv_into в mmap) сравнивается с наивной
+передачей: read/sendall блоками по 4 KiB и recv/write с
+подтверждением на каждый блок.
+
+    python -m benchmarks.bench_dcc [MiB, по умолчанию 1024]
+"""
+import os
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+from source.irc_dcc import DONE, FAILED, DccManager, parse_dcc
+
+MiB = 1 << 20
+NAIVE_BLOCK = 4096
+TICK = 0.01
+
+
+class Peer:
+    def __init__(self, nick):
+        self.nick = nick
+        self.sent = []
+
+    def local_address(self):
+        return "127.0.0.1"
+
+    def send_raw(self, line):
+        self.sent.append(line)
+
+
+class Ticker(threading.Thread):
+    """
+    Поток, который только спит по TICK; max_late - худшее опоздание
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.max_late = 0.0
+        self.stop = threading.Event()
+
+    def run(self):
+        while not self.stop.is_set():
+            began = time.perf_counter()
+            time.sleep(TICK)
+            late = time.perf_counter() - began - TICK
+            self.max_late = max(self.max_late, late)
+
+
+def make_file(path, size):
+    block = os.urandom(MiB)
+    with open(path, "wb") as f:
+        for offset in range(0, size, MiB):
+            f.write(block[:min(MiB, size - offset)])
+
+
+def dcc_transfer(source, directory, size):
+    sender, receiver = DccManager(), DccManager(directory)
+    alice, bob = Peer("alice"), Peer("bob")
+    offers = []
+    receiver.offered.connect(lambda client, request: offers.append(request))
+    try:
+        sender.send(alice, "bob", source)
+        body = alice.sent.pop().split(" :", 1)[1].strip("\x01")
+        receiver.handle(bob, parse_dcc("alice", body))
+        transfer = receiver.receive(bob, offers[0])
+        outgoing = next(iter(sender.transfers.values()))
+        while outgoing.state not in (DONE, FAILED) or \
+                transfer.state not in (DONE, FAILED):
+            time.sleep(0.01)
+        if transfer.state != DONE or transfer.done != size:
+            raise RuntimeError(f"transfer failed: {transfer.error}")
+    finally:
+        sender.shutdown()
+        receiver.shutdown()
+
+
+def naive_transfer(source, directory, size):
+    listener = socket.create_server(("127.0.0.1", 0))
+
+    def serve():
+        conn, _ = listener.accept()
+        with conn, open(source, "rb") as f:
+            while True:
+                block = f.read(NAIVE_BLOCK)
+                if not block:
+                    break
+                conn.sendall(block)
+            while conn.recv(4096):
+                pass
+
+    server = threading.Thread(target=serve)
+    server.start()
+    received = 0
+    with socket.create_connection(listener.getsockname()) as sock, \
+            open(os.path.join(directory, "naive.bin"), "wb") as f:
+        while received < size:
+            data = sock.recv(NAIVE_BLOCK)
+            if not data:
+                break
+            f.write(data)
+            received += len(data)
+            sock.sendall(struct.pack("!I", received & 0xFFFFFFFF))
+    server.join()
+    listener.close()
+    if received != size:
+        raise RuntimeError(f"received {received} of {size} bytes")
+
+
+def measure(name, transfer, source, directory, size):
+    ticker = Ticker()
+    ticker.start()
+    cpu = time.process_time()
+    began = time.perf_counter()
+    transfer(source, directory, size)
+    elapsed = time.perf_counter() - began
+    cpu = time.process_time() - cpu
+    ticker.stop.set()
+    ticker.join()
+    megabytes = size / MiB
+    print(f"{name:<22} {megabytes / elapsed:9.1f} MiB/s  "
+          f"{cpu * 1000 / megabytes:7.2f} ms CPU/MiB  "
+          f"ticker late {ticker.max_late * 1000:6.1f} ms")
+
+
+def main():
+    size = (int(sys.argv[1]) if len(sys.argv) > 1 else 1024) * MiB
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "source.bin")
+        make_file(source, size)
+        incoming = os.path.join(directory, "in")
+        os.makedirs(incoming)
+        print(f"{size // MiB} MiB over loopback")
+        measure("DCC sendfile + mmap", dcc_transfer, source, incoming, size)
+        os.remove(os.path.join(incoming, "source.bin"))
+        measure("read/sendall 4 KiB", naive_transfer, source, incoming,
+                size)
+
+
+if __name__ == "__main__":
+    main()
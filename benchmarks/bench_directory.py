@@ -0,0 +1,97 @@
+"""
+Время до готового каталога каналов после подключения и входящий
+трафик: полный LIST, LIST с фильтром ELIST (>N пользователей) и
+каталог из кэша на диске. Сервер - FakeIRCd с распределением
+пользователей как в больших сетях: много каналов на 1-2 человека и
+немного больших.
+
+    python -m benchmarks.bench_directory [каналов, по умолчанию 50000]
+"""
+import sys
+import tempfile
+import threading
+import time
+from source.irc_client import IRCClient
+from source.irc_directory import ChannelCache
+from source.irc_metrics import METRICS
+from source.irc_session import SessionManager
+from test.fake_ircd import FakeIRCd
+
+MIN_USERS = 5
+
+
+def zipf_users(i):
+    return max(1, int(5000 / (i + 1) ** 0.8))
+
+
+class Ready:
+    def __init__(self):
+        self.channels = 0
+        self.done = threading.Event()
+
+    def on_channels(self, network_id, channels):
+        self.channels += len(channels)
+
+    def on_channels_end(self, network_id):
+        self.done.set()
+
+    def on_messages(self, network_id, messages):
+        pass
+
+    def on_members(self, network_id, ops):
+        pass
+
+    def on_joined(self, network_id, channel):
+        pass
+
+    def on_history(self, network_id, target, lines):
+        pass
+
+
+def measure(server, cache, min_users):
+    """
+    :return: (секунд до channels_end, каналов, байт от сервера)
+    """
+    METRICS.reset()
+    manager = SessionManager(IRCClient, channel_cache=cache,
+                             list_min_users=min_users)
+    ready = Ready()
+    manager.add_listener(ready)
+    began = time.perf_counter()
+    manager.open("127.0.0.1", server.port, "bench", "bench")
+    if not ready.done.wait(120):
+        raise TimeoutError("directory did not arrive")
+    elapsed = time.perf_counter() - began
+    # дождаться, пока LIST (если он ушел) допишется в кэш
+    time.sleep(0.2)
+    received = METRICS.snapshot()["counters"].get("recv.bytes", 0)
+    manager.close("bench")
+    return elapsed, ready.channels, received
+
+
+def report(name, result):
+    elapsed, channels, received = result
+    print(f"{name:<28} {elapsed * 1000:9.1f} ms  {channels:>7} channels  "
+          f"{received / 1024:9.1f} KiB in")
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    METRICS.enable()
+    server = FakeIRCd(list_size=size, list_users=zipf_users)
+    try:
+        report("full LIST", measure(server, None, None))
+        with tempfile.TemporaryDirectory() as path:
+            cache = ChannelCache(path)
+            report(f"LIST >{MIN_USERS - 1} (ELIST)",
+                   measure(server, cache, MIN_USERS))
+            report("cached directory", measure(server, cache, MIN_USERS))
+            full = ChannelCache(path + "/full")
+            measure(server, full, None)
+            report("cached full directory", measure(server, full, None))
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
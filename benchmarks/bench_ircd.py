@@ -0,0 +1,370 @@
+"""
+Нагрузочные сценарии против локального FakeIRCd (test/fake_ircd.py) с
+настоящим IRCClient и SessionManager: огромные LIST и NAMES, флуд
+PRIVMSG по многим каналам, нетсплит пачкой и без, медленный
+читатель на стороне сервера.
+
+Каждый сценарий идет в отдельном процессе, чтобы пиковая память
+(ru_maxrss, вместе с сервером в том же процессе) была своей.
+Результат - JSON: строк в секунду, задержки от отправки сервером до
+вызова слушателя в потоке Qt (p50/p95/p99/max) и пиковая память.
+
+    python -m benchmarks.bench_ircd [--output out.json]
+        [--baseline old.json [--tolerance 0.2]] [--scale 1.0]
+        [--only flood_max,netsplit]
+
+С --baseline метрики сравниваются с прошлым прогоном: *_per_sec
+должны не упасть, *_ms и *_mb - не вырасти больше чем на tolerance;
+иначе код выхода 1.
+"""
+import argparse
+import json
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from source.irc_client import IRCClient
+from source.irc_session import SessionManager
+from source.irc_writer import WriteQueue
+from test.fake_ircd import FakeIRCd, stamp_of
+
+NETWORK = "bench"
+HIGHER_BETTER = ("_per_sec",)
+LOWER_BETTER = ("_ms", "_mb")
+
+
+class Listener:
+    """
+    Слушатель SessionManager: считает события, а для строк чата -
+    задержку от штампа сервера до вызова on_messages
+    """
+
+    def __init__(self, session=None):
+        self.session = session
+        self.channels = 0
+        self.channels_done = threading.Event()
+        self.member_updates = 0
+        self.member_ops = 0
+        self.members = []
+        self.lines = 0
+        self.latencies = []
+        self._seen = {}
+
+    def on_messages(self, network_id, messages):
+        now = time.perf_counter_ns()
+        buffers = self.session.buffers
+        for name in {name for name, _ in messages}:
+            lines, total = buffers.tail(name, self._seen.get(name, 0))
+            self._seen[name] = total
+            for line in lines:
+                stamp = stamp_of(line.text)
+                if stamp is not None:
+                    self.latencies.append((now - stamp) / 1e6)
+            self.lines += len(lines)
+
+    def on_channels(self, network_id, channels):
+        self.channels += len(channels)
+
+    def on_channels_end(self, network_id):
+        self.channels_done.set()
+
+    def on_members(self, network_id, ops):
+        self.member_updates += 1
+        self.member_ops += len(ops)
+        self.members.extend(ops)
+
+    def on_joined(self, network_id, channel):
+        pass
+
+    def on_history(self, network_id, target, lines):
+        pass
+
+
+def wait_until(predicate, timeout=120.0, step=0.001):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError("scenario did not finish")
+        time.sleep(step)
+
+
+def open_session(server, listener, dispatch=None, setup=None):
+    manager = SessionManager(IRCClient, dispatch=dispatch)
+    manager.add_listener(listener)
+
+    def prepare(session):
+        session.client.auto_list = False
+        listener.session = session
+        if setup is not None:
+            setup(session)
+    session = manager.open("127.0.0.1", server.port, "bench", NETWORK,
+                           setup=prepare)
+    return manager, session, server.wait_client()
+
+
+def peak_rss_mb():
+    # ru_maxrss в Linux - килобайты
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {}
+
+    def at(q):
+        return values[min(len(values) - 1, int(q * len(values)))]
+    return {"latency_p50_ms": at(0.50), "latency_p95_ms": at(0.95),
+            "latency_p99_ms": at(0.99), "latency_max_ms": values[-1],
+            "latency_mean_ms": statistics.fmean(values)}
+
+
+def scenario_list(scale):
+    count = int(200_000 * scale)
+    server = FakeIRCd(list_size=count)
+    listener = Listener()
+    manager, session, _ = open_session(server, listener)
+    try:
+        began = time.perf_counter()
+        session.client.list_channels()
+        if not listener.channels_done.wait(120):
+            raise TimeoutError("LIST did not finish")
+        elapsed = time.perf_counter() - began
+        assert listener.channels == count, listener.channels
+    finally:
+        manager.close(NETWORK)
+        server.close()
+    return {"channels": count, "list_ms": elapsed * 1000,
+            "list_lines_per_sec": count / elapsed}
+
+
+def scenario_names(scale):
+    count = int(50_000 * scale)
+    server = FakeIRCd(names_size=count)
+    listener = Listener()
+    manager, session, _ = open_session(server, listener)
+    try:
+        began = time.perf_counter()
+        session.client.join_channel("#big")
+        wait_until(lambda: listener.member_updates)
+        elapsed = time.perf_counter() - began
+        assert len(listener.members[0][3]) == count + 1
+    finally:
+        manager.close(NETWORK)
+        server.close()
+    return {"nicks": count, "names_ms": elapsed * 1000,
+            "names_nicks_per_sec": count / elapsed}
+
+
+def scenario_flood_max(scale):
+    count = int(300_000 * scale)
+    server = FakeIRCd()
+    listener = Listener()
+    manager, session, conn = open_session(server, listener)
+    buffers = session.buffers
+    try:
+        began = time.perf_counter()
+        server.flood(conn, channels=100, count=count)
+        wait_until(lambda: sum(buffers.tail(name, 0)[1]
+                               for name in buffers.names()) >= count)
+        elapsed = time.perf_counter() - began
+    finally:
+        manager.close(NETWORK)
+        server.close()
+    return {"lines": count, "flood_lines_per_sec": count / elapsed}
+
+
+def scenario_flood_paced(scale):
+    # задержка до GUI: события идут через QtDispatcher в поток, где
+    # крутится цикл Qt, как в окне клиента
+    from PyQt6.QtCore import QCoreApplication, QTimer
+    from source.irc_qt import QtDispatcher
+    app = QCoreApplication.instance() or QCoreApplication([])
+    rate = 5000
+    count = int(20_000 * scale)
+    server = FakeIRCd()
+    listener = Listener()
+    manager, session, conn = open_session(server, listener,
+                                          dispatch=QtDispatcher())
+    result = {}
+
+    def flood():
+        result["sent"], result["secs"] = server.flood(
+            conn, channels=50, count=count, rate=rate)
+
+    def check():
+        if listener.lines >= count:
+            app.quit()
+    timer = QTimer()
+    timer.timeout.connect(check)
+    timer.start(20)
+    sender = threading.Thread(target=flood)
+    try:
+        sender.start()
+        app.exec()
+        sender.join()
+    finally:
+        timer.stop()
+        manager.close(NETWORK)
+        server.close()
+    metrics = {"lines": count, "rate": rate,
+               "paced_lines_per_sec": count / result["secs"]}
+    metrics.update(percentiles(listener.latencies))
+    return metrics
+
+
+def netsplit_run(nicks, batched):
+    caps = ("batch",) if batched else ()
+    server = FakeIRCd(caps=caps, names_size=nicks)
+    listener = Listener()
+    manager, session, conn = open_session(server, listener)
+    try:
+        session.client.join_channel("#split")
+        wait_until(lambda: listener.member_updates)
+        updates = listener.member_updates
+        listener.member_ops = 0
+        began = time.perf_counter()
+        server.netsplit(conn, "#split",
+                        [f"user{i}" for i in range(nicks)], batch=batched)
+        wait_until(lambda: listener.member_ops >= nicks)
+        elapsed = time.perf_counter() - began
+        return elapsed, listener.member_updates - updates
+    finally:
+        manager.close(NETWORK)
+        server.close()
+
+
+def scenario_netsplit(scale):
+    nicks = int(5_000 * scale)
+    batched, batched_updates = netsplit_run(nicks, True)
+    plain, plain_updates = netsplit_run(nicks, False)
+    return {"nicks": nicks,
+            "netsplit_batched_ms": batched * 1000,
+            "netsplit_batched_updates": batched_updates,
+            "netsplit_unbatched_ms": plain * 1000,
+            "netsplit_unbatched_updates": plain_updates}
+
+
+def scenario_slow_reader(scale):
+    count = int(1_000 * scale)
+    server = FakeIRCd()
+    listener = Listener()
+
+    def setup(session):
+        session.client.send_queue = WriteQueue(rate=500, burst=100,
+                                               max_size=500)
+    manager, session, conn = open_session(server, listener, setup=setup)
+    client = session.client
+    server.throttle(conn, 50_000)
+    calls = []
+    try:
+        text = "y" * 200
+        for i in range(count):
+            began = time.perf_counter()
+            client.send_message("#slow", text)
+            calls.append(time.perf_counter() - began)
+        server.ping(conn, "slow")
+        wait_until(lambda: "slow" in conn.pongs)
+        stats = client.send_queue.stats()
+    finally:
+        manager.close(NETWORK)
+        server.close()
+    return {"messages": count, "dropped": stats["dropped"],
+            "send_call_max_ms": max(calls) * 1000,
+            "send_call_mean_ms": statistics.fmean(calls) * 1000,
+            "pong_rtt_ms": conn.pongs["slow"] / 1e6}
+
+
+SCENARIOS = {
+    "list": scenario_list,
+    "names": scenario_names,
+    "flood_max": scenario_flood_max,
+    "flood_paced": scenario_flood_paced,
+    "netsplit": scenario_netsplit,
+    "slow_reader": scenario_slow_reader,
+}
+
+
+def run_child(name, scale):
+    """
+    Запускает сценарий в отдельном процессе
+    :return: словарь метрик
+    """
+    child = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_ircd", "--run", name,
+         "--scale", str(scale)],
+        capture_output=True, text=True, check=True)
+    return json.loads(child.stdout.splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    """
+    :return: список регрессий (сценарий, метрика, было, стало)
+    """
+    regressions = []
+    for name, metrics in results.items():
+        old = baseline.get("scenarios", {}).get(name, {})
+        for key, value in metrics.items():
+            before = old.get(key)
+            if not before:
+                continue
+            if key.endswith(HIGHER_BETTER) and \
+                    value < before * (1 - tolerance):
+                regressions.append((name, key, before, value))
+            elif key.endswith(LOWER_BETTER) and \
+                    value > before * (1 + tolerance):
+                regressions.append((name, key, before, value))
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.bench_ircd",
+        description="Load benchmarks against a local fake ircd")
+    parser.add_argument("--run", choices=sorted(SCENARIOS),
+                        help=argparse.SUPPRESS)
+    parser.add_argument("--only", help="comma-separated scenario names")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiply scenario sizes")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="previous results JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.run:
+        metrics = SCENARIOS[args.run](args.scale)
+        metrics["peak_rss_mb"] = peak_rss_mb()
+        print(json.dumps(metrics))
+        return 0
+
+    names = args.only.split(",") if args.only else list(SCENARIOS)
+    results = {}
+    for name in names:
+        results[name] = run_child(name, args.scale)
+        print(name, json.dumps(results[name], indent=1), flush=True)
+    report = {"python": platform.python_version(),
+              "platform": platform.platform(),
+              "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "scale": args.scale, "scenarios": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, key, before, value in regressions:
+            print(f"REGRESSION {name}.{key}: {before:.2f} -> {value:.2f}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Журнал на синтетических данных: скорость записи LogStore (события
+в секунду, стоимость record для потока чтения) и задержка поиска
+FTS5 по готовой базе.
+
+    python -m benchmarks.bench_log [строк, по умолчанию 10000000]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from source.irc_log import LogStore
+
+CHUNK = 100_000
+QUERIES = ("kubernetes", "segfault", "python asyncio", '"merge conflict"',
+           "deploy*", "the")
+
+
+def make_vocabulary(rng):
+    common = ["the", "a", "is", "to", "and", "it", "in", "that", "you", "for",
+              "lol", "ok", "yes", "no", "what", "why", "how", "just", "now"]
+    topical = ["python", "asyncio", "kernel", "segfault", "deploy",
+               "deployment", "merge", "conflict", "kubernetes", "docker",
+               "rust", "borrow", "checker", "debian", "package", "build"]
+    rare = [f"word{i}" for i in range(20000)]
+    return common, topical, rare
+
+
+def make_text(rng, common, topical, rare):
+    words = []
+    for _ in range(rng.randint(3, 16)):
+        roll = rng.random()
+        if roll < 0.7:
+            words.append(rng.choice(common))
+        elif roll < 0.9:
+            words.append(rng.choice(rare))
+        else:
+            words.append(rng.choice(topical))
+    return " ".join(words)
+
+
+def ingest(store, rows):
+    rng = random.Random(7)
+    common, topical, rare = make_vocabulary(rng)
+    networks = ["libera", "oftc", "rizon"]
+    channels = [f"#chan{i}" for i in range(300)]
+    ts = time.time() - 180 * 86400
+    step = 180 * 86400 / rows
+    record_time = 0.0
+    started = time.perf_counter()
+    for base in range(0, rows, CHUNK):
+        events = []
+        for _ in range(min(CHUNK, rows - base)):
+            ts += step
+            events.append((rng.choice(networks), rng.choice(channels),
+                           "PRIVMSG", f"user{rng.randrange(5000)}",
+                           make_text(rng, common, topical, rare), ts))
+        began = time.perf_counter()
+        for network, channel, kind, nick, text, when in events:
+            store.record(network, channel, kind, nick, text, when)
+        record_time += time.perf_counter() - began
+        while store.pending() > store.max_pending // 2:
+            time.sleep(0.01)
+        done = base + len(events)
+        if done % (CHUNK * 10) == 0 or done == rows:
+            elapsed = time.perf_counter() - started
+            print(f"ingest {done:>11,} rows  {done / elapsed:10,.0f} rows/s")
+    store.flush()
+    elapsed = time.perf_counter() - started
+    print(f"ingest total {rows:,} rows in {elapsed:.1f} s "
+          f"({rows / elapsed:,.0f} rows/s, {store.commits:,} commits, "
+          f"dropped {store.dropped})")
+    print(f"record() in reader thread: {record_time / rows * 1e6:.2f} us "
+          f"per event")
+
+
+def query(store):
+    for text in QUERIES:
+        for channel in (None, "#chan7"):
+            best = None
+            for _ in range(5):
+                began = time.perf_counter()
+                hits = store.search(text, channel=channel, limit=50)
+                elapsed = time.perf_counter() - began
+                best = elapsed if best is None else min(best, elapsed)
+            where = f" in {channel}" if channel else ""
+            print(f"search {text + where:<30} {len(hits):3} hits  "
+                  f"{best * 1000:9.2f} ms")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "log.db")
+        store = LogStore(path)
+        try:
+            ingest(store, rows)
+            size = sum(os.path.getsize(os.path.join(directory, name))
+                       for name in os.listdir(directory))
+            print(f"database {size / 1e6:,.0f} MB")
+            query(store)
+        finally:
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Сравнение скорости разбора строк: старый parse_irc_line на подстроках
+и однопроходный токенайзер с таблицей обработчиков. Обработчики
+клиента делают больше старого разбора (списки участников, записи
+ChatLine с общими именами, история, журнал), поэтому отдельно
+измерен токенайзер с обработчиками, которые делают ровно то же, что
+старый разбор: так видно, сколько стоит сам разбор, а сколько -
+новая работа.
+
+    python -m benchmarks.bench_parser
+"""
+import re
+import time
+from source.irc_batch import BatchTracker
+from source.irc_caps import CapNegotiator
+from source.irc_history import ChatHistory
+from source.irc_members import MembershipTracker
+from source.irc_parser import parse_irc_line, parse_message
+from source.irc_records import InternTable
+
+
+class _NullSignal:
+    def emit(self, *args):
+        pass
+
+
+class NullClient:
+    def __init__(self):
+        self.nick = "tester"
+        self.current_channel = None
+        self.users = []
+        self.message_received = _NullSignal()
+        self.chat_received = _NullSignal()
+        self.names = InternTable()
+        self.channels_received = _NullSignal()
+        self.users_updated = _NullSignal()
+        self.channels_end = _NullSignal()
+        self.channel_joined = _NullSignal()
+        self.members_changed = _NullSignal()
+        self.membership = MembershipTracker()
+        self.event_log = None
+        self.auto_list = True
+        self.registered = _NullSignal()
+        self.history_received = _NullSignal()
+        self.caps = CapNegotiator()
+        self.batches = BatchTracker()
+        self.history = ChatHistory()
+        self.rules = None
+
+    def send_raw(self, data):
+        pass
+
+
+def legacy_parse_irc_line(line, client):
+    try:
+        client.message_received.emit(f"<< {line}")
+
+        if line.startswith("PING"):
+            client.send_raw("PONG " + line.split()[1])
+
+        if " 001 " in line:
+            client.send_raw("LIST")
+
+        if " 322 " in line:
+            parts = line.split()
+            channel = parts[3]
+            client.channels_received.emit([channel])
+
+        if "JOIN :" in line and client.nick in line:
+            channel = line.split("JOIN :")[1]
+            client.current_channel = channel
+            client.send_raw(f"NAMES {channel}")
+
+        if " 353 " in line:
+            users_part = line.split(":", 2)[2]
+            users = users_part.strip().split()
+            client.users = users
+            client.users_updated.emit(users)
+
+        if "PRIVMSG" in line:
+            match = re.match(r":([^!]+)!.* PRIVMSG (\S+) :(.+)", line)
+            if match:
+                sender, target, msg = match.groups()
+                client.message_received.emit(f"[{target}] <{sender}>: {msg}")
+    except Exception as e:
+        client.message_received.emit(f"Error: {e}")
+
+
+def _pong(msg, client):
+    client.send_raw("PONG :" + msg.params[0])
+
+
+def _list(msg, client):
+    client.channels_received.emit([msg.params[1]])
+
+
+def _join(msg, client):
+    if msg.nick == client.nick:
+        client.current_channel = msg.params[0]
+        client.send_raw("NAMES " + msg.params[0])
+
+
+def _names(msg, client):
+    users = msg.params[-1].split()
+    client.users = users
+    client.users_updated.emit(users)
+
+
+def _privmsg(msg, client):
+    client.message_received.emit(
+        f"[{msg.params[0]}] <{msg.nick}>: {msg.params[1]}")
+
+
+LEGACY_HANDLERS = {"PING": _pong, "322": _list, "JOIN": _join,
+                   "353": _names, "PRIVMSG": _privmsg}
+
+
+def tokenizer_legacy_work(line, client):
+    try:
+        client.message_received.emit("<< " + line)
+        msg = parse_message(line)
+        if msg is not None:
+            handler = LEGACY_HANDLERS.get(msg.command)
+            if handler is not None:
+                handler(msg, client)
+    except Exception as e:
+        client.message_received.emit(f"Error: {e}")
+
+
+def sample_lines(n):
+    chatter = "the reader thread spends most of its time parsing lines "
+    base = [
+        ":alice!~a@host.example PRIVMSG #python :does anyone use asyncio "
+        "with Qt here?",
+        ":bob!~b@10.0.0.1 PRIVMSG #python :yes, through a bridge thread",
+        ":carol!~carol@user/carol PRIVMSG #python :" + chatter * 2,
+        ":erin!~erin@gateway/web/x PRIVMSG #linux :" + chatter * 4,
+        ":irc.example.org 322 tester #chan 42 :[+nt] some topic text",
+        ":irc.example.org 353 tester = #python :@op +voice alice bob carol",
+        ":carol!~c@host JOIN :#python",
+        "PING :irc.example.org",
+        ":dave!~d@host QUIT :Ping timeout: 240 seconds",
+    ]
+    return (base * (n // len(base) + 1))[:n]
+
+
+def measure(func, lines, repeat=3):
+    client = NullClient()
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            func(line, client)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(lines) / best
+
+
+def main():
+    lines = sample_lines(200_000)
+    legacy = measure(legacy_parse_irc_line, lines)
+    same_work = measure(tokenizer_legacy_work, lines)
+    current = measure(parse_irc_line, lines)
+    print(f"legacy parse_irc_line:        {legacy:12,.0f} lines/sec")
+    print(f"tokenizer, legacy work:       {same_work:12,.0f} lines/sec "
+          f"x{same_work / legacy:.2f}")
+    print(f"tokenizer + client handlers:  {current:12,.0f} lines/sec "
+          f"x{current / legacy:.2f}")
+
+
+if __name__ == "__main__":
+    main()
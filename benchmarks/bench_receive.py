@@ -0,0 +1,66 @@
+"""
+Прием пачки строк (например, большого LIST), пришедшей одним куском:
+старый цикл decode + split("\\r\\n", 1) против LineReader.
+
+    python -m benchmarks.bench_receive
+"""
+import time
+from source.irc_buffer import LineReader
+
+
+def make_burst(n):
+    return b"".join(
+        b":irc.example.org 322 tester #channel-%d %d :[+nt] topic text "
+        b"for channel number %d\r\n" % (i, i % 500, i) for i in range(n))
+
+
+def chunks(data, size):
+    view = memoryview(data)
+    return [bytes(view[i:i + size]) for i in range(0, len(data), size)]
+
+
+def legacy_receive(parts):
+    count = 0
+    buffer = ""
+    for part in parts:
+        buffer += part.decode("utf-8", errors="ignore")
+        while "\r\n" in buffer:
+            line, buffer = buffer.split("\r\n", 1)
+            count += 1
+    return count
+
+
+def reader_receive(parts):
+    count = 0
+    reader = LineReader()
+    for part in parts:
+        target = reader.get_buffer()
+        while len(target) < len(part):
+            reader.min_free = len(part)
+            target = reader.get_buffer()
+        target[:len(part)] = part
+        count += len(reader.commit(len(part)))
+    return count
+
+
+def measure(func, parts):
+    start = time.perf_counter()
+    count = func(parts)
+    return count, time.perf_counter() - start
+
+
+def main():
+    lines = 50_000
+    data = make_burst(lines)
+    for size in (4096, 65536, 1 << 20):
+        parts = chunks(data, size)
+        for name, func in (("legacy", legacy_receive),
+                           ("LineReader", reader_receive)):
+            count, elapsed = measure(func, parts)
+            assert count == lines
+            print(f"recv {size:>8} B  {name:<10} {elapsed * 1000:9.1f} ms  "
+                  f"{count / elapsed:12,.0f} lines/sec")
+
+
+if __name__ == "__main__":
+    main()
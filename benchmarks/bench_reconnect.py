@@ -0,0 +1,97 @@
+"""
+Восстановление сессии после обрыва связи: сколько строк уходит
+серверу и сколько времени проходит до того, как все каналы снова
+наши и списки участников сверены. Пока клиента не было, из каждого
+канала ушло CHURN участников - они приходят удалениями строк, а не
+новыми списками.
+
+Строки JOIN сверх запаса очереди отправки (burst) уходят с ее
+ограничением скорости, как и потребует сервер. Для сравнения -
+сколько строк стоил бы вход в каналы по одному (JOIN и NAMES на
+канал) и сколько он занял бы при том же ограничении.
+
+    python -m benchmarks.bench_reconnect [каналов, по умолчанию 200]
+"""
+import sys
+import time
+from source.irc_client import IRCClient
+from source.irc_reconnect import Backoff
+from source.irc_session import SessionManager
+from source.irc_writer import WriteQueue
+from test.fake_ircd import FakeIRCd
+from test.test_irc_async import wait_for
+from test.test_irc_reconnect import Recorder
+
+MEMBERS = 100
+CHURN = 5
+
+
+def restore(server, channels):
+    """
+    :return: (секунд до восстановления, строк от клиента, строк JOIN,
+    операций над списками участников, из них reset)
+    """
+    manager = SessionManager(IRCClient, reconnect=True)
+    recorder = Recorder()
+    manager.add_listener(recorder)
+    session = manager.open(
+        "127.0.0.1", server.port, "bench", "bench",
+        setup=lambda s: setattr(s.client, "reconnect", Backoff(base=0.0)))
+    client = session.client
+    try:
+        conn = server.wait_client(len(server.connections) - 1)
+        client.join_channels(channels)
+        if not wait_for(lambda: len(client.membership.channels) ==
+                        len(channels), 600):
+            raise TimeoutError("channels were not joined")
+        session.batcher.flush()
+        before = len(recorder.events)
+
+        server.names_size = MEMBERS - CHURN
+        began = time.perf_counter()
+        server.drop(conn)
+        conn = server.wait_client(len(server.connections), 60)
+        if not wait_for(lambda: len(conn.channels) == len(channels) and
+                        not client.rejoining, 600):
+            raise TimeoutError("channels were not restored")
+        # PONG придет после всех NAMES: сервер пишет по порядку
+        server.ping(conn, "sync")
+        if not wait_for(lambda: "sync" in conn.pongs, 60):
+            raise TimeoutError("no PONG")
+        elapsed = time.perf_counter() - began
+
+        session.batcher.flush()
+        ops = [op for event in recorder.events[before:]
+               if event[0] == "members" for op in event[2]]
+        sent = [line for line in conn.received if not line.startswith(
+            ("PONG", "CAP"))]
+        joins = [line for line in sent if line.startswith("JOIN")]
+        resets = sum(1 for op in ops if op[1] == "reset")
+        return elapsed, len(sent), len(joins), len(ops), resets
+    finally:
+        manager.close("bench")
+        server.names_size = MEMBERS
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    channels = [f"#channel-{i}" for i in range(count)]
+    server = FakeIRCd(names_size=MEMBERS)
+    try:
+        elapsed, sent, joins, ops, resets = restore(server, channels)
+    finally:
+        server.close()
+    queue = WriteQueue()
+    naive = 2 * count
+    naive_seconds = max(0, naive - queue.bucket.burst) / queue.bucket.rate
+    print(f"{count} channels, {MEMBERS} members each, "
+          f"{CHURN} left during the drop")
+    print(f"restore                {elapsed * 1000:9.1f} ms")
+    print(f"lines sent             {sent:9} ({joins} JOIN)")
+    print(f"member list ops        {ops:9} ({resets} resets)")
+    print(f"one JOIN+NAMES each    {naive:9} lines, "
+          f"{naive_seconds:.0f} s at the send queue limit")
+
+
+if __name__ == "__main__":
+    main()
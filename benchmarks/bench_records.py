@@ -0,0 +1,145 @@
+"""
+Память на строку чата: 1M строк в 200 каналах от 5000 ников, по
+5000 строк на буфер, как держит их сессия. Сравниваются готовые
+строки "[канал] <ник>: текст", строки, преобразованные в HTML
+(Rendered, как буферы хранили их с TextPipeline), и компактные
+записи BufferSet. Память считает tracemalloc: сколько осталось
+занято после заполнения буферов. Отдельно - время записи строки и
+списки участников 200 каналов по 500 ников с общей таблицей имен
+и без нее.
+
+    python -m benchmarks.bench_records [строк, по умолчанию 1000000]
+"""
+import random
+import sys
+import time
+import tracemalloc
+from collections import deque
+from source.irc_buffers import BufferSet
+from source.irc_members import MembershipTracker
+from source.irc_records import ChatLine, InternTable
+from source.irc_text import TextPipeline
+
+CHANNELS = 200
+NICKS = 5000
+CAPACITY = 5000
+MEMBERS = 500
+TIMED = 100_000
+WORDS = ("the reader thread spends most of its time parsing lines and "
+         "dispatching them to handlers, see https://example.org/docs "
+         "или тут: привет всем :)").split()
+
+
+def messages(count):
+    rand = random.Random(1)
+    for i in range(count):
+        channel = f"#channel{rand.randrange(CHANNELS)}"
+        nick = f"user{rand.randrange(NICKS)}"
+        text = " ".join(rand.choices(WORDS, k=rand.randint(4, 16)))
+        # строки разбора у каждой строки свои, как после parse_message
+        yield "".join(channel), "".join(nick), text
+
+
+class Strings:
+    def __init__(self):
+        self.buffers = {}
+
+    def add(self, channel, nick, text):
+        buffer = self.buffers.get(channel)
+        if buffer is None:
+            buffer = self.buffers[channel] = deque(maxlen=CAPACITY)
+        buffer.append(f"[{channel}] <{nick}>: {text}")
+
+
+class RenderedStrings(Strings):
+    def __init__(self):
+        super().__init__()
+        self.pipeline = TextPipeline(highlights=["me"])
+
+    def add(self, channel, nick, text):
+        buffer = self.buffers.get(channel)
+        if buffer is None:
+            buffer = self.buffers[channel] = deque(maxlen=CAPACITY)
+        buffer.append(self.pipeline.render(f"[{channel}] <{nick}>: {text}"))
+
+
+class Records:
+    def __init__(self):
+        self.table = InternTable()
+        self.buffers = BufferSet(CAPACITY, self.table)
+        self.pipeline = TextPipeline(highlights=["me"])
+
+    def add(self, channel, nick, text):
+        table = self.table
+        line = ChatLine(time.time(), table.intern(channel),
+                        table.intern(nick), text)
+        line.highlight = self.pipeline.highlighted(text)
+        self.buffers.append(channel, (line,))
+
+
+def retained(factory, count):
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    store = factory()
+    for channel, nick, text in messages(count):
+        store.add(channel, nick, text)
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return used, store
+
+
+def append_time(factory, inputs):
+    store = factory()
+    began = time.perf_counter()
+    for channel, nick, text in inputs:
+        store.add(channel, nick, text)
+    return (time.perf_counter() - began) / len(inputs)
+
+
+def members_memory(intern):
+    rand = random.Random(2)
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    tracker = MembershipTracker(intern)
+    for c in range(CHANNELS):
+        channel = f"#channel{c}"
+        # ники из строки NAMES - новые строки для каждого канала
+        line = " ".join(f"user{n}" for n in rand.sample(range(NICKS),
+                                                        MEMBERS))
+        tracker.names_chunk(channel, line.split())
+        tracker.names_end(channel)
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return used
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    inputs = list(messages(TIMED))
+    print(f"{count:,} lines, {CHANNELS} channels, {NICKS} nicks, "
+          f"{CAPACITY} lines per buffer")
+    results = {}
+    for name, factory in (("strings", Strings),
+                          ("strings + Rendered", RenderedStrings),
+                          ("compact records", Records)):
+        used, store = retained(factory, count)
+        kept = min(count, CHANNELS * CAPACITY)
+        results[name] = used / kept
+        print(f"{name:<20} {used / 2 ** 20:8.1f} MiB "
+              f"{used / kept:7.1f} B/line "
+              f"{append_time(factory, inputs) * 1e6:7.2f} us/line")
+        del store
+    base = results["strings + Rendered"]
+    print(f"compact records take {results['compact records'] / base:.0%} "
+          f"of strings + Rendered, "
+          f"{results['compact records'] / results['strings']:.0%} "
+          f"of plain strings")
+    plain = members_memory(None)
+    shared = members_memory(InternTable().intern)
+    print(f"members of {CHANNELS} channels x {MEMBERS}: "
+          f"{plain / 2 ** 20:.1f} MiB, with shared names "
+          f"{shared / 2 ** 20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Цена строки чата в HTML (ChatRenderer): время, цветной ник и текст с
+форматированием mIRC. Сравниваются сборка без кэшей (strftime и
+фрагмент ника на каждую строку), холодный кэш (почти каждый ник
+новый) и горячий (болтают несколько сотен ников, как в живом
+канале). Отдельно - сколько GUI-поток тратит на пачку из 1000 строк,
+когда вставляет готовые строки из потока доставки и когда
+преобразует их сам.
+
+    python -m benchmarks.bench_render
+"""
+import os
+import random
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtWidgets import QApplication  # noqa: E402
+from source.irc_buffers import BufferSet  # noqa: E402
+from source.irc_gui import NetworkView  # noqa: E402
+from source.irc_records import ChatLine  # noqa: E402
+from source.irc_text import (  # noqa: E402
+    ChatRenderer, Rendered, TextPipeline, nick_fragment)
+
+LINES = 100_000
+HOT_NICKS = 300
+COLD_NICKS = 200_000
+BATCH = 1000
+BATCHES = 100
+TEXTS = ["anyone tried the new release?", "\x02build\x02 is \x0303green",
+         "see https://example.org/issue/42 for details :)",
+         "me too, restarting now", "ok"]
+
+
+def make_lines(count, nicks, rand):
+    now = time.time()
+    return [ChatLine(now + i / 100, "#chan", f"user{rand.randrange(nicks)}",
+                     rand.choice(TEXTS))
+            for i in range(count)]
+
+
+def uncached(pipeline, line):
+    # как без кэшей: время и ник собираются для каждой строки заново
+    stamp = time.strftime("%H:%M", time.localtime(line.time))
+    body = pipeline.render(line.text)
+    return Rendered(f'<span class="ts">{stamp}</span> ' +
+                    nick_fragment(line.sender) + " " + body.html,
+                    body.highlight, body.urls)
+
+
+def per_line(render, lines):
+    began = time.perf_counter()
+    for line in lines:
+        render(line)
+    return (time.perf_counter() - began) / len(lines) * 1e6
+
+
+def gui_cost(app, renderer, lines, prebuilt):
+    view = NetworkView("bench", lambda index: None)
+    view.source = BufferSet()
+    view.renderer = renderer
+    view.chat_page.resize(700, 400)
+    view.chat_page.show()
+    view.show_buffer("#chan")
+    app.processEvents()
+    spent = 0.0
+    for number in range(BATCHES):
+        batch = lines[number * BATCH:(number + 1) * BATCH]
+        first = view.source.append("#chan", batch) - len(batch)
+        records = [renderer.render(line) for line in batch] \
+            if prebuilt else None
+        began = time.perf_counter()
+        if prebuilt:
+            view.on_rendered("#chan", first, records)
+        view.on_lines({"#chan": [len(batch), 0]})
+        app.processEvents()
+        spent += time.perf_counter() - began
+    view.close()
+    return spent / BATCHES * 1000
+
+
+def main():
+    app = QApplication.instance() or QApplication([])
+    rand = random.Random(1)
+    pipeline = TextPipeline(highlights=["me"])
+    hot_lines = make_lines(LINES, HOT_NICKS, rand)
+    cold_lines = make_lines(LINES, COLD_NICKS, rand)
+
+    naive = per_line(lambda line: uncached(pipeline, line), hot_lines)
+    cold_renderer = ChatRenderer(pipeline)
+    cold = per_line(cold_renderer.render, cold_lines)
+    hot_renderer = ChatRenderer(pipeline)
+    per_line(hot_renderer.render, hot_lines)
+    hot = per_line(hot_renderer.render, hot_lines)
+    print(f"{LINES:,} lines, render per line:")
+    for label, cost, renderer in (
+            ("no caches", naive, None),
+            (f"cold cache ({COLD_NICKS:,} nicks)", cold, cold_renderer),
+            (f"hot cache ({HOT_NICKS} nicks)", hot, hot_renderer)):
+        info = renderer.nick_fragment.cache_info() if renderer else ""
+        print(f"  {label:<28} {cost:6.2f} us  {info}")
+
+    lines = make_lines(BATCH * BATCHES, HOT_NICKS, rand)
+    inside = gui_cost(app, hot_renderer, lines, prebuilt=False)
+    outside = gui_cost(app, hot_renderer, lines, prebuilt=True)
+    print(f"GUI thread per {BATCH}-line batch:")
+    print(f"  {'render in GUI thread':<28} {inside:6.2f} ms")
+    print(f"  {'insert prebuilt lines':<28} {outside:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Воспроизведение большой записи трафика: синтетическая запись сети с
+50 каналами по 500 участников и потоком сообщений, входов, выходов
+и смен ников (теги server-time, как у современных серверов)
+прогоняется через ReplayClient с максимальной скоростью - без
+метрик и с разбивкой по командам.
+
+    python -m benchmarks.bench_replay [MiB, по умолчанию 256]
+"""
+import os
+import random
+import sys
+import tempfile
+from source.irc_replay import format_report, replay
+
+CHANNELS = 50
+MEMBERS = 500
+
+
+def write_capture(path, size):
+    rand = random.Random(1)
+    words = ("the reader thread spends most of its time parsing lines "
+             "and dispatching them to handlers").split()
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(":srv 001 me :Welcome\r\n:srv 376 me :End of MOTD\r\n")
+        for c in range(CHANNELS):
+            f.write(f":me!u@h JOIN #chan{c}\r\n")
+            names = " ".join(f"user{u}" for u in range(MEMBERS))
+            f.write(f":srv 353 me = #chan{c} :me {names}\r\n"
+                    f":srv 366 me #chan{c} :End\r\n")
+        second = 0
+        while f.tell() < size:
+            second += 1
+            stamp = f"@time=2024-01-01T{second // 3600 % 24:02}:" \
+                    f"{second // 60 % 60:02}:{second % 60:02}.000Z"
+            lines = []
+            for _ in range(100):
+                channel = f"#chan{rand.randrange(CHANNELS)}"
+                user = f"user{rand.randrange(MEMBERS)}"
+                roll = rand.random()
+                if roll < 0.9:
+                    text = " ".join(rand.choices(words, k=10))
+                    lines.append(f"{stamp} :{user}!~u@host PRIVMSG "
+                                 f"{channel} :{text}")
+                elif roll < 0.95:
+                    lines.append(f"{stamp} :{user}!~u@host PART {channel}")
+                    lines.append(f"{stamp} :{user}!~u@host JOIN {channel}")
+                elif roll < 0.98:
+                    lines.append(f"{stamp} :{user}!~u@host MODE {channel} "
+                                 f"+v {user}")
+                else:
+                    lines.append("PING :srv")
+            f.write("\r\n".join(lines) + "\r\n")
+
+
+def main():
+    size = (int(sys.argv[1]) if len(sys.argv) > 1 else 256) << 20
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "capture.log")
+        write_capture(path, size)
+        fast = replay(path, profile=False)
+        print(f"max speed, no timings: {fast.lines / fast.seconds:,.0f} "
+              f"lines/sec, {fast.bytes / 2 ** 20 / fast.seconds:.1f} MiB/s")
+        print()
+        print(format_report(replay(path), top=8))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Правила игнорирования и подсветки на потоке строк как при флуде:
+разбор с RuleSet из нескольких тысяч правил против разбора без
+правил, время одной проверки и сборки правил. Для сравнения -
+проверка тех же правил по одному (fnmatch по маске и re.search по
+тексту), как сделал бы простой список правил.
+
+Смесь правил: игнор ников, хостов и доменов, маски с шаблонами,
+команды бота в каналах (text=^!...) и слова для подсветки.
+
+    python -m benchmarks.bench_rules [правил, по умолчанию 5000]
+"""
+import random
+import re
+import sys
+import time
+from fnmatch import fnmatchcase
+from benchmarks.bench_parser import NullClient
+from source.irc_parser import parse_irc_line, parse_message
+from source.irc_rules import IGNORE, Rule, RuleSet, split_mask
+
+LINES = 200_000
+NAIVE_LINES = 2_000
+CHANNELS = [f"#channel{i}" for i in range(50)]
+
+
+def make_rules(count):
+    rules = []
+    for i in range(count):
+        kind = i % 20
+        if kind < 12:
+            rules.append(Rule("ignore", f"spammer{i}"))
+        elif kind < 15:
+            rules.append(Rule("ignore", f"*!*@10.{i // 256 % 256}."
+                                        f"{i % 256}.1"))
+        elif kind < 17:
+            rules.append(Rule("ignore", f"*!*@*.isp{i}.example"))
+        elif kind == 17:
+            rules.append(Rule("ignore", f"guest{i}*!*@*"))
+        elif kind == 18:
+            rules.append(Rule("ignore", "*", channels=(CHANNELS[i % 50],),
+                              text=f"^!cmd{i}\\b"))
+        else:
+            rules.append(Rule("highlight", "*", text=f"\\bword{i}\\b"))
+    return rules
+
+
+def make_lines(count, rules, rand):
+    words = "the reader thread spends most of its time parsing".split()
+    lines = []
+    for i in range(count):
+        channel = rand.choice(CHANNELS)
+        text = " ".join(rand.choice(words) for _ in range(12))
+        roll = rand.random()
+        if roll < 0.2:
+            # флуд от игнорируемого
+            mask = rand.choice(rules).mask
+            nick = f"spammer{rand.randrange(len(rules))}"
+            host = mask.rpartition("@")[2].replace("*", "x") \
+                if "@" in mask else "host.example"
+            prefix = f"{nick}!~s@{host}"
+        else:
+            prefix = f"user{i % 3000}!~u@host{i % 500}.example.net"
+        if roll > 0.98:
+            text += f" word{rand.randrange(len(rules))}"
+        if 0.5 < roll < 0.55:
+            lines.append(f":{prefix} JOIN {channel}")
+        else:
+            lines.append(f":{prefix} PRIVMSG {channel} :{text}")
+    return lines
+
+
+def naive_check(rules, msg):
+    # правила по одному: так же, как RuleSet, но без сборки
+    if msg.prefix is None or "!" not in msg.prefix:
+        return None
+    prefix = msg.prefix.lower()
+    channel = msg.params[0].lower() if msg.params else ""
+    text = msg.params[-1] if msg.command == "PRIVMSG" else ""
+    verdict = None
+    for rule in rules:
+        if rule.channels and channel not in rule.channels:
+            continue
+        if rule.commands and msg.command not in rule.commands:
+            continue
+        if not fnmatchcase(prefix, "{}!{}@{}".format(
+                *split_mask(rule.mask.lower()))):
+            continue
+        if rule.text and not re.search(rule.text, text, re.IGNORECASE):
+            continue
+        if rule.action == IGNORE:
+            return IGNORE
+        verdict = rule.action
+    return verdict
+
+
+def parse_rate(lines, rules):
+    client = NullClient()
+    client.rules = rules
+    best = None
+    for _ in range(3):
+        began = time.perf_counter()
+        for line in lines:
+            parse_irc_line(line, client)
+        elapsed = time.perf_counter() - began
+        best = elapsed if best is None else min(best, elapsed)
+    return len(lines) / best
+
+
+def check_time(check, rules, messages):
+    began = time.perf_counter()
+    verdicts = [check(rules, msg) for msg in messages]
+    return (time.perf_counter() - began) / len(messages), verdicts
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rand = random.Random(1)
+    rules = make_rules(count)
+    began = time.perf_counter()
+    ruleset = RuleSet(rules)
+    compiled = time.perf_counter() - began
+    lines = make_lines(LINES, rules, rand)
+    messages = [parse_message(line) for line in lines]
+
+    plain = parse_rate(lines, None)
+    ruled = parse_rate(lines, ruleset)
+    per_line, verdicts = check_time(RuleSet.check, ruleset, messages)
+    naive, naive_verdicts = check_time(naive_check, rules,
+                                       messages[:NAIVE_LINES])
+    ignored = verdicts.count(IGNORE)
+    highlighted = len(verdicts) - ignored - verdicts.count(None)
+    print(f"{count} rules compiled in {compiled * 1000:.1f} ms, "
+          f"{LINES} lines: {ignored} ignored, {highlighted} highlighted")
+    print(f"parse, no rules        {plain:12,.0f} lines/sec")
+    print(f"parse + rules          {ruled:12,.0f} lines/sec")
+    print(f"RuleSet.check          {per_line * 1e6:12.2f} us/line")
+    print(f"rules one by one       {naive * 1e6:12.2f} us/line")
+    if naive_verdicts != verdicts[:NAIVE_LINES]:
+        print("warning: verdicts differ from the one-by-one check")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Долгая сессия: 1M строк чата через Scrollback + ScrollbackModel +
+QListView (offscreen) против прежнего QTextEdit, в который строки
+только дописываются. Печатает RSS процесса и время добавления пачки
+по мере роста истории.
+
+    python -m benchmarks.bench_scrollback
+"""
+import os
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtGui import QTextCursor  # noqa: E402
+from PyQt6.QtWidgets import QApplication, QTextEdit  # noqa: E402
+from benchmarks.bench_backends import rss_kb  # noqa: E402
+from source.irc_buffers import BufferSet  # noqa: E402
+from source.irc_gui import NetworkView  # noqa: E402
+from source.irc_records import ChatLine  # noqa: E402
+from source.irc_text import Rendered  # noqa: E402
+
+BATCH = 1000
+
+
+def make_batch(start):
+    return [Rendered(f"[#chan] &lt;user{i % 300}&gt;: message number {i} "
+                     f"with some ordinary chat text", i % 50 == 0, [])
+            for i in range(start, start + BATCH)]
+
+
+def make_lines(start):
+    return [ChatLine(float(i), "#chan", f"user{i % 300}",
+                     f"message number {i} with some ordinary chat text",
+                     i % 50 == 0)
+            for i in range(start, start + BATCH)]
+
+
+def soak_scrollback(app, total, report):
+    view = NetworkView("bench", lambda index: None)
+    view.source = BufferSet()
+    view.chat_page.resize(700, 400)
+    view.chat_page.show()
+    base = rss_kb()
+    for start in range(0, total, BATCH):
+        batch = make_lines(start)
+        began = time.perf_counter()
+        view.source.append("#chan", batch)
+        view.on_lines({"#chan": [len(batch), 0]})
+        app.processEvents()
+        elapsed = time.perf_counter() - began
+        if (start + BATCH) % report == 0:
+            print(f"scrollback {start + BATCH:>9,} lines  "
+                  f"RSS +{(rss_kb() - base) / 1024:7.1f} MB  "
+                  f"batch {elapsed * 1000:7.2f} ms  "
+                  f"on disk {view.active_buffer.model.scrollback.spilled:,}")
+    view.close()
+
+
+def soak_textedit(app, total, report):
+    chat = QTextEdit()
+    chat.setReadOnly(True)
+    chat.resize(700, 400)
+    chat.show()
+    base = rss_kb()
+    for start in range(0, total, BATCH):
+        batch = make_batch(start)
+        began = time.perf_counter()
+        cursor = QTextCursor(chat.document())
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.beginEditBlock()
+        if not chat.document().isEmpty():
+            cursor.insertBlock()
+        cursor.insertHtml("<br>".join(msg.html for msg in batch))
+        cursor.endEditBlock()
+        app.processEvents()
+        elapsed = time.perf_counter() - began
+        if (start + BATCH) % report == 0:
+            print(f"QTextEdit  {start + BATCH:>9,} lines  "
+                  f"RSS +{(rss_kb() - base) / 1024:7.1f} MB  "
+                  f"batch {elapsed * 1000:7.2f} ms")
+
+
+def main():
+    app = QApplication.instance() or QApplication([])
+    soak_textedit(app, 100_000, 20_000)
+    soak_scrollback(app, 1_000_000, 100_000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Разбиение большой вставки на строки PRIVMSG: старая нарезка по 400
+символов против split_message по байтам UTF-8. Показывает число
+строк, сколько из них сервер обрежет (длиннее 512 байт вместе с
+префиксом) и среднее заполнение строки. Для known host наш
+user@host известен по эху JOIN, иначе берется худший случай.
+
+    python -m benchmarks.bench_split
+"""
+import time
+from source.irc_split import MAX_LINE_BYTES, line_budget, split_message
+from source.replace_emotions import replace_emotions
+
+NICK = "tester"
+TARGET = "#channel"
+USERHOST = "~tester@user.example.org"
+PREFIX = f":{NICK}!~{'u' * 9}@{'h' * 63} PRIVMSG {TARGET} :"
+KNOWN_PREFIX = f":{NICK}!{USERHOST} PRIVMSG {TARGET} :"
+
+
+def make_paste(size, sample):
+    words = sample.split()
+    parts = []
+    total = 0
+    i = 0
+    while total < size:
+        word = words[i % len(words)]
+        parts.append(word)
+        total += len(word.encode("utf-8")) + 1
+        i += 1
+    return " ".join(parts)
+
+
+def legacy_split(text):
+    return [replace_emotions(text[i:i + 400])
+            for i in range(0, len(text), 400)]
+
+
+def new_split(text):
+    return split_message(replace_emotions(text), line_budget(TARGET, NICK))
+
+
+def known_host_split(text):
+    return split_message(replace_emotions(text),
+                         line_budget(TARGET, NICK, USERHOST))
+
+
+def measure(func, text, prefix):
+    start = time.perf_counter()
+    parts = func(text)
+    elapsed = time.perf_counter() - start
+    sizes = [len(f"{prefix}{p}\r\n".encode("utf-8")) for p in parts]
+    overflow = sum(size > MAX_LINE_BYTES for size in sizes)
+    fill = sum(sizes) / len(sizes) / MAX_LINE_BYTES
+    return len(parts), overflow, fill, elapsed
+
+
+def main():
+    samples = {
+        "ascii": "the quick brown fox jumps over the lazy dog :) ",
+        "cyrillic": "съешь же ещё этих мягких французских булок :) ",
+        "emoji": "ok 😀 🎉 👍 отлично :D ",
+    }
+    for name, sample in samples.items():
+        text = make_paste(4 << 20, sample)
+        for label, func, prefix in (
+                ("legacy", legacy_split, PREFIX),
+                ("split_message", new_split, PREFIX),
+                ("known host", known_host_split, KNOWN_PREFIX)):
+            lines, overflow, fill, elapsed = measure(func, text, prefix)
+            print(f"{name:<8} {label:<13} {lines:8,} lines  "
+                  f"{overflow:7,} truncated  fill {fill:6.1%}  "
+                  f"{elapsed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
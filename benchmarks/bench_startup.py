@@ -0,0 +1,143 @@
+"""
+Холодный старт и память: main.py --headless (подключение к
+локальному серверу и вход в канал) против GUI (окно показано).
+Каждый замер - новый процесс; время от запуска до готовности,
+память - VmRSS/VmHWM из /proc (только Linux).
+
+    python -m benchmarks.bench_startup [запусков]
+"""
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUI_CHILD = (
+    "import sys\n"
+    "from PyQt6.QtWidgets import QApplication\n"
+    "from source.irc_gui import IRCWindow\n"
+    "app = QApplication(sys.argv)\n"
+    "window = IRCWindow()\n"
+    "window.show()\n"
+    "app.processEvents()\n"
+    "print('ready', flush=True)\n"
+    "sys.stdin.read()\n"
+)
+
+
+class JoinServer:
+    """
+    Сервер на одно подключение: отвечает 001 и сообщает, когда
+    клиент прислал JOIN
+    """
+
+    def __init__(self):
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(1)
+        self.port = self.sock.getsockname()[1]
+        self.joined = threading.Event()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        conn, _ = self.sock.accept()
+        with conn:
+            conn.sendall(b":srv 001 bench :Welcome\r\n")
+            data = b""
+            while not self.joined.is_set():
+                chunk = conn.recv(4096)
+                if not chunk:
+                    return
+                data += chunk
+                if b"JOIN #bench" in data:
+                    self.joined.set()
+            while conn.recv(4096):
+                pass
+
+    def close(self):
+        self.sock.close()
+
+
+def memory(pid):
+    values = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM"):
+                values[key] = int(value.split()[0]) / 1024
+    return values["VmRSS"], values["VmHWM"]
+
+
+def run_headless(config_dir):
+    server = JoinServer()
+    config = os.path.join(config_dir, "bench.ini")
+    with open(config, "w", encoding="utf-8") as f:
+        f.write(f"[client]\nnick = bench\necho = no\n\n"
+                f"[network bench]\nserver = 127.0.0.1\n"
+                f"port = {server.port}\nchannels = #bench\n")
+    began = time.perf_counter()
+    child = subprocess.Popen(
+        [sys.executable, "-m", "source.main", "--headless", "-c", config],
+        cwd=ROOT, stdout=subprocess.DEVNULL)
+    try:
+        if not server.joined.wait(30):
+            raise RuntimeError("headless client did not join")
+        elapsed = time.perf_counter() - began
+        rss, peak = memory(child.pid)
+    finally:
+        child.send_signal(signal.SIGINT)
+        child.wait(10)
+        server.close()
+    return elapsed, rss, peak
+
+
+def run_gui():
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    began = time.perf_counter()
+    child = subprocess.Popen(
+        [sys.executable, "-c", GUI_CHILD], cwd=ROOT, env=env,
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL, text=True)
+    try:
+        if child.stdout.readline().strip() != "ready":
+            raise RuntimeError("GUI did not start")
+        elapsed = time.perf_counter() - began
+        rss, peak = memory(child.pid)
+    finally:
+        child.stdin.close()
+        child.wait(10)
+    return elapsed, rss, peak
+
+
+def run_bare():
+    began = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    return time.perf_counter() - began, 0.0, 0.0
+
+
+def report(name, samples):
+    elapsed = statistics.median(s[0] for s in samples) * 1000
+    rss = statistics.median(s[1] for s in samples)
+    peak = statistics.median(s[2] for s in samples)
+    line = f"{name:<28} {elapsed:8.1f} ms"
+    if rss:
+        line += f"   RSS {rss:6.1f} MB   peak {peak:6.1f} MB"
+    print(line)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    with tempfile.TemporaryDirectory() as config_dir:
+        report("python -c pass", [run_bare() for _ in range(runs)])
+        report("headless: joined channel",
+               [run_headless(config_dir) for _ in range(runs)])
+        report("GUI: window shown", [run_gui() for _ in range(runs)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Стоимость преобразования одной строки чата при росте таблицы
+смайлов: regex replace_emotions (плоская альтернатива, только смайлы)
+против TextPipeline (дерево смайлов + коды mIRC + ссылки + подсветка
+за один проход, результат - HTML).
+
+    python -m benchmarks.bench_text
+"""
+import random
+import re
+import time
+from source.irc_text import TextPipeline
+from source.replace_emotions import EMOTICONS
+
+WORDS = ("hello", "world", "this", "is", "a", "normal", "chat", "line",
+         "with", "some", "words", "tester", "\x02bold\x02",
+         "\x034red\x03", "https://example.org/page?x=1")
+
+
+def make_table(size):
+    table = dict(EMOTICONS)
+    i = 0
+    while len(table) < size:
+        table[f":e{i}:"] = chr(0x1F600 + i % 80)
+        table[f"({i})"] = chr(0x2600 + i % 100)
+        i += 1
+    return table
+
+
+def legacy_replacer(table):
+    # то же построение, что в replace_emotions, но с другой таблицей
+    pattern = re.compile(
+        r'(^|\s)(' + '|'.join(map(re.escape, table.keys())) + r')(?=\s|$)')
+
+    def replace(text):
+        return pattern.sub(lambda m: m.group(1) + table[m.group(2)], text)
+    return replace
+
+
+def make_lines(table, count):
+    rng = random.Random(1)
+    emoticons = list(table)
+    lines = []
+    for _ in range(count):
+        words = [rng.choice(WORDS) for _ in range(12)]
+        words.insert(rng.randrange(12), rng.choice(emoticons))
+        lines.append(" ".join(words))
+    return lines
+
+
+def measure(func, lines):
+    start = time.perf_counter()
+    for line in lines:
+        func(line)
+    return (time.perf_counter() - start) / len(lines) * 1e6
+
+
+def main():
+    for size in (9, 50, 200, 500, 1000):
+        table = make_table(size)
+        lines = make_lines(table, 20_000)
+        legacy = measure(legacy_replacer(table), lines)
+        pipeline = measure(TextPipeline(table, ["tester"]).render, lines)
+        print(f"{size:5} emoticons  replace_emotions {legacy:7.2f} us/line  "
+              f"TextPipeline {pipeline:7.2f} us/line")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Рукопожатие TLS при переподключении: полное против возобновления
+сессии прошлого подключения (TlsTransport), с локальным сервером
+и самоподписанным сертификатом RSA 2048 из тестов. По localhost
+задержки сети нет, поэтому разница - работа обеих сторон: подпись
+сервера, проверка цепочки и обмен ключами. В TLS 1.2 возобновление
+к тому же экономит один круг до сервера; в TLS 1.3 кругов столько
+же, но без сертификатов.
+
+    python -m benchmarks.bench_tls [подключений, по умолчанию 300]
+"""
+import socket
+import ssl
+import statistics
+import sys
+from source.irc_tls import TlsOptions, TlsTransport
+from test.test_irc_tls import CERT, TlsServer
+
+
+def handshakes(server, count, resume, version):
+    transport = TlsTransport(TlsOptions(cafile=CERT))
+    times = []
+    for _ in range(count):
+        if not resume:
+            transport.session = None
+        sock = socket.create_connection(("127.0.0.1", server.port))
+        tls = transport.wrap(sock, "127.0.0.1")
+        if tls.version() != version:
+            raise RuntimeError(f"negotiated {tls.version()}")
+        times.append(transport.last_handshake)
+        # билет TLS 1.3 приходит с первыми данными
+        tls.sendall(b"CAP LS 302\r\n")
+        tls.recv(4096)
+        transport.remember(tls)
+        tls.close()
+    return times, transport.resumed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    server = TlsServer()
+    try:
+        for version, maximum in (("TLSv1.3", ssl.TLSVersion.TLSv1_3),
+                                 ("TLSv1.2", ssl.TLSVersion.TLSv1_2)):
+            server.context.maximum_version = maximum
+            full, _ = handshakes(server, count, False, version)
+            resumed, hits = handshakes(server, count, True, version)
+            full_ms = statistics.median(full) * 1000
+            resumed_ms = statistics.median(resumed) * 1000
+            print(f"{version}, {count} handshakes, median:")
+            print(f"  full       {full_ms:6.2f} ms")
+            print(f"  resumed    {resumed_ms:6.2f} ms  "
+                  f"({hits}/{count} resumed)")
+            print(f"  saved      {full_ms - resumed_ms:6.2f} ms "
+                  f"({1 - resumed_ms / full_ms:.0%})")
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import asyncio
+import threading
+from functools import partial
+from source.irc_buffer import LineReader
+from source.irc_client import IRCClient
+
+
+class EventLoopThread:
+    """
+    Один asyncio-цикл в фоновом потоке, который обслуживает
+    все асинхронные подключения процесса.
+    Мост с GUI: GUI-поток передает работу в цикл через
+    call_soon_threadsafe/run_coroutine_threadsafe, а обратно события
+    приходят сигналами IRCClient через SessionManager и его
+    dispatch.
+    """
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, daemon=True,
+                                       name="irc-event-loop")
+        self.thread.start()
+
+    @classmethod
+    def shared(cls):
+        """
+        Общий цикл процесса, создается при первом обращении
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def in_loop_thread(self):
+        return threading.current_thread() is self.thread
+
+    def submit(self, coro):
+        """
+        Запускает корутину в цикле
+        :return: concurrent.futures.Future
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call(self, func, *args):
+        """
+        Вызывает функцию в потоке цикла
+        """
+        if self.in_loop_thread():
+            func(*args)
+        else:
+            self.loop.call_soon_threadsafe(func, *args)
+
+    def stop(self):
+        """
+        Останавливает цикл и ждет завершения потока
+        """
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+class _IRCProtocol(asyncio.BufferedProtocol):
+    """
+    Протокол asyncio: читает прямо в буфер LineReader и
+    передает готовые строки клиенту.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.reader = LineReader(
+            encoding=client.encoding,
+            fallback_encoding=client.fallback_encoding)
+
+    def connection_made(self, transport):
+        self.client.transport = transport
+
+    def get_buffer(self, sizehint):
+        return self.reader.get_buffer()
+
+    def buffer_updated(self, nbytes):
+        self.client.handle_received(self.reader, nbytes)
+
+    def eof_received(self):
+        return False
+
+    def connection_lost(self, exc):
+        client = self.client
+        client.connected = False
+        client.transport = None
+        if client._wake is not None:
+            client._wake.set()
+        if client._closing.is_set():
+            return
+        if exc is not None:
+            client.message_received.emit(f"Ошибка: {exc}")
+        if client.reconnect is not None:
+            client._reconnect_task = asyncio.get_running_loop() \
+                .create_task(client._reconnect_async())
+
+
+class AsyncIRCClient(IRCClient):
+    """
+    IRC-клиент на asyncio с тем же API и сигналами, что и IRCClient.
+    Все подключения обслуживаются одним циклом EventLoopThread,
+    вместо отдельного потока на каждое подключение.
+    TLS (tls) работает с тем же общим контекстом, но без
+    возобновления сессий: asyncio не передает сессию в рукопожатие.
+    """
+
+    def __init__(self, loop_thread=None):
+        super().__init__()
+        self.loop_thread = loop_thread or EventLoopThread.shared()
+        self.transport = None
+        self._wake = None
+        self._drain_task = None
+        self._reconnect_task = None
+        self._connect_future = None
+
+    def connect(self, server, port, nick, wait=True):
+        """
+        Начинает подключение и сразу возвращает управление,
+        ошибки приходят сигналом message_received.
+        :param server: Адрес сервера
+        :param port: порт подключения (6667, с TLS - 6697)
+        :param nick: ник под которым подключаемся
+        :param wait: не используется, connect никогда не ждет
+        :return: concurrent.futures.Future подключения
+        """
+        self.nick = nick
+        future = self.loop_thread.submit(
+            self.connect_async(server, port, nick))
+        future.add_done_callback(self._on_connect_done)
+        self._connect_future = future
+        return future
+
+    async def connect_async(self, server, port, nick):
+        """
+        Корутина подключения, выполняется в цикле
+        """
+        self.nick = nick
+        self.server, self.port = server, port
+        self.list_request = None
+        self._closing.clear()
+        await self._open()
+        self.register()
+
+    async def _open(self):
+        loop = asyncio.get_running_loop()
+        tls = self.tls
+        await loop.create_connection(
+            lambda: _IRCProtocol(self), self.server, self.port,
+            ssl=tls.context if tls is not None else None,
+            server_hostname=self.server if tls is not None else None)
+        self.connected = True
+        self._wake = asyncio.Event()
+        self.send_queue.on_put = partial(self.loop_thread.call,
+                                         self._wake.set)
+        self._drain_task = loop.create_task(self._drain())
+
+    async def _reconnect_async(self):
+        """
+        Переподключение после обрыва, как IRCClient._reconnect, но
+        ожидание задержки не занимает поток
+        """
+        self.prepare_rejoin()
+        while not self._closing.is_set():
+            await asyncio.sleep(self.next_delay())
+            if self._closing.is_set():
+                return
+            try:
+                await self._open()
+            except OSError as e:
+                self.message_received.emit(f"Ошибка: {e}")
+                continue
+            if self._closing.is_set():
+                self.transport.close()
+                return
+            self.reconnects += 1
+            self.register()
+            self.reconnected.emit()
+            return
+
+    def _on_connect_done(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            self.message_received.emit(f"Ошибка: {future.exception()}")
+
+    def local_address(self):
+        return self.transport.get_extra_info("sockname")[0]
+
+    def send_raw(self, data):
+        """
+        Ставит командный текст в очередь отправки из любого потока
+        :param data:
+        :return: False, если строка отброшена переполненной очередью
+        """
+        if self.connected and self.transport is not None:
+            return self.send_queue.put(data)
+        return False
+
+    async def _drain(self):
+        queue = self.send_queue
+        while self.transport is not None:
+            self._wake.clear()
+            items, delay = queue.take()
+            if items:
+                self.transport.write(
+                    b"".join(payload for _, payload in items))
+                queue.record(items)
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def alive(self):
+        """
+        Подключается, подключен или ждет переподключения, и disconnect
+        не вызывался
+        """
+        if self._closing.is_set():
+            return False
+        if self.connected:
+            return True
+        return any(pending is not None and not pending.done()
+                   for pending in (self._connect_future,
+                                   self._reconnect_task))
+
+    def disconnect(self):
+        """
+        Закрывает подключение и прекращает попытки переподключения
+        """
+        self._closing.set()
+        self.connected = False
+        if self._reconnect_task is not None:
+            self.loop_thread.call(self._reconnect_task.cancel)
+        if self.transport is not None:
+            self.loop_thread.call(self.transport.close)
+
+
+# классы клиента по имени (--backend, backend = в настройках): поток на
+# подключение или все подключения в одном asyncio-цикле
+BACKENDS = {"threads": IRCClient, "asyncio": AsyncIRCClient}
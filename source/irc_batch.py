@@ -0,0 +1,51 @@
+class Batch:
+    """
+    Открытый BATCH IRCv3: тип, параметры и накопленные сообщения
+    """
+    __slots__ = ("ref", "type", "params", "messages")
+
+    def __init__(self, ref, batch_type, params):
+        self.ref = ref
+        self.type = batch_type
+        self.params = params
+        self.messages = []
+
+
+class BatchTracker:
+    """
+    Сообщения с тегом batch откладываются до BATCH -ref и
+    обрабатываются вместе: нетсплит из сотен QUIT дает одно изменение
+    списков участников, история канала - одну пачку строк.
+    Пока пачка применяется, изменения участников копятся в collected.
+    """
+
+    def __init__(self):
+        self._open = {}
+        self.collected = None
+
+    def __len__(self):
+        return len(self._open)
+
+    def open(self, ref, batch_type, params):
+        self._open[ref] = Batch(ref, batch_type, params)
+
+    def add(self, ref, msg):
+        """
+        Откладывает сообщение в открытую пачку
+        :return: False, если пачки с таким ref нет
+        """
+        batch = self._open.get(ref)
+        if batch is None:
+            return False
+        batch.messages.append(msg)
+        return True
+
+    def close(self, ref):
+        """
+        :return: Batch или None для неизвестного ref
+        """
+        return self._open.pop(ref, None)
+
+    def clear(self):
+        self._open.clear()
+        self.collected = None
@@ -0,0 +1,181 @@
+import threading
+import time
+from collections import deque
+
+
+class EventBatcher:
+    """
+    Собирает события клиента в потоке чтения и отдает их пачками
+    не чаще max_rate раз в секунду. События одного вида (строки
+    чата, каналы из LIST) сливаются в одно, пока между ними нет
+    одиночного события, порядок относительно которого важен.
+    """
+
+    def __init__(self, deliver, max_rate=30, max_batch=2000,
+                 max_pending=100000, autostart=True):
+        """
+        :param deliver: функция, получающая список событий [вид, данные]
+        :param max_rate: максимум доставок в секунду
+        :param max_batch: максимум элементов в одной доставке
+        :param max_pending: сколько элементов можно держать в очереди,
+        сверх этого самые старые строки чата отбрасываются
+        :param autostart: запускать поток доставки при первом событии.
+        False - пачки доставляет только flush (в тестах доставка не
+        зависит от потока)
+        """
+        self.deliver = deliver
+        self.interval = 1.0 / max_rate
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.delivered = 0
+        self.merged = 0
+        self.dropped = 0
+        self.batches = 0
+        self._pending = deque()
+        self._open = {}
+        self._count = 0
+        self._last_flush = 0.0
+        self._urgent = False
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._autostart = autostart
+        self._thread = None
+
+    def add(self, kind, *args):
+        """
+        Добавляет одиночное событие
+        :param kind: вид события
+        :param args: данные события
+        """
+        with self._cond:
+            self._pending.append([kind, args])
+            self._open.clear()
+            self._count += 1
+            self._wake()
+
+    def extend(self, kind, items, urgent=False):
+        """
+        Добавляет элементы события, которое можно сливать
+        с ожидающим событием того же вида
+        :param kind: вид события ("message", "channels", ...)
+        :param items: список элементов
+        :param urgent: доставить без ожидания интервала
+        """
+        with self._cond:
+            event = self._open.get(kind)
+            if event is not None:
+                event[1].extend(items)
+                self.merged += len(items)
+            else:
+                event = [kind, list(items)]
+                self._pending.append(event)
+                self._open[kind] = event
+            self._count += len(items)
+            if self._count > self.max_pending:
+                self._trim()
+            if urgent:
+                self._urgent = True
+            self._wake()
+
+    def mark_urgent(self):
+        """
+        Просит доставить накопленное без ожидания интервала
+        """
+        with self._cond:
+            self._urgent = True
+            self._wake()
+
+    def _wake(self):
+        if self._thread is None and self._autostart:
+            self._thread = threading.Thread(
+                target=self._run, daemon=True, name="irc-batcher")
+            self._thread.start()
+        self._cond.notify()
+
+    def _trim(self):
+        excess = self._count - self.max_pending
+        for event in self._pending:
+            if excess <= 0:
+                break
+            if event[0] == "message":
+                cut = min(excess, len(event[1]))
+                del event[1][:cut]
+                excess -= cut
+                self._count -= cut
+                self.dropped += cut
+        self._pending = deque(e for e in self._pending
+                              if not isinstance(e[1], list) or e[1])
+        self._open.clear()
+
+    def pending(self):
+        """
+        Количество элементов, ожидающих доставки
+        """
+        return self._count
+
+    def stats(self):
+        """
+        Счетчики доставки: пачки, элементы, слитые и отброшенные
+        """
+        return {"batches": self.batches, "delivered": self.delivered,
+                "merged": self.merged, "dropped": self.dropped,
+                "pending": self._count}
+
+    def _take(self):
+        batch = []
+        budget = self.max_batch
+        pending = self._pending
+        while pending and budget > 0:
+            kind, payload = pending[0]
+            if isinstance(payload, list):
+                if len(payload) > budget:
+                    batch.append([kind, payload[:budget]])
+                    del payload[:budget]
+                    budget = 0
+                    break
+                budget -= len(payload)
+            else:
+                budget -= 1
+            event = pending.popleft()
+            if self._open.get(kind) is event:
+                del self._open[kind]
+            batch.append(event)
+        taken = self.max_batch - budget
+        self._count -= taken
+        return batch, taken
+
+    def flush(self):
+        """
+        Немедленно доставляет до max_batch накопленных элементов
+        """
+        with self._flush_lock:
+            with self._cond:
+                batch, taken = self._take()
+                self._last_flush = time.monotonic()
+                self._urgent = False
+            if batch:
+                self.batches += 1
+                self.delivered += taken
+                self.deliver(batch)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                delay = self._last_flush + self.interval - time.monotonic()
+                if delay > 0 and not self._urgent:
+                    self._cond.wait(delay)
+                    continue
+            self.flush()
+
+    def stop(self):
+        """
+        Останавливает фоновый поток доставки
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
@@ -0,0 +1,118 @@
+class LineReader:
+    """
+    Приемный буфер для строк IRC. Данные читаются прямо в заранее
+    выделенный bytearray (recv_into), все завершенные строки
+    декодируются одним блоком; если блок не декодируется, строки
+    декодируются по одной с запасной кодировкой.
+    Понимает окончания \\r\\n и \\n.
+    """
+
+    def __init__(self, size=65536, encoding="utf-8",
+                 fallback_encoding="latin-1", min_free=4096):
+        """
+        :param size: начальный размер буфера в байтах
+        :param encoding: основная кодировка строк
+        :param fallback_encoding: кодировка, если строка не декодируется
+        основной (latin-1 декодирует любые байты)
+        :param min_free: минимум свободного места перед чтением
+        """
+        self.encoding = encoding
+        self.fallback_encoding = fallback_encoding
+        self.min_free = min_free
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+
+    def pending(self):
+        """
+        Количество байт незавершенной строки в буфере
+        """
+        return self._end - self._start
+
+    def get_buffer(self):
+        """
+        Возвращает memoryview свободной части буфера для recv_into
+        """
+        if len(self._buf) - self._end < self.min_free:
+            self._compact()
+        return self._view[self._end:]
+
+    def _compact(self):
+        pending = self._end - self._start
+        if pending + self.min_free > len(self._buf):
+            size = len(self._buf) * 2
+            while pending + self.min_free > size:
+                size *= 2
+            buf = bytearray(size)
+            buf[:pending] = self._view[self._start:self._end]
+            self._view.release()
+            self._buf = buf
+            self._view = memoryview(buf)
+        elif pending:
+            self._buf[:pending] = bytes(self._view[self._start:self._end])
+        self._start = 0
+        self._end = pending
+
+    def commit(self, nbytes):
+        """
+        Отмечает nbytes байт, записанных в буфер из get_buffer,
+        и возвращает все завершенные строки.
+        :param nbytes: сколько байт записано
+        :return: список декодированных строк
+        """
+        buf = self._buf
+        start = self._start
+        end = self._end + nbytes
+        last = buf.rfind(b"\n", start, end)
+        if last == -1:
+            self._end = end
+            return []
+        if last + 1 == end:
+            self._start = self._end = 0
+        else:
+            self._start = last + 1
+            self._end = end
+        try:
+            block = str(self._view[start:last], self.encoding)
+        except UnicodeDecodeError:
+            return self._split_lines(start, last)
+        return [line.rstrip("\r") for line in block.split("\n")
+                if line and line != "\r"]
+
+    def _split_lines(self, pos, last):
+        buf = self._buf
+        view = self._view
+        find = buf.find
+        lines = []
+        while pos <= last:
+            nl = find(b"\n", pos, last + 1)
+            stop = nl
+            if stop > pos and buf[stop - 1] == 13:
+                stop -= 1
+            if stop > pos:
+                lines.append(self._decode(view[pos:stop]))
+            pos = nl + 1
+        return lines
+
+    def feed(self, data):
+        """
+        Добавляет готовый кусок байтов (когда recv_into недоступен)
+        :param data: bytes-подобный объект
+        :return: список завершенных строк
+        """
+        lines = []
+        data = memoryview(data)
+        while data:
+            target = self.get_buffer()
+            n = min(len(target), len(data))
+            target[:n] = data[:n]
+            lines.extend(self.commit(n))
+            data = data[n:]
+        return lines
+
+    def _decode(self, chunk):
+        try:
+            return str(chunk, self.encoding)
+        except UnicodeDecodeError:
+            return str(chunk, self.fallback_encoding, "replace")
@@ -0,0 +1,64 @@
+import threading
+from source.irc_records import InternTable, RecordBuffer
+
+SERVER_BUFFER = "*"
+
+
+class BufferSet:
+    """
+    Буферы сообщений одной сети по каналам и приватам. Заполняются в
+    потоке чтения; GUI-поток забирает из них только хвост буфера,
+    который сейчас виден. Строки хранятся компактно (RecordBuffer),
+    ники и каналы в них - номерами из таблицы имен сети.
+    """
+
+    def __init__(self, capacity=5000, table=None):
+        """
+        :param capacity: сколько строк хранить в каждом буфере
+        :param table: InternTable сети, по умолчанию своя
+        """
+        self.capacity = capacity
+        self.table = table if table is not None else InternTable()
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, name):
+        return name.lower() in self._buffers
+
+    def __len__(self):
+        return len(self._buffers)
+
+    def names(self):
+        with self._lock:
+            return [buffer.name for buffer in self._buffers.values()]
+
+    def append(self, name, records):
+        """
+        Дописывает строки в буфер, создавая его при первой строке
+        :param records: ChatLine
+        :return: номер последней строки буфера
+        """
+        key = name.lower()
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if buffer is None:
+                buffer = RecordBuffer(name, self.capacity)
+                self._buffers[key] = buffer
+            for record in records:
+                buffer.append(record, self.table)
+            return buffer.total
+
+    def tail(self, name, since):
+        """
+        Строки, добавленные после строки номер since
+        :return: (список ChatLine, номер последней строки); если
+        часть строк уже вытеснена, возвращается то, что осталось
+        """
+        with self._lock:
+            buffer = self._buffers.get(name.lower())
+            if buffer is None:
+                return [], 0
+            total = buffer.total
+            first = max(since, total - len(buffer))
+            return [buffer.line(number, self.table)
+                    for number in range(first, total)], total
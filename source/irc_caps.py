@@ -0,0 +1,219 @@
+import base64
+from datetime import datetime
+
+WANTED_CAPS = ("multi-prefix", "message-tags", "server-time", "batch",
+               "echo-message", "draft/chathistory")
+SASL_MECHANISMS = ("PLAIN", "EXTERNAL")
+SASL_CHUNK = 400
+
+
+def server_time(tags):
+    """
+    Время сообщения из тега server-time
+    :param tags: словарь тегов IRCMessage или None
+    :return: секунды с начала эпохи или None
+    """
+    if not tags:
+        return None
+    value = tags.get("time")
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(
+            value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+class SaslAuth:
+    """
+    Вход в учетную запись SASL во время регистрации: PLAIN - имя и
+    пароль, EXTERNAL - клиентский сертификат TLS (TlsOptions.certfile)
+    """
+
+    def __init__(self, mechanism="PLAIN", username=None, password=None):
+        """
+        :param mechanism: PLAIN или EXTERNAL
+        :param username: учетная запись (для PLAIN)
+        :param password: пароль (для PLAIN)
+        """
+        mechanism = mechanism.upper()
+        if mechanism not in SASL_MECHANISMS:
+            raise ValueError(f"unsupported SASL mechanism: {mechanism}")
+        if mechanism == "PLAIN" and not (username and password):
+            raise ValueError("SASL PLAIN needs username and password")
+        self.mechanism = mechanism
+        self.username = username
+        self.password = password
+
+    def start(self):
+        return [f"AUTHENTICATE {self.mechanism}"]
+
+    def respond(self, challenge):
+        """
+        Ответ на AUTHENTICATE сервера. Оба механизма ждут пустой вызов
+        "+"; ответ в base64 режется по 400 байт, а ответ ровно из
+        целых кусков заканчивается строкой "+"
+        :param challenge: параметр AUTHENTICATE от сервера
+        :return: строки AUTHENTICATE для отправки
+        """
+        if challenge != "+":
+            return ["AUTHENTICATE *"]
+        if self.mechanism == "PLAIN":
+            payload = f"{self.username}\0{self.username}\0" \
+                      f"{self.password}".encode("utf-8")
+        else:
+            payload = b""
+        data = base64.b64encode(payload).decode("ascii")
+        lines = ["AUTHENTICATE " + data[i:i + SASL_CHUNK]
+                 for i in range(0, len(data), SASL_CHUNK)]
+        if len(data) % SASL_CHUNK == 0:
+            lines.append("AUTHENTICATE +")
+        return lines
+
+
+class CapNegotiator:
+    """
+    Согласование возможностей IRCv3 (CAP LS 302 / REQ / ACK / NAK).
+    Методы разбирают ответы сервера и возвращают строки, которые
+    нужно отправить; регистрация приостановлена сервером до CAP END.
+    Сервер, не знающий CAP, просто отвечает ошибкой на CAP LS и
+    регистрирует нас как обычно.
+    С заданным sasl (SaslAuth) запрашивается и sasl, а CAP END
+    откладывается до конца входа в учетную запись (903 или ошибки
+    902-907): неудачный вход не мешает регистрации.
+    """
+
+    def __init__(self, wanted=WANTED_CAPS, sasl=None):
+        """
+        :param wanted: возможности, которые клиент умеет использовать
+        :param sasl: SaslAuth или None
+        """
+        self.wanted = set(wanted)
+        self.sasl = sasl
+        self.available = {}
+        self.enabled = set()
+        self._requested = set()
+        self._authenticating = False
+        self.done = False
+
+    def __contains__(self, cap):
+        return cap in self.enabled
+
+    def start(self):
+        """
+        Строки в начале подключения, до NICK/USER
+        """
+        self.available.clear()
+        self.enabled.clear()
+        self._requested.clear()
+        self._authenticating = False
+        self.done = False
+        return ["CAP LS 302"]
+
+    def ls(self, params):
+        """
+        CAP * LS [*] :список. Список может прийти несколькими строками,
+        последняя - без "*"
+        :param params: параметры CAP после ника и подкоманды
+        """
+        self._add_available(params[-1])
+        if len(params) > 1 and params[0] == "*":
+            return []
+        return self._request(self._wanted() & set(self.available))
+
+    def new(self, params):
+        """
+        CAP NEW (cap-notify): сервер добавил возможности
+        """
+        names = self._add_available(params[-1])
+        return self._request((self._wanted() & names) - self.enabled)
+
+    def delete(self, params):
+        """
+        CAP DEL: сервер убрал возможности
+        """
+        for name in params[-1].split():
+            self.available.pop(name, None)
+            self.enabled.discard(name)
+        return []
+
+    def ack(self, params):
+        lines = []
+        for name in params[-1].split():
+            if name.startswith("-"):
+                self.enabled.discard(name[1:])
+                self._requested.discard(name[1:])
+            else:
+                self.enabled.add(name)
+                self._requested.discard(name)
+                if name == "sasl" and self.sasl is not None and \
+                        not self.done:
+                    self._authenticating = True
+                    lines += self.sasl.start()
+        return lines + self._finish()
+
+    def nak(self, params):
+        names = set(params[-1].split())
+        # REQ атомарен: отказ в одной возможности отклоняет все,
+        # поэтому список из нескольких запрашивается заново по одной
+        if len(names) > 1:
+            return ["CAP REQ :" + name for name in sorted(names)]
+        self._requested -= names
+        return self._finish()
+
+    def authenticate(self, params):
+        """
+        AUTHENTICATE от сервера во время входа SASL
+        """
+        if not self._authenticating or not params:
+            return []
+        return self.sasl.respond(params[0])
+
+    def sasl_done(self):
+        """
+        Вход SASL закончился (успешно или нет): регистрацию можно
+        продолжать
+        """
+        if not self._authenticating:
+            return []
+        self._authenticating = False
+        return self._finish()
+
+    def registered(self):
+        """
+        Сервер прислал 001: согласование закончено, даже если сервер
+        не поддерживает CAP
+        """
+        self.done = True
+
+    def _add_available(self, text):
+        names = set()
+        for token in text.split():
+            name, _, value = token.partition("=")
+            self.available[name] = value
+            names.add(name)
+        return names
+
+    def _wanted(self):
+        if self.sasl is None:
+            return self.wanted
+        # sasl=PLAIN,EXTERNAL - механизмы сервера (CAP 302), без
+        # нашего просить sasl незачем
+        mechanisms = self.available.get("sasl")
+        if mechanisms and self.sasl.mechanism not in \
+                mechanisms.upper().split(","):
+            return self.wanted
+        return self.wanted | {"sasl"}
+
+    def _request(self, names):
+        if not names:
+            return self._finish()
+        self._requested |= names
+        return ["CAP REQ :" + " ".join(sorted(names))]
+
+    def _finish(self):
+        if self.done or self._requested or self._authenticating:
+            return []
+        self.done = True
+        return ["CAP END"]
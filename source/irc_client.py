@@ -1,87 +1,341 @@
 import socket
 import threading
+import time
+from source.irc_batch import BatchTracker
+from source.irc_buffer import LineReader
+from source.irc_caps import CapNegotiator
+from source.irc_directory import list_command
+from source.irc_history import ChatHistory
+from source.irc_members import MembershipTracker
+from source.irc_metrics import METRICS
 from source.replace_emotions import replace_emotions
 from source.irc_parser import parse_irc_line
-from PyQt6.QtCore import QObject, pyqtSignal
+from source.irc_records import ChatLine, InternTable
+from source.irc_signal import Signal
+from source.irc_split import line_budget, pack_joins, split_message
+from source.irc_writer import WriteQueue, Writer
 
+CONNECT_TIMEOUT = 30
 
-class IRCClient(QObject):
+
+class IRCClient:
     """
     IRC-клиент с поддержкой подключения к IRC-серверу,
     получения списка каналов,
     присоединения к каналу, обмена сообщениями и отслеживания пользователей.
-
+    Не зависит от Qt: события отдаются сигналами irc_signal, их
+    подписчики вызываются в потоке чтения.
+    С заданным reconnect (Backoff) после обрыва переподключается
+    сам: ник, каналы и списки участников переживают обрыв, каналы
+    возвращаются несколькими строками JOIN, а списки участников
+    сверяются с NAMES и меняются только в расхождениях.
+    Строки чата (PRIVMSG, наши сообщения, история) приходят сигналом
+    chat_received записями ChatLine, ники и каналы в них - из таблицы
+    имен сети names; message_received - служебные строки.
+    rules (irc_rules.RuleSet) проверяются сразу после разбора строки:
+    игнорируемое не доходит до сигналов, а у строк чата,
+    подсвеченных правилами, выставлен ChatLine.highlight.
+    С заданным tls (irc_tls.TlsTransport) подключение идет по TLS, а
+    переподключение возобновляет сессию TLS прошлого подключения.
     """
-    message_received = pyqtSignal(str)
-    channels_received = pyqtSignal(list)
-    users_updated = pyqtSignal(list)
+    message_received = Signal(str)
+    chat_received = Signal(object)
+    channels_received = Signal(list)
+    channels_end = Signal()
+    members_changed = Signal(list)
+    channel_joined = Signal(str)
+    registered = Signal()
+    history_received = Signal(str, list)
+    reconnected = Signal()
+    dcc_received = Signal(object)
 
     def __init__(self):
-        super().__init__()
         self.sock = None
+        self.server = None
+        self.port = None
         self.nick = None
+        self.userhost = None
         self.connected = False
         self.read_thread = None
         self.current_channel = None
-        self.users = []
+        self.names = InternTable()
+        self.membership = MembershipTracker(self.names.intern)
+        self.encoding = "utf-8"
+        self.fallback_encoding = "latin-1"
+        self.send_queue = WriteQueue()
+        self.writer = None
+        self.event_log = None
+        self.auto_list = True
+        self.list_min_users = None
+        self.list_request = None
+        self.elist = ""
+        self.caps = CapNegotiator()
+        self.batches = BatchTracker()
+        self.history = ChatHistory()
+        self.rules = None
+        self.tls = None
+        self.reconnect = None
+        self.reconnects = 0
+        self.listing = False
+        self.joined_channels = {}
+        self.rejoining = {}
+        self._closing = threading.Event()
+        self._lock = threading.Lock()
 
-    def connect(self, server, port, nick):
+    def connect(self, server, port, nick, wait=True):
         """
         Подключается к заданному IRC-серверу, слушает входные
         сообщения.
         :param server: Адрес сервера
-        :param port: порт подключения(6667)
+        :param port: порт подключения (6667, с TLS - 6697)
         :param nick: ник под которым подключаемся
+        :param wait: False - поиск адреса, подключение и рукопожатие
+        TLS идут в потоке чтения, connect возвращается сразу, а ошибки
+        приходят сигналом message_received (для GUI-потока)
         """
         self.nick = nick
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.sock.connect((server, port))
+        self.server, self.port = server, port
+        self.list_request = None
+        self._closing.clear()
+        if wait:
+            self._start(self._open_socket())
+            self.register()
+            target = self.listen
+        else:
+            target = self._open_and_listen
+
+        self.read_thread = threading.Thread(target=target, daemon=True)
+        self.read_thread.start()
+
+    def _open_and_listen(self):
+        try:
+            sock = self._open_socket()
+        except OSError as e:
+            if not self._closing.is_set():
+                self.message_received.emit(f"Ошибка: {e}")
+            if not self._reconnect():
+                return
+        else:
+            with self._lock:
+                if self._closing.is_set():
+                    sock.close()
+                    return
+                self._start(sock)
+            self.register()
+        self.listen()
+
+    def _open_socket(self):
+        sock = socket.create_connection((self.server, self.port),
+                                        CONNECT_TIMEOUT)
+        if self.tls is not None:
+            try:
+                sock = self.tls.wrap(sock, self.server)
+            except OSError:
+                sock.close()
+                raise
+        sock.settimeout(None)
+        return sock
+
+    def _start(self, sock):
+        self.sock = sock
         self.connected = True
+        self.writer = Writer(self.send_queue, sock.sendall)
+        self.writer.start()
 
-        self.send_raw(f"NICK {nick}")
-        self.send_raw(f"USER {nick} 0 * :{nick}")
+    def register(self):
+        """
+        Начало регистрации: CAP LS, затем NICK/USER. Сервер ждет
+        CAP END, которое отправит CapNegotiator после ответов на REQ
+        """
+        self.batches.clear()
+        self.history.reset()
+        self.elist = ""
+        for line in self.caps.start():
+            self.send_raw(line)
+        self.send_raw(f"NICK {self.nick}")
+        self.send_raw(f"USER {self.nick} 0 * :{self.nick}")
 
-        self.read_thread = threading.Thread(target=self.listen, daemon=True)
-        self.read_thread.start()
+    def alive(self):
+        """
+        Подключен или еще подключается (переподключается после
+        обрыва), и disconnect не вызывался
+        """
+        if self._closing.is_set():
+            return False
+        thread = self.read_thread
+        return self.connected or (thread is not None and
+                                  thread.is_alive())
+
+    def disconnect(self):
+        """
+        Закрывает подключение, поток чтения завершается и не
+        переподключается
+        """
+        with self._lock:
+            self._closing.set()
+            self._close()
+
+    def _close(self):
+        self.connected = False
+        if self.writer is not None:
+            self.writer.stop()
+        if self.sock is not None:
+            if self.tls is not None:
+                self.tls.remember(self.sock)
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.sock.close()
+
+    def local_address(self):
+        """
+        Наш адрес в подключении к серверу (для DCC)
+        """
+        return self.sock.getsockname()[0]
 
     def send_raw(self, data):
         """
-        Отправляет командный текст серверу
+        Отправляет командный текст серверу. Если запущен поток
+        отправки, строка ставится в очередь с ограничением скорости.
         :param data:
-        :return:
+        :return: False, если строка отброшена переполненной очередью
         """
-        if self.connected:
-            self.sock.send((data + "\r\n").encode("utf-8"))
+        if not self.connected:
+            return False
+        if self.writer is not None:
+            return self.send_queue.put(data)
+        self.sock.sendall((data + "\r\n").encode("utf-8"))
+        return True
 
     def listen(self):
         """
         Слушает сообщения от сервера, обрабатывает строки
-        IRC и вызывает соответствующие сигналы.
+        IRC и вызывает соответствующие сигналы. После обрыва
+        переподключается, если задан reconnect.
         :return:
         """
-        buffer = ""
-        while self.connected:
-            try:
-                data = self.sock.recv(4096).decode("utf-8", errors="ignore")
-                if not data:
+        while True:
+            reader = LineReader(encoding=self.encoding,
+                                fallback_encoding=self.fallback_encoding)
+            while self.connected:
+                try:
+                    nbytes = self.sock.recv_into(reader.get_buffer())
+                    if not nbytes:
+                        self.connected = False
+                        break
+                    self.handle_received(reader, nbytes)
+                except Exception as e:
+                    if not self._closing.is_set():
+                        self.message_received.emit(f"Ошибка: {e}")
+                    self.connected = False
                     break
-                buffer += data
-                while "\r\n" in buffer:
-                    line, buffer = buffer.split("\r\n", 1)
-                    self.handle_line(line)
-            except Exception as e:
-                self.message_received.emit(f"Ошибка: {e}")
-                self.connected = False
+            if not self._reconnect():
                 break
 
+    def _reconnect(self):
+        """
+        Переподключается после обрыва с задержками self.reconnect,
+        пока не получится или пока не вызван disconnect
+        :return: True, если подключение восстановлено
+        """
+        if self.reconnect is None or self._closing.is_set():
+            return False
+        with self._lock:
+            if self._closing.is_set():
+                return False
+            self._close()
+        self.prepare_rejoin()
+        while True:
+            if self._closing.wait(self.next_delay()):
+                return False
+            try:
+                sock = self._open_socket()
+            except OSError as e:
+                self.message_received.emit(f"Ошибка: {e}")
+                continue
+            with self._lock:
+                if self._closing.is_set():
+                    sock.close()
+                    return False
+                self._start(sock)
+            self.reconnects += 1
+            self.register()
+            self.reconnected.emit()
+            return True
+
+    def next_delay(self):
+        """
+        Задержка перед следующей попыткой переподключения, о ней
+        сообщается в буфер сервера
+        """
+        delay = self.reconnect.next()
+        self.message_received.emit(
+            f"Соединение потеряно, переподключение через {delay:.1f} с")
+        return delay
+
+    def prepare_rejoin(self):
+        """
+        Связь оборвалась: запоминает каналы, в которые надо вернуться
+        после регистрации, и выбрасывает то, что относилось к старому
+        подключению. Недошедший LIST будет запрошен заново.
+        """
+        self.rejoining = dict(self.joined_channels)
+        self.membership.clear_pending()
+        self.send_queue.restart()
+        if self.listing:
+            self.listing = False
+            self.list_request = None
+
+    def ready(self):
+        """
+        Регистрация закончена (конец MOTD): задержка переподключения
+        сбрасывается, каналы, в которых мы были до обрыва,
+        возвращаются упакованными строками JOIN
+        """
+        if self.reconnect is not None:
+            self.reconnect.reset()
+        if self.rejoining:
+            for line in pack_joins(self.rejoining.values()):
+                self.send_raw(line)
+
+    def handle_received(self, reader, nbytes):
+        """
+        Обрабатывает байты, только что записанные в буфер reader
+        (после recv_into в его get_buffer)
+        :param reader: LineReader соединения
+        :param nbytes: сколько байт записано
+        """
+        lines = reader.commit(nbytes)
+        if METRICS.enabled:
+            METRICS.count("recv.bytes", nbytes)
+            METRICS.count("recv.lines", len(lines))
+        self.handle_lines(lines)
+
     def handle_line(self, line):
         parse_irc_line(line, self)
 
-    def list_channels(self):
+    def handle_lines(self, lines):
+        """
+        Обрабатывает пачку строк, полученных за одно чтение
+        :param lines: список строк без \r\n
+        """
+        for line in lines:
+            self.handle_line(line)
+
+    def list_channels(self, min_users=None, mask=None):
         """
-        Запрашивает список каналов на сервере
+        Запрашивает список каналов на сервере. Фильтры уходят
+        серверу, если он объявил их в ELIST, иначе придет весь список
+        :param min_users: минимум пользователей, по умолчанию
+        list_min_users
+        :param mask: маска имени канала
         """
-        self.send_raw("LIST")
+        if min_users is None:
+            min_users = self.list_min_users
+        self.list_request = (min_users, mask)
+        self.listing = True
+        self.send_raw(list_command(self.elist, min_users, mask))
 
     def join_channel(self, channel):
         """
@@ -92,19 +346,64 @@ class IRCClient(QObject):
         self.send_raw(f"JOIN {channel}")
         self.current_channel = channel
 
+    def join_channels(self, channels):
+        """
+        Входит в несколько каналов упакованными строками JOIN,
+        пропуская те, где мы уже есть или куда возвращаемся после
+        переподключения
+        :param channels: имена каналов
+        """
+        channels = [channel for channel in channels
+                    if channel.lower() not in self.joined_channels and
+                    channel.lower() not in self.rejoining]
+        for line in pack_joins(channels):
+            self.send_raw(line)
+
     def send_message(self, target, message):
         """
         Отправляет сообщения в указанный канал или
         пользователю. Длинные сообщения разбиваются
-        на части.
+        на части по байтам UTF-8 так, чтобы вместе с префиксом
+        :nick!user@host строка не превысила 512 байт.
         :param target: Имя канала или пользователя
         :param message: само сообщение
+        :return: False, если очередь отправки переполнилась: части с
+        первой отброшенной не отправлены, в чат и журнал не попали
+        """
+        text = replace_emotions(message)
+        budget = line_budget(target, self.nick, self.userhost)
+        # с echo-message сервер сам вернет наше сообщение, уже с
+        # server-time, и оно пройдет обычным путем входящих
+        echo = "echo-message" in self.caps
+        parts = split_message(text, budget)
+        for number, part in enumerate(parts):
+            if not self.send_raw(f"PRIVMSG {target} :{part}"):
+                self.message_received.emit(
+                    f"Ошибка: очередь отправки переполнена, в {target} не "
+                    f"отправлено {len(parts) - number} из {len(parts)} "
+                    f"строк")
+                return False
+            if echo:
+                continue
+            names = self.names
+            self.chat_received.emit(ChatLine(
+                time.time(), names.intern(target), names.intern(self.nick),
+                part))
+            if self.event_log is not None:
+                self.event_log(target, "PRIVMSG", self.nick, part)
+        return True
+
+    def request_history(self, target):
+        """
+        Просит у сервера страницу истории цели раньше самого раннего
+        известного сообщения. Ответ придет сигналом history_received
+        :return: False, если сервер не поддерживает CHATHISTORY, запрос
+        уже идет или история кончилась
         """
-        max_len = 400
-        parts = [message[i:i + max_len] for i in range(0,
-                                                       len(message), max_len)]
-        for part in parts:
-            part_with_emojis = replace_emotions(part)
-            self.send_raw(f"PRIVMSG {target} :{part_with_emojis}")
-            self.message_received.emit(f"[{target}] <{self.nick}>: "
-                                       f"{part_with_emojis}")
+        if "draft/chathistory" not in self.caps or \
+                "batch" not in self.caps:
+            return False
+        line = self.history.request(target)
+        if line is None:
+            return False
+        return self.send_raw(line)
@@ -0,0 +1,443 @@
+"""
+Передача файлов DCC SEND с докачкой (RESUME/ACCEPT).
+
+Отправитель слушает порт и отдает файл через socket.sendfile: байты
+идут из кэша страниц прямо в сокет, без копирования в Python.
+Получатель читает прямо в mmap файла (recv_into в отображенную
+память), файлы без размера - через большой буфер. Каждая передача
+работает в пуле потоков DccManager, поток чтения IRC только
+разбирает CTCP и ставит работу в пул, а GUI получает прогресс не
+чаще progress_interval на передачу.
+"""
+import itertools
+import mmap
+import os
+import select
+import socket
+import struct
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from source.irc_signal import Signal
+
+DCC_WORKERS = 8
+DCC_BUFFER = 1 << 20
+SENDFILE_CHUNK = 64 << 20
+PROGRESS_INTERVAL = 0.25
+ACCEPT_TIMEOUT = 120
+IDLE_TIMEOUT = 60
+
+SEND, RECEIVE = "send", "receive"
+WAITING, ACTIVE, DONE, FAILED, CANCELLED = (
+    "waiting", "active", "done", "failed", "cancelled")
+
+DccRequest = namedtuple("DccRequest",
+                        "nick command filename host port size position "
+                        "token")
+TransferState = namedtuple("TransferState",
+                           "id direction nick filename size bytes rate "
+                           "state error")
+
+
+def default_download_dir():
+    """
+    Каталог для принятых файлов: ~/Downloads
+    """
+    return os.path.join(os.path.expanduser("~"), "Downloads")
+
+
+def _split_filename(text):
+    # имя файла с пробелами приходит в кавычках
+    if text.startswith('"'):
+        end = text.find('"', 1)
+        if end > 0:
+            return text[1:end], text[end + 1:].split()
+    name, _, rest = text.partition(" ")
+    return name, rest.split()
+
+
+def parse_dcc(nick, body):
+    """
+    Разбирает CTCP DCC без обрамляющих \\x01:
+    DCC SEND файл адрес порт [размер [токен]],
+    DCC RESUME файл порт позиция [токен],
+    DCC ACCEPT файл порт позиция [токен]
+    :param nick: отправитель
+    :return: DccRequest или None для чужих и битых запросов
+    """
+    parts = body.split(" ", 2)
+    if len(parts) < 3 or parts[0].upper() != "DCC":
+        return None
+    command = parts[1].upper()
+    filename, args = _split_filename(parts[2])
+    try:
+        if command == "SEND" and len(args) >= 2:
+            size = int(args[2]) if len(args) > 2 else 0
+            token = args[3] if len(args) > 3 else None
+            return DccRequest(nick, command, filename,
+                              dcc_to_ip(args[0]), int(args[1]), size, 0,
+                              token)
+        if command in ("RESUME", "ACCEPT") and len(args) >= 2:
+            token = args[2] if len(args) > 2 else None
+            return DccRequest(nick, command, filename, None,
+                              int(args[0]), 0, int(args[1]), token)
+    except ValueError:
+        return None
+    return None
+
+
+def ctcp_dcc(command, filename, *args):
+    """
+    Текст CTCP DCC для PRIVMSG
+    """
+    if " " in filename:
+        filename = f'"{filename}"'
+    fields = " ".join(str(arg) for arg in args)
+    return f"\x01DCC {command} {filename} {fields}\x01"
+
+
+def ip_to_dcc(host):
+    """
+    Адрес IPv4 в DCC передается одним числом, IPv6 - как есть
+    """
+    try:
+        return struct.unpack("!I", socket.inet_aton(host))[0]
+    except OSError:
+        return host
+
+
+def dcc_to_ip(value):
+    if value.isdigit():
+        return socket.inet_ntoa(struct.pack("!I", int(value)))
+    return value
+
+
+class Transfer:
+    """
+    Одна передача. Счетчики меняет только ее рабочий поток, остальные
+    получают копии TransferState через сигнал progress.
+    """
+    _ids = itertools.count(1)
+
+    def __init__(self, direction, nick, filename, path, size, port=0,
+                 host=None):
+        self.id = next(self._ids)
+        self.direction = direction
+        self.nick = nick
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.port = port
+        self.host = host
+        self.position = 0
+        self.done = 0
+        self.state = WAITING
+        self.error = None
+        self.started = None
+        self.finished = None
+        self.sock = None
+        self.cancelled = False
+        self.reported = 0.0
+
+    def rate(self):
+        """
+        Байт в секунду с начала передачи
+        """
+        if self.started is None:
+            return 0.0
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def snapshot(self):
+        return TransferState(self.id, self.direction, self.nick,
+                             self.filename, self.size,
+                             self.position + self.done, self.rate(),
+                             self.state, self.error)
+
+
+class DccManager:
+    """
+    Передачи DCC всех сетей. handle подписывается на
+    IRCClient.dcc_received (это делает SessionManager), входящие
+    предложения файлов приходят сигналом offered(клиент, DccRequest):
+    принять их - receive, отправить свой файл - send. Сигналы
+    вызываются в рабочих потоках и потоке чтения.
+    """
+    offered = Signal(object, object)
+    progress = Signal(list)
+
+    def __init__(self, download_dir=None, workers=DCC_WORKERS,
+                 progress_interval=PROGRESS_INTERVAL,
+                 accept_timeout=ACCEPT_TIMEOUT):
+        """
+        :param download_dir: куда сохранять принятые файлы
+        :param workers: сколько передач идут одновременно
+        :param progress_interval: не чаще раза в столько секунд на
+        передачу сигнал progress
+        :param accept_timeout: сколько ждать подключения получателя
+        """
+        self.download_dir = download_dir or default_download_dir()
+        self.progress_interval = progress_interval
+        self.accept_timeout = accept_timeout
+        self.public_host = None
+        self.transfers = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers,
+                                        thread_name_prefix="dcc")
+
+    def handle(self, client, request):
+        """
+        CTCP DCC от сервера; вызывается в потоке чтения клиента
+        """
+        if request.command == "SEND":
+            self.offered.emit(client, request)
+        elif request.command == "RESUME":
+            self._on_resume(client, request)
+        elif request.command == "ACCEPT":
+            self._on_accept(request)
+
+    def send(self, client, nick, path):
+        """
+        Предлагает файл нику: открывает порт и ждет подключения
+        :return: Transfer
+        """
+        size = os.path.getsize(path)
+        host = self.public_host or client.local_address()
+        listener = socket.create_server(("", 0))
+        listener.settimeout(self.accept_timeout)
+        port = listener.getsockname()[1]
+        transfer = Transfer(SEND, nick, os.path.basename(path), path, size,
+                            port)
+        transfer.sock = listener
+        self._add(transfer)
+        client.send_raw(f"PRIVMSG {nick} :" + ctcp_dcc(
+            "SEND", transfer.filename, ip_to_dcc(host), port, size))
+        self._pool.submit(self._run, self._serve, transfer)
+        return transfer
+
+    def receive(self, client, request, path=None, resume=True):
+        """
+        Принимает предложенный файл. Если часть файла уже скачана,
+        просит отправителя продолжить с ее конца (DCC RESUME)
+        :param path: куда сохранить, по умолчанию в download_dir
+        :return: Transfer
+        """
+        if path is None:
+            path = os.path.join(self.download_dir,
+                                _safe_name(request.filename))
+        have = os.path.getsize(path) if os.path.exists(path) else 0
+        if have and not (resume and have < request.size):
+            # готовый или чужой файл не затираем
+            path, have = _unique_path(path), 0
+        transfer = Transfer(RECEIVE, request.nick, request.filename, path,
+                            request.size, request.port, request.host)
+        self._add(transfer)
+        if resume and 0 < have < request.size:
+            transfer.position = have
+            client.send_raw(f"PRIVMSG {request.nick} :" + ctcp_dcc(
+                "RESUME", request.filename, request.port, have))
+        else:
+            self._pool.submit(self._run, self._receive, transfer)
+        return transfer
+
+    def cancel(self, transfer_id):
+        """
+        Прерывает передачу; недокачанный файл остается для докачки
+        """
+        transfer = self.transfers.get(transfer_id)
+        if transfer is None or transfer.state in (DONE, FAILED, CANCELLED):
+            return
+        transfer.cancelled = True
+        sock = transfer.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+        if transfer.state == WAITING and sock is None:
+            transfer.state = CANCELLED
+            self._finish(transfer)
+
+    def shutdown(self):
+        """
+        Прерывает все передачи и останавливает пул
+        """
+        for transfer_id in list(self.transfers):
+            self.cancel(transfer_id)
+        self._pool.shutdown(wait=False)
+
+    def _add(self, transfer):
+        with self._lock:
+            self.transfers[transfer.id] = transfer
+            self._pending[(transfer.nick.lower(), transfer.port)] = transfer
+
+    def _on_resume(self, client, request):
+        transfer = self._pending.get((request.nick.lower(), request.port))
+        if transfer is None or transfer.direction != SEND or \
+                transfer.state != WAITING or \
+                not 0 <= request.position <= transfer.size:
+            return
+        # позицию прочтет рабочий поток после accept, а получатель
+        # подключится только после ACCEPT
+        transfer.position = request.position
+        client.send_raw(f"PRIVMSG {request.nick} :" + ctcp_dcc(
+            "ACCEPT", request.filename, request.port, request.position))
+
+    def _on_accept(self, request):
+        transfer = self._pending.get((request.nick.lower(), request.port))
+        if transfer is None or transfer.direction != RECEIVE or \
+                transfer.state != WAITING:
+            return
+        transfer.position = request.position
+        self._pool.submit(self._run, self._receive, transfer)
+
+    def _run(self, work, transfer):
+        try:
+            work(transfer)
+            transfer.state = DONE
+        except Exception as e:
+            transfer.state = CANCELLED if transfer.cancelled else FAILED
+            transfer.error = str(e)
+        finally:
+            if transfer.sock is not None:
+                transfer.sock.close()
+            self._finish(transfer)
+
+    def _finish(self, transfer):
+        transfer.finished = time.monotonic()
+        with self._lock:
+            self._pending.pop((transfer.nick.lower(), transfer.port), None)
+        self.progress.emit([transfer.snapshot()])
+
+    def _begin(self, transfer):
+        if transfer.cancelled:
+            raise ConnectionAbortedError("cancelled")
+        transfer.state = ACTIVE
+        transfer.started = time.monotonic()
+        self._report(transfer, force=True)
+
+    def _report(self, transfer, force=False):
+        now = time.monotonic()
+        if force or now - transfer.reported >= self.progress_interval:
+            transfer.reported = now
+            self.progress.emit([transfer.snapshot()])
+
+    def _serve(self, transfer):
+        listener = transfer.sock
+        try:
+            conn, _ = listener.accept()
+        finally:
+            listener.close()
+        transfer.sock = conn
+        conn.settimeout(IDLE_TIMEOUT)
+        with open(transfer.path, "rb") as f:
+            self._begin(transfer)
+            offset = transfer.position
+            acks = bytearray()
+            while offset < transfer.size:
+                sent = conn.sendfile(
+                    f, offset, min(SENDFILE_CHUNK, transfer.size - offset))
+                if not sent:
+                    raise ConnectionError("receiver closed the connection")
+                offset += sent
+                transfer.done = offset - transfer.position
+                # подтверждения получателя не должны забить его
+                # буфер отправки, читаем их, не дожидаясь
+                while select.select([conn], [], [], 0)[0]:
+                    if not _read_ack(conn, acks):
+                        break
+                self._report(transfer)
+            expected = transfer.size & 0xFFFFFFFF
+            while _last_ack(acks) != expected:
+                if not _read_ack(conn, acks):
+                    break
+
+    def _receive(self, transfer):
+        sock = socket.create_connection((transfer.host, transfer.port),
+                                        timeout=IDLE_TIMEOUT)
+        transfer.sock = sock
+        os.makedirs(os.path.dirname(transfer.path) or ".", exist_ok=True)
+        self._begin(transfer)
+        if transfer.size:
+            self._receive_mapped(transfer, sock)
+        else:
+            self._receive_buffered(transfer, sock)
+
+    def _receive_mapped(self, transfer, sock):
+        size = transfer.size
+        position = transfer.position
+        mode = "r+b" if position else "w+b"
+        with open(transfer.path, mode) as f:
+            f.truncate(size)
+            received = position
+            try:
+                with mmap.mmap(f.fileno(), size) as mapped:
+                    view = memoryview(mapped)
+                    try:
+                        while received < size:
+                            n = sock.recv_into(view[received:min(
+                                received + DCC_BUFFER, size)])
+                            if not n:
+                                raise ConnectionError(
+                                    f"connection closed at {received} "
+                                    f"of {size} bytes")
+                            received += n
+                            sock.sendall(struct.pack(
+                                "!I", received & 0xFFFFFFFF))
+                            transfer.done = received - position
+                            self._report(transfer)
+                    finally:
+                        view.release()
+            finally:
+                # недокачанный файл обрезается до принятого, чтобы его
+                # можно было продолжить через RESUME
+                if received < size:
+                    f.truncate(received)
+
+    def _receive_buffered(self, transfer, sock):
+        buffer = bytearray(DCC_BUFFER)
+        view = memoryview(buffer)
+        received = 0
+        with open(transfer.path, "wb") as f:
+            while True:
+                n = sock.recv_into(buffer)
+                if not n:
+                    break
+                f.write(view[:n])
+                received += n
+                sock.sendall(struct.pack("!I", received & 0xFFFFFFFF))
+                transfer.done = received
+                self._report(transfer)
+
+
+def _read_ack(conn, acks):
+    data = conn.recv(4096)
+    acks += data
+    # нужно только последнее подтверждение и начало следующего
+    extra = len(acks) // 4 * 4 - 4
+    if extra > 0:
+        del acks[:extra]
+    return bool(data)
+
+
+def _last_ack(acks):
+    end = len(acks) // 4 * 4
+    if not end:
+        return None
+    return struct.unpack("!I", acks[end - 4:end])[0]
+
+
+def _unique_path(path):
+    root, ext = os.path.splitext(path)
+    for n in itertools.count(1):
+        candidate = f"{root} ({n}){ext}"
+        if not os.path.exists(candidate):
+            return candidate
+
+
+def _safe_name(filename):
+    name = os.path.basename(filename.replace("\\", "/")).lstrip(".")
+    return name or "download"
@@ -0,0 +1,137 @@
+import json
+import os
+import re
+import time
+
+DEFAULT_TTL = 24 * 3600
+CACHE_VERSION = 1
+_UNSAFE = re.compile(r"[^A-Za-z0-9._-]")
+
+
+def default_cache_dir():
+    """
+    Каталог кэша каналов: $XDG_CACHE_HOME/irclient/channels или
+    ~/.cache/irclient/channels
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or \
+        os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "irclient", "channels")
+
+
+def list_command(elist, min_users=None, mask=None):
+    """
+    Команда LIST с фильтрами на стороне сервера, которые он объявил
+    в ISUPPORT ELIST: U - число пользователей (">N" - больше N),
+    M - маска имени. Фильтр, который сервер не умеет, не
+    отправляется: старые серверы поняли бы ">2" как имя канала.
+    :param elist: буквы ELIST (строка или множество)
+    :param min_users: минимум пользователей
+    :param mask: маска имени канала, например *python*
+    """
+    conditions = []
+    if min_users and min_users > 1 and "U" in elist:
+        conditions.append(f">{min_users - 1}")
+    if mask and "M" in elist:
+        conditions.append(mask)
+    if not conditions:
+        return "LIST"
+    return "LIST " + ",".join(conditions)
+
+
+class ChannelCache:
+    """
+    Кэш каталогов каналов на диске, по файлу на сеть. Строка
+    заголовка в JSON (сеть, время получения, фильтры LIST), дальше
+    по строке на канал: имя, пользователи и тема через табуляцию.
+    Строки LIST пишутся в файл по мере прихода и заменяют прежний
+    каталог только по RPL_LISTEND, так что оборванный LIST кэш не
+    портит.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        """
+        :param path: каталог для файлов кэша (создается при записи)
+        :param ttl: через сколько секунд каталог считается устаревшим
+        """
+        self.path = path
+        self.ttl = ttl
+
+    def file(self, network_id):
+        return os.path.join(self.path,
+                            _UNSAFE.sub("_", network_id) + ".channels")
+
+    def is_fresh(self, header, min_users=None, mask=None, now=None):
+        """
+        Каталог получен меньше ttl назад и с теми же фильтрами
+        """
+        if header is None:
+            return False
+        now = time.time() if now is None else now
+        return now - header.get("fetched", 0) < self.ttl and \
+            header.get("min_users") == min_users and \
+            header.get("mask") == mask
+
+    def load(self, network_id):
+        """
+        :return: (заголовок, список (канал, пользователи, тема)) или
+        (None, []), если кэша нет или он поврежден
+        """
+        try:
+            with open(self.file(network_id), encoding="utf-8") as f:
+                header = json.loads(f.readline())
+                if not isinstance(header, dict) or \
+                        header.get("version") != CACHE_VERSION:
+                    return None, []
+                rows = []
+                for line in f:
+                    name, users, topic = line.rstrip("\n").split("\t", 2)
+                    rows.append((name, int(users), topic))
+        except (OSError, ValueError):
+            return None, []
+        return header, rows
+
+    def writer(self, network_id, min_users=None, mask=None):
+        """
+        :return: CacheWriter для нового LIST этой сети
+        """
+        os.makedirs(self.path, exist_ok=True)
+        return CacheWriter(self.file(network_id), {
+            "version": CACHE_VERSION, "network": network_id,
+            "fetched": time.time(), "min_users": min_users, "mask": mask})
+
+
+class CacheWriter:
+    """
+    Запись одного LIST во временный файл рядом с кэшем. Вызывается
+    из потока чтения клиента.
+    """
+
+    def __init__(self, path, header):
+        self.path = path
+        self.count = 0
+        self._temporary = path + ".part"
+        self._file = open(self._temporary, "w", encoding="utf-8")
+        self._file.write(json.dumps(header) + "\n")
+
+    def write(self, rows):
+        """
+        :param rows: список (канал, пользователи, тема)
+        """
+        self._file.writelines(
+            f"{name}\t{users}\t{topic.replace(chr(9), ' ')}\n"
+            for name, users, topic in rows)
+        self.count += len(rows)
+
+    def commit(self):
+        """
+        LIST закончен: каталог заменяет прежний
+        """
+        self._file.close()
+        os.replace(self._temporary, self.path)
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._temporary)
+        except OSError:
+            pass
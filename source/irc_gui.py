@@ -1,33 +1,564 @@
+import html
+import json
+import tempfile
+import time
+from functools import partial
 from PyQt6.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTextEdit,
-    QListWidget, QLineEdit, QLabel, QTabWidget, QMessageBox
+    QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
+    QListView, QLineEdit, QLabel, QTabWidget, QMessageBox, QComboBox,
+    QStackedWidget, QTableView, QAbstractItemView, QHeaderView,
+    QStyledItemDelegate, QTabBar, QCheckBox, QPlainTextEdit, QFileDialog,
+    QSpinBox
 )
+from PyQt6.QtCore import QPoint, Qt, QSize, QTimer
+from PyQt6.QtGui import QColor, QFont, QFontDatabase, QKeySequence, \
+    QShortcut, QTextDocument
 from source.irc_client import IRCClient
+from source.irc_dcc import DccManager
+from source.irc_directory import ChannelCache
+from source.irc_models import (
+    ChannelDirectoryModel, ChannelFilterProxy, LogSearchModel,
+    ScrollbackModel, TransferModel, UserListModel, format_bytes
+)
+from source.irc_log import LogStore
+from source.irc_metrics import METRICS, Sampler, format_snapshot, rates
+from source.irc_rules import load_rules
+from source.irc_qt import QtDispatcher
+from source.irc_buffers import SERVER_BUFFER
+from source.irc_records import ChatLine
+from source.irc_scrollback import Scrollback
+from source.irc_session import SessionManager
+from source.irc_text import STYLE_SHEET, Rendered, TextPipeline
+from source.irc_tls import TLS_PORT, TlsTransport
+
+HIGHLIGHT_COLOR = QColor("#fff3b0")
+HIGHLIGHT_TAB_COLOR = QColor("#c00000")
+SCROLLBACK_LINES = 5000
+TAB_REFRESH_MS = 500
+METRICS_REFRESH_MS = 1000
+HEARTBEAT_MS = 100
+PROFILE_MS = 5000
+LIST_MIN_USERS = 2
+
+
+class ChatLineDelegate(QStyledItemDelegate):
+    """
+    Рисует строку чата как HTML. Высоты строк кэшируются по тексту
+    для текущей ширины, документ для разметки один на представление.
+    """
+    MAX_CACHED = 20000
+
+    def __init__(self, view):
+        super().__init__(view)
+        self.view = view
+        self._doc = QTextDocument()
+        self._doc.setDocumentMargin(1)
+        self._doc.setDefaultStyleSheet(STYLE_SHEET)
+        self._heights = {}
+        self._width = -1
+
+    def _layout(self, text, font, width):
+        doc = self._doc
+        doc.setDefaultFont(font)
+        doc.setHtml(text)
+        doc.setTextWidth(width)
+        return doc
+
+    def sizeHint(self, option, index):
+        width = self.view.viewport().width()
+        if width != self._width or len(self._heights) > self.MAX_CACHED:
+            self._heights = {}
+            self._width = width
+        text = index.data()
+        height = self._heights.get(text)
+        if height is None:
+            height = int(self._layout(text, option.font, width)
+                         .size().height())
+            self._heights[text] = height
+        return QSize(width, height)
+
+    def paint(self, painter, option, index):
+        painter.save()
+        if index.data(ScrollbackModel.HighlightRole):
+            painter.fillRect(option.rect, HIGHLIGHT_COLOR)
+        doc = self._layout(index.data(), option.font, option.rect.width())
+        painter.translate(option.rect.topLeft())
+        doc.drawContents(painter)
+        painter.restore()
+
+
+class MetricsPanel(QWidget):
+    """
+    Окно отладки (F12): метрики горячих путей раз в секунду, пока
+    окно открыто, профилирование всех потоков на PROFILE_MS и
+    сохранение снимка в JSON
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent, Qt.WindowType.Window)
+        self.setWindowTitle("IRClient metrics")
+        self.resize(720, 560)
+        self._previous = None
+        self._sampler = None
+
+        self.enabled_box = QCheckBox("Collect metrics")
+        self.enabled_box.setChecked(METRICS.enabled)
+        self.enabled_box.toggled.connect(METRICS.enable)
+        reset_btn = QPushButton("Reset")
+        reset_btn.clicked.connect(METRICS.reset)
+        self.profile_btn = QPushButton("Profile 5 s")
+        self.profile_btn.clicked.connect(self.start_profile)
+        save_btn = QPushButton("Save JSON...")
+        save_btn.clicked.connect(self.save_json)
+        buttons = QHBoxLayout()
+        buttons.addWidget(self.enabled_box)
+        buttons.addStretch(1)
+        buttons.addWidget(reset_btn)
+        buttons.addWidget(self.profile_btn)
+        buttons.addWidget(save_btn)
+
+        font = QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont)
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setFont(font)
+        self.profile_text = QPlainTextEdit()
+        self.profile_text.setReadOnly(True)
+        self.profile_text.setFont(font)
+        self.profile_text.hide()
+
+        layout = QVBoxLayout(self)
+        layout.addLayout(buttons)
+        layout.addWidget(self.text, stretch=2)
+        layout.addWidget(self.profile_text, stretch=1)
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(METRICS_REFRESH_MS)
+        self._timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        self.enabled_box.setChecked(METRICS.enabled)
+        self.refresh()
+        self._timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self._timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self):
+        snapshot = METRICS.snapshot()
+        per_sec = rates(self._previous, snapshot)
+        self._previous = snapshot
+        self.text.setPlainText(format_snapshot(snapshot, per_sec))
+
+    def start_profile(self):
+        if self._sampler is not None:
+            return
+        self._sampler = Sampler()
+        self._sampler.start()
+        self.profile_btn.setEnabled(False)
+        QTimer.singleShot(PROFILE_MS, self.finish_profile)
+
+    def finish_profile(self):
+        sampler, self._sampler = self._sampler, None
+        sampler.stop()
+        self.profile_text.setPlainText(sampler.report())
+        self.profile_text.show()
+        self.profile_btn.setEnabled(True)
+
+    def save_json(self):
+        try:
+            path, _ = QFileDialog.getSaveFileName(
+                self, "Save metrics", "metrics.json", "JSON (*.json)")
+            if not path:
+                return
+            snapshot = METRICS.snapshot()
+            snapshot["rates"] = rates(self._previous, snapshot)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, indent=1)
+        except Exception as e:
+            QMessageBox.critical(self, "Save error", str(e))
+
+
+class BufferView:
+    """
+    GUI-сторона буфера канала: модель (создается при первом показе),
+    сколько строк буфера уже показано и счетчики непрочитанного
+    """
+    __slots__ = ("name", "tab", "model", "shown", "unread", "highlights",
+                 "label")
+
+    def __init__(self, name, tab):
+        self.name = name
+        self.tab = tab
+        self.label = None
+        self.model = None
+        self.shown = 0
+        self.unread = 0
+        self.highlights = 0
+
+
+class NetworkView:
+    """
+    Виджеты одной сети: чат, каталог каналов и списки участников
+    каналов.
+    Переключение сетей меняет только видимую страницу в стеках.
+    У каждого канала свой буфер и вкладка, но представление чата
+    одно: оно показывает модель активного буфера, скрытые буферы
+    не рисуются.
+    """
+
+    def __init__(self, network_id, on_channel_activated):
+        self.network_id = network_id
+        self.source = None
+        self.renderer = None
+        self.follow = None
+        self.fetch_history = None
+        self.buffers = {}
+        self.active_buffer = None
+        self._dirty = set()
+        self._tab_timer = QTimer()
+        self._tab_timer.setSingleShot(True)
+        self._tab_timer.setInterval(TAB_REFRESH_MS)
+        self._tab_timer.timeout.connect(self._refresh_tabs)
+
+        self.buffer_tabs = QTabBar()
+        self.buffer_tabs.setExpanding(False)
+        self.buffer_tabs.currentChanged.connect(self._on_tab_changed)
+        self.chat_view = QListView()
+        self.chat_view.setFont(QFont("Segoe UI Emoji"))
+        self.chat_view.setItemDelegate(ChatLineDelegate(self.chat_view))
+        self.chat_view.setWordWrap(True)
+        self.chat_view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.chat_view.setLayoutMode(QListView.LayoutMode.Batched)
+        self.chat_view.setVerticalScrollMode(
+            QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.chat_view.setSelectionMode(
+            QAbstractItemView.SelectionMode.NoSelection)
+        self.chat_view.verticalScrollBar().valueChanged.connect(
+            self._on_chat_scrolled)
+        self.chat_page = QWidget()
+        chat_layout = QVBoxLayout(self.chat_page)
+        chat_layout.setContentsMargins(0, 0, 0, 0)
+        chat_layout.addWidget(self.buffer_tabs)
+        chat_layout.addWidget(self.chat_view)
+
+        self.channel_model = ChannelDirectoryModel()
+        self.channel_proxy = ChannelFilterProxy()
+        self.channel_proxy.setSourceModel(self.channel_model)
+        self.channels_view = QTableView()
+        self.channels_view.setModel(self.channel_proxy)
+        self.channels_view.setSortingEnabled(True)
+        self.channels_view.sortByColumn(
+            ChannelDirectoryModel.USERS, Qt.SortOrder.DescendingOrder)
+        self.channels_view.setSelectionBehavior(
+            QAbstractItemView.SelectionBehavior.SelectRows)
+        self.channels_view.setEditTriggers(
+            QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.channels_view.verticalHeader().hide()
+        self.channels_view.horizontalHeader().setSectionResizeMode(
+            ChannelDirectoryModel.TOPIC, QHeaderView.ResizeMode.Stretch)
+        self.channels_view.doubleClicked.connect(on_channel_activated)
+
+        self.user_models = {}
+        self.users_view = QListView()
+        self.users_view.setMaximumWidth(150)
+        self.users_view.setUniformItemSizes(True)
+
+    def user_model(self, channel):
+        """
+        Модель участников канала, создается при первом обращении
+        """
+        key = channel.lower()
+        model = self.user_models.get(key)
+        if model is None:
+            model = UserListModel()
+            self.user_models[key] = model
+        return model
+
+    def show_users(self, channel):
+        self.users_view.setModel(self.user_model(channel))
+
+    def buffer(self, name):
+        """
+        Состояние буфера в GUI, при первом обращении появляется вкладка
+        """
+        key = name.lower()
+        state = self.buffers.get(key)
+        if state is None:
+            label = self.network_id if name == SERVER_BUFFER else name
+            blocked = self.buffer_tabs.blockSignals(True)
+            index = self.buffer_tabs.addTab(label)
+            self.buffer_tabs.setTabData(index, name)
+            self.buffer_tabs.blockSignals(blocked)
+            state = BufferView(name, index)
+            self.buffers[key] = state
+            if self.active_buffer is None:
+                self.show_buffer(name)
+        return state
+
+    def on_lines(self, counts):
+        """
+        В буферы пришли строки. Видимый буфер догружает хвост, у
+        остальных только растут счетчики, подписи вкладок
+        обновляются по таймеру
+        :param counts: словарь буфер -> [строк, подсвеченных]
+        """
+        for name, (lines, highlights) in counts.items():
+            state = self.buffer(name)
+            if state is self.active_buffer:
+                self._pull(state)
+            else:
+                state.unread += lines
+                state.highlights += highlights
+                self._dirty.add(state)
+        if self._dirty and not self._tab_timer.isActive():
+            self._tab_timer.start()
+
+    def show_buffer(self, name):
+        """
+        Показывает буфер, дорисовывая только строки, пришедшие,
+        пока он был скрыт
+        """
+        state = self.buffer(name)
+        if self.buffer_tabs.currentIndex() != state.tab:
+            # сигнал currentChanged вызовет show_buffer снова
+            self.buffer_tabs.setCurrentIndex(state.tab)
+            return
+        if state is self.active_buffer:
+            return
+        self.active_buffer = state
+        if name != SERVER_BUFFER:
+            self.show_users(name)
+        if state.model is None:
+            state.model = ScrollbackModel(
+                Scrollback(SCROLLBACK_LINES, tempfile.TemporaryFile()))
+        self.chat_view.setModel(state.model)
+        state.unread = state.highlights = 0
+        self._dirty.add(state)
+        self._pull(state)
+        self.chat_view.scrollToBottom()
+        self._refresh_tabs()
+
+    def render(self, line):
+        """
+        HTML строки буфера в GUI-потоке - для строк, которые поток
+        доставки не подготовил (догрузка буфера при переключении,
+        история с сервера)
+        :param line: ChatLine
+        :return: Rendered
+        """
+        if self.renderer is None:
+            return Rendered(html.escape(str(line), False), line.highlight,
+                            [])
+        return self.renderer.render(line)
+
+    def _pull(self, state):
+        lines, state.shown = self.source.tail(state.name, state.shown)
+        if lines:
+            self._insert(state, [self.render(line) for line in lines])
+        if self.follow is not None:
+            self.follow(state.name, state.shown)
+
+    def on_rendered(self, name, first, records):
+        """
+        Готовые строки видимого буфера из потока доставки
+        :param first: номер первой из них в буфере
+        """
+        state = self.active_buffer
+        if state is None or state.name.lower() != name.lower():
+            return
+        if first > state.shown:
+            # между показанными и готовыми есть строки: их догрузит
+            # _pull
+            self._pull(state)
+            return
+        records = records[state.shown - first:]
+        if records:
+            state.shown += len(records)
+            self._insert(state, records)
+
+    def _insert(self, state, records):
+        bar = self.chat_view.verticalScrollBar()
+        at_bottom = bar.value() >= bar.maximum()
+        if at_bottom:
+            state.model.drop_older()
+            state.model.append(records)
+            self.chat_view.scrollToBottom()
+            return
+        top = self.chat_view.indexAt(QPoint(0, 0)).row()
+        removed = state.model.append(records)
+        if removed and top >= removed:
+            # модель убрала строки над видимыми: прокрутка остается
+            # на той же строке
+            self.chat_view.scrollTo(
+                state.model.index(top - removed, 0),
+                QAbstractItemView.ScrollHint.PositionAtTop)
+
+    def _on_tab_changed(self, index):
+        if index >= 0:
+            self.show_buffer(self.buffer_tabs.tabData(index))
+
+    def _refresh_tabs(self):
+        # setTabText перестраивает панель вкладок, поэтому подпись
+        # меняется только при переходе "прочитано" <-> "есть новые",
+        # а число строк показывает подсказка
+        dirty, self._dirty = self._dirty, set()
+        tabs = self.buffer_tabs
+        for state in dirty:
+            index = state.tab
+            label = self.network_id if state.name == SERVER_BUFFER \
+                else state.name
+            if state.highlights:
+                label += " !"
+            elif state.unread:
+                label += " *"
+            if label != state.label:
+                state.label = label
+                tabs.setTabText(index, label)
+                tabs.setTabTextColor(
+                    index, HIGHLIGHT_TAB_COLOR if state.highlights
+                    else tabs.palette().windowText().color())
+            tabs.setTabToolTip(
+                index, f"{state.unread} new, {state.highlights} highlights"
+                if state.unread else "")
+
+    def show_notice(self, text):
+        """
+        Служебная строка клиента (не от сервера) в буфер сервера
+        """
+        self.source.append(SERVER_BUFFER, [ChatLine.status(text)])
+        self.on_lines({SERVER_BUFFER: [1, 0]})
+
+    def _on_chat_scrolled(self, value):
+        state = self.active_buffer
+        if state is None:
+            return
+        model = state.model
+        if value != 0:
+            return
+        if model.can_load_older():
+            self._keep_top(model.load_older())
+        elif self.fetch_history is not None and \
+                state.name != SERVER_BUFFER:
+            # локальная история кончилась: страница с сервера придет
+            # в on_history
+            self.fetch_history(state.name)
+
+    def _keep_top(self, added):
+        # строки добавлены над видимыми: прокрутка остается на той
+        # же строке, а не прыгает к новому началу
+        if added:
+            self.chat_view.scrollTo(
+                self.active_buffer.model.index(added, 0),
+                QAbstractItemView.ScrollHint.PositionAtTop)
+
+    def on_history(self, name, lines):
+        """
+        Страница истории буфера с сервера
+        :param lines: список ChatLine
+        """
+        state = self.buffers.get(name.lower())
+        if state is None or state.model is None:
+            return
+        added = state.model.prepend_history(
+            [self.render(line) for line in lines])
+        if state is self.active_buffer and \
+                self.chat_view.verticalScrollBar().value() == 0:
+            self._keep_top(added)
+
+    def close(self):
+        for state in self.buffers.values():
+            if state.model is not None:
+                state.model.scrollback.close()
 
 
 class IRCWindow(QWidget):
-    def __init__(self):
+    def __init__(self, client_class=IRCClient, log_path=None,
+                 cache_path=None, download_path=None, rules_path=None):
         super().__init__()
         """
         Инициализирует окно приложения
+        :param client_class: IRCClient (поток на подключение)
+        или AsyncIRCClient (общий asyncio-цикл)
+        :param log_path: файл журнала SQLite; None - журнал не ведется
+        :param cache_path: каталог кэша списков каналов; None - LIST
+        при каждом подключении
+        :param download_path: куда сохранять файлы DCC; None -
+        ~/Downloads
+        :param rules_path: файл правил игнорирования и подсветки
+        (irc_rules) или None
         """
         try:
             self.setWindowTitle("IRClient")
             self.setGeometry(100, 100, 700, 500)
 
-            self.irc = IRCClient()
-            self.irc.message_received.connect(self.on_message)
-            self.irc.channels_received.connect(self.on_channels)
-            self.irc.users_updated.connect(self.on_users)
+            self.log_store = LogStore(log_path) if log_path else None
+            self.dispatcher = QtDispatcher(self)
+            self.dcc = DccManager(download_path)
+            self.dcc.offered.connect(
+                partial(self.dispatcher, self.on_dcc_offer))
+            self.dcc.progress.connect(
+                partial(self.dispatcher, self.on_dcc_progress))
+            self.sessions = SessionManager(
+                client_class, pipeline_factory=self.make_pipeline,
+                log_store=self.log_store, dispatch=self.dispatcher,
+                channel_cache=ChannelCache(cache_path) if cache_path
+                else None, list_min_users=LIST_MIN_USERS, reconnect=True,
+                dcc=self.dcc,
+                rules=load_rules(rules_path) if rules_path else None)
+            self.sessions.add_listener(self)
+            self.views = {}
+            self.active_network = None
 
             self.nick = None
             self.server = None
-            self.port = 6667
+            self.port = TLS_PORT
+
+            self.metrics_panel = None
+            QShortcut(QKeySequence("F12"), self, self.toggle_metrics)
+            # пульс GUI-потока: насколько таймер опоздал - столько
+            # интерфейс не отвечал
+            self._heartbeat_at = time.perf_counter()
+            self._heartbeat = QTimer(self)
+            self._heartbeat.setInterval(HEARTBEAT_MS)
+            self._heartbeat.timeout.connect(self._on_heartbeat)
+            self._heartbeat.start()
 
             self.init_ui()
         except Exception as e:
             QMessageBox.critical(self, "Initialization Error", str(e))
 
+    def toggle_metrics(self):
+        """
+        Показывает или прячет окно метрик
+        """
+        if self.metrics_panel is None:
+            self.metrics_panel = MetricsPanel(self)
+        self.metrics_panel.setVisible(not self.metrics_panel.isVisible())
+
+    def _on_heartbeat(self):
+        now = time.perf_counter()
+        if METRICS.enabled:
+            METRICS.observe("gui.stall", max(
+                0.0, now - self._heartbeat_at - HEARTBEAT_MS / 1000))
+        self._heartbeat_at = now
+
+    @staticmethod
+    def make_pipeline(nick):
+        """
+        Преобразователь входящих строк сети: подсвечивает наш ник
+        """
+        return TextPipeline(highlights=[nick])
+
+    @property
+    def irc(self):
+        """
+        Клиент активной сети
+        """
+        session = self.sessions.get(self.active_network)
+        return session.client if session is not None else None
+
     def init_ui(self):
         """
         Создает все приколюхи интерфейса
@@ -37,7 +568,10 @@ class IRCWindow(QWidget):
 
             top_layout = QHBoxLayout()
             self.server_input = QLineEdit("irc.libera.chat")
-            self.port_input = QLineEdit("6667")
+            self.port_input = QLineEdit(str(TLS_PORT))
+            self.tls_box = QCheckBox("TLS")
+            self.tls_box.setChecked(True)
+            self.tls_box.toggled.connect(self.on_tls_toggled)
             self.nick_input = QLineEdit("kyst")
             self.connect_btn = QPushButton("Connect")
             self.connect_btn.clicked.connect(self.connect_server)
@@ -45,38 +579,57 @@ class IRCWindow(QWidget):
             top_layout.addWidget(self.server_input)
             top_layout.addWidget(QLabel("Port:"))
             top_layout.addWidget(self.port_input)
+            top_layout.addWidget(self.tls_box)
             top_layout.addWidget(QLabel("Nick:"))
             top_layout.addWidget(self.nick_input)
             top_layout.addWidget(self.connect_btn)
             layout.addLayout(top_layout)
 
+            network_layout = QHBoxLayout()
+            self.network_select = QComboBox()
+            self.network_select.currentTextChanged.connect(
+                self.switch_network)
+            network_layout.addWidget(QLabel("Network:"))
+            network_layout.addWidget(self.network_select, stretch=1)
+            layout.addLayout(network_layout)
+
             self.tabs = QTabWidget()
 
-            self.channels_list = QListWidget()
-            self.channels_list.itemDoubleClicked.connect(self.join_channel)
+            self.channels_stack = QStackedWidget()
             channel_tab = QWidget()
             channel_layout = QVBoxLayout()
-            channel_layout.addWidget(QLabel("Available channels:"))
-            channel_layout.addWidget(self.channels_list)
+            filter_layout = QHBoxLayout()
+            self.channel_filter = QLineEdit()
+            self.channel_filter.setPlaceholderText("#name or *glob*")
+            self.channel_filter.textChanged.connect(self.filter_channels)
+            self.min_users_input = QSpinBox()
+            self.min_users_input.setRange(0, 100000)
+            self.min_users_input.setValue(LIST_MIN_USERS)
+            self.min_users_input.setToolTip(
+                "Minimum users (filtered by the server if it supports ELIST)")
+            self.min_users_input.valueChanged.connect(self.set_min_users)
+            self.refresh_btn = QPushButton("Refresh")
+            self.refresh_btn.clicked.connect(self.refresh_channels)
+            filter_layout.addWidget(QLabel("Available channels:"))
+            filter_layout.addWidget(self.channel_filter, stretch=1)
+            filter_layout.addWidget(QLabel("Min users:"))
+            filter_layout.addWidget(self.min_users_input)
+            filter_layout.addWidget(self.refresh_btn)
+            channel_layout.addLayout(filter_layout)
+            channel_layout.addWidget(self.channels_stack)
             channel_tab.setLayout(channel_layout)
             self.tabs.addTab(channel_tab, "Channels")
 
             chat_tab = QWidget()
             chat_layout = QVBoxLayout()
-            self.chat_display = QTextEdit()
-            self.chat_display.setReadOnly(True)
-            from PyQt6.QtGui import QFont
-            emoji_font = QFont("Segoe UI Emoji")
-            self.chat_display.setFont(emoji_font)
-            chat_layout.addWidget(self.chat_display)
-
-            self.users_list = QListWidget()
-            self.users_list.setMaximumWidth(150)
+            self.chat_stack = QStackedWidget()
+            self.users_stack = QStackedWidget()
+            self.users_stack.setMaximumWidth(150)
 
             chat_main_layout = QHBoxLayout()
-            chat_main_layout.addWidget(self.chat_display, stretch=4)
-            chat_main_layout.addWidget(self.users_list, stretch=1)
-            chat_layout.insertLayout(0, chat_main_layout)
+            chat_main_layout.addWidget(self.chat_stack, stretch=4)
+            chat_main_layout.addWidget(self.users_stack, stretch=1)
+            chat_layout.addLayout(chat_main_layout)
 
             msg_layout = QHBoxLayout()
             self.msg_input = QLineEdit()
@@ -89,12 +642,180 @@ class IRCWindow(QWidget):
             chat_tab.setLayout(chat_layout)
             self.tabs.addTab(chat_tab, "Chat")
 
+            if self.log_store is not None:
+                self.tabs.addTab(self.init_search_tab(), "Search")
+            self.tabs.addTab(self.init_transfers_tab(), "Transfers")
+
             layout.addWidget(self.tabs)
             self.setLayout(layout)
 
         except Exception as e:
             QMessageBox.critical(self, "UI Error", str(e))
 
+    def init_search_tab(self):
+        """
+        Вкладка поиска по журналу
+        """
+        search_tab = QWidget()
+        search_layout = QVBoxLayout(search_tab)
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText(
+            'words, "a phrase", prefix*, a OR b')
+        self.search_input.returnPressed.connect(self.search_log)
+        self.search_model = LogSearchModel()
+        self.search_view = QTableView()
+        self.search_view.setModel(self.search_model)
+        self.search_view.verticalHeader().hide()
+        self.search_view.setEditTriggers(
+            QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.search_view.horizontalHeader().setSectionResizeMode(
+            LogSearchModel.TEXT, QHeaderView.ResizeMode.Stretch)
+        self.search_status = QLabel()
+        search_layout.addWidget(self.search_input)
+        search_layout.addWidget(self.search_view)
+        search_layout.addWidget(self.search_status)
+        return search_tab
+
+    def init_transfers_tab(self):
+        """
+        Вкладка передач файлов DCC
+        """
+        transfers_tab = QWidget()
+        transfers_layout = QVBoxLayout(transfers_tab)
+        self.transfer_model = TransferModel()
+        self.transfer_view = QTableView()
+        self.transfer_view.setModel(self.transfer_model)
+        self.transfer_view.verticalHeader().hide()
+        self.transfer_view.setSelectionBehavior(
+            QAbstractItemView.SelectionBehavior.SelectRows)
+        self.transfer_view.setEditTriggers(
+            QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.transfer_view.horizontalHeader().setSectionResizeMode(
+            TransferModel.FILE, QHeaderView.ResizeMode.Stretch)
+        send_layout = QHBoxLayout()
+        self.dcc_nick_input = QLineEdit()
+        self.dcc_nick_input.setPlaceholderText("nick")
+        send_file_btn = QPushButton("Send file...")
+        send_file_btn.clicked.connect(self.send_file)
+        cancel_btn = QPushButton("Cancel")
+        cancel_btn.clicked.connect(self.cancel_transfer)
+        send_layout.addWidget(QLabel("To:"))
+        send_layout.addWidget(self.dcc_nick_input, stretch=1)
+        send_layout.addWidget(send_file_btn)
+        send_layout.addWidget(cancel_btn)
+        transfers_layout.addWidget(self.transfer_view)
+        transfers_layout.addLayout(send_layout)
+        return transfers_tab
+
+    def send_file(self):
+        """
+        Предлагает файл нику через DCC SEND в активной сети
+        """
+        try:
+            nick = self.dcc_nick_input.text().strip()
+            if self.irc is None or not nick:
+                QMessageBox.warning(
+                    self, "Error", "Connect and enter a nickname")
+                return
+            path, _ = QFileDialog.getOpenFileName(self, "Send file")
+            if path:
+                self.dcc.send(self.irc, nick, path)
+        except Exception as e:
+            QMessageBox.critical(self, "DCC error", str(e))
+
+    def cancel_transfer(self):
+        """
+        Прерывает выбранные передачи
+        """
+        for index in self.transfer_view.selectionModel().selectedRows():
+            self.dcc.cancel(self.transfer_model.transfer_id(index.row()))
+
+    def on_dcc_offer(self, client, request):
+        """
+        Входящий DCC SEND: спрашивает, принять ли файл
+        """
+        answer = QMessageBox.question(
+            self, "DCC",
+            f"{request.nick} offers {request.filename} "
+            f"({format_bytes(request.size)}). Accept?")
+        if answer != QMessageBox.StandardButton.Yes:
+            return
+        try:
+            self.dcc.receive(client, request)
+        except Exception as e:
+            QMessageBox.critical(self, "DCC error", str(e))
+
+    def on_dcc_progress(self, states):
+        self.transfer_model.update(states)
+
+    def search_log(self):
+        """
+        Ищет по журналу всех сетей
+        """
+        try:
+            query = self.search_input.text().strip()
+            if not query:
+                return
+            started = time.perf_counter()
+            hits = self.log_store.search(query, limit=200)
+            elapsed = (time.perf_counter() - started) * 1000
+            self.search_model.set_hits(hits)
+            self.search_status.setText(
+                f"{len(hits)} hits in {elapsed:.1f} ms")
+        except Exception as e:
+            self.search_status.setText(f"Search error: {e}")
+
+    def closeEvent(self, event):
+        """
+        Отключается от сетей и дописывает журнал
+        """
+        self.dcc.shutdown()
+        for session in list(self.sessions):
+            self.sessions.close(session.network_id)
+        if self.log_store is not None:
+            self.log_store.close()
+        super().closeEvent(event)
+
+    def add_view(self, network_id):
+        """
+        Создает виджеты для новой сети
+        """
+        view = NetworkView(network_id, self.join_channel)
+        view.buffer_tabs.currentChanged.connect(
+            lambda index: self.on_buffer_changed(network_id))
+        self.views[network_id] = view
+        self.chat_stack.addWidget(view.chat_page)
+        self.channels_stack.addWidget(view.channels_view)
+        self.users_stack.addWidget(view.users_view)
+        self.network_select.addItem(network_id)
+        return view
+
+    def on_buffer_changed(self, network_id):
+        """
+        Сообщения уходят в канал или приват открытой вкладки
+        """
+        session = self.sessions.get(network_id)
+        state = self.views[network_id].active_buffer
+        if session is not None and state is not None and \
+                state.name != SERVER_BUFFER:
+            session.client.current_channel = state.name
+
+    def switch_network(self, network_id):
+        """
+        Показывает состояние выбранной сети без переподключения
+        :param network_id: имя сети
+        """
+        view = self.views.get(network_id)
+        if view is None:
+            return
+        self.active_network = network_id
+        self.chat_stack.setCurrentWidget(view.chat_page)
+        self.channels_stack.setCurrentWidget(view.channels_view)
+        view.channel_proxy.set_pattern(self.channel_filter.text())
+        self.users_stack.setCurrentWidget(view.users_view)
+        if self.network_select.currentText() != network_id:
+            self.network_select.setCurrentText(network_id)
+
     def connect_server(self):
         """
         Обрабатывает подключения к серверу.
@@ -111,61 +832,176 @@ class IRCWindow(QWidget):
                     self, "Error", "Enter Server Name and Nickname")
                 return
 
-            self.irc.connect(self.server, self.port, self.nick)
-            self.chat_display.append(
-                f"Connected to {self.server}: {self.port} as {self.nick}")
+            if self.server in self.sessions:
+                self.switch_network(self.server)
+                return
+
+            view = self.add_view(self.server)
+            # адрес, подключение и рукопожатие TLS - в потоке чтения
+            # клиента, ошибки придут в буфер сервера
+            try:
+                session = self.sessions.open(
+                    self.server, self.port, self.nick,
+                    setup=self.setup_tls if self.tls_box.isChecked()
+                    else None, wait=False)
+            except Exception:
+                self.remove_view(self.server)
+                raise
+            view.source = session.buffers
+            view.renderer = session.renderer
+            view.follow = session.show
+            view.fetch_history = session.client.request_history
+            self.switch_network(self.server)
+            view.show_notice(
+                f"Connecting to {self.server}: {self.port} as {self.nick}"
+                + (" (TLS)" if self.tls_box.isChecked() else ""))
         except Exception as e:
             QMessageBox.critical(self, "Connection error", str(e))
 
-    def on_message(self, msg):
+    @staticmethod
+    def setup_tls(session):
+        session.client.tls = TlsTransport()
+
+    def on_tls_toggled(self, checked):
+        """
+        Стандартный порт меняется вместе с TLS, свой порт остается
+        """
+        port = self.port_input.text()
+        if checked and port == "6667":
+            self.port_input.setText(str(TLS_PORT))
+        elif not checked and port == str(TLS_PORT):
+            self.port_input.setText("6667")
+
+    def remove_view(self, network_id):
+        view = self.views.pop(network_id, None)
+        if view is None:
+            return
+        self.chat_stack.removeWidget(view.chat_page)
+        self.channels_stack.removeWidget(view.channels_view)
+        self.users_stack.removeWidget(view.users_view)
+        view.close()
+        self.network_select.removeItem(
+            self.network_select.findText(network_id))
+
+    def on_messages(self, network_id, messages):
         """
-        Добавляет полученное сообщение в чат
-        :param msg: текст сообщения
+        Пачка строк чата сети: строки уже лежат в буферах сессии
+        :param messages: список (буфер, подсвечена ли строка)
         """
         try:
-            self.chat_display.append(msg)
+            counts = {}
+            for name, highlight in messages:
+                count = counts.get(name)
+                if count is None:
+                    count = counts[name] = [0, 0]
+                count[0] += 1
+                if highlight:
+                    count[1] += 1
+            self.views[network_id].on_lines(counts)
         except Exception as e:
-            print(f"[on_message] Error: {e}")
+            print(f"[on_messages] Error: {e}")
 
-    def on_channels(self, channels):
+    def on_channels(self, network_id, channels):
         """
-        Добавляет полученные каналы в список
+        Откладывает строки LIST для пакетной вставки в каталог сети
+        :param channels: список (канал, пользователи, тема)
         """
         try:
-            for ch in channels:
-                if not any(self.channels_list.item(i).text() == ch
-                           for i in range(self.channels_list.count())):
-                    self.channels_list.addItem(ch)
+            self.views[network_id].channel_model.queue_rows(channels)
         except Exception as e:
             print(f"[on_channels] Error: {e}")
 
-    def join_channel(self, item):
+    def on_channels_end(self, network_id):
+        """
+        RPL_LISTEND: вставляет оставшиеся строки и сортирует каталог
+        """
+        try:
+            self.views[network_id].channel_model.finish()
+        except Exception as e:
+            print(f"[on_channels_end] Error: {e}")
+
+    def set_min_users(self, value):
+        """
+        Фильтр по числу пользователей для следующих LIST
+        """
+        self.sessions.list_min_users = value or None
+        for session in self.sessions:
+            session.client.list_min_users = value or None
+
+    def refresh_channels(self):
+        """
+        Запрашивает каталог каналов активной сети заново
+        """
+        try:
+            if self.irc is not None:
+                self.irc.list_channels()
+        except Exception as e:
+            print(f"[refresh_channels] Error: {e}")
+
+    def filter_channels(self, text):
+        """
+        Фильтрует каталог активной сети по подстроке или шаблону
+        """
+        view = self.views.get(self.active_network)
+        if view is not None:
+            view.channel_proxy.set_pattern(text)
+
+    def on_joined(self, network_id, channel):
+        """
+        Показывает буфер и участников канала, в который мы вошли
+        """
+        try:
+            view = self.views[network_id]
+            view.show_users(channel)
+            view.show_buffer(channel)
+        except Exception as e:
+            print(f"[on_joined] Error: {e}")
+
+    def on_rendered(self, network_id, name, first, records):
+        """
+        Готовые строки видимого буфера сети
+        """
+        try:
+            self.views[network_id].on_rendered(name, first, records)
+        except Exception as e:
+            print(f"[on_rendered] Error: {e}")
+
+    def on_history(self, network_id, target, lines):
+        """
+        История канала с сервера, запрошенная прокруткой вверх
+        """
+        try:
+            self.views[network_id].on_history(target, lines)
+        except Exception as e:
+            print(f"[on_history] Error: {e}")
+
+    def join_channel(self, index):
         """
         Обрабатывает двойной клик по каналу из списка
         каналов, переключает вкладку на чат
-        :param item:
+        :param index: индекс строки в прокси-модели
         """
         try:
-            channel = item.text()
+            view = self.views[self.active_network]
+            row = view.channel_proxy.mapToSource(index).row()
+            channel = view.channel_model.channel(row)
             self.irc.join_channel(channel)
-            self.chat_display.append(f"Connecting to {channel}...")
+            view.show_notice(f"Connecting to {channel}...")
             self.tabs.setCurrentIndex(1)
         except Exception as e:
             print(f"[join_channel] Error: {e}")
 
-    def on_users(self, users):
+    def on_members(self, network_id, ops):
         """
-        Добавляет пользователей
-        :param users:
+        Применяет изменения списков участников построчно
+        :param ops: список (канал, операция, строка, значение)
         """
         try:
-            users_sorted = sorted(users, key=lambda u: (
-                not u.startswith("@"), u.lower()))
-            self.users_list.clear()
-            for user in users_sorted:
-                self.users_list.addItem(user)
+            view = self.views[network_id]
+            for channel, op, row, value in ops:
+                view.user_model(channel).apply(op, row, value)
         except Exception as e:
-            print(f"[on_users] Error: {e}")
+            print(f"[on_members] Error: {e}")
 
     def send_message(self):
         """
@@ -174,9 +1010,10 @@ class IRCWindow(QWidget):
         """
         try:
             text = self.msg_input.text().strip()
-            if not text or not self.irc.current_channel:
+            irc = self.irc
+            if not text or irc is None or not irc.current_channel:
                 return
-            self.irc.send_message(self.irc.current_channel, text)
+            irc.send_message(irc.current_channel, text)
             self.msg_input.clear()
         except Exception as e:
             print(f"[send_message] Error: {e}")
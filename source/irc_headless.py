@@ -0,0 +1,242 @@
+import configparser
+import os
+import sys
+import threading
+from collections import namedtuple
+from functools import partial
+from source.irc_async import BACKENDS
+from source.irc_buffers import SERVER_BUFFER
+from source.irc_caps import SaslAuth
+from source.irc_log import LogStore
+from source.irc_rules import load_rules
+from source.irc_session import SessionManager
+from source.irc_tls import TLS_PORT, TlsOptions, TlsTransport
+
+HeadlessConfig = namedtuple("HeadlessConfig",
+                            "nick log echo networks rules backend",
+                            defaults=(None, "threads"))
+NetworkConfig = namedtuple("NetworkConfig",
+                           "network_id server port nick channels tls sasl",
+                           defaults=(None, None))
+
+
+def load_config(path):
+    """
+    Читает INI-файл для работы без GUI:
+
+        [client]
+        nick = logbot
+        log = irclog.db
+        echo = yes
+        rules = rules.txt
+        backend = asyncio
+
+        [network libera]
+        server = irc.libera.chat
+        tls = yes
+        channels = #python, #rust
+        sasl_username = logbot
+        sasl_password = secret
+
+    У сети можно задать свой nick. log по умолчанию берется из
+    переменной окружения IRCLIENT_LOG, без него журнал не ведется.
+    rules - файл правил игнорирования и подсветки (irc_rules).
+    backend - threads (поток на подключение, по умолчанию) или
+    asyncio (все сети в одном цикле, для десятков сетей).
+    TLS включается tls = yes или портом 6697, порт по умолчанию -
+    6697 с TLS и 6667 без него. tls_verify = no отключает проверку
+    сертификата, tls_cafile - свои корневые сертификаты,
+    tls_certfile и tls_keyfile - клиентский сертификат. С
+    sasl_username и sasl_password клиент входит в учетную запись
+    SASL PLAIN, sasl_mechanism = EXTERNAL - по сертификату.
+    :param path: файл настроек
+    :return: HeadlessConfig
+    """
+    parser = configparser.ConfigParser()
+    if not parser.read(path, encoding="utf-8"):
+        raise ValueError(f"config file not found: {path}")
+    client = parser["client"] if parser.has_section("client") else {}
+    nick = client.get("nick")
+    log = client.get("log") or os.environ.get("IRCLIENT_LOG")
+    echo = parser.getboolean("client", "echo", fallback=True)
+    backend = client.get("backend", "threads")
+    if backend not in BACKENDS:
+        raise ValueError(f"[client]: unknown backend {backend!r}, "
+                         f"expected {' or '.join(BACKENDS)}")
+    networks = []
+    for section in parser.sections():
+        kind, _, name = section.partition(" ")
+        if kind != "network":
+            continue
+        options = parser[section]
+        name = name.strip() or options.get("server")
+        if not options.get("server"):
+            raise ValueError(f"[{section}]: server is required")
+        network_nick = options.get("nick", nick)
+        if not network_nick:
+            raise ValueError(f"[{section}]: nick is required")
+        channels = options.get("channels", "").replace(",", " ").split()
+        port = options.getint("port", 0)
+        tls = None
+        if options.getboolean("tls", fallback=port == TLS_PORT):
+            tls = TlsOptions(options.getboolean("tls_verify", True),
+                             options.get("tls_cafile"),
+                             options.get("tls_certfile"),
+                             options.get("tls_keyfile"))
+        sasl = None
+        mechanism = options.get("sasl_mechanism")
+        if mechanism or options.get("sasl_username"):
+            try:
+                sasl = SaslAuth(mechanism or "PLAIN",
+                                options.get("sasl_username"),
+                                options.get("sasl_password"))
+            except ValueError as e:
+                raise ValueError(f"[{section}]: {e}") from None
+        networks.append(NetworkConfig(
+            name, options["server"],
+            port or (TLS_PORT if tls is not None else 6667),
+            network_nick, channels, tls, sasl))
+    if not networks:
+        raise ValueError("config has no [network ...] sections")
+    return HeadlessConfig(nick, log, echo, networks, client.get("rules"),
+                          backend)
+
+
+class HeadlessRunner:
+    """
+    Клиент без GUI и без Qt: подключается к сетям из настроек,
+    заходит в каналы после регистрации, ведет журнал и печатает
+    строки чата. Слушатель SessionManager вызывается в потоке
+    доставки пачек каждой сети.
+    """
+
+    def __init__(self, config, client_class=None, out=None):
+        """
+        :param config: HeadlessConfig
+        :param client_class: класс клиента, по умолчанию - по
+        config.backend
+        :param out: куда печатать строки, по умолчанию sys.stdout
+        """
+        self.config = config
+        self.out = out if out is not None else sys.stdout
+        self.log_store = LogStore(config.log) if config.log else None
+        rules = load_rules(config.rules) if config.rules else None
+        self.sessions = SessionManager(client_class or
+                                       BACKENDS[config.backend],
+                                       log_store=self.log_store,
+                                       reconnect=True, rules=rules)
+        self.sessions.add_listener(self)
+        self._seen = {}
+        self._out_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self):
+        """
+        Подключается ко всем сетям; ошибка подключения к одной сети
+        не мешает остальным
+        :return: сколько сетей подключено
+        """
+        for network in self.config.networks:
+            try:
+                self.sessions.open(
+                    network.server, network.port, network.nick,
+                    network.network_id,
+                    setup=partial(self._setup, network=network))
+            except Exception as e:
+                self._print(f"[{network.network_id}] Error: {e}")
+        return len(self.sessions)
+
+    @staticmethod
+    def _setup(session, network):
+        client = session.client
+        # полный LIST при каждом подключении боту не нужен
+        client.auto_list = False
+        if network.tls is not None:
+            client.tls = TlsTransport(network.tls)
+        client.caps.sasl = network.sasl
+
+        # после переподключения каналы возвращает сам клиент,
+        # join_channels их пропустит
+        client.registered.connect(partial(client.join_channels,
+                                          network.channels))
+
+    def run(self, poll_interval=1.0):
+        """
+        Работает, пока не вызван stop или пока не отключатся все сети.
+        Сеть, которая переподключается после обрыва, считается живой
+        :return: код выхода процесса
+        """
+        if not self.start():
+            self.stop()
+            return 1
+        try:
+            while not self._stop.wait(poll_interval):
+                if not any(session.client.alive()
+                           for session in self.sessions):
+                    break
+        except KeyboardInterrupt:
+            pass
+        self.stop()
+        return 0
+
+    def stop(self):
+        """
+        Отключается от всех сетей и дописывает журнал
+        """
+        self._stop.set()
+        for session in list(self.sessions):
+            if session.client.connected:
+                session.client.send_raw("QUIT")
+            self.sessions.close(session.network_id)
+        if self.log_store is not None:
+            self.log_store.close()
+            self.log_store = None
+
+    def _print(self, text):
+        with self._out_lock:
+            print(text, file=self.out, flush=True)
+
+    def on_messages(self, network_id, messages):
+        if not self.config.echo:
+            return
+        session = self.sessions.get(network_id)
+        if session is None:
+            return
+        for name in dict.fromkeys(name for name, _ in messages):
+            key = (network_id, name)
+            lines, self._seen[key] = session.buffers.tail(
+                name, self._seen.get(key, 0))
+            for line in lines:
+                # в буфере сервера эхо сырых строк, печатаем только
+                # ошибки и служебные сообщения
+                if name == SERVER_BUFFER and line.text.startswith("<< "):
+                    continue
+                self._print(f"{network_id} {line}")
+
+    def on_channels(self, network_id, channels):
+        pass
+
+    def on_channels_end(self, network_id):
+        pass
+
+    def on_members(self, network_id, ops):
+        pass
+
+    def on_joined(self, network_id, channel):
+        self._print(f"{network_id} joined {channel}")
+
+    def on_history(self, network_id, target, lines):
+        pass
+
+
+def run_headless(path, backend=None):
+    """
+    Точка входа main.py --headless
+    :param path: файл настроек
+    :param backend: имя из BACKENDS вместо backend из файла настроек
+    :return: код выхода
+    """
+    config = load_config(path)
+    if backend is not None:
+        config = config._replace(backend=backend)
+    return HeadlessRunner(config).run()
@@ -0,0 +1,68 @@
+DEFAULT_PAGE = 50
+
+
+class ChatHistory:
+    """
+    Догрузка истории каналов с сервера (IRCv3 draft/chathistory).
+    При входе в канал история не запрашивается: страница
+    CHATHISTORY BEFORE уходит, только когда пользователь докрутил до
+    начала буфера. Граница - время самого раннего известного
+    сообщения цели (server-time); на одну цель одновременно идет не
+    больше одного запроса, после пустого ответа запросы прекращаются.
+    """
+
+    def __init__(self, page_size=DEFAULT_PAGE):
+        """
+        :param page_size: сколько сообщений просить за раз
+        """
+        self.page_size = page_size
+        self.max_limit = None
+        self._oldest = {}
+        self._pending = set()
+        self._exhausted = set()
+
+    def seen(self, target, time):
+        """
+        Пришло живое сообщение цели с тегом time. Запоминается только
+        первое: оно и есть самое раннее
+        """
+        self._oldest.setdefault(target.lower(), time)
+
+    def request(self, target):
+        """
+        :return: команда CHATHISTORY или None, если запрос уже идет
+        или история кончилась
+        """
+        key = target.lower()
+        if key in self._pending or key in self._exhausted:
+            return None
+        limit = self.page_size
+        if self.max_limit:
+            limit = min(limit, self.max_limit)
+        self._pending.add(key)
+        oldest = self._oldest.get(key)
+        if oldest is None:
+            return f"CHATHISTORY LATEST {target} * {limit}"
+        return f"CHATHISTORY BEFORE {target} timestamp={oldest} {limit}"
+
+    def received(self, target, count, first_time):
+        """
+        Пришла пачка истории
+        :param count: сколько в ней сообщений
+        :param first_time: тег time самого раннего из них
+        """
+        key = target.lower()
+        self._pending.discard(key)
+        if not count or first_time is None:
+            self._exhausted.add(key)
+        else:
+            self._oldest[key] = first_time
+
+    def exhausted(self, target):
+        return target.lower() in self._exhausted
+
+    def reset(self):
+        """
+        Новое подключение: незавершенные запросы пропали
+        """
+        self._pending.clear()
@@ -0,0 +1,305 @@
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import deque, namedtuple
+
+LogHit = namedtuple("LogHit", "ts network channel kind nick text snippet")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    network TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    nick TEXT NOT NULL,
+    text TEXT NOT NULL,
+    scope TEXT NOT NULL
+);
+-- канал без учета регистра, как в history; irc_lower
+-- регистрирует каждое подключение LogStore
+DROP INDEX IF EXISTS events_channel;
+CREATE INDEX IF NOT EXISTS events_channel_folded
+    ON events (network, irc_lower(channel), ts);
+CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5 (
+    text, scope, content='events', content_rowid='id'
+);
+"""
+
+
+# 1 - слово канала в scope без учета регистра
+SCHEMA_VERSION = 1
+FTS_OPERATORS = ("AND", "OR", "NOT")
+_QUERY_TOKEN = re.compile(r'"([^"]*)"?|(\S+)')
+
+
+def scope_token(kind, name):
+    """
+    Слово индекса, которым помечены события сети (kind "n") или
+    канала ("c"). Фильтр по нему идет внутри FTS5 (пересечение
+    списков), а не перебором всех совпадений с проверкой канала.
+    Имя канала берется без учета регистра: #Python и #python в IRC -
+    один канал
+    """
+    if kind == "c":
+        name = name.lower()
+    return "%s%08x" % (kind, zlib.crc32(name.encode("utf-8")))
+
+
+def fts_query(query):
+    """
+    Запрос пользователя в выражение FTS5. Слова и "фразы" уходят в
+    кавычках, поэтому двоеточия, скобки и ^ из запроса остаются
+    текстом и не выходят за фильтр столбца. Операторами остаются
+    только OR, AND, NOT между словами и * в конце слова (префикс).
+    :param query: строка поиска
+    :return: выражение FTS5, пустое, если искать нечего
+    """
+    parts = []
+    for phrase, word in _QUERY_TOKEN.findall(query):
+        if word in FTS_OPERATORS:
+            if parts and parts[-1] not in FTS_OPERATORS:
+                parts.append(word)
+            continue
+        prefix = word.endswith("*")
+        text = word.rstrip("*") if word else phrase
+        if text.strip():
+            parts.append('"' + text.replace('"', '""') + '"' +
+                         ("*" if prefix else ""))
+    while parts and parts[-1] in FTS_OPERATORS:
+        parts.pop()
+    return " ".join(parts)
+
+
+class LogStore:
+    """
+    Журнал событий сетей (PRIVMSG, NOTICE, JOIN, PART) в SQLite.
+    record только кладет событие в очередь и никогда не ждет диска;
+    отдельный поток записывает накопленное одной транзакцией.
+    База в режиме WAL, поэтому поиск из GUI-потока не мешает записи.
+    """
+
+    def __init__(self, path, batch_size=5000, flush_interval=0.5,
+                 max_pending=200000):
+        """
+        :param path: файл базы
+        :param batch_size: максимум событий в одной транзакции
+        :param flush_interval: как долго копить события, секунды
+        :param max_pending: предел очереди, сверх него самые старые
+        события отбрасываются
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.written = 0
+        self.dropped = 0
+        self.commits = 0
+        self.error = None
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._stopped = False
+        self._local = threading.local()
+        conn = self._reader()
+        conn.executescript(SCHEMA)
+        self._migrate(conn)
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="irc-log-writer")
+        self._thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.create_function("irc_lower", 1, str.lower, deterministic=True)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @staticmethod
+    def _migrate(conn):
+        # журнал версии 0: слово канала в scope считалось по имени как
+        # есть, события #Python не находились фильтром по #python
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= 1:
+            return
+        with conn:
+            rows = conn.execute(
+                "SELECT id, network, channel, text, scope FROM events "
+                "WHERE channel != irc_lower(channel)").fetchall()
+            for rowid, network, channel, text, scope in rows:
+                fixed = scope_token("n", network) + " " + \
+                    scope_token("c", channel)
+                conn.execute("INSERT INTO events_fts (events_fts, rowid, "
+                             "text, scope) VALUES ('delete', ?, ?, ?)",
+                             (rowid, text, scope))
+                conn.execute("UPDATE events SET scope = ? WHERE id = ?",
+                             (fixed, rowid))
+                conn.execute("INSERT INTO events_fts (rowid, text, scope) "
+                             "VALUES (?, ?, ?)", (rowid, text, fixed))
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def record(self, network, channel, kind, nick, text, ts=None):
+        """
+        Ставит событие в очередь записи, вызывается из потока чтения
+        """
+        event = (time.time() if ts is None else ts, network, channel,
+                 kind, nick, text,
+                 scope_token("n", network) + " " + scope_token("c", channel))
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                self._pending.popleft()
+                self.dropped += 1
+            self._pending.append(event)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def pending(self):
+        return len(self._pending)
+
+    def flush(self, timeout=None):
+        """
+        Ждет, пока очередь будет записана
+        :return: False, если не дождались
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify()
+            while (self._pending or self._in_flight) and \
+                    self._thread.is_alive():
+                left = None if deadline is None else \
+                    deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    return False
+                self._cond.wait(left)
+        return True
+
+    def close(self):
+        """
+        Записывает остаток очереди и останавливает поток записи
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join()
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _run(self):
+        conn = self._connect()
+        insert = "INSERT INTO events (ts, network, channel, kind, nick, " \
+                 "text, scope) VALUES (?, ?, ?, ?, ?, ?, ?)"
+        # индекс пополняется одним INSERT ... SELECT на пачку: триггер
+        # на каждую строку в несколько раз медленнее
+        index = "INSERT INTO events_fts (rowid, text, scope) " \
+                "SELECT id, text, scope FROM events WHERE id > ?"
+        try:
+            while True:
+                with self._cond:
+                    if not self._pending and not self._stopped:
+                        self._cond.wait(self.flush_interval)
+                    if not self._pending:
+                        if self._stopped:
+                            return
+                        continue
+                    count = min(len(self._pending), self.batch_size)
+                    batch = [self._pending.popleft() for _ in range(count)]
+                    self._in_flight = count
+                try:
+                    with conn:
+                        last = conn.execute(
+                            "SELECT coalesce(max(id), 0) FROM events"
+                        ).fetchone()[0]
+                        conn.executemany(insert, batch)
+                        conn.execute(index, (last,))
+                except sqlite3.Error as e:
+                    self.error = e
+                    self.dropped += count
+                else:
+                    self.written += count
+                    self.commits += 1
+                with self._cond:
+                    self._in_flight = 0
+                    self._cond.notify_all()
+        finally:
+            conn.close()
+
+    def search(self, query, network=None, channel=None, limit=50,
+               window=5000):
+        """
+        Полнотекстовый поиск по журналу. Ранжирование bm25 идет среди
+        window самых свежих совпадений: FTS5 перебирает их по rowid
+        от новых к старым и останавливается, поэтому частое слово
+        ищется так же быстро, как редкое, а время не растет с
+        размером журнала.
+        :param query: слова, "фраза", OR, AND, NOT, префикс* (см.
+        fts_query)
+        :param network: искать только в этой сети
+        :param channel: искать только в этом канале, без учета
+        регистра
+        :param limit: сколько результатов вернуть
+        :param window: среди скольких свежих совпадений выбирать
+        :return: список LogHit, лучшие первыми
+        """
+        query = fts_query(query)
+        if not query:
+            return []
+        match = f"text : ({query})"
+        sql = ("SELECT events_fts.rowid, events_fts.rank FROM events_fts "
+               "JOIN events e ON e.id = events_fts.rowid "
+               "WHERE events_fts MATCH ?")
+        args = [None]
+        scope = []
+        if network is not None:
+            scope.append(scope_token("n", network))
+            sql += " AND e.network = ?"
+            args.append(network)
+        if channel is not None:
+            scope.append(scope_token("c", channel))
+            sql += " AND irc_lower(e.channel) = ?"
+            args.append(channel.lower())
+        if scope:
+            match = f"scope : ({' AND '.join(scope)}) AND {match}"
+        args[0] = match
+        sql = (f"SELECT rowid FROM ({sql} ORDER BY events_fts.rowid DESC "
+               f"LIMIT ?) ORDER BY rank LIMIT ?")
+        args += [window, limit]
+        conn = self._reader()
+        ids = [row[0] for row in conn.execute(sql, args)]
+        if not ids:
+            return []
+        marks = ",".join("?" * len(ids))
+        rows = conn.execute(
+            "SELECT e.id, e.ts, e.network, e.channel, e.kind, e.nick, "
+            "e.text, snippet(events_fts, 0, '[', ']', '...', 12) "
+            "FROM events_fts JOIN events e ON e.id = events_fts.rowid "
+            f"WHERE events_fts MATCH ? AND events_fts.rowid IN ({marks})",
+            [match] + ids)
+        found = {row[0]: LogHit(*row[1:]) for row in rows}
+        return [found[i] for i in ids if i in found]
+
+    def history(self, network, channel, limit=100, before=None):
+        """
+        Последние события канала, от старых к новым. Канал - без учета
+        регистра, как в search
+        :param before: только события раньше этого времени
+        """
+        sql = ("SELECT ts, network, channel, kind, nick, text, '' FROM events "
+               "WHERE network = ? AND irc_lower(channel) = ?")
+        args = [network, channel.lower()]
+        if before is not None:
+            sql += " AND ts < ?"
+            args.append(before)
+        sql += " ORDER BY ts DESC LIMIT ?"
+        args.append(limit)
+        rows = self._reader().execute(sql, args).fetchall()
+        rows.reverse()
+        return [LogHit(*row) for row in rows]
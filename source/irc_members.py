@@ -0,0 +1,335 @@
+from bisect import bisect_left
+
+DEFAULT_PREFIX = "(ov)@+"
+DEFAULT_CHANMODES = "beI,k,l,imnpst"
+
+
+def parse_prefix(value):
+    """
+    Разбирает ISUPPORT PREFIX вида (qaohv)~&@%+
+    :return: (режимы, символы) в порядке убывания старшинства
+    """
+    if not value.startswith("(") or ")" not in value:
+        return "", ""
+    modes, symbols = value[1:].split(")", 1)
+    return modes, symbols[:len(modes)]
+
+
+class ChannelMembers:
+    """
+    Отсортированный список участников канала: сначала по старшему
+    префиксу (@, +, ...), затем по нику без учета регистра.
+    Поиск места - бинарный, каждая операция возвращает номер строки,
+    чтобы представление могло обновить ровно одну строку.
+    """
+
+    def __init__(self, name, symbols="@+", intern=None):
+        """
+        :param name: имя канала
+        :param symbols: символы префиксов в порядке старшинства
+        :param intern: функция, возвращающая общую копию строки
+        (InternTable.intern): ник, который сидит в сотне каналов,
+        хранится один раз
+        """
+        self.name = name
+        self.symbols = symbols
+        self.intern = intern
+        self._keys = []
+        self._members = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, nick):
+        return nick.lower() in self._members
+
+    def _key(self, nick, prefixes):
+        rank = len(self.symbols)
+        for symbol in prefixes:
+            rank = min(rank, self.symbols.index(symbol))
+        if self.intern is None:
+            return rank, nick.lower(), nick
+        return rank, self.intern(nick.lower()), self.intern(nick)
+
+    def display(self, row):
+        """
+        Строка для показа: старший префикс и ник
+        """
+        nick = self._keys[row][2]
+        prefixes = self._members[nick.lower()][1]
+        return self._best(prefixes) + nick
+
+    def _best(self, prefixes):
+        if not prefixes:
+            return ""
+        return min(prefixes, key=self.symbols.index)
+
+    def items(self):
+        """
+        Все участники в порядке показа
+        """
+        return [self.display(row) for row in range(len(self._keys))]
+
+    def split(self, entry):
+        """
+        Отделяет префиксы от ника в записи NAMES (с multi-prefix
+        префиксов может быть несколько)
+        :return: (префиксы, ник)
+        """
+        i = 0
+        while i < len(entry) and entry[i] in self.symbols:
+            i += 1
+        return entry[:i], entry[i:]
+
+    def prefixes(self, nick):
+        member = self._members.get(nick.lower())
+        return member[1] if member else None
+
+    def add(self, nick, prefixes=""):
+        """
+        Добавляет участника
+        :return: номер новой строки или None, если уже есть
+        """
+        folded = nick.lower()
+        if folded in self._members:
+            return None
+        key = self._key(nick, prefixes)
+        self._members[key[1]] = [key, prefixes]
+        row = bisect_left(self._keys, key)
+        self._keys.insert(row, key)
+        return row
+
+    def remove(self, nick):
+        """
+        Удаляет участника
+        :return: номер удаленной строки или None
+        """
+        member = self._members.pop(nick.lower(), None)
+        if member is None:
+            return None
+        row = bisect_left(self._keys, member[0])
+        del self._keys[row]
+        return row
+
+    def set_prefixes(self, nick, prefixes):
+        """
+        Меняет префиксы участника
+        :return: (старая строка, новая строка) или None
+        """
+        member = self._members.get(nick.lower())
+        if member is None:
+            return None
+        nick = member[0][2]
+        old_row = self.remove(nick)
+        new_row = self.add(nick, prefixes)
+        return old_row, new_row
+
+    def rename(self, old, new):
+        """
+        Смена ника с сохранением префиксов
+        :return: (старая строка, новая строка) или None
+        """
+        member = self._members.get(old.lower())
+        if member is None:
+            return None
+        old_row = self.remove(old)
+        new_row = self.add(new, member[1])
+        return old_row, new_row
+
+    def bulk_load(self, entries):
+        """
+        Заполняет пустой список записями NAMES одной сортировкой
+        """
+        for entry in entries:
+            prefixes, nick = self.split(entry)
+            folded = nick.lower()
+            if nick and folded not in self._members:
+                key = self._key(nick, prefixes)
+                self._members[key[1]] = [key, prefixes]
+                self._keys.append(key)
+        self._keys.sort()
+
+    def reconcile(self, fresh):
+        """
+        Приводит список к fresh (свежему списку NAMES того же канала)
+        по одному участнику: ушедшие и сменившие префиксы удаляются,
+        новые вставляются
+        :param fresh: ChannelMembers
+        :return: список (операция, строка, текст) или None, если
+        операций вышло больше, чем строк, и проще заменить список
+        целиком
+        """
+        stale = [member[0][2] for folded, member in self._members.items()
+                 if fresh._members.get(folded) != member]
+        added = [member for folded, member in fresh._members.items()
+                 if self._members.get(folded) != member]
+        if len(stale) + len(added) > max(len(self), len(fresh)):
+            return None
+        ops = []
+        for nick in stale:
+            ops.append(("remove", self.remove(nick), None))
+        for key, prefixes in added:
+            row = self.add(key[2], prefixes)
+            ops.append(("insert", row, self.display(row)))
+        return ops
+
+
+class MembershipTracker:
+    """
+    Участники всех каналов одной сети. Копит куски RPL_NAMREPLY до
+    RPL_ENDOFNAMES, затем применяет JOIN/PART/QUIT/KICK/NICK/MODE
+    как дельты. Методы возвращают список операций для представления:
+    (канал, "insert", строка, текст), (канал, "remove", строка, None),
+    (канал, "reset", None, список).
+    """
+
+    def __init__(self, intern=None):
+        """
+        :param intern: функция общей копии строки для ников
+        (см. ChannelMembers)
+        """
+        self.intern = intern
+        self.channels = {}
+        self._pending = {}
+        self.modes, self.symbols = parse_prefix(DEFAULT_PREFIX)
+        self.chanmodes = DEFAULT_CHANMODES.split(",")
+
+    def set_isupport(self, key, value):
+        """
+        Учитывает параметры PREFIX и CHANMODES из RPL_ISUPPORT
+        """
+        if key == "PREFIX":
+            modes, symbols = parse_prefix(value)
+            if modes:
+                self.modes, self.symbols = modes, symbols
+        elif key == "CHANMODES":
+            parts = value.split(",")
+            if len(parts) >= 4:
+                self.chanmodes = parts[:4]
+
+    def get(self, channel):
+        return self.channels.get(channel.lower())
+
+    def names_chunk(self, channel, entries):
+        """
+        Кусок RPL_NAMREPLY (353)
+        """
+        self._pending.setdefault(channel.lower(), []).extend(entries)
+
+    def names_end(self, channel):
+        """
+        RPL_ENDOFNAMES (366): собранный список заменяет текущий. Если
+        список канала уже был (NAMES после переподключения), приходят
+        только расхождения - представление не перестраивается
+        """
+        folded = channel.lower()
+        entries = self._pending.pop(folded, [])
+        members = ChannelMembers(channel, self.symbols, self.intern)
+        members.bulk_load(entries)
+        current = self.channels.get(folded)
+        if current is not None and current.symbols == members.symbols:
+            ops = current.reconcile(members)
+            if ops is not None:
+                return [(current.name, op, row, value)
+                        for op, row, value in ops]
+        self.channels[folded] = members
+        return [(channel, "reset", None, members.items())]
+
+    def clear_pending(self):
+        """
+        Соединение оборвалось посреди NAMES: недособранные куски
+        больше не нужны
+        """
+        self._pending.clear()
+
+    def join(self, channel, nick):
+        members = self.get(channel)
+        if members is None:
+            return []
+        row = members.add(nick)
+        if row is None:
+            return []
+        return [(channel, "insert", row, members.display(row))]
+
+    def part(self, channel, nick):
+        members = self.get(channel)
+        if members is None:
+            return []
+        row = members.remove(nick)
+        if row is None:
+            return []
+        return [(channel, "remove", row, None)]
+
+    def leave(self, channel):
+        """
+        Мы сами вышли из канала
+        """
+        self.channels.pop(channel.lower(), None)
+        self._pending.pop(channel.lower(), None)
+        return [(channel, "reset", None, [])]
+
+    def quit(self, nick):
+        ops = []
+        for members in self.channels.values():
+            row = members.remove(nick)
+            if row is not None:
+                ops.append((members.name, "remove", row, None))
+        return ops
+
+    def shared(self, nick):
+        """
+        :return: каналы (в нижнем регистре), где сидит nick
+        """
+        return [folded for folded, members in self.channels.items()
+                if nick in members]
+
+    def rename(self, old, new):
+        ops = []
+        for members in self.channels.values():
+            moved = members.rename(old, new)
+            if moved is not None:
+                name = members.name
+                ops.append((name, "remove", moved[0], None))
+                ops.append((name, "insert", moved[1],
+                            members.display(moved[1])))
+        return ops
+
+    def mode(self, channel, modestring, args):
+        """
+        MODE канала: меняет префиксы участников для режимов из PREFIX,
+        параметры остальных режимов пропускает по CHANMODES
+        """
+        members = self.get(channel)
+        if members is None:
+            return []
+        ops = []
+        args = list(args)
+        adding = True
+        always = self.chanmodes[0] + self.chanmodes[1]
+        on_set = self.chanmodes[2]
+        for mode in modestring:
+            if mode in "+-":
+                adding = mode == "+"
+                continue
+            if mode in self.modes:
+                if not args:
+                    break
+                nick = args.pop(0)
+                current = members.prefixes(nick)
+                if current is None:
+                    continue
+                symbol = self.symbols[self.modes.index(mode)]
+                if adding and symbol not in current:
+                    updated = current + symbol
+                elif not adding and symbol in current:
+                    updated = current.replace(symbol, "")
+                else:
+                    continue
+                old_row, new_row = members.set_prefixes(nick, updated)
+                ops.append((channel, "remove", old_row, None))
+                ops.append((channel, "insert", new_row,
+                            members.display(new_row)))
+            elif mode in always or (adding and mode in on_set):
+                if args:
+                    args.pop(0)
+        return ops
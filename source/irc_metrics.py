@@ -0,0 +1,359 @@
+"""
+Метрики горячих путей: счетчики, гистограммы времени и датчики.
+Выключенные метрики почти ничего не стоят: горячий путь проверяет
+один атрибут METRICS.enabled и дальше не идет.
+
+    IRCLIENT_METRICS=metrics.json python -m source.main
+
+включает метрики с запуска и раз в IRCLIENT_METRICS_INTERVAL секунд
+(по умолчанию 10) пишет их в файл JSON. Сигнал SIGUSR1 запускает
+сэмплирующий профилировщик на PROFILE_SECONDS секунд, отчет ложится
+рядом с файлом метрик.
+"""
+import json
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+HISTOGRAM_BUCKETS = 32
+PROFILE_SECONDS = 10
+DUMP_INTERVAL = 10.0
+
+
+class Histogram:
+    """
+    Гистограмма длительностей с корзинами по степеням двойки в
+    микросекундах: корзина i - до 2**i мкс. Процентили оцениваются
+    верхней границей корзины.
+    """
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self):
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        index = int(seconds * 1e6).bit_length()
+        if index >= HISTOGRAM_BUCKETS:
+            index = HISTOGRAM_BUCKETS - 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """
+        :param q: доля от 0 до 1
+        :return: секунды
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, value in enumerate(self.buckets):
+            seen += value
+            if seen >= rank and value:
+                return min((1 << index) / 1e6, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {"count": self.count,
+                "mean_ms": self.total / self.count * 1000
+                if self.count else 0.0,
+                "p50_ms": self.percentile(0.5) * 1000,
+                "p99_ms": self.percentile(0.99) * 1000,
+                "max_ms": self.max * 1000}
+
+
+class Metrics:
+    """
+    Реестр метрик процесса. Счетчики и гистограммы пишут потоки
+    чтения, датчики (функции, возвращающие число или словарь чисел)
+    опрашиваются только при снимке.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.errors = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def enable(self, on=True):
+        self.enabled = on
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, seconds):
+        """
+        Добавляет длительность в гистограмму name
+        """
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(seconds)
+
+    def error(self, exc):
+        """
+        Запоминает исключение, проглоченное обработчиком. Считается и
+        при выключенных метриках: это не горячий путь
+        """
+        text = "".join(traceback.format_exception(
+            type(exc), exc, exc.__traceback__))
+        with self._lock:
+            self.errors += 1
+            self.last_error = text
+
+    def add_gauge(self, name, func):
+        self.gauges[name] = func
+
+    def remove_gauges(self, prefix):
+        for name in [name for name in self.gauges
+                     if name.startswith(prefix)]:
+            del self.gauges[name]
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.errors = 0
+            self.last_error = None
+
+    def snapshot(self):
+        """
+        :return: словарь для JSON: time (monotonic), counters,
+        histograms, gauges, errors, last_error
+        """
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {name: histogram.as_dict()
+                          for name, histogram in self.histograms.items()}
+            errors, last_error = self.errors, self.last_error
+        gauges = {}
+        for name, func in list(self.gauges.items()):
+            try:
+                value = func()
+            except Exception as e:
+                value = {"error": str(e)}
+            if isinstance(value, dict):
+                for key, item in value.items():
+                    gauges[f"{name}.{key}"] = item
+            else:
+                gauges[name] = value
+        return {"time": time.monotonic(), "enabled": self.enabled,
+                "counters": counters, "histograms": histograms,
+                "gauges": gauges, "errors": errors,
+                "last_error": last_error}
+
+
+def rates(previous, current):
+    """
+    Скорость счетчиков в секунду между двумя снимками
+    :param previous: прошлый снимок или None
+    """
+    if previous is None:
+        return {}
+    elapsed = current["time"] - previous["time"]
+    if elapsed <= 0:
+        return {}
+    before = previous["counters"]
+    return {name: (value - before.get(name, 0)) / elapsed
+            for name, value in current["counters"].items()}
+
+
+def format_snapshot(snapshot, per_sec=None):
+    """
+    Текстовый отчет для панели отладки
+    """
+    per_sec = per_sec or {}
+    lines = [f"metrics {'on' if snapshot['enabled'] else 'off'}, "
+             f"handler errors: {snapshot['errors']}", "", "counters:"]
+    for name, value in sorted(snapshot["counters"].items()):
+        lines.append(f"  {name:<32} {value:>12}  "
+                     f"{per_sec.get(name, 0.0):>10.1f}/s")
+    lines += ["", f"  {'timings':<30} {'count':>9} {'mean ms':>9} "
+                  f"{'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}"]
+    for name, h in sorted(snapshot["histograms"].items()):
+        lines.append(f"  {name:<30} {h['count']:>9} {h['mean_ms']:>9.3f} "
+                     f"{h['p50_ms']:>9.3f} {h['p99_ms']:>9.3f} "
+                     f"{h['max_ms']:>9.3f}")
+    lines += ["", "gauges:"]
+    for name, value in sorted(snapshot["gauges"].items()):
+        if isinstance(value, float):
+            value = f"{value:.3f}"
+        lines.append(f"  {name:<32} {value:>12}")
+    if snapshot["last_error"]:
+        lines += ["", "last handler error:", snapshot["last_error"]]
+    return "\n".join(lines)
+
+
+class JsonDumper:
+    """
+    Поток, который раз в interval секунд пишет снимок метрик со
+    скоростями счетчиков в файл JSON (через временный файл, чтобы
+    читатель не увидел половину)
+    """
+
+    def __init__(self, metrics, path, interval=DUMP_INTERVAL):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._previous = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="metrics-dump")
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self):
+        snapshot = self.metrics.snapshot()
+        snapshot["rates"] = rates(self._previous, snapshot)
+        snapshot["timestamp"] = time.time()
+        self._previous = snapshot
+        temporary = self.path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, indent=1)
+        os.replace(temporary, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.dump()
+            except OSError as e:
+                print(f"metrics dump failed: {e}")
+
+
+class Sampler:
+    """
+    Сэмплирующий профилировщик всех потоков: раз в interval снимает
+    стеки через sys._current_frames. В отличие от cProfile не
+    замедляет профилируемый код и видит, где стоит GUI-поток во
+    время зависания.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = 0
+        self.own = Counter()
+        self.cumulative = Counter()
+        self.threads = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="metrics-sampler")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def sample(self, frames, names):
+        """
+        Учитывает один снимок стеков
+        :param frames: {ident потока: кадр}
+        :param names: {ident потока: имя}
+        """
+        self.samples += 1
+        for ident, frame in frames.items():
+            self.threads[names.get(ident, str(ident))] += 1
+            self.own[_where(frame)] += 1
+            seen = set()
+            while frame is not None:
+                where = _where(frame)
+                if where not in seen:
+                    seen.add(where)
+                    self.cumulative[where] += 1
+                frame = frame.f_back
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            frames.pop(own, None)
+            names = {thread.ident: thread.name
+                     for thread in threading.enumerate()}
+            self.sample(frames, names)
+
+    def report(self, limit=30):
+        """
+        Отчет в духе pstats: сэмплы в самой функции и с вызванными
+        """
+        lines = [f"{self.samples} samples every "
+                 f"{self.interval * 1000:.1f} ms", "", "threads:"]
+        for name, count in self.threads.most_common():
+            lines.append(f"  {count:>7}  {name}")
+        lines += ["", f"  {'own':>7} {'cumul':>7}  function"]
+        for where, count in self.cumulative.most_common(limit):
+            lines.append(f"  {self.own[where]:>7} {count:>7}  {where}")
+        return "\n".join(lines)
+
+
+def _where(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:" \
+           f"{code.co_firstlineno})"
+
+
+def profile_for(seconds, path, interval=0.005):
+    """
+    Запускает Sampler на seconds секунд в фоне и пишет отчет в path
+    :return: Sampler
+    """
+    sampler = Sampler(interval)
+    sampler.start()
+
+    def finish():
+        sampler.stop()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(sampler.report())
+    threading.Timer(seconds, finish).start()
+    return sampler
+
+
+def metrics_from_env(environ=None):
+    """
+    Включает метрики, если задана IRCLIENT_METRICS, запускает запись
+    в файл и ставит обработчик SIGUSR1 для профилирования
+    :return: JsonDumper или None
+    """
+    environ = os.environ if environ is None else environ
+    path = environ.get("IRCLIENT_METRICS")
+    if not path:
+        return None
+    METRICS.enable()
+    dumper = JsonDumper(METRICS, path, float(
+        environ.get("IRCLIENT_METRICS_INTERVAL", DUMP_INTERVAL)))
+    dumper.start()
+    if hasattr(signal, "SIGUSR1") and \
+            threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, lambda signum, frame: profile_for(
+            PROFILE_SECONDS, path + ".profile.txt"))
+    return dumper
+
+
+METRICS = Metrics()
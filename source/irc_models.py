@@ -0,0 +1,574 @@
+import fnmatch
+import re
+import time
+from PyQt6.QtCore import (
+    QAbstractListModel, QAbstractTableModel, QModelIndex,
+    QSortFilterProxyModel, Qt, QTimer
+)
+
+
+class ChannelDirectoryModel(QAbstractTableModel):
+    """
+    Каталог каналов сети: имя, число пользователей и тема.
+    Строки из LIST копятся и вставляются пачкой по таймеру или
+    по RPL_LISTEND, дубликаты находятся через словарь имя -> строка.
+    Сортирует сама модель (list.sort), а не прокси: сортированная
+    вставка в QSortFilterProxyModel сравнивает строки через data()
+    и на десятках тысяч каналов занимает секунды. Пока идет LIST,
+    строки дописываются в конец, пересортировка - по RPL_LISTEND.
+    Каналы, которых не было в последнем LIST (например, из
+    устаревшего кэша), по RPL_LISTEND удаляются.
+    """
+    NAME, USERS, TOPIC, FOLDED = range(4)
+    HEADERS = ("Channel", "Users", "Topic")
+
+    def __init__(self, flush_interval=250, parent=None):
+        """
+        :param flush_interval: период вставки накопленных строк, мс
+        """
+        super().__init__(parent)
+        self._rows = []
+        self._index = {}
+        self._queued = []
+        self._listed = set()
+        self._sort_column = None
+        self._sort_order = Qt.SortOrder.AscendingOrder
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(flush_interval)
+        self._timer.timeout.connect(self.flush)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation,
+                   role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and \
+                role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            return row[column]
+        if role == Qt.ItemDataRole.ToolTipRole and column == self.TOPIC:
+            return row[column]
+        return None
+
+    def channel(self, row):
+        """
+        Имя канала в строке row
+        """
+        return self._rows[row][self.NAME]
+
+    def folded_name(self, row):
+        """
+        Имя канала в нижнем регистре, для фильтра
+        """
+        return self._rows[row][self.FOLDED]
+
+    def queue_rows(self, rows):
+        """
+        Откладывает строки до следующей вставки
+        :param rows: список (канал, пользователи, тема)
+        """
+        self._queued.extend(rows)
+        self._listed.update(row[0] for row in rows)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self, resort=False):
+        """
+        Вставляет накопленные строки одной операцией
+        :param resort: пересортировать после вставки
+        """
+        self._timer.stop()
+        rows, self._queued = self._queued, []
+        self.add_rows(rows, resort)
+
+    def finish(self):
+        """
+        Конец LIST: вставляет остаток, убирает каналы, которых в
+        этом LIST не было, и сортирует каталог
+        """
+        self.flush()
+        listed, self._listed = self._listed, set()
+        if len(listed) < len(self._rows):
+            self.beginResetModel()
+            self._rows = [row for row in self._rows
+                          if row[self.NAME] in listed]
+            self._index = {row[self.NAME]: i
+                           for i, row in enumerate(self._rows)}
+            self.endResetModel()
+        if self._sort_column is not None:
+            self._resort()
+
+    def add_rows(self, rows, resort=True):
+        """
+        Добавляет новые каналы и обновляет уже известные
+        :param rows: список (канал, пользователи, тема)
+        :param resort: восстановить порядок сортировки
+        """
+        index = self._index
+        new = {}
+        first_changed = last_changed = None
+        for name, users, topic in rows:
+            row = index.get(name)
+            if row is None:
+                new[name] = [name, users, topic, name.lower()]
+                continue
+            self._rows[row][self.USERS] = users
+            self._rows[row][self.TOPIC] = topic
+            if first_changed is None or row < first_changed:
+                first_changed = row
+            if last_changed is None or row > last_changed:
+                last_changed = row
+        if first_changed is not None:
+            self.dataChanged.emit(
+                self.index(first_changed, self.USERS),
+                self.index(last_changed, self.TOPIC))
+        if new:
+            start = len(self._rows)
+            self.beginInsertRows(QModelIndex(), start, start + len(new) - 1)
+            for offset, name in enumerate(new):
+                index[name] = start + offset
+            self._rows.extend(new.values())
+            self.endInsertRows()
+        if resort and self._sort_column is not None:
+            self._resort()
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        """
+        Сортирует строки; новые строки после этого тоже встают
+        на свои места
+        """
+        self._sort_column = column
+        self._sort_order = order
+        self._resort()
+
+    def _resort(self):
+        column = self._sort_column
+        if column == self.NAME:
+            column = self.FOLDED
+
+        def key(row):
+            return row[column]
+
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        names = [self._rows[i.row()][self.NAME] for i in persistent]
+        self._rows.sort(
+            key=key, reverse=self._sort_order == Qt.SortOrder.DescendingOrder)
+        self._index = {row[self.NAME]: i for i, row in enumerate(self._rows)}
+        self.changePersistentIndexList(persistent, [
+            self.index(self._index[name], i.column())
+            for name, i in zip(names, persistent)])
+        self.layoutChanged.emit()
+
+    def clear(self):
+        self.beginResetModel()
+        self._rows = []
+        self._index = {}
+        self._queued = []
+        self._listed = set()
+        self.endResetModel()
+
+
+class ChannelFilterProxy(QSortFilterProxyModel):
+    """
+    Фильтр по имени канала: подстрока или шаблон с * ? [].
+    Сортировку передает исходной модели.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._match = None
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        self.sourceModel().sort(column, order)
+
+    def set_pattern(self, text):
+        """
+        Задает фильтр: шаблон, если в тексте есть * ? [, иначе подстрока
+        :param text: строка фильтра
+        """
+        text = text.lower()
+        if not text:
+            match = None
+        elif any(ch in text for ch in "*?["):
+            regex = re.compile(fnmatch.translate(text))
+
+            def match(name):
+                return regex.match(name) is not None
+        else:
+            def match(name):
+                return text in name
+        self._match = match
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self._match is None:
+            return True
+        return self._match(self.sourceModel().folded_name(source_row))
+
+
+class UserListModel(QAbstractListModel):
+    """
+    Список участников канала в GUI-потоке. Повторяет порядок
+    ChannelMembers из потока чтения, применяя операции вставки и
+    удаления по номерам строк, без перестройки всего списка.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._items = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._items)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if index.isValid() and role == Qt.ItemDataRole.DisplayRole:
+            return self._items[index.row()]
+        return None
+
+    def items(self):
+        return list(self._items)
+
+    def apply(self, op, row, value):
+        """
+        Применяет операцию MembershipTracker
+        :param op: "insert", "remove" или "reset"
+        :param row: номер строки
+        :param value: текст строки или новый список для reset
+        """
+        if op == "insert":
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._items.insert(row, value)
+            self.endInsertRows()
+        elif op == "remove":
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._items[row]
+            self.endRemoveRows()
+        elif op == "reset":
+            self.beginResetModel()
+            self._items = list(value)
+            self.endResetModel()
+
+
+class LogSearchModel(QAbstractTableModel):
+    """
+    Результаты поиска по журналу (список LogHit)
+    """
+    TIME, NETWORK, CHANNEL, NICK, TEXT = range(5)
+    HEADERS = ("Time", "Network", "Channel", "Nick", "Text")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._hits = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._hits)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation,
+                   role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and \
+                role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        hit = self._hits[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == self.TIME:
+                return time.strftime("%Y-%m-%d %H:%M",
+                                     time.localtime(hit.ts))
+            return (None, hit.network, hit.channel, hit.nick,
+                    hit.snippet or hit.text)[column]
+        if role == Qt.ItemDataRole.ToolTipRole and column == self.TEXT:
+            return hit.text
+        return None
+
+    def hit(self, row):
+        return self._hits[row]
+
+    def set_hits(self, hits):
+        self.beginResetModel()
+        self._hits = list(hits)
+        self.endResetModel()
+
+
+def format_bytes(count):
+    """
+    Размер для показа: 512 B, 1.5 MiB, 3.2 GiB
+    """
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if count < 1024 or unit == "GiB":
+            return f"{count:.0f} {unit}" if unit == "B" else \
+                f"{count:.1f} {unit}"
+        count /= 1024
+
+
+class TransferModel(QAbstractTableModel):
+    """
+    Передачи DCC (irc_dcc.TransferState). update обновляет строки по
+    id передачи и сообщает представлению только о них
+    """
+    FILE, NICK, DIRECTION, PROGRESS, RATE, STATE = range(6)
+    HEADERS = ("File", "Nick", "", "Progress", "Speed", "State")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._states = []
+        self._rows = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._states)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation,
+                   role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and \
+                role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        state = self._states[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == self.DIRECTION:
+                return "\u2191" if state.direction == "send" else "\u2193"
+            if column == self.PROGRESS:
+                if not state.size:
+                    return format_bytes(state.bytes)
+                return f"{state.bytes * 100 // state.size}% of " \
+                       f"{format_bytes(state.size)}"
+            if column == self.RATE:
+                return f"{format_bytes(state.rate)}/s"
+            return (state.filename, state.nick, None, None, None,
+                    state.state)[column]
+        if role == Qt.ItemDataRole.ToolTipRole and column == self.STATE:
+            return state.error
+        return None
+
+    def transfer_id(self, row):
+        return self._states[row].id
+
+    def update(self, states):
+        """
+        :param states: список TransferState из DccManager.progress
+        """
+        last = len(self.HEADERS) - 1
+        for state in states:
+            row = self._rows.get(state.id)
+            if row is None:
+                row = len(self._states)
+                self.beginInsertRows(QModelIndex(), row, row)
+                self._states.append(state)
+                self._rows[state.id] = row
+                self.endInsertRows()
+            else:
+                self._states[row] = state
+                self.dataChanged.emit(self.index(row, 0),
+                                      self.index(row, last))
+
+
+class ScrollbackModel(QAbstractListModel):
+    """
+    Строки чата для QListView поверх Scrollback. Представление
+    запрашивает только видимые строки, поэтому стоимость отрисовки не
+    зависит от длины истории. Когда пользователь докручивает до
+    верха, load_older подгружает страницу из файла вытесненных строк;
+    пока такие строки показаны, вытесняемые из буфера строки
+    переходят к ним, и видимые строки не сдвигаются.
+    Выше всех идут строки истории с сервера (prepend_history): они
+    показываются, только когда файл прочитан до начала, чтобы между
+    ними и остальными строками не было пропуска.
+    Перешедших строк в памяти не больше max_older: самые старые из
+    них убираются (они есть в файле, load_older вернет их), так что
+    и прокрученный вверх буфер не растет без предела.
+    """
+    HighlightRole = Qt.ItemDataRole.UserRole + 1
+    # предел перешедших строк по умолчанию, в страницах файла
+    OLDER_PAGES = 8
+
+    def __init__(self, scrollback, parent=None, max_older=None):
+        """
+        :param scrollback: Scrollback
+        :param max_older: сколько строк держать над буфером, пока
+        показаны строки из файла или история, по умолчанию
+        OLDER_PAGES страниц
+        """
+        super().__init__(parent)
+        self.scrollback = scrollback
+        self.max_older = max_older or \
+            scrollback.page_size * self.OLDER_PAGES
+        self._older = []
+        self._older_start = 0
+        self.history = []
+        self._history_shown = False
+
+    def _history_rows(self):
+        return len(self.history) if self._history_shown else 0
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._history_rows() + len(self._older) + \
+            len(self.scrollback)
+
+    def record(self, row):
+        history = self._history_rows()
+        if row < history:
+            return self.history[row]
+        row -= history
+        older = len(self._older)
+        if row < older:
+            return self._older[row]
+        return self.scrollback[row - older]
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.record(index.row()).html
+        if role == self.HighlightRole:
+            return self.record(index.row()).highlight
+        return None
+
+    def append(self, records):
+        """
+        Добавляет строки в конец
+        :param records: список Rendered
+        :return: сколько строк убрано сверху над показанными из файла
+        и историей (видимые строки сдвигаются на столько вверх)
+        """
+        if not records:
+            return 0
+        scrollback = self.scrollback
+        if self._older or self._history_shown:
+            if not self._older:
+                self._older_start = scrollback.spilled
+            first = self.rowCount()
+            self.beginInsertRows(QModelIndex(), first,
+                                 first + len(records) - 1)
+            self._older.extend(scrollback.append(records))
+            self.endInsertRows()
+            return self._trim_older()
+        removed = scrollback.overflow(len(records))
+        if removed:
+            self.beginRemoveRows(QModelIndex(), 0, removed - 1)
+            scrollback.evict(removed)
+            self.endRemoveRows()
+        first = self.rowCount()
+        added = min(len(records), scrollback.capacity)
+        self.beginInsertRows(QModelIndex(), first, first + added - 1)
+        scrollback.append(records)
+        self.endInsertRows()
+        return 0
+
+    def _trim_older(self):
+        excess = len(self._older) - self.max_older
+        if excess <= 0:
+            return 0
+        # между историей и оставшимися строками был бы пропуск,
+        # она уходит вместе с ними
+        removed = self._history_rows() + excess
+        self.beginRemoveRows(QModelIndex(), 0, removed - 1)
+        del self._older[:excess]
+        self._older_start += excess
+        self._history_shown = False
+        self.endRemoveRows()
+        return removed
+
+    def _spill_loaded(self):
+        # файл вытесненных строк показан до начала или пуст
+        return self._older_start == 0 and \
+            (bool(self._older) or self.scrollback.spilled == 0)
+
+    def can_load_older(self):
+        """
+        Есть ли выше что подгрузить без обращения к серверу
+        """
+        if not self._spill_loaded():
+            return True
+        return bool(self.history) and not self._history_shown
+
+    def load_older(self, count=None):
+        """
+        Подгружает из файла страницу строк перед первой показанной,
+        а когда файл кончился - уже полученную историю с сервера
+        :return: сколько строк добавлено в начало
+        """
+        if not self._older:
+            self._older_start = self.scrollback.spilled
+        if self._older_start > 0:
+            count = count or self.scrollback.page_size
+            start = max(0, self._older_start - count)
+            records = self.scrollback.read_spilled(start, self._older_start)
+            if records:
+                self.beginInsertRows(QModelIndex(), 0, len(records) - 1)
+                self._older[:0] = records
+                self._older_start = start
+                self.endInsertRows()
+                return len(records)
+            # без файла убранные сверху строки потеряны, как и все
+            # вытесненные: история примыкает к оставшимся
+            self._older_start = 0
+        if self.history and not self._history_shown:
+            self.beginInsertRows(QModelIndex(), 0, len(self.history) - 1)
+            self._history_shown = True
+            self.endInsertRows()
+            return len(self.history)
+        return 0
+
+    def prepend_history(self, records):
+        """
+        Добавляет строки истории с сервера перед всеми остальными.
+        Если файл вытесненных строк еще не прочитан до начала, строки
+        только запоминаются и покажутся после него
+        :return: сколько строк добавлено в начало
+        """
+        if not records:
+            return 0
+        if self._history_shown:
+            self.beginInsertRows(QModelIndex(), 0, len(records) - 1)
+            self.history[:0] = records
+            self.endInsertRows()
+            return len(records)
+        self.history[:0] = records
+        if self._spill_loaded():
+            return self.load_older()
+        return 0
+
+    def drop_older(self):
+        """
+        Убирает подгруженные из файла строки (пользователь вернулся
+        вниз). Показанная история уходит вместе с ними; если файла
+        нет, она примыкает к буферу и остается
+        """
+        if not self._older:
+            return
+        self.beginRemoveRows(QModelIndex(), 0,
+                             self._history_rows() + len(self._older) - 1)
+        self._older = []
+        self._older_start = 0
+        self._history_shown = False
+        self.endRemoveRows()
@@ -1,42 +1,484 @@
-import re
+import time
+from source.irc_caps import server_time
+from source.irc_dcc import parse_dcc
+from source.irc_metrics import METRICS
+from source.irc_records import ChatLine
+from source.irc_rules import HIGHLIGHT, IGNORE, STATE_COMMANDS
+
+_TAG_UNESCAPE = {":": ";", "s": " ", "\\": "\\", "r": "\r", "n": "\n"}
+
+
+class IRCMessage:
+    """
+    Разобранная строка IRC (RFC 1459 / IRCv3): теги, префикс,
+    команда и параметры. Последний параметр может содержать пробелы.
+    highlight - строку подсветило правило (irc_rules)
+    """
+    __slots__ = ("tags", "prefix", "command", "params", "highlight")
+
+    def __init__(self, tags, prefix, command, params):
+        self.tags = tags
+        self.prefix = prefix
+        self.command = command
+        self.params = params
+        self.highlight = False
+
+    @property
+    def nick(self):
+        """
+        Ник отправителя из префикса nick!user@host
+        """
+        if self.prefix is None:
+            return None
+        return self.prefix.partition("!")[0]
+
+    def __repr__(self):
+        return (f"IRCMessage(tags={self.tags!r}, prefix={self.prefix!r}, "
+                f"command={self.command!r}, params={self.params!r})")
+
+
+def _unescape_tag_value(value):
+    if "\\" not in value:
+        return value
+    out = []
+    i = 0
+    n = len(value)
+    while i < n:
+        ch = value[i]
+        if ch == "\\":
+            i += 1
+            if i < n:
+                out.append(_TAG_UNESCAPE.get(value[i], value[i]))
+        else:
+            out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def parse_tags(raw):
+    """
+    Разбирает строку тегов IRCv3 (без ведущего '@')
+    :param raw: строка вида key=value;flag
+    :return: словарь тегов
+    """
+    tags = {}
+    for item in raw.split(";"):
+        if not item:
+            continue
+        key, sep, value = item.partition("=")
+        tags[key] = _unescape_tag_value(value) if sep else ""
+    return tags
+
+
+def parse_message(line):
+    """
+    Разбивает строку IRC на части за один проход.
+    :param line: строка от сервера без завершающего \\r\\n
+    :return: IRCMessage или None для пустой строки (и строки из одних
+    тегов)
+    """
+    if not line:
+        return None
+    tags = None
+    prefix = None
+    if line[0] == "@":
+        raw_tags, _, line = line.partition(" ")
+        tags = parse_tags(raw_tags[1:])
+        line = line.lstrip(" ")
+        if not line:
+            return None
+    if line[0] == ":":
+        prefix, _, line = line[1:].partition(" ")
+
+    head, sep, trailing = line.partition(" :")
+    params = head.split()
+    if not params:
+        return None
+    command = params.pop(0).upper()
+    if sep:
+        params.append(trailing)
+    return IRCMessage(tags, prefix, command, params)
+
+
+def _on_ping(msg, client):
+    if msg.params:
+        client.send_raw("PONG :" + msg.params[0])
+
+
+def _on_welcome(msg, client):
+    client.caps.registered()
+    client.registered.emit()
+
+
+def _on_motd_end(msg, client):
+    # конец регистрации: ISUPPORT (005) уже пришел, и LIST может
+    # взять фильтры ELIST. Повторный MOTD второй LIST не вызывает
+    client.ready()
+    if client.auto_list and client.list_request is None:
+        client.list_channels()
+
+
+def _on_list(msg, client):
+    params = msg.params
+    if len(params) >= 2:
+        users = int(params[2]) if len(params) > 2 and \
+            params[2].isdigit() else 0
+        topic = params[3] if len(params) > 3 else ""
+        client.channels_received.emit([(params[1], users, topic)])
+
+
+def _on_list_end(msg, client):
+    client.listing = False
+    client.channels_end.emit()
+
+
+def _on_isupport(msg, client):
+    for token in msg.params[1:-1]:
+        key, _, value = token.partition("=")
+        if key == "CHATHISTORY" and value.isdigit():
+            client.history.max_limit = int(value) or None
+        elif key == "ELIST":
+            client.elist = value.upper()
+        client.membership.set_isupport(key, value)
+
+
+def _on_cap(msg, client):
+    if len(msg.params) < 3:
+        return
+    caps = client.caps
+    handler = {"LS": caps.ls, "ACK": caps.ack, "NAK": caps.nak,
+               "NEW": caps.new, "DEL": caps.delete}.get(msg.params[1].upper())
+    if handler is not None:
+        for line in handler(msg.params[2:]):
+            client.send_raw(line)
+
+
+def _on_authenticate(msg, client):
+    for line in client.caps.authenticate(msg.params):
+        client.send_raw(line)
+
+
+def _on_sasl_success(msg, client):
+    for line in client.caps.sasl_done():
+        client.send_raw(line)
+
+
+def _on_sasl_error(msg, client):
+    # вход не удался: регистрируемся без учетной записи
+    if client.caps.sasl is not None:
+        text = msg.params[-1] if msg.params else msg.command
+        client.message_received.emit(f"Ошибка SASL: {text}")
+    for line in client.caps.sasl_done():
+        client.send_raw(line)
+
+
+def _on_batch(msg, client):
+    if not msg.params or len(msg.params[0]) < 2:
+        return
+    ref = msg.params[0]
+    batches = client.batches
+    if ref[0] == "+":
+        batches.open(ref[1:], msg.params[1] if len(msg.params) > 1 else "",
+                     msg.params[2:])
+        return
+    batch = batches.close(ref[1:])
+    if batch is None:
+        return
+    if batch.type in ("chathistory", "draft/chathistory"):
+        _apply_history(batch, client)
+        return
+    # нетсплит и прочие пачки применяются целиком: изменения
+    # участников всех строк уходят одним members_changed
+    outer = batches.collected
+    if outer is None:
+        batches.collected = []
+    try:
+        for message in batch.messages:
+            dispatch(message, client)
+    finally:
+        if outer is None:
+            ops, batches.collected = batches.collected, None
+            _emit_members(client, ops)
+
+
+def _apply_history(batch, client):
+    if not batch.params:
+        return
+    target = batch.params[0]
+    names = client.names
+    lines = []
+    for message in batch.messages:
+        if message.command == "PRIVMSG" and message.prefix and \
+                len(message.params) >= 2:
+            lines.append(ChatLine(
+                server_time(message.tags) or time.time(),
+                names.intern(message.params[0]), names.intern(message.nick),
+                message.params[1]))
+    first = batch.messages[0].tags if batch.messages else None
+    client.history.received(target, len(batch.messages),
+                            first.get("time") if first else None)
+    client.history_received.emit(target, lines)
+
+
+def _emit_members(client, ops):
+    if ops:
+        collected = client.batches.collected
+        if collected is not None:
+            collected.extend(ops)
+        else:
+            client.members_changed.emit(ops)
+
+
+def _on_join(msg, client):
+    if not msg.params:
+        return
+    channel = msg.params[0]
+    if client.event_log is not None:
+        client.event_log(channel, "JOIN", msg.nick, "",
+                         server_time(msg.tags))
+    if msg.nick == client.nick:
+        client.userhost = msg.prefix.partition("!")[2] or None
+        folded = channel.lower()
+        client.joined_channels[folded] = channel
+        # NAMES сервер присылает на JOIN сам, запрашивать его еще
+        # раз - лишняя строка в очереди отправки на каждый канал
+        if client.rejoining.pop(folded, None) is not None:
+            # возврат после переподключения: канал и участники уже
+            # показаны
+            return
+        client.current_channel = channel
+        client.channel_joined.emit(channel)
+    else:
+        _emit_members(client, client.membership.join(channel, msg.nick))
+
+
+def _on_part(msg, client):
+    if not msg.params:
+        return
+    reason = msg.params[1] if len(msg.params) > 1 else ""
+    for channel in msg.params[0].split(","):
+        if client.event_log is not None:
+            client.event_log(channel, "PART", msg.nick, reason,
+                             server_time(msg.tags))
+        if msg.nick == client.nick:
+            ops = _left(client, channel)
+        else:
+            ops = client.membership.part(channel, msg.nick)
+        _emit_members(client, ops)
+
+
+def _on_kick(msg, client):
+    if len(msg.params) < 2:
+        return
+    channel, victim = msg.params[0], msg.params[1]
+    if victim == client.nick:
+        ops = _left(client, channel)
+    else:
+        ops = client.membership.part(channel, victim)
+    _emit_members(client, ops)
+
+
+def _left(client, channel):
+    client.joined_channels.pop(channel.lower(), None)
+    client.rejoining.pop(channel.lower(), None)
+    return client.membership.leave(channel)
+
+
+def _on_join_error(msg, client):
+    # вернуться в канал после переподключения не вышло (бан, ключ,
+    # лимит): его список участников больше не верен
+    if len(msg.params) >= 2 and msg.params[1].lower() in client.rejoining:
+        _emit_members(client, _left(client, msg.params[1]))
+
+
+def _on_nick_in_use(msg, client):
+    # до регистрации (цель "*") - например, после быстрого
+    # переподключения сервер еще держит наше старое соединение
+    if len(msg.params) >= 2 and msg.params[0] == "*":
+        client.nick = msg.params[1] + "_"
+        client.send_raw(f"NICK {client.nick}")
+
+
+def _on_quit(msg, client):
+    _emit_members(client, client.membership.quit(msg.nick))
+
+
+def _on_nick(msg, client):
+    if not msg.params:
+        return
+    new = msg.params[0]
+    if msg.nick == client.nick:
+        client.nick = new
+    _emit_members(client, client.membership.rename(msg.nick, new))
+
+
+def _on_mode(msg, client):
+    if len(msg.params) < 2 or msg.params[0][:1] not in "#&!+":
+        return
+    _emit_members(client, client.membership.mode(
+        msg.params[0], msg.params[1], msg.params[2:]))
+
+
+def _on_names(msg, client):
+    if len(msg.params) < 2:
+        return
+    client.membership.names_chunk(msg.params[-2], msg.params[-1].split())
+
+
+def _on_names_end(msg, client):
+    if len(msg.params) < 2:
+        return
+    _emit_members(client, client.membership.names_end(msg.params[1]))
+
+
+def _on_host_hidden(msg, client):
+    if len(msg.params) >= 2 and client.userhost:
+        user = client.userhost.partition("@")[0]
+        client.userhost = f"{user}@{msg.params[1]}"
+
+
+def _on_privmsg(msg, client):
+    params = msg.params
+    prefix = msg.prefix
+    if prefix and len(params) >= 2 and params[1]:
+        sender = prefix.partition("!")[0]
+        target, text = params[0], params[1]
+        if text[0] == "\x01" and text.startswith("\x01DCC "):
+            _on_dcc(sender, text.strip("\x01"), client)
+            return
+        tags = msg.tags
+        when = server_time(tags) if tags is not None else None
+        intern = client.names.intern
+        client.chat_received.emit(ChatLine(
+            when or time.time(), intern(target), intern(sender), text,
+            msg.highlight))
+        if client.event_log is None and tags is None:
+            return
+        channel = _log_channel(target, sender, client)
+        if tags is not None and "time" in tags:
+            client.history.seen(channel, tags["time"])
+        if client.event_log is not None:
+            client.event_log(channel, "PRIVMSG", sender, text, when)
+
+
+def _on_dcc(sender, body, client):
+    # CTCP DCC: сама передача идет в пуле DccManager, здесь только
+    # разбор запроса
+    request = parse_dcc(sender, body)
+    if request is None:
+        return
+    if request.command == "SEND":
+        client.message_received.emit(
+            f"DCC SEND от {sender}: {request.filename} "
+            f"({request.size} байт)")
+    client.dcc_received.emit(request)
+
+
+def _on_notice(msg, client):
+    if client.event_log is not None and msg.prefix and \
+            len(msg.params) >= 2:
+        client.event_log(_log_channel(msg.params[0], msg.nick, client),
+                         "NOTICE", msg.nick, msg.params[1],
+                         server_time(msg.tags))
+
+
+def _log_channel(target, sender, client):
+    # личное сообщение журналируется под ником собеседника
+    if client.nick and target.lower() == client.nick.lower():
+        return sender
+    return target
+
+
+HANDLERS = {
+    "PING": _on_ping,
+    "001": _on_welcome,
+    "005": _on_isupport,
+    "376": _on_motd_end,
+    "422": _on_motd_end,
+    "322": _on_list,
+    "323": _on_list_end,
+    "JOIN": _on_join,
+    "PART": _on_part,
+    "KICK": _on_kick,
+    "QUIT": _on_quit,
+    "NICK": _on_nick,
+    "MODE": _on_mode,
+    "353": _on_names,
+    "366": _on_names_end,
+    "396": _on_host_hidden,
+    "433": _on_nick_in_use,
+    "403": _on_join_error,
+    "405": _on_join_error,
+    "471": _on_join_error,
+    "473": _on_join_error,
+    "474": _on_join_error,
+    "475": _on_join_error,
+    "477": _on_join_error,
+    "PRIVMSG": _on_privmsg,
+    "NOTICE": _on_notice,
+    "CAP": _on_cap,
+    "AUTHENTICATE": _on_authenticate,
+    "903": _on_sasl_success,
+    "902": _on_sasl_error,
+    "904": _on_sasl_error,
+    "905": _on_sasl_error,
+    "906": _on_sasl_error,
+    "907": _on_sasl_error,
+    "BATCH": _on_batch,
+}
+
+
+def dispatch(msg, client):
+    """
+    Вызывает обработчик команды из таблицы HANDLERS
+    :param msg: IRCMessage
+    :param client: IRCClient
+    """
+    tags = msg.tags
+    if tags is not None and "batch" in tags and \
+            client.batches.add(tags["batch"], msg):
+        return
+    handler = HANDLERS.get(msg.command)
+    if handler is not None:
+        handler(msg, client)
 
 
 def parse_irc_line(line, client):
     """
     Обрабатывает строку IRC-протокола и вызывает
-    методы клиента
+    методы клиента. При включенных метриках время обработки
+    попадает в гистограмму parse.<команда>
+    Правила клиента (client.rules) проверяются сразу после разбора:
+    проигнорированная строка не показывается и дальше не идет, а
+    если она меняет состояние (JOIN, QUIT, ...), то обрабатывается
+    молча
     :param line: строка от сервера IRC
     :param client: IRCClient
     """
+    started = time.perf_counter() if METRICS.enabled else 0.0
     try:
-        client.message_received.emit(f"<< {line}")
-
-        if line.startswith("PING"):
-            client.send_raw("PONG " + line.split()[1])
-
-        if " 001 " in line:
-            client.send_raw("LIST")
-
-        if " 322 " in line:
-            parts = line.split()
-            channel = parts[3]
-            client.channels_received.emit([channel])
-
-        if "JOIN :" in line and client.nick in line:
-            channel = line.split("JOIN :")[1]
-            client.current_channel = channel
-            client.send_raw(f"NAMES {channel}")
-
-        if " 353 " in line:
-            users_part = line.split(":", 2)[2]
-            users = users_part.strip().split()
-            client.users = users
-            client.users_updated.emit(users)
-
-        if "PRIVMSG" in line:
-            match = re.match(r":([^!]+)!.* PRIVMSG (\S+) :(.+)", line)
-            if match:
-                sender, target, msg = match.groups()
-                client.message_received.emit(f"[{target}] <{sender}>: {msg}")
+        msg = parse_message(line)
+        rules = client.rules
+        if rules is not None and msg is not None:
+            verdict = rules.check(msg, client.membership)
+            if verdict == IGNORE:
+                if started:
+                    METRICS.count("rules.ignored")
+                if msg.command not in STATE_COMMANDS:
+                    return
+            else:
+                client.message_received.emit("<< " + line)
+                if verdict == HIGHLIGHT:
+                    msg.highlight = True
+                    if started:
+                        METRICS.count("rules.highlighted")
+        else:
+            client.message_received.emit("<< " + line)
+        if msg is not None:
+            dispatch(msg, client)
+            if started:
+                METRICS.observe("parse." + msg.command,
+                                time.perf_counter() - started)
     except Exception as e:
+        METRICS.error(e)
         client.message_received.emit(f"Error: {e}")
@@ -0,0 +1,22 @@
+from PyQt6.QtCore import QObject, pyqtSignal
+
+
+class QtDispatcher(QObject):
+    """
+    Адаптер ядра к Qt: переносит вызовы из фоновых потоков в поток,
+    где создан диспетчер (обычно GUI-поток). Из своего потока вызов
+    выполняется сразу, из чужого - через очередь событий Qt.
+    Передается в SessionManager как dispatch.
+    """
+    _called = pyqtSignal(object, tuple)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._called.connect(self._invoke)
+
+    def __call__(self, func, *args):
+        self._called.emit(func, args)
+
+    @staticmethod
+    def _invoke(func, args):
+        func(*args)
@@ -0,0 +1,53 @@
+import random
+
+DEFAULT_BASE = 1.0
+DEFAULT_CAP = 60.0
+
+
+class Backoff:
+    """
+    Задержки переподключения: экспоненциальный рост с полным
+    разбросом (full jitter) - задержка попытки n случайна от 0 до
+    min(cap, base * factor ** n). Разброс нужен, чтобы тысячи
+    клиентов после падения сервера не стучались в него одновременно.
+    Первая попытка почти сразу: короткий обрыв восстанавливается
+    быстро.
+    """
+
+    def __init__(self, base=DEFAULT_BASE, cap=DEFAULT_CAP, factor=2.0,
+                 rand=random.random):
+        """
+        :param base: верхняя граница первой задержки, секунд
+        :param cap: предел задержки, секунд
+        :param factor: во сколько раз растет граница с каждой попыткой
+        :param rand: источник случайных чисел из [0, 1)
+        """
+        self.base = base
+        self.cap = cap
+        self.factor = factor
+        self.rand = rand
+        self.attempts = 0
+
+    def ceiling(self):
+        """
+        Верхняя граница задержки следующей попытки
+        """
+        # степень ограничена, чтобы не считать огромные числа после
+        # суток без сети
+        power = min(self.attempts, 64)
+        return min(self.cap, self.base * self.factor ** power)
+
+    def next(self):
+        """
+        :return: задержка перед следующей попыткой, секунд
+        """
+        delay = self.rand() * self.ceiling()
+        self.attempts += 1
+        return delay
+
+    def reset(self):
+        """
+        Подключение удалось: следующий обрыв снова начнется с
+        короткой задержки
+        """
+        self.attempts = 0
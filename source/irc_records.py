@@ -0,0 +1,198 @@
+"""
+Компактное хранение строк чата.
+
+Строка чата идет от разбора до экрана записью ChatLine (время,
+цель, отправитель, текст), а не готовой строкой "[цель] <ник>:
+текст": вид строки собирается только при показе. Ники и каналы
+одной сети хранятся один раз в InternTable, записи ссылаются на них.
+В RecordBuffer строки лежат в параллельных массивах array (время,
+номера цели и отправителя, флаги, место текста), а тексты - подряд
+в UTF-8 кусками по TEXT_CHUNK байт, так что строка в буфере стоит
+несколько десятков байт плюс длина текста, без отдельных объектов
+Python на каждую.
+"""
+import threading
+import time
+from array import array
+from collections import deque
+
+TEXT_CHUNK = 1 << 16
+HIGHLIGHTED = 1
+
+
+class InternTable:
+    """
+    Имена одной сети (ники, каналы, хосты): каждое хранится одной
+    строкой и получает номер, 0 - нет имени. Таблица только растет,
+    ее размер - число разных имен за время сессии. Дописывать можно
+    из любого потока
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._names = [None]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._names) - 1
+
+    def id(self, name):
+        """
+        :return: номер имени, новое имя получает следующий номер
+        """
+        if name is None:
+            return 0
+        number = self._ids.get(name)
+        if number is None:
+            with self._lock:
+                number = self._ids.get(name)
+                if number is None:
+                    number = len(self._names)
+                    self._names.append(name)
+                    self._ids[name] = number
+        return number
+
+    def intern(self, name):
+        """
+        :return: строка таблицы, равная name (одна на все вхождения)
+        """
+        number = self._ids.get(name)
+        if number is None:
+            number = self.id(name)
+        return self._names[number]
+
+    def name(self, number):
+        return self._names[number]
+
+
+class ChatLine:
+    """
+    Строка чата. Без отправителя (sender None) - служебная строка
+    клиента или сервера, text показывается как есть
+    """
+    __slots__ = ("time", "target", "sender", "text", "highlight")
+
+    def __init__(self, when, target, sender, text, highlight=False):
+        """
+        :param when: время в секундах эпохи (server-time или прихода)
+        :param target: канал или ник, кому адресована строка
+        :param sender: ник отправителя или None
+        :param text: текст сообщения
+        :param highlight: строка подсвечена (правилами или ником)
+        """
+        self.time = when
+        self.target = target
+        self.sender = sender
+        self.text = text
+        self.highlight = highlight
+
+    @classmethod
+    def status(cls, text):
+        """
+        Служебная строка с текущим временем
+        """
+        return cls(time.time(), None, None, text)
+
+    def __str__(self):
+        if self.sender is None:
+            return self.text
+        return f"[{self.target}] <{self.sender}>: {self.text}"
+
+    def __repr__(self):
+        return f"ChatLine({self.time!r}, {self.target!r}, " \
+               f"{self.sender!r}, {self.text!r}, {self.highlight!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, ChatLine):
+            return NotImplemented
+        return (self.time, self.target, self.sender, self.text,
+                self.highlight) == (other.time, other.target,
+                                    other.sender, other.text,
+                                    other.highlight)
+
+    __hash__ = None
+
+
+class RecordBuffer:
+    """
+    Последние capacity строк одного канала или привата и сквозной
+    номер строки total. Массивы растут до capacity, дальше строки
+    пишутся по кругу поверх самых старых; куски текста, в которых
+    не осталось живых строк, освобождаются целиком.
+    """
+    __slots__ = ("name", "capacity", "total", "_times", "_targets",
+                 "_senders", "_flags", "_starts", "_sizes", "_chunks",
+                 "_first_chunk")
+
+    def __init__(self, name, capacity):
+        self.name = name
+        self.capacity = capacity
+        self.total = 0
+        self._times = array("d")
+        self._targets = array("I")
+        self._senders = array("I")
+        self._flags = array("B")
+        # начало текста - сквозное смещение: номер куска * TEXT_CHUNK
+        # плюс смещение в куске
+        self._starts = array("Q")
+        self._sizes = array("I")
+        self._chunks = deque()
+        self._first_chunk = 0
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, line, names):
+        """
+        :param line: ChatLine
+        :param names: InternTable сети
+        """
+        # символ UTF-8 - не больше 4 байт, текст всегда влезает в кусок
+        data = line.text[:TEXT_CHUNK // 4].encode("utf-8", "surrogatepass")
+        chunks = self._chunks
+        if not chunks or len(chunks[-1]) + len(data) > TEXT_CHUNK:
+            chunks.append(bytearray())
+        chunk = chunks[-1]
+        start = (self._first_chunk + len(chunks) - 1) * TEXT_CHUNK + \
+            len(chunk)
+        chunk += data
+        target = names.id(line.target)
+        sender = names.id(line.sender)
+        flags = HIGHLIGHTED if line.highlight else 0
+        if self.total < self.capacity:
+            self._times.append(line.time)
+            self._targets.append(target)
+            self._senders.append(sender)
+            self._flags.append(flags)
+            self._starts.append(start)
+            self._sizes.append(len(data))
+        else:
+            slot = self.total % self.capacity
+            self._times[slot] = line.time
+            self._targets[slot] = target
+            self._senders[slot] = sender
+            self._flags[slot] = flags
+            self._starts[slot] = start
+            self._sizes[slot] = len(data)
+        self.total += 1
+        if self.total > self.capacity:
+            oldest = self._starts[self.total % self.capacity]
+            while self._first_chunk < oldest // TEXT_CHUNK:
+                chunks.popleft()
+                self._first_chunk += 1
+
+    def line(self, number, names):
+        """
+        :param number: сквозной номер живой строки
+        (total - len(self) <= number < total)
+        :return: ChatLine
+        """
+        slot = number % self.capacity
+        start = self._starts[slot]
+        chunk = self._chunks[start // TEXT_CHUNK - self._first_chunk]
+        offset = start % TEXT_CHUNK
+        text = chunk[offset:offset + self._sizes[slot]].decode(
+            "utf-8", "surrogatepass")
+        return ChatLine(self._times[slot], names.name(self._targets[slot]),
+                        names.name(self._senders[slot]), text,
+                        bool(self._flags[slot] & HIGHLIGHTED))
@@ -0,0 +1,235 @@
+"""
+Воспроизведение записанного трафика сервера без сети и без GUI.
+
+Запись - байты от сервера как есть (строки IRC через \\r\\n), можно
+сжатые gzip. Они идут в клиента тем же путем, что и из сокета в
+IRCClient.listen: кусками в буфер LineReader, дальше
+handle_received, разбор и обработчики. Обычный файл отображается в
+память (mmap) и читается по мере воспроизведения, gzip читается
+потоком, так что размер записи ограничен только диском.
+
+Без speed строки идут с максимальной скоростью; со speed -
+в темпе записи (1.0 - как было, 10 - в десять раз быстрее) по тегам
+времени IRCv3 (server-time). Строки без тега идут сразу.
+
+    python -m source.irc_replay capture.log [--nick me] [--speed 1]
+"""
+import argparse
+import gzip
+import mmap
+import os
+import sys
+import time
+from collections import Counter, namedtuple
+from source.irc_buffer import LineReader
+from source.irc_caps import server_time
+from source.irc_client import IRCClient
+from source.irc_metrics import METRICS
+from source.irc_parser import parse_message, parse_tags
+from source.irc_rules import load_rules
+
+CHUNK = 1 << 20
+NICK_SCAN = 1 << 20
+
+ReplayReport = namedtuple("ReplayReport",
+                          "lines bytes seconds commands nick channels "
+                          "sent errors")
+
+
+class ReplayClient(IRCClient):
+    """
+    Клиент для воспроизведения: считается подключенным, а строки,
+    которые он отправил бы серверу, только считает по командам
+    """
+
+    def __init__(self, nick=None):
+        super().__init__()
+        self.nick = nick
+        self.connected = True
+        self.auto_list = False
+        self.sent = Counter()
+
+    def send_raw(self, data):
+        self.sent[data.partition(" ")[0].upper()] += 1
+        return True
+
+
+def open_capture(path):
+    """
+    Читает запись кусками, не загружая ее целиком
+    :return: генератор bytes-подобных кусков
+    """
+    if path.endswith(".gz"):
+        with gzip.open(path, "rb") as f:
+            while True:
+                chunk = f.read(CHUNK)
+                if not chunk:
+                    return
+                yield chunk
+    if not os.path.getsize(path):
+        return
+    with open(path, "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if hasattr(mapped, "madvise"):
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+        for start in range(0, len(mapped), CHUNK):
+            yield mapped[start:start + CHUNK]
+
+
+def guess_nick(path):
+    """
+    Наш ник из приветствия сервера (001) в начале записи
+    :return: ник или None
+    """
+    seen = 0
+    reader = LineReader()
+    for chunk in open_capture(path):
+        for line in reader.feed(chunk):
+            msg = parse_message(line)
+            if msg is not None and msg.command == "001" and msg.params:
+                return msg.params[0]
+        seen += len(chunk)
+        if seen >= NICK_SCAN:
+            break
+    return None
+
+
+def replay(path, client=None, speed=None, profile=True,
+           clock=time.monotonic, sleep=time.sleep):
+    """
+    Прогоняет запись через клиента
+    :param path: файл записи (.gz - сжатый)
+    :param client: IRCClient; по умолчанию ReplayClient с ником из
+    записи
+    :param speed: None - как можно быстрее, иначе темп записи,
+    умноженный на speed
+    :param profile: собрать время разбора по командам метриками
+    (parse.<команда>); на время прогона они включаются и
+    сбрасываются. Без него скорость - чистая, без затрат метрик
+    :return: ReplayReport
+    """
+    if client is None:
+        client = ReplayClient(guess_nick(path))
+    was_enabled = METRICS.enabled
+    METRICS.reset()
+    METRICS.enable(profile)
+    reader = LineReader(encoding=client.encoding,
+                        fallback_encoding=client.fallback_encoding)
+    pacer = _Pacer(speed, clock, sleep) if speed else None
+    size = lines = 0
+    began = time.perf_counter()
+    try:
+        for chunk in open_capture(path):
+            size += len(chunk)
+            lines += chunk.count(b"\n")
+            chunk = memoryview(chunk)
+            while chunk:
+                # как recv_into: байты ложатся прямо в буфер LineReader
+                target = reader.get_buffer()
+                n = min(len(target), len(chunk))
+                target[:n] = chunk[:n]
+                chunk = chunk[n:]
+                if pacer is None:
+                    client.handle_received(reader, n)
+                else:
+                    for line in reader.commit(n):
+                        pacer.wait(line)
+                        client.handle_line(line)
+        elapsed = time.perf_counter() - began
+        snapshot = METRICS.snapshot()
+    finally:
+        METRICS.enable(was_enabled)
+    commands = {name[len("parse."):]: histogram
+                for name, histogram in snapshot["histograms"].items()
+                if name.startswith("parse.")}
+    channels = {}
+    for folded, name in client.joined_channels.items():
+        members = client.membership.channels.get(folded)
+        channels[name] = len(members) if members is not None else 0
+    return ReplayReport(
+        lines, size, elapsed, commands, client.nick, channels,
+        dict(getattr(client, "sent", {})), snapshot["errors"])
+
+
+class _Pacer:
+    """
+    Задерживает строки с тегом time до их времени в записи
+    """
+
+    def __init__(self, speed, clock, sleep):
+        self.speed = speed
+        self.clock = clock
+        self.sleep = sleep
+        self.origin = None
+
+    def wait(self, line):
+        if line[0] != "@":
+            return
+        stamp = server_time(parse_tags(line[1:line.find(" ")]))
+        if stamp is None:
+            return
+        if self.origin is None:
+            self.origin = (stamp, self.clock())
+            return
+        first, started = self.origin
+        delay = started + (stamp - first) / self.speed - self.clock()
+        if delay > 0:
+            self.sleep(delay)
+
+
+def format_report(report, top=15):
+    """
+    Текстовый отчет: скорость, самые дорогие команды и итоговое
+    состояние
+    """
+    seconds = report.seconds or 1e-9
+    lines = [f"{report.lines} lines, {report.bytes / 2 ** 20:.1f} MiB "
+             f"in {report.seconds:.2f} s: {report.lines / seconds:,.0f} "
+             f"lines/sec, {report.bytes / 2 ** 20 / seconds:.1f} MiB/s",
+             f"handler errors: {report.errors}", "",
+             f"  {'command':<12} {'count':>10} {'total ms':>10} "
+             f"{'mean us':>9} {'p99 us':>9} {'max us':>9}"]
+    costs = sorted(report.commands.items(),
+                   key=lambda item: item[1]["count"] * item[1]["mean_ms"],
+                   reverse=True)
+    for command, h in costs[:top]:
+        lines.append(f"  {command:<12} {h['count']:>10} "
+                     f"{h['count'] * h['mean_ms']:>10.1f} "
+                     f"{h['mean_ms'] * 1000:>9.2f} "
+                     f"{h['p99_ms'] * 1000:>9.1f} {h['max_ms'] * 1000:>9.1f}")
+    users = sum(report.channels.values())
+    lines += ["", f"nick {report.nick}, {len(report.channels)} channels, "
+                  f"{users} members"]
+    for name, count in sorted(report.channels.items(),
+                              key=lambda item: -item[1])[:top]:
+        lines.append(f"  {name:<30} {count:>7}")
+    if report.sent:
+        lines += ["", "would send: " + ", ".join(
+            f"{command} {count}"
+            for command, count in sorted(report.sent.items()))]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m source.irc_replay")
+    parser.add_argument("capture", help="запись трафика сервера (.gz - "
+                                        "сжатая)")
+    parser.add_argument("--nick", help="наш ник, по умолчанию из 001")
+    parser.add_argument("--speed", type=float,
+                        help="темп записи (1 - как было), без него - "
+                             "как можно быстрее")
+    parser.add_argument("--rules", help="файл правил (irc_rules)")
+    parser.add_argument("--no-timings", action="store_true",
+                        help="не собирать время по командам")
+    parser.add_argument("--top", type=int, default=15,
+                        help="сколько команд и каналов показать")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    client = ReplayClient(args.nick or guess_nick(args.capture))
+    if args.rules:
+        client.rules = load_rules(args.rules)
+    print(format_report(replay(args.capture, client, args.speed,
+                               not args.no_timings), args.top))
+
+
+if __name__ == "__main__":
+    main()
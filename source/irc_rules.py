@@ -0,0 +1,291 @@
+"""
+Правила игнорирования и подсветки входящих строк.
+
+Правило - маска отправителя nick!user@host (glob), каналы, команды
+IRC и регулярное выражение по тексту; пустое условие подходит ко
+всему. RuleSet собирает правила один раз: маски из одного ника,
+хоста или домена (*!*@*.example.org) без текста ложатся в словари,
+остальные правила - в одно регулярное выражение на канал (и одно
+общее). Проверка строки - несколько поисков в словарях и не больше
+двух вызовов match на действие, сколько бы правил ни было.
+
+Файл правил - по правилу на строку:
+
+    # комментарий
+    ignore *!*@*.bots.example
+    ignore * channel=#python command=JOIN,PART,QUIT
+    highlight * channel=#ops text=\\b(deploy|rollback)\\b
+
+text идет последним и тянется до конца строки. Маски, каналы и
+текст сравниваются без учета регистра. У QUIT и NICK канала нет:
+channel= для них проверяется по каналам, где отправитель сидит
+вместе с нами.
+"""
+import re
+from collections import namedtuple
+
+IGNORE, HIGHLIGHT = "ignore", "highlight"
+CHANNEL_PREFIXES = "#&!+"
+# команды, у которых последний параметр - текст, а не канал или ник
+TEXT_COMMANDS = frozenset(("PRIVMSG", "NOTICE", "PART", "QUIT", "KICK",
+                           "TOPIC"))
+# строки, которые меняют состояние (списки участников, наш ник):
+# проигнорированные, они все равно обрабатываются, только не
+# показываются
+STATE_COMMANDS = frozenset(("JOIN", "PART", "KICK", "QUIT", "NICK",
+                            "MODE"))
+# команды, у которых первый параметр - цель (канал или ник)
+TARGET_COMMANDS = frozenset(("JOIN", "PART", "KICK", "PRIVMSG", "NOTICE",
+                             "TOPIC", "MODE"))
+# команды без канала: относятся ко всем каналам, где есть отправитель
+NETWORK_COMMANDS = frozenset(("QUIT", "NICK"))
+
+Rule = namedtuple("Rule", "action mask channels commands text",
+                  defaults=("*", None, None, None))
+
+
+def parse_rule(line):
+    """
+    :param line: строка файла правил вида
+    "ignore маска channel=#a,#b command=JOIN text=выражение"
+    :return: Rule или None для пустой строки и комментария
+    """
+    line = line.strip()
+    if not line or line[0] in "#;":
+        return None
+    head, sep, text = line.partition(" text=")
+    words = head.split()
+    if sep and not text:
+        raise ValueError(f"empty text in rule: {line}")
+    if len(words) < 2 or words[0].lower() not in (IGNORE, HIGHLIGHT):
+        raise ValueError(f"expected 'ignore|highlight mask ...': {line}")
+    channels = commands = None
+    for word in words[2:]:
+        key, _, value = word.partition("=")
+        if key == "channel":
+            channels = tuple(value.split(","))
+        elif key == "command":
+            commands = tuple(value.split(","))
+        else:
+            raise ValueError(f"unknown rule option {key!r}: {line}")
+    return Rule(words[0].lower(), words[1], channels, commands,
+                text or None)
+
+
+def load_rules(path):
+    """
+    Читает файл правил
+    :return: RuleSet
+    """
+    with open(path, encoding="utf-8") as f:
+        rules = [rule for rule in map(parse_rule, f) if rule is not None]
+    return RuleSet(rules)
+
+
+def split_mask(mask):
+    """
+    Маска из ника дополняется до ник!*@*, ник!user - до ник!user@*
+    :return: (nick, user, host)
+    """
+    nick, _, userhost = mask.partition("!")
+    user, _, host = userhost.partition("@")
+    return nick or "*", user or "*", host or "*"
+
+
+def _literal(glob):
+    return glob and not any(char in glob for char in "*?")
+
+
+def _glob_atoms(glob, stop):
+    return [f"[^{stop}\\n]*" if char == "*" else
+            f"[^{stop}\\n]" if char == "?" else re.escape(char)
+            for char in glob]
+
+
+def _hit(conditions, command, channel):
+    for commands, channels in conditions:
+        if (commands is None or command in commands) and \
+                (channels is None or channel in channels):
+            return True
+    return False
+
+
+class _Matcher:
+    """
+    Правила одного действия
+    """
+
+    def __init__(self, rules):
+        self.any = []
+        self.nicks = {}
+        self.hosts = {}
+        self.domains = {}
+        generic = {}
+        for rule in rules:
+            self._add(rule, generic)
+        self.common = None
+        if None in generic:
+            self.common = _compile(generic.pop(None))
+        self.channels = {channel: _compile(heads)
+                         for channel, heads in generic.items()}
+
+    def _add(self, rule, generic):
+        commands = frozenset(command.upper() for command in rule.commands) \
+            if rule.commands else None
+        channels = frozenset(channel.lower() for channel in rule.channels) \
+            if rule.channels else None
+        nick, user, host = split_mask(rule.mask.lower())
+        condition = (commands, channels)
+        if rule.text is None and user == "*":
+            table = key = None
+            if nick == host == "*":
+                self.any.append(condition)
+                return
+            if host == "*" and _literal(nick):
+                table, key = self.nicks, nick
+            elif nick == "*" and _literal(host):
+                table, key = self.hosts, host
+            elif nick == "*" and host.startswith("*.") and \
+                    _literal(host[1:]):
+                table, key = self.domains, host[1:]
+            if table is not None:
+                table.setdefault(key, []).append(condition)
+                return
+        head = ("(?:" + "|".join(sorted(commands)) + ")" if commands
+                else "[^\x00]*", "\x00", *_glob_atoms(nick, "!"), "!",
+                *_glob_atoms(user, "@"), "@", *_glob_atoms(host, ""), "\n")
+        for channel in channels or (None,):
+            generic.setdefault(channel, {}).setdefault(head, []).append(
+                rule.text)
+
+    def match(self, command, channel, prefix, text):
+        if self.any and _hit(self.any, command, channel):
+            return True
+        nick, _, userhost = prefix.lower().partition("!")
+        host = userhost.partition("@")[2]
+        if self.nicks:
+            conditions = self.nicks.get(nick)
+            if conditions and _hit(conditions, command, channel):
+                return True
+        if self.hosts:
+            conditions = self.hosts.get(host)
+            if conditions and _hit(conditions, command, channel):
+                return True
+        if self.domains:
+            dot = host.find(".")
+            while dot >= 0:
+                conditions = self.domains.get(host[dot:])
+                if conditions and _hit(conditions, command, channel):
+                    return True
+                dot = host.find(".", dot + 1)
+        regex = self.channels.get(channel) if channel else None
+        if regex is None and self.common is None:
+            return False
+        key = f"{command}\x00{prefix}\n{text}"
+        return bool(regex is not None and regex.match(key) or
+                    self.common is not None and self.common.match(key))
+
+
+def _compile(heads):
+    # начала правил (команды и маска) собираются в дерево, как
+    # trie_pattern в irc_text: общая часть масок проверяется один
+    # раз, а не на каждое правило. Тексты правил с одинаковым
+    # началом - альтернативы в его листе
+    trie = {}
+    for atoms, texts in heads.items():
+        node = trie
+        for atom in atoms:
+            node = node.setdefault(atom, {})
+        node[""] = texts
+    return re.compile(_node_pattern(trie), re.IGNORECASE | re.MULTILINE)
+
+
+def _node_pattern(node):
+    texts = node.get("")
+    if texts is not None:
+        # лист: маска кончается "\n", после него ветвей нет
+        if None in texts:
+            return ""
+        return ".*?(?:" + "|".join(f"(?:{text})" for text in texts) + ")"
+    branches = [atom + _node_pattern(child) for atom, child in node.items()]
+    if len(branches) == 1:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")"
+
+
+class RuleSet:
+    """
+    Собранные правила. check вызывается в потоке чтения каждого
+    клиента, set_rules подменяет собранное одним присваиванием, так
+    что правила можно менять на ходу. Игнор сильнее подсветки.
+    Строки без пользователя в префиксе (от сервера) под правила не
+    попадают.
+    """
+
+    def __init__(self, rules=()):
+        self.rules = []
+        self._matchers = (_Matcher(()), _Matcher(()))
+        self.set_rules(rules)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def set_rules(self, rules):
+        """
+        :param rules: список Rule
+        """
+        rules = list(rules)
+        for rule in rules:
+            _validate(rule)
+        self._matchers = (
+            _Matcher(rule for rule in rules if rule.action == IGNORE),
+            _Matcher(rule for rule in rules if rule.action == HIGHLIGHT))
+        self.rules = rules
+
+    def check(self, msg, membership=None):
+        """
+        QUIT и NICK проверяются по каждому общему с отправителем
+        каналу: игнорируются, только если правило подходит ко всем
+        (в остальных каналах строку должно быть видно), а подсвечиваются
+        по любому из них
+        :param msg: irc_parser.IRCMessage
+        :param membership: irc_members.MembershipTracker клиента, для
+        каналов отправителя QUIT и NICK
+        :return: IGNORE, HIGHLIGHT или None
+        """
+        prefix = msg.prefix
+        if prefix is None or "!" not in prefix:
+            return None
+        command = msg.command
+        params = msg.params
+        channels = ("",)
+        if command in TARGET_COMMANDS:
+            if params and params[0][:1] in CHANNEL_PREFIXES:
+                channels = (params[0].lower(),)
+        elif command in NETWORK_COMMANDS and membership is not None:
+            channels = membership.shared(prefix.partition("!")[0]) or \
+                channels
+        text = params[-1] if command in TEXT_COMMANDS and params and \
+            (len(params) > 1 or command == "QUIT") else ""
+        ignore, highlight = self._matchers
+        if all(ignore.match(command, channel, prefix, text)
+               for channel in channels):
+            return IGNORE
+        if any(highlight.match(command, channel, prefix, text)
+               for channel in channels):
+            return HIGHLIGHT
+        return None
+
+
+def _validate(rule):
+    if rule.action not in (IGNORE, HIGHLIGHT):
+        raise ValueError(f"unknown rule action: {rule.action!r}")
+    if rule.text is not None:
+        try:
+            compiled = re.compile(rule.text)
+        except re.error as e:
+            raise ValueError(f"bad text pattern {rule.text!r}: {e}")
+        # правила склеиваются в одно выражение, имена групп в нем
+        # повторялись бы
+        if compiled.groupindex:
+            raise ValueError(f"named groups are not allowed: {rule.text!r}")
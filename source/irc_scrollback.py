@@ -0,0 +1,146 @@
+from array import array
+from source.irc_text import Rendered
+
+
+class Scrollback:
+    """
+    История чата: кольцевой буфер на capacity последних строк.
+    Вытесненные строки, если задан spill_file, дописываются в файл;
+    в памяти остается только смещение начала каждой страницы
+    из page_size строк, поэтому расход памяти не растет со временем.
+    """
+
+    def __init__(self, capacity=5000, spill_file=None, page_size=256):
+        """
+        :param capacity: сколько строк держать в памяти
+        :param spill_file: двоичный файл для вытесненных строк
+        (например, tempfile.TemporaryFile()) или None - тогда они
+        отбрасываются
+        :param page_size: строк в странице файла
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.page_size = page_size
+        self._items = [None] * capacity
+        self._start = 0
+        self._count = 0
+        self.spilled = 0
+        self.dropped = 0
+        self._spill = spill_file
+        self._spill_size = 0
+        self._pages = array("Q")
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("scrollback index out of range")
+        return self._items[(self._start + index) % self.capacity]
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
+
+    @property
+    def total(self):
+        """
+        Все строки за сессию: в памяти, в файле и отброшенные
+        """
+        return self.dropped + self.spilled + self._count
+
+    def overflow(self, count):
+        """
+        Сколько строк из буфера вытеснит добавление count строк
+        """
+        return max(0, self._count + min(count, self.capacity) -
+                   self.capacity)
+
+    def evict(self, count):
+        """
+        Вытесняет count самых старых строк
+        :return: вытесненные строки
+        """
+        capacity = self.capacity
+        items = self._items
+        evicted = []
+        for _ in range(min(count, self._count)):
+            slot = self._start
+            evicted.append(items[slot])
+            items[slot] = None
+            self._start = (slot + 1) % capacity
+        self._count -= len(evicted)
+        if evicted:
+            self._spill_records(evicted)
+        return evicted
+
+    def append(self, records):
+        """
+        Добавляет строки в конец, при нехватке места вытесняя старые
+        :param records: список Rendered
+        :return: вытесненные строки, от старых к новым
+        """
+        capacity = self.capacity
+        evicted = self.evict(self.overflow(len(records)))
+        if len(records) > capacity:
+            overflow = records[:-capacity]
+            self._spill_records(overflow)
+            evicted.extend(overflow)
+            records = records[-capacity:]
+        items = self._items
+        end = (self._start + self._count) % capacity
+        for record in records:
+            items[end] = record
+            end = (end + 1) % capacity
+        self._count += len(records)
+        return evicted
+
+    def _spill_records(self, records):
+        if self._spill is None:
+            self.dropped += len(records)
+            return
+        chunks = []
+        size = self._spill_size
+        for record in records:
+            if self.spilled % self.page_size == 0:
+                self._pages.append(size)
+            data = ("1" if record.highlight else "0") + \
+                record.html.replace("\n", "<br>") + "\n"
+            data = data.encode("utf-8")
+            chunks.append(data)
+            size += len(data)
+            self.spilled += 1
+        self._spill.seek(self._spill_size)
+        self._spill.write(b"".join(chunks))
+        self._spill_size = size
+
+    def read_spilled(self, start, stop):
+        """
+        Читает строки из файла
+        :param start: номер первой строки среди вытесненных
+        :param stop: номер строки после последней
+        :return: список Rendered
+        """
+        start = max(start, 0)
+        stop = min(stop, self.spilled)
+        if self._spill is None or start >= stop:
+            return []
+        page = start // self.page_size
+        self._spill.flush()
+        self._spill.seek(self._pages[page])
+        skip = start - page * self.page_size
+        records = []
+        for _ in range(skip):
+            self._spill.readline()
+        for _ in range(stop - start):
+            line = self._spill.readline().decode("utf-8")
+            records.append(Rendered(line[1:-1], line[0] == "1", []))
+        return records
+
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
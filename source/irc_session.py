@@ -0,0 +1,386 @@
+import time
+from functools import partial
+from source.irc_batcher import EventBatcher
+from source.irc_buffers import SERVER_BUFFER, BufferSet
+from source.irc_client import IRCClient
+from source.irc_metrics import METRICS
+from source.irc_records import ChatLine
+from source.irc_text import ChatRenderer
+from source.irc_reconnect import Backoff
+
+
+class Session:
+    """
+    Подключение к одной сети: клиент, буферы строк и пакетировщик
+    событий для GUI. Каналы, в которых мы находимся, знает клиент
+    (IRCClient.joined_channels)
+    """
+
+    def __init__(self, network_id, server, port, nick, client, batcher):
+        self.network_id = network_id
+        self.server = server
+        self.port = port
+        self.nick = nick
+        self.client = client
+        self.batcher = batcher
+        self.buffers = BufferSet(table=client.names)
+        self.pipeline = None
+        self.renderer = None
+        # буфер, который показывает представление, и номер последней
+        # его строки, уже превращенной в HTML: (имя, номер)
+        self.visible = None
+        self.list_writer = None
+
+    def show(self, name, shown):
+        """
+        Представление показывает буфер name, строки до номера shown
+        у него уже есть. Новые строки этого буфера поток доставки
+        будет превращать в HTML сам
+        """
+        self.visible = (name, shown)
+
+
+class SessionManager:
+    """
+    Владеет подключениями ко многим сетям. Сессии хранятся в словаре
+    по network_id, поэтому маршрутизация событий сети в ее
+    представление - O(1).
+    События клиента собираются EventBatcher в потоке чтения и
+    приходят слушателям пачками. Сам менеджер не зависит от Qt: в
+    какой поток попадут пачки, решает dispatch.
+    """
+
+    def __init__(self, client_class=IRCClient, max_rate=30,
+                 max_batch=2000, max_pending=100000, pipeline_factory=None,
+                 log_store=None, dispatch=None, channel_cache=None,
+                 list_min_users=None, reconnect=False, dcc=None,
+                 rules=None, batch_thread=True):
+        """
+        :param client_class: класс клиента для новых подключений
+        :param max_rate: максимум доставок пачек в секунду на сеть
+        :param max_batch: максимум элементов в пачке
+        :param max_pending: предел очереди, сверх него строки чата
+        отбрасываются
+        :param pipeline_factory: функция ника, возвращающая
+        TextPipeline сессии. Им в потоке чтения проверяется подсветка
+        строк. С dispatch по нему же строится ChatRenderer сессии:
+        новые строки видимого буфера (Session.show) превращаются в
+        HTML в потоке доставки и приходят слушателям on_rendered
+        :param log_store: LogStore для журнала событий или None
+        :param dispatch: функция dispatch(func, *args), вызывающая func
+        в потоке слушателей (для GUI - irc_qt.QtDispatcher). None -
+        слушатели вызываются прямо в потоке доставки пачек
+        :param channel_cache: irc_directory.ChannelCache или None. С
+        кэшем каталог каналов сети приходит слушателям сразу при
+        открытии сессии, а LIST уходит, только если каталог устарел
+        :param list_min_users: минимум пользователей для LIST
+        (фильтр ELIST на сервере)
+        :param reconnect: переподключаться после обрыва связи с
+        растущей задержкой (irc_reconnect.Backoff); каналы и списки
+        участников сессии при этом сохраняются
+        :param dcc: irc_dcc.DccManager, которому уходят запросы DCC
+        всех сетей, или None - запросы игнорируются
+        :param rules: irc_rules.RuleSet игнорирования и подсветки,
+        общий для всех сетей, или None
+        :param batch_thread: доставлять пачки потоком EventBatcher.
+        False - только по Session.batcher.flush (для тестов)
+        """
+        self.client_class = client_class
+        self.pipeline_factory = pipeline_factory
+        self.log_store = log_store
+        self.max_rate = max_rate
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.sessions = {}
+        self.listeners = []
+        self.dispatch = dispatch
+        self.channel_cache = channel_cache
+        self.list_min_users = list_min_users
+        self.reconnect = reconnect
+        self.dcc = dcc
+        self.rules = rules
+        self.batch_thread = batch_thread
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def __contains__(self, network_id):
+        return network_id in self.sessions
+
+    def __iter__(self):
+        return iter(self.sessions.values())
+
+    def get(self, network_id):
+        return self.sessions.get(network_id)
+
+    def add_listener(self, listener):
+        """
+        Подписывает объект на события всех сетей. У слушателя
+        вызываются методы on_messages, on_channels, on_channels_end,
+        on_members, on_joined, on_history с network_id первым
+        аргументом. on_messages получает список (буфер, подсвечена ли
+        строка), сами строки лежат в Session.buffers. on_history
+        получает буфер и строки истории с сервера (CHATHISTORY,
+        список ChatLine), которые старше всего, что есть в буфере.
+        on_rendered (только с pipeline_factory и dispatch) получает
+        буфер, номер первой строки и готовые строки Rendered; он
+        приходит в пачке раньше on_messages.
+        """
+        self.listeners.append(listener)
+
+    def open(self, server, port, nick, network_id=None, setup=None,
+             wait=True):
+        """
+        Создает сессию и подключается к серверу. Если сессия с таким
+        network_id уже есть, возвращает ее без переподключения.
+        :param network_id: имя сети, по умолчанию адрес сервера
+        :param setup: функция сессии, вызывается до подключения
+        (настроить клиента, подписаться на его сигналы)
+        :param wait: False - не ждать подключения (и рукопожатия TLS):
+        клиент подключается в своем потоке, ошибки приходят в буфер
+        сервера. Для GUI-потока
+        :return: Session
+        """
+        network_id = network_id or server
+        session = self.sessions.get(network_id)
+        if session is not None:
+            return session
+        client = self.client_class()
+        if self.log_store is not None:
+            client.event_log = partial(self.log_store.record, network_id)
+        if self.dispatch is not None:
+            deliver = partial(self._post, network_id)
+        else:
+            deliver = partial(self._on_batch, network_id)
+        batcher = EventBatcher(deliver, self.max_rate, self.max_batch,
+                               self.max_pending, self.batch_thread)
+        session = Session(network_id, server, port, nick, client, batcher)
+        if self.pipeline_factory is not None:
+            session.pipeline = self.pipeline_factory(nick)
+            if self.dispatch is not None:
+                session.renderer = ChatRenderer(session.pipeline)
+        client.list_min_users = self.list_min_users
+        client.rules = self.rules
+        if self.reconnect:
+            client.reconnect = Backoff()
+        self._wire(session)
+        if setup is not None:
+            setup(session)
+        METRICS.add_gauge(f"{network_id}.send_queue",
+                          lambda: client.send_queue.stats())
+        METRICS.add_gauge(f"{network_id}.batcher", batcher.stats)
+        self.sessions[network_id] = session
+        if self.channel_cache is not None:
+            self._load_directory(session)
+        try:
+            if wait:
+                client.connect(server, port, nick)
+            else:
+                client.connect(server, port, nick, wait=False)
+        except Exception:
+            del self.sessions[network_id]
+            METRICS.remove_gauges(network_id + ".")
+            raise
+        return session
+
+    def close(self, network_id):
+        """
+        Отключается от сети и забывает ее состояние
+        """
+        session = self.sessions.pop(network_id, None)
+        if session is not None:
+            METRICS.remove_gauges(network_id + ".")
+            session.batcher.stop()
+            # клиент может еще подключаться в своем потоке
+            session.client.disconnect()
+            self._abort_list_writer(session)
+        return session
+
+    def _wire(self, session):
+        client = session.client
+        batcher = session.batcher
+        client.message_received.connect(partial(self._on_message, session))
+        client.chat_received.connect(partial(self._on_chat, session))
+        client.channels_received.connect(
+            lambda channels: batcher.extend("channels", channels))
+        client.channels_end.connect(lambda: batcher.add("channels_end"))
+        if self.channel_cache is not None:
+            client.channels_received.connect(
+                partial(self._on_list_rows, session))
+            client.channels_end.connect(partial(self._on_list_end, session))
+            client.reconnected.connect(
+                partial(self._abort_list_writer, session))
+        client.channels_end.connect(batcher.mark_urgent)
+        client.members_changed.connect(partial(batcher.extend, "members"))
+        client.channel_joined.connect(partial(batcher.add, "joined"))
+        client.history_received.connect(
+            partial(self._on_history_lines, session))
+        if self.dcc is not None:
+            client.dcc_received.connect(partial(self.dcc.handle, client))
+
+    def _load_directory(self, session):
+        """
+        Отдает слушателям каталог каналов из кэша. Если он свежий и
+        получен с теми же фильтрами, LIST при подключении не нужен.
+        Каталог уходит одной пачкой мимо EventBatcher: его предел
+        пачки рассчитан на поток из сети, а не на готовый список
+        """
+        cache = self.channel_cache
+        header, rows = cache.load(session.network_id)
+        if rows:
+            session.batcher.deliver([["channels", rows],
+                                     ["channels_end", ()]])
+        if cache.is_fresh(header, self.list_min_users):
+            session.client.auto_list = False
+
+    @staticmethod
+    def _abort_list_writer(session):
+        # LIST оборвался вместе со связью: после переподключения
+        # клиент запросит его заново
+        writer, session.list_writer = session.list_writer, None
+        if writer is not None:
+            writer.abort()
+
+    def _on_list_rows(self, session, rows):
+        # поток чтения: строки LIST сразу пишутся в файл кэша
+        writer = session.list_writer
+        if writer is None:
+            min_users, mask = session.client.list_request or (None, None)
+            writer = session.list_writer = self.channel_cache.writer(
+                session.network_id, min_users, mask)
+        writer.write(rows)
+
+    def _on_list_end(self, session):
+        writer, session.list_writer = session.list_writer, None
+        request = session.client.list_request
+        if writer is None and request is not None:
+            # пустой ответ на LIST с фильтром - тоже каталог
+            writer = self.channel_cache.writer(session.network_id, *request)
+        if writer is not None:
+            writer.commit()
+
+    @staticmethod
+    def _on_message(session, message):
+        # поток чтения: служебные строки (эхо сырых строк, ошибки,
+        # DCC) ложатся в буфер сервера, строки чата приходят
+        # chat_received. Подсветку в буфере сервера не считаем
+        session.buffers.append(SERVER_BUFFER, (ChatLine.status(message),))
+        session.batcher.extend("message", ((SERVER_BUFFER, False),))
+
+    @staticmethod
+    def _on_chat(session, line):
+        # поток чтения: строка чата ложится в буфер компактной
+        # записью, в HTML ее превратит представление, если покажет.
+        # Строку, подсвеченную правилами клиента, заново не проверяем
+        nick = session.client.nick
+        name = line.target
+        if nick and name.lower() == nick.lower():
+            name = line.sender
+        if not line.highlight and session.pipeline is not None:
+            line.highlight = session.pipeline.highlighted(line.text)
+        session.buffers.append(name, (line,))
+        session.batcher.extend("message", ((name, line.highlight),))
+
+    @staticmethod
+    def _on_history_lines(session, target, lines):
+        # поток чтения: история в буфер не пишется - она старше его
+        # начала
+        session.batcher.add("history", target, lines)
+        session.batcher.mark_urgent()
+
+    def _post(self, network_id, events):
+        session = self.sessions.get(network_id)
+        if session is not None and session.renderer is not None:
+            self._prerender(session, events)
+        # поток доставки: время отправки нужно, чтобы измерить, сколько
+        # пачка ждала в очереди потока слушателей (для GUI - зависания)
+        posted = time.perf_counter() if METRICS.enabled else 0.0
+        self.dispatch(self._on_posted, network_id, events, posted)
+
+    @staticmethod
+    def _prerender(session, events):
+        # поток доставки: новые строки видимого буфера превращаются в
+        # HTML здесь, GUI-потоку остается их вставить. Строки скрытых
+        # буферов не преобразуются, пока их не покажут
+        visible = session.visible
+        if visible is None:
+            return
+        name, shown = visible
+        key = name.lower()
+        if not any(kind == "message" and
+                   any(buffer.lower() == key for buffer, _ in payload)
+                   for kind, payload in events):
+            return
+        started = time.perf_counter() if METRICS.enabled else 0.0
+        lines, total = session.buffers.tail(name, shown)
+        if not lines:
+            return
+        render = session.renderer.render
+        rendered = [render(line) for line in lines]
+        # представление могло за это время переключиться на другой
+        # буфер, тогда его выбор не трогаем
+        if session.visible is visible:
+            session.visible = (name, total)
+        events.insert(0, ["rendered", (name, total - len(lines), rendered)])
+        if started:
+            METRICS.observe("session.prerender",
+                            time.perf_counter() - started)
+
+    def _on_posted(self, network_id, events, posted):
+        if posted:
+            METRICS.observe("session.dispatch_lag",
+                            time.perf_counter() - posted)
+        self._on_batch(network_id, events)
+
+    def _on_batch(self, network_id, events):
+        session = self.sessions.get(network_id)
+        if session is None:
+            return
+        started = time.perf_counter() if METRICS.enabled else 0.0
+        for kind, payload in events:
+            if kind == "message":
+                self._on_messages(network_id, payload)
+            elif kind == "channels":
+                self._on_channels(session, payload)
+            elif kind == "channels_end":
+                self._on_channels_end(session)
+            elif kind == "members":
+                self._on_members(session, payload)
+            elif kind == "joined":
+                self._on_joined(session, *payload)
+            elif kind == "history":
+                self._on_history(session, *payload)
+            elif kind == "rendered":
+                self._on_rendered(session, *payload)
+        if started:
+            # время слушателей: в GUI это время, на которое встал
+            # интерфейс
+            METRICS.observe("session.deliver", time.perf_counter() - started)
+
+    def _on_messages(self, network_id, messages):
+        for listener in self.listeners:
+            listener.on_messages(network_id, messages)
+
+    def _on_channels(self, session, channels):
+        for listener in self.listeners:
+            listener.on_channels(session.network_id, channels)
+
+    def _on_channels_end(self, session):
+        for listener in self.listeners:
+            listener.on_channels_end(session.network_id)
+
+    def _on_members(self, session, ops):
+        for listener in self.listeners:
+            listener.on_members(session.network_id, ops)
+
+    def _on_joined(self, session, channel):
+        for listener in self.listeners:
+            listener.on_joined(session.network_id, channel)
+
+    def _on_history(self, session, target, lines):
+        for listener in self.listeners:
+            listener.on_history(session.network_id, target, lines)
+
+    def _on_rendered(self, session, name, first, rendered):
+        for listener in self.listeners:
+            listener.on_rendered(session.network_id, name, first, rendered)
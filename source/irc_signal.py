@@ -0,0 +1,68 @@
+import threading
+
+
+class BoundSignal:
+    """
+    Сигнал конкретного объекта: список подписчиков, которые
+    вызываются по emit в том же потоке. Список подписчиков
+    неизменяемый и заменяется целиком при connect/disconnect, так что
+    emit из потока чтения не берет блокировку.
+    """
+    __slots__ = ("_slots", "_lock")
+
+    def __init__(self):
+        self._slots = ()
+        self._lock = threading.Lock()
+
+    def connect(self, slot):
+        """
+        Подписывает функцию на сигнал
+        """
+        with self._lock:
+            self._slots = self._slots + (slot,)
+
+    def disconnect(self, slot=None):
+        """
+        Отписывает функцию, без аргумента - всех подписчиков
+        """
+        with self._lock:
+            if slot is None:
+                self._slots = ()
+                return
+            slots = list(self._slots)
+            slots.remove(slot)
+            self._slots = tuple(slots)
+
+    def emit(self, *args):
+        for slot in self._slots:
+            slot(*args)
+
+    def __len__(self):
+        return len(self._slots)
+
+
+class Signal:
+    """
+    Объявление сигнала в классе, как pyqtSignal, но без Qt: у каждого
+    экземпляра класса свой BoundSignal. Подписчики вызываются прямо в
+    потоке, который вызвал emit; перенос в GUI-поток делает адаптер
+    (см. irc_qt.QtDispatcher).
+    """
+
+    def __init__(self, *types):
+        """
+        :param types: типы аргументов, только для документации
+        """
+        self.types = types
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        bound = instance.__dict__.get(self.name)
+        if bound is None:
+            bound = instance.__dict__.setdefault(self.name, BoundSignal())
+        return bound
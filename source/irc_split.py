@@ -0,0 +1,97 @@
+import re
+
+MAX_LINE_BYTES = 512
+DEFAULT_USER_LEN = 10
+DEFAULT_HOST_LEN = 63
+# только настоящие переводы строк: str.splitlines режет еще и по
+# \x1d, \x1e (курсив и зачеркивание mIRC), \x0b, \x0c, \x85, \u2028
+LINE_BREAK = re.compile(r"\r\n|\r|\n")
+
+
+def line_budget(target, nick, userhost=None, command="PRIVMSG"):
+    """
+    Сколько байт текста поместится в одну строку, с учетом префикса
+    :nick!user@host COMMAND target :, который добавит сервер.
+    :param target: канал или ник получателя
+    :param nick: наш ник
+    :param userhost: наш user@host, если известен; иначе берется
+    худший случай (USERLEN 10, хост 63 байта)
+    :param command: PRIVMSG или NOTICE
+    """
+    if userhost is None:
+        userhost_len = DEFAULT_USER_LEN + 1 + DEFAULT_HOST_LEN
+    else:
+        userhost_len = len(userhost.encode("utf-8"))
+    prefix_len = (1 + len(nick.encode("utf-8")) + 1 + userhost_len + 1 +
+                  len(command) + 1 + len(target.encode("utf-8")) + 2)
+    return MAX_LINE_BYTES - 2 - prefix_len
+
+
+def _is_continuation(byte):
+    return byte & 0xC0 == 0x80
+
+
+def split_message(text, budget):
+    """
+    Режет текст на куски не длиннее budget байт в UTF-8 так, чтобы
+    строк было минимально возможное число. Режет по границам символов;
+    по пробелу - только если это не добавит лишней строки.
+    :param text: текст, уже прошедший все преобразования
+    :param budget: байт на строку (см. line_budget)
+    :return: список строк
+    """
+    if budget < 4:
+        raise ValueError("line budget is too small")
+    parts = []
+    for paragraph in LINE_BREAK.split(text):
+        data = paragraph.encode("utf-8")
+        if data.strip():
+            _split_bytes(data, budget, parts)
+    return parts
+
+
+def _split_bytes(data, budget, parts):
+    total = len(data)
+    # сколько байт можно недобрать во всех строках вместе,
+    # не увеличивая их число
+    slack = -(-total // budget) * budget - total
+    pos = 0
+    while total - pos > budget:
+        end = pos + budget
+        while _is_continuation(data[end]):
+            end -= 1
+        space = data.rfind(b" ", pos, end + 1)
+        if space > pos and pos + budget - (space + 1) <= slack:
+            cut, start = space, space + 1
+        else:
+            cut, start = end, end
+        parts.append(data[pos:cut].decode("utf-8"))
+        slack -= pos + budget - start
+        pos = start
+    if pos < total:
+        parts.append(data[pos:].decode("utf-8"))
+
+
+def pack_joins(channels, limit=MAX_LINE_BYTES - 2):
+    """
+    Собирает каналы в строки JOIN #a,#b,#c не длиннее limit байт
+    (без \\r\\n): сто каналов уходят тремя-четырьмя строками, а не
+    сотней, и не ждут ограничения скорости очереди отправки
+    :param channels: имена каналов
+    :param limit: байт на строку
+    :return: список строк
+    """
+    lines = []
+    names = []
+    size = len("JOIN ")
+    for channel in channels:
+        length = len(channel.encode("utf-8"))
+        if names and size + 1 + length > limit:
+            lines.append("JOIN " + ",".join(names))
+            names = []
+            size = len("JOIN ")
+        size += length + (1 if names else 0)
+        names.append(channel)
+    if names:
+        lines.append("JOIN " + ",".join(names))
+    return lines
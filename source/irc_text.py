@@ -0,0 +1,337 @@
+import html
+import re
+import time
+import zlib
+from collections import namedtuple
+from functools import lru_cache
+from source.replace_emotions import EMOTICONS
+
+BOLD = "\x02"
+COLOR = "\x03"
+MONOSPACE = "\x11"
+REVERSE = "\x16"
+ITALIC = "\x1d"
+STRIKE = "\x1e"
+UNDERLINE = "\x1f"
+RESET = "\x0f"
+
+MIRC_COLORS = (
+    "#ffffff", "#000000", "#00007f", "#009300", "#ff0000", "#7f0000",
+    "#9c009c", "#fc7f00", "#ffff00", "#00fc00", "#009393", "#00ffff",
+    "#0000fc", "#ff00ff", "#7f7f7f", "#d2d2d2",
+)
+
+_CONTROL = (r"\x03(?:(?P<fg>\d{1,2})(?:,(?P<bg>\d{1,2}))?)?"
+            r"|[\x02\x0f\x11\x16\x1d\x1e\x1f]")
+_URL = r"(?:https?://|www\.)[^\s<>\"\x00-\x1f]+"
+_URL_TRAILING = ".,;:!?)]}'\""
+
+# цвета ников: ник всегда получает один и тот же цвет
+NICK_COLORS = (
+    "#b03a2e", "#1f618d", "#1e8449", "#af601a", "#7d3c98", "#117a65",
+    "#9a7d0a", "#a93226", "#2e4053", "#ca6f1e", "#2874a6", "#6c3483",
+)
+# общая таблица стилей документа, в котором рисуются строки: во
+# фрагментах строк только имена классов
+STYLE_SHEET = " ".join(
+    [".ts { color: #909090; }", ".st { color: #606060; }"] +
+    [f".n{i} {{ color: {color}; font-weight: bold; }}"
+     for i, color in enumerate(NICK_COLORS)])
+MAX_STYLE_TAGS = 1024
+
+Rendered = namedtuple("Rendered", "html highlight urls")
+
+
+def trie_pattern(words):
+    """
+    Регулярное выражение для набора строк, в котором общие префиксы
+    вынесены за скобки: :-) и :-( дают :\\-(?:\\(|\\)). Движок re
+    перебирает альтернативы по очереди, поэтому плоский список из
+    сотен смайлов проверялся бы в каждой позиции целиком, а дерево -
+    за длину самого длинного смайла.
+    """
+    trie = {}
+    for word in words:
+        if not word:
+            continue
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = None
+    return _node_pattern(trie)
+
+
+def _node_pattern(node):
+    terminal = "" in node
+    branches = [re.escape(char) + _node_pattern(child)
+                for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ""
+    if len(branches) == 1:
+        body = branches[0]
+        if terminal and len(body) > 1:
+            body = f"(?:{body})"
+    else:
+        body = "(?:" + "|".join(branches) + ")"
+    return body + "?" if terminal else body
+
+
+class _Style:
+    __slots__ = ("bold", "italic", "underline", "strike", "mono",
+                 "fg", "bg")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.bold = self.italic = self.underline = False
+        self.strike = self.mono = False
+        self.fg = self.bg = None
+
+    def css(self):
+        rules = []
+        if self.bold:
+            rules.append("font-weight:bold")
+        if self.italic:
+            rules.append("font-style:italic")
+        decorations = []
+        if self.underline:
+            decorations.append("underline")
+        if self.strike:
+            decorations.append("line-through")
+        if decorations:
+            rules.append("text-decoration:" + " ".join(decorations))
+        if self.mono:
+            rules.append("font-family:monospace")
+        if self.fg is not None:
+            rules.append(f"color:{self.fg}")
+        if self.bg is not None:
+            rules.append(f"background-color:{self.bg}")
+        return ";".join(rules)
+
+    def tag(self):
+        """
+        Открывающий тег span текущего стиля или "". Теги одинаковых
+        сочетаний стилей собираются один раз и общие для всех строк
+        """
+        key = (self.bold, self.italic, self.underline, self.strike,
+               self.mono, self.fg, self.bg)
+        tag = _STYLE_TAGS.get(key)
+        if tag is None:
+            css = self.css()
+            tag = f'<span style="{css}">' if css else ""
+            if len(_STYLE_TAGS) < MAX_STYLE_TAGS:
+                _STYLE_TAGS[key] = tag
+        return tag
+
+
+_STYLE_TAGS = {}
+
+
+class TextPipeline:
+    """
+    Преобразует входящую строку в HTML для чата за один проход:
+    управляющие коды mIRC (жирный, цвета, ...), ссылки, смайлы и
+    подсветка слов (обычно нашего ника). Все этапы собраны в одно
+    регулярное выражение, оно пересобирается только при смене
+    настроек. highlighted вызывается в потоке чтения для каждой
+    строки, render - только для строк, которые показываются.
+    """
+
+    def __init__(self, emoticons=None, highlights=()):
+        """
+        :param emoticons: словарь смайл -> замена, по умолчанию
+        EMOTICONS из replace_emotions
+        :param highlights: слова, при которых строка подсвечивается
+        """
+        self.emoticons = dict(EMOTICONS if emoticons is None else emoticons)
+        self.highlights = [word for word in highlights if word]
+        self._compile()
+
+    def set_emoticons(self, emoticons):
+        """
+        Заменяет таблицу смайлов
+        """
+        self.emoticons = dict(emoticons)
+        self._compile()
+
+    def set_highlights(self, words):
+        """
+        Заменяет слова для подсветки
+        """
+        self.highlights = [word for word in words if word]
+        self._compile()
+
+    def _compile(self):
+        stages = [f"(?P<ctrl>{_CONTROL})", f"(?P<url>{_URL})"]
+        if self.emoticons:
+            stages.append(
+                f"(?<!\\S)(?P<emo>{trie_pattern(self.emoticons)})(?!\\S)")
+        highlight = None
+        if self.highlights:
+            words = trie_pattern(word.lower() for word in self.highlights)
+            stages.append(f"(?<!\\w)(?P<hl>(?i:{words}))(?!\\w)")
+            highlight = (re.compile(f"(?<!\\w)(?i:{words})(?!\\w)"),
+                         [word.lower() for word in self.highlights])
+        # новое выражение подменяется одним присваиванием, поток
+        # чтения в это время продолжает пользоваться старым
+        self._regex = re.compile("|".join(stages))
+        self._highlight = highlight
+
+    def highlighted(self, text):
+        """
+        Есть ли в тексте слово для подсветки, без преобразования
+        строки
+        """
+        highlight = self._highlight
+        if highlight is None:
+            return False
+        regex, words = highlight
+        # обычно слово одно-два (наш ник) и его в строке нет: поиск
+        # подстроки отсекает такие строки быстрее выражения с
+        # проверкой границ слова
+        lowered = text.lower()
+        for word in words:
+            if word in lowered:
+                return regex.search(text) is not None
+        return False
+
+    def render(self, text):
+        """
+        :param text: строка сообщения, как пришла от сервера
+        :return: Rendered(html, highlight, urls)
+        """
+        regex = self._regex
+        emoticons = self.emoticons
+        escape = html.escape
+        out = []
+        urls = []
+        highlight = False
+        style = None
+        span = False
+        pos = 0
+        for match in regex.finditer(text):
+            kind = match.lastgroup
+            if kind == "url":
+                url = match.group()
+                end = match.end()
+                while url[-1] in _URL_TRAILING:
+                    url = url[:-1]
+                    end -= 1
+            else:
+                end = match.end()
+            start = match.start()
+            if start > pos:
+                out.append(escape(text[pos:start], False))
+            pos = end
+            if kind == "ctrl":
+                if style is None:
+                    style = _Style()
+                _apply_control(style, match)
+                if span:
+                    out.append("</span>")
+                tag = style.tag()
+                span = bool(tag)
+                if span:
+                    out.append(tag)
+            elif kind == "url":
+                urls.append(url)
+                href = url if "://" in url else "http://" + url
+                out.append(f'<a href="{escape(href)}">{escape(url, False)}'
+                           f'</a>')
+            elif kind == "emo":
+                out.append(escape(emoticons[match.group()], False))
+            else:
+                highlight = True
+                out.append(f"<b>{escape(match.group(), False)}</b>")
+        if pos < len(text):
+            out.append(escape(text[pos:], False))
+        if span:
+            out.append("</span>")
+        return Rendered("".join(out), highlight, urls)
+
+
+class ChatRenderer:
+    """
+    Строка чата (irc_records.ChatLine) в HTML для представления:
+    время, ник своим цветом и текст через TextPipeline. Цвета и стиль
+    времени - классы STYLE_SHEET, фрагменты ников (экранированный ник
+    в span цвета) запоминаются в ограниченном LRU, время - на текущую
+    минуту. Вызывается в потоке доставки пачек, поэтому GUI-потоку
+    остается только вставить готовые строки.
+    """
+
+    def __init__(self, pipeline, cache_size=4096):
+        """
+        :param pipeline: TextPipeline для текста сообщений
+        :param cache_size: сколько фрагментов ников помнить
+        """
+        self.pipeline = pipeline
+        self.nick_fragment = lru_cache(maxsize=cache_size)(nick_fragment)
+        self._minute = (None, "")
+
+    def time_fragment(self, when):
+        minute = int(when // 60)
+        cached = self._minute
+        if cached[0] != minute:
+            stamp = time.strftime("%H:%M", time.localtime(when))
+            cached = (minute, f'<span class="ts">{stamp}</span> ')
+            self._minute = cached
+        return cached[1]
+
+    def render(self, line):
+        """
+        :param line: ChatLine
+        :return: Rendered
+        """
+        body = self.pipeline.render(line.text)
+        if line.sender is None:
+            return Rendered(f'{self.time_fragment(line.time)}'
+                            f'<span class="st">{body.html}</span>',
+                            line.highlight, body.urls)
+        return Rendered(self.time_fragment(line.time) +
+                        self.nick_fragment(line.sender) + " " + body.html,
+                        line.highlight or body.highlight, body.urls)
+
+
+def nick_fragment(nick):
+    """
+    Ник в угловых скобках, цвет - по crc32 ника без учета регистра
+    (hash строк меняется от запуска к запуску)
+    """
+    color = zlib.crc32(nick.lower().encode("utf-8", "surrogatepass")) % \
+        len(NICK_COLORS)
+    return f'<span class="n{color}">&lt;{html.escape(nick, False)}&gt;' \
+           f'</span>'
+
+
+def _apply_control(style, match):
+    code = match.group()[0]
+    if code == COLOR:
+        fg, bg = match.group("fg"), match.group("bg")
+        if fg is None:
+            style.fg = style.bg = None
+            return
+        style.fg = _color(fg)
+        if bg is not None:
+            style.bg = _color(bg)
+    elif code == BOLD:
+        style.bold = not style.bold
+    elif code == ITALIC:
+        style.italic = not style.italic
+    elif code == UNDERLINE:
+        style.underline = not style.underline
+    elif code == STRIKE:
+        style.strike = not style.strike
+    elif code == MONOSPACE:
+        style.mono = not style.mono
+    elif code == REVERSE:
+        style.fg, style.bg = style.bg or MIRC_COLORS[0], \
+            style.fg or MIRC_COLORS[1]
+    elif code == RESET:
+        style.reset()
+
+
+def _color(number):
+    number = int(number)
+    return MIRC_COLORS[number] if number < len(MIRC_COLORS) else None
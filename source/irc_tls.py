@@ -0,0 +1,108 @@
+"""
+TLS для подключений к IRC-серверам.
+
+Контекст ssl.SSLContext один на процесс (на каждый набор настроек
+проверки и клиентского сертификата): загрузка корневых сертификатов
+системы стоит миллисекунды и память, а общий контекст к тому же
+держит общий кэш сессий. TlsTransport одного клиента запоминает
+сессию TLS последнего подключения и предлагает ее серверу при
+переподключении: сервер, поддерживающий возобновление, пропускает
+полное рукопожатие (обмен ключами и проверку цепочки сертификатов).
+В TLS 1.3 билет сессии приходит уже после рукопожатия, вместе с
+первыми данными, поэтому сессия запоминается при закрытии
+соединения, а не сразу после рукопожатия.
+"""
+import ssl
+import threading
+import time
+from collections import namedtuple
+from source.irc_metrics import METRICS
+
+TLS_PORT = 6697
+
+TlsOptions = namedtuple("TlsOptions", "verify cafile certfile keyfile",
+                        defaults=(True, None, None, None))
+
+_contexts = {}
+_contexts_lock = threading.Lock()
+
+
+def shared_context(verify=True, cafile=None, certfile=None, keyfile=None):
+    """
+    Клиентский контекст TLS, общий для всех подключений процесса с
+    такими же настройками
+    :param verify: проверять сертификат и имя сервера
+    :param cafile: свои корневые сертификаты вместо системных
+    :param certfile: клиентский сертификат (для SASL EXTERNAL)
+    :param keyfile: ключ сертификата, если он не в certfile
+    :return: ssl.SSLContext
+    """
+    key = (verify, cafile, certfile, keyfile)
+    context = _contexts.get(key)
+    if context is not None:
+        return context
+    with _contexts_lock:
+        context = _contexts.get(key)
+        if context is None:
+            context = ssl.create_default_context(cafile=cafile)
+            context.minimum_version = ssl.TLSVersion.TLSv1_2
+            if not verify:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            if certfile:
+                context.load_cert_chain(certfile, keyfile)
+            _contexts[key] = context
+    return context
+
+
+class TlsTransport:
+    """
+    TLS поверх сокета IRCClient. Рукопожатие идет в wrap, то есть в
+    потоке, который открывает подключение (у IRCClient - в потоке
+    чтения при connect(wait=False) и при переподключении)
+    """
+
+    def __init__(self, options=None):
+        """
+        :param options: TlsOptions, по умолчанию - проверка
+        сертификата по системным корневым
+        """
+        self.options = options or TlsOptions()
+        self.context = shared_context(*self.options)
+        self.session = None
+        self.server = None
+        self.handshakes = 0
+        self.resumed = 0
+        self.last_handshake = None
+
+    def wrap(self, sock, server):
+        """
+        Рукопожатие TLS на подключенном сокете. Сессия прошлого
+        подключения к тому же серверу предлагается для возобновления
+        :param sock: сокет с таймаутом подключения
+        :param server: имя сервера для SNI и проверки сертификата
+        :return: ssl.SSLSocket
+        """
+        session = self.session if server == self.server else None
+        started = time.perf_counter()
+        tls = self.context.wrap_socket(sock, server_hostname=server,
+                                       session=session)
+        self.last_handshake = time.perf_counter() - started
+        self.server = server
+        self.handshakes += 1
+        if tls.session_reused:
+            self.resumed += 1
+        if METRICS.enabled:
+            METRICS.observe("tls.handshake", self.last_handshake)
+            if tls.session_reused:
+                METRICS.count("tls.resumed")
+        return tls
+
+    def remember(self, sock):
+        """
+        Запоминает сессию соединения перед его закрытием
+        :param sock: ssl.SSLSocket
+        """
+        session = getattr(sock, "session", None)
+        if session is not None:
+            self.session = session
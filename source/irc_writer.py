@@ -0,0 +1,217 @@
+import heapq
+import threading
+import time
+
+PRIORITY_CONTROL = 0
+PRIORITY_COMMAND = 1
+PRIORITY_MESSAGE = 2
+
+CONTROL_COMMANDS = frozenset((
+    "PONG", "PING", "PASS", "NICK", "USER", "CAP", "AUTHENTICATE", "QUIT"))
+MESSAGE_COMMANDS = frozenset(("PRIVMSG", "NOTICE"))
+
+
+def command_priority(line):
+    """
+    Приоритет строки по команде: служебные команды идут первыми,
+    сообщения - последними
+    """
+    command = line.split(" ", 1)[0].upper()
+    if command in CONTROL_COMMANDS:
+        return PRIORITY_CONTROL
+    if command in MESSAGE_COMMANDS:
+        return PRIORITY_MESSAGE
+    return PRIORITY_COMMAND
+
+
+class TokenBucket:
+    """
+    Ведро токенов: burst строк можно отправить сразу, дальше
+    rate строк в секунду.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, now):
+        self.refill(now)
+        return int(self.tokens)
+
+    def take(self, count):
+        self.tokens -= count
+
+    def wait_time(self):
+        """
+        Через сколько секунд появится следующий токен
+        """
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class WriteQueue:
+    """
+    Ограниченная очередь исходящих строк с приоритетами и
+    ограничением скорости. Служебные строки (PONG, NICK, CAP...)
+    идут вне очереди и не тратят токены, чтобы сервер не отключил
+    нас по ping timeout, пока отправляется длинная вставка.
+    """
+
+    def __init__(self, rate=0.5, burst=5, max_size=1000):
+        """
+        :param rate: строк в секунду после исчерпания burst
+        :param burst: сколько строк можно отправить подряд
+        :param max_size: предел очереди для обычных строк
+        """
+        self.bucket = TokenBucket(rate, burst)
+        self.max_size = max_size
+        self.cond = threading.Condition()
+        self.on_put = None
+        self._heap = []
+        self._seq = 0
+        self.sent = 0
+        self.dropped = 0
+        self.writes = 0
+        self.latency_avg = 0.0
+        self.latency_max = 0.0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def put(self, line):
+        """
+        Ставит строку в очередь
+        :param line: строка без \\r\\n
+        :return: False, если очередь переполнена и строка отброшена
+        """
+        priority = command_priority(line)
+        payload = (line + "\r\n").encode("utf-8")
+        with self.cond:
+            if priority != PRIORITY_CONTROL and \
+                    len(self._heap) >= self.max_size:
+                self.dropped += 1
+                return False
+            self._seq += 1
+            heapq.heappush(self._heap, (priority, self._seq,
+                                        time.monotonic(), payload))
+            self.cond.notify()
+        if self.on_put is not None:
+            self.on_put()
+        return True
+
+    def restart(self):
+        """
+        Новое подключение: строки старого выбрасываются (новое еще не
+        зарегистрировано), ведро токенов снова полное - сервер
+        считает флуд по подключению
+        :return: сколько строк выброшено
+        """
+        with self.cond:
+            count = len(self._heap)
+            self._heap.clear()
+            self.dropped += count
+            self.bucket.tokens = float(self.bucket.burst)
+        return count
+
+    def take(self, now=None):
+        """
+        Забирает строки, которые можно отправить сейчас
+        :return: (список (время постановки, байты), задержка до
+        следующей попытки или None, если очередь пуста)
+        """
+        now = time.monotonic() if now is None else now
+        with self.cond:
+            heap = self._heap
+            items = []
+            while heap and heap[0][0] == PRIORITY_CONTROL:
+                _, _, queued, payload = heapq.heappop(heap)
+                items.append((queued, payload))
+            allowed = self.bucket.available(now)
+            while heap and allowed > 0:
+                _, _, queued, payload = heapq.heappop(heap)
+                items.append((queued, payload))
+                allowed -= 1
+                self.bucket.take(1)
+            if not heap:
+                return items, None
+            return items, self.bucket.wait_time()
+
+    def record(self, items, now=None):
+        """
+        Учитывает отправленные строки в статистике задержки
+        """
+        now = time.monotonic() if now is None else now
+        with self.cond:
+            self.writes += 1
+            for queued, _ in items:
+                latency = now - queued
+                self.latency_avg += (latency - self.latency_avg) * 0.1
+                self.latency_max = max(self.latency_max, latency)
+            self.sent += len(items)
+
+    def stats(self):
+        """
+        Глубина очереди, отправленные/отброшенные строки,
+        число системных вызовов и задержка отправки в мс
+        """
+        return {"depth": len(self._heap), "sent": self.sent,
+                "dropped": self.dropped, "writes": self.writes,
+                "latency_avg_ms": self.latency_avg * 1000,
+                "latency_max_ms": self.latency_max * 1000}
+
+
+class Writer:
+    """
+    Поток отправки: забирает из WriteQueue все, что разрешает ведро
+    токенов, и отправляет одним sendall.
+    """
+
+    def __init__(self, queue, send):
+        """
+        :param queue: WriteQueue
+        :param send: функция отправки байтов (sock.sendall)
+        """
+        self.queue = queue
+        self.send = send
+        self.error = None
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="irc-writer")
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        with self.queue.cond:
+            self._stopped = True
+            self.queue.cond.notify()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def _run(self):
+        queue = self.queue
+        while True:
+            with queue.cond:
+                while not len(queue) and not self._stopped:
+                    queue.cond.wait()
+                if self._stopped:
+                    return
+            items, delay = queue.take()
+            if items:
+                try:
+                    self.send(b"".join(payload for _, payload in items))
+                except OSError as e:
+                    self.error = e
+                    return
+                queue.record(items)
+            elif delay:
+                with queue.cond:
+                    if not self._stopped:
+                        queue.cond.wait(delay)
@@ -1,14 +1,55 @@
+import argparse
+import os
 import sys
-from PyQt6.QtWidgets import QApplication
-from source.irc_gui import IRCWindow
+from source.irc_metrics import metrics_from_env
 
 
-def main():
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="irclient")
+    parser.add_argument("--headless", action="store_true",
+                        help="работать без GUI по файлу настроек")
+    parser.add_argument("-c", "--config", default="irclient.ini",
+                        help="файл настроек для --headless")
+    parser.add_argument("--backend", choices=("threads", "asyncio"),
+                        help="поток на подключение (threads, по "
+                        "умолчанию) или один asyncio-цикл на все "
+                        "подключения; без GUI - вместо backend из "
+                        "файла настроек")
+    return parser.parse_args(argv)
+
+
+def run_gui(backend=None):
+    from PyQt6.QtWidgets import QApplication
+    from source.irc_async import BACKENDS
+    from source.irc_directory import default_cache_dir
+    from source.irc_gui import IRCWindow
+    app = QApplication(sys.argv)
+    window = IRCWindow(client_class=BACKENDS[backend or "threads"],
+                       log_path=os.environ.get("IRCLIENT_LOG"),
+                       cache_path=os.environ.get("IRCLIENT_CACHE",
+                                                 default_cache_dir()),
+                       download_path=os.environ.get("IRCLIENT_DOWNLOADS"),
+                       rules_path=os.environ.get("IRCLIENT_RULES"))
+    window.show()
+    return app.exec()
+
+
+def main(argv=None):
+    """
+    Запускает GUI, а с --headless - клиент без Qt. PyQt импортируется
+    только для GUI, поэтому в режиме без GUI он не загружается.
+    IRCLIENT_METRICS=файл.json включает метрики (см. irc_metrics).
+    :param argv: аргументы командной строки, по умолчанию sys.argv[1:]
+    """
+    args = parse_args(sys.argv[1:] if argv is None else argv)
     try:
-        app = QApplication(sys.argv)
-        window = IRCWindow()
-        window.show()
-        sys.exit(app.exec())
+        metrics_from_env()
+        if args.headless:
+            from source.irc_headless import run_headless
+            code = run_headless(args.config, args.backend)
+        else:
+            code = run_gui(args.backend)
+        sys.exit(code)
     except KeyboardInterrupt:
         print("Exiting...")
     except Exception as e:
@@ -0,0 +1,369 @@
+"""
+Поддельный IRC-сервер для тестов и бенчмарков. Работает на asyncio в
+фоновом потоке того же процесса; тест управляет им обычными
+вызовами из своего потока: отдать большой LIST или NAMES, залить
+каналы PRIVMSG с заданной скоростью, устроить нетсплит, читать
+от клиента медленно.
+
+    server = FakeIRCd(list_size=100000, names_size=5000)
+    client.connect("127.0.0.1", server.port, "tester")
+    conn = server.wait_client()
+    server.flood(conn, channels=50, count=10000, rate=5000)
+    server.close()
+"""
+import asyncio
+import threading
+import time
+
+SERVER_NAME = "fake.irc"
+NAMES_LINE_BYTES = 400
+FLOOD_TICK = 0.005
+FLOOD_CHUNK = 1000
+
+
+def stamp_of(text):
+    """
+    Время отправки строки флуда (time.perf_counter_ns сервера) из
+    текста сообщения или None
+    """
+    start = text.find(" ts")
+    if start < 0:
+        return None
+    end = text.find(" ", start + 3)
+    digits = text[start + 3:end if end > 0 else None]
+    return int(digits) if digits.isdigit() else None
+
+
+class FakeConnection:
+    """
+    Подключение клиента к FakeIRCd: регистрация (с CAP, если сервер
+    объявляет возможности), PING/PONG, JOIN с NAMES, LIST.
+    Все полученные от клиента строки лежат в received.
+    """
+
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.nick = None
+        self.user = False
+        self.registered = threading.Event()
+        self.closed = threading.Event()
+        self.received = []
+        self.channels = set()
+        self.caps = set()
+        self.pongs = {}
+        self.pings = {}
+        self.read_rate = None
+        self._negotiating = False
+
+    def write(self, lines):
+        """
+        Отправляет строки клиенту; вызывается в потоке цикла
+        """
+        if not self.writer.is_closing():
+            self.writer.write("".join(line + "\r\n" for line in lines)
+                              .encode("utf-8"))
+
+    async def run(self):
+        buffer = b""
+        try:
+            while True:
+                size = 65536
+                if self.read_rate:
+                    size = max(1, int(self.read_rate * 0.01))
+                data = await self.reader.read(size)
+                if not data:
+                    break
+                buffer += data
+                *lines, buffer = buffer.split(b"\r\n")
+                for line in lines:
+                    self.handle(line.decode("utf-8", "replace"))
+                await self.writer.drain()
+                if self.read_rate:
+                    await asyncio.sleep(len(data) / self.read_rate)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.closed.set()
+            self.writer.close()
+
+    def handle(self, line):
+        self.received.append(line)
+        command, _, rest = line.partition(" ")
+        command = command.upper()
+        handler = getattr(self, "_on_" + command.lower(), None)
+        if handler is not None:
+            handler(rest)
+
+    def _on_cap(self, rest):
+        sub, _, value = rest.partition(" ")
+        caps = self.server.caps
+        if sub == "LS":
+            self._negotiating = True
+            self.write([f":{SERVER_NAME} CAP * LS :{' '.join(caps)}"])
+        elif sub == "REQ":
+            wanted = value.lstrip(":").split()
+            if all(cap in caps for cap in wanted):
+                self.caps.update(wanted)
+                self.write([f":{SERVER_NAME} CAP * ACK :{' '.join(wanted)}"])
+            else:
+                self.write([f":{SERVER_NAME} CAP * NAK :{' '.join(wanted)}"])
+        elif sub == "END":
+            self._negotiating = False
+            self._try_register()
+
+    def _on_nick(self, rest):
+        self.nick = rest.lstrip(":")
+        self._try_register()
+
+    def _on_user(self, rest):
+        self.user = True
+        self._try_register()
+
+    def _try_register(self):
+        if self.registered.is_set() or self._negotiating or \
+                not self.nick or not self.user:
+            return
+        nick = self.nick
+        self.write([
+            f":{SERVER_NAME} 001 {nick} :Welcome to the fake network",
+            f":{SERVER_NAME} 005 {nick} PREFIX=(ov)@+ CHANTYPES=# "
+            f"CHATHISTORY=100 ELIST=U SAFELIST "
+            f":are supported by this server",
+            f":{SERVER_NAME} 376 {nick} :End of /MOTD command."])
+        self.registered.set()
+
+    def _on_ping(self, rest):
+        self.write([f":{SERVER_NAME} PONG {SERVER_NAME} {rest}"])
+
+    def _on_pong(self, rest):
+        token = rest.rpartition(":")[2]
+        sent = self.pings.pop(token, None)
+        if sent is not None:
+            self.pongs[token] = time.perf_counter_ns() - sent
+
+    def _on_join(self, rest):
+        for channel in rest.split(" ", 1)[0].split(","):
+            self.channels.add(channel)
+            self.write([f":{self.nick}!u@fake JOIN {channel}"])
+            self.write(self.server.names_lines(self.nick, channel))
+
+    def _on_list(self, rest):
+        more_than = None
+        for condition in rest.split(","):
+            if condition.startswith(">") and condition[1:].isdigit():
+                more_than = int(condition[1:])
+        asyncio.get_running_loop().create_task(
+            self.stream(self.server.list_lines(self.nick, more_than)))
+
+    async def stream(self, lines):
+        """
+        Отправляет длинный ответ частями, дожидаясь, пока клиент
+        прочтет предыдущую
+        """
+        chunk = []
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) >= FLOOD_CHUNK:
+                self.write(chunk)
+                chunk = []
+                await self.writer.drain()
+        self.write(chunk)
+        await self.writer.drain()
+
+    def _on_privmsg(self, rest):
+        if self.server.echo or "echo-message" in self.caps:
+            self.write([f":{self.nick}!u@fake PRIVMSG {rest}"])
+
+    def _on_quit(self, rest):
+        self.writer.close()
+
+
+class FakeIRCd:
+    """
+    Сервер на 127.0.0.1 со случайным портом. Методы вызываются из
+    потока теста и ждут, пока цикл сервера выполнит действие.
+    """
+
+    def __init__(self, caps=(), list_size=0, names_size=0, echo=False,
+                 list_users=None):
+        """
+        :param caps: возможности IRCv3, которые сервер объявит
+        :param list_size: сколько каналов отдавать на LIST
+        :param list_users: функция номера канала, дающая число
+        пользователей; по умолчанию i % 1000
+        :param names_size: сколько участников в NAMES при JOIN
+        :param echo: возвращать PRIVMSG клиента и без echo-message
+        """
+        self.caps = tuple(caps)
+        self.list_size = list_size
+        self.list_users = list_users or (lambda i: i % 1000)
+        self.names_size = names_size
+        self.echo = echo
+        self.connections = []
+        self._connected = threading.Condition()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever,
+                                       daemon=True, name="fake-ircd")
+        self.thread.start()
+        self._server = self.call(asyncio.start_server(
+            self._accept, "127.0.0.1", 0))
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    def call(self, coro):
+        """
+        Выполняет корутину в цикле сервера и возвращает ее результат
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def _accept(self, reader, writer):
+        conn = FakeConnection(self, reader, writer)
+        with self._connected:
+            self.connections.append(conn)
+            self._connected.notify_all()
+        await conn.run()
+
+    def wait_client(self, index=0, timeout=5.0, registered=True):
+        """
+        Ждет подключения клиента (и его регистрации)
+        :return: FakeConnection
+        """
+        with self._connected:
+            if not self._connected.wait_for(
+                    lambda: len(self.connections) > index, timeout):
+                raise TimeoutError("client did not connect")
+            conn = self.connections[index]
+        if registered and not conn.registered.wait(timeout):
+            raise TimeoutError("client did not register")
+        return conn
+
+    def send(self, conn, *lines):
+        """
+        Отправляет строки клиенту
+        """
+        async def write():
+            conn.write(lines)
+            await conn.writer.drain()
+        self.call(write())
+
+    def list_lines(self, nick, more_than=None):
+        """
+        Ответ на LIST из list_size каналов (генератор)
+        :param more_than: фильтр ELIST U (LIST >N)
+        """
+        yield f":{SERVER_NAME} 321 {nick} Channel :Users  Name"
+        for i in range(self.list_size):
+            users = self.list_users(i)
+            if more_than is not None and users <= more_than:
+                continue
+            yield (f":{SERVER_NAME} 322 {nick} #channel-{i} {users} "
+                   f":[+nt] topic of channel number {i}")
+        yield f":{SERVER_NAME} 323 {nick} :End of /LIST"
+
+    def names_lines(self, nick, channel, count=None):
+        """
+        NAMES на count участников (по умолчанию names_size) плюс мы,
+        строками не длиннее NAMES_LINE_BYTES
+        """
+        count = self.names_size if count is None else count
+        head = f":{SERVER_NAME} 353 {nick} = {channel} :"
+        lines = []
+        names = [f"@{nick}"]
+        size = len(head)
+        for i in range(count):
+            name = ("@" if i % 50 == 0 else "+" if i % 10 == 0 else "") + \
+                f"user{i}"
+            if size + len(name) + 1 > NAMES_LINE_BYTES:
+                lines.append(head + " ".join(names))
+                names = []
+                size = len(head)
+            names.append(name)
+            size += len(name) + 1
+        lines.append(head + " ".join(names))
+        lines.append(f":{SERVER_NAME} 366 {nick} {channel} "
+                     f":End of /NAMES list.")
+        return lines
+
+    def flood(self, conn, channels, count, rate=None, size=80):
+        """
+        Заливает каналы #flood-0..channels-1 сообщениями PRIVMSG. В
+        тексте каждой строки номер и время отправки (" ts<ns>", см.
+        stamp_of), для измерения задержки до клиента.
+        :param rate: строк в секунду, None - так быстро, как клиент
+        читает
+        :param size: примерная длина текста
+        :return: (отправлено строк, секунд)
+        """
+        return self.call(self._flood(conn, channels, count, rate, size))
+
+    async def _flood(self, conn, channels, count, rate, size):
+        padding = "x" * max(0, size - 30)
+        began = time.perf_counter()
+        sent = 0
+        while sent < count:
+            if rate is None:
+                batch = min(FLOOD_CHUNK, count - sent)
+            else:
+                due = int((time.perf_counter() - began) * rate) + 1
+                batch = min(due, count) - sent
+                if batch <= 0:
+                    await asyncio.sleep(FLOOD_TICK)
+                    continue
+            now = time.perf_counter_ns()
+            conn.write([
+                f":nick{i % 97}!u@fake PRIVMSG #flood-{i % channels} "
+                f":n{i} ts{now} {padding}"
+                for i in range(sent, sent + batch)])
+            sent += batch
+            await conn.writer.drain()
+        return sent, time.perf_counter() - began
+
+    def netsplit(self, conn, channel, nicks, batch=True):
+        """
+        Нетсплит: QUIT всех nicks, в одном BATCH netsplit, если
+        batch и клиент включил возможность batch
+        """
+        quits = [f"{'@batch=ns ' if batch else ''}:{nick}!u@fake QUIT "
+                 f":hub.fake leaf.fake" for nick in nicks]
+        if batch:
+            quits.insert(0, f":{SERVER_NAME} BATCH +ns netsplit hub.fake "
+                            f"leaf.fake")
+            quits.append(f":{SERVER_NAME} BATCH -ns")
+        self.send(conn, *quits)
+
+    def ping(self, conn, token):
+        """
+        Отправляет PING; время до PONG появится в conn.pongs[token]
+        в наносекундах
+        """
+        async def write():
+            conn.pings[token] = time.perf_counter_ns()
+            conn.write([f"PING :{token}"])
+        self.call(write())
+
+    def throttle(self, conn, bytes_per_sec):
+        """
+        Медленный читатель: сервер читает от клиента не быстрее
+        bytes_per_sec (None - без ограничения)
+        """
+        conn.read_rate = bytes_per_sec
+
+    def drop(self, conn):
+        """
+        Обрыв связи: соединение закрывается без QUIT и ERROR
+        """
+        self.loop.call_soon_threadsafe(conn.writer.transport.abort)
+
+    def close(self):
+        async def shutdown():
+            self._server.close()
+            for conn in self.connections:
+                conn.writer.close()
+            await self._server.wait_closed()
+        try:
+            self.call(shutdown())
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
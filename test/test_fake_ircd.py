@@ -0,0 +1,92 @@
+import unittest
+from source.irc_client import IRCClient
+from source.irc_session import SessionManager
+from test.fake_ircd import FakeIRCd, stamp_of
+from test.test_irc_async import wait_for
+from test.test_irc_session import Recorder
+
+
+class TestFakeIRCd(unittest.TestCase):
+    """
+    Настоящий IRCClient против FakeIRCd: сервер должен выдерживать
+    то, что от него ждут бенчмарки
+    """
+
+    def start(self, **options):
+        self.server = FakeIRCd(**options)
+        self.manager = SessionManager(IRCClient)
+        self.recorder = Recorder()
+        self.manager.add_listener(self.recorder)
+        self.session = self.manager.open("127.0.0.1", self.server.port,
+                                         "tester", "fake")
+        self.client = self.session.client
+        self.conn = self.server.wait_client()
+
+    def tearDown(self):
+        self.manager.close("fake")
+        self.server.close()
+
+    def events(self, kind):
+        self.session.batcher.flush()
+        return [e for e in self.recorder.events if e[0] == kind]
+
+    def test_registration_and_list_replay(self):
+        self.start(caps=("batch", "server-time"), list_size=3000)
+        self.assertEqual(self.conn.caps, {"batch", "server-time"})
+        self.assertTrue(wait_for(lambda: self.events("channels_end")))
+        channels = [c for e in self.events("channels") for c in e[2]]
+        self.assertEqual(len(channels), 3000)
+        self.assertEqual(channels[7], ("#channel-7", 7,
+                                       "[+nt] topic of channel number 7"))
+
+    def test_join_gets_large_names(self):
+        self.start(names_size=1000)
+        self.client.join_channel("#big")
+        self.assertTrue(wait_for(lambda: self.events("members")))
+        channel, op, _, names = self.events("members")[0][2][0]
+        self.assertEqual((channel, op), ("#big", "reset"))
+        self.assertEqual(len(names), 1001)
+        self.assertIn("@tester", names)
+
+    def test_flood_reaches_every_buffer(self):
+        self.start()
+        sent, _ = self.server.flood(self.conn, channels=4, count=2000)
+        self.assertEqual(sent, 2000)
+        self.assertTrue(wait_for(lambda: sum(
+            self.session.buffers.tail(f"#flood-{i}", 0)[1]
+            for i in range(4)) == 2000))
+        lines, total = self.session.buffers.tail("#flood-1", 0)
+        self.assertEqual(total, 500)
+        self.assertIsNotNone(stamp_of(lines[0].text))
+
+    def test_netsplit_is_one_members_update(self):
+        self.start(caps=("batch",), names_size=20)
+        self.client.join_channel("#split")
+        self.assertTrue(wait_for(lambda: self.events("members")))
+        updates = len(self.events("members"))
+        self.server.netsplit(self.conn, "#split",
+                             [f"user{i}" for i in range(1, 11)])
+        self.assertTrue(wait_for(
+            lambda: len(self.events("members")) > updates))
+        ops = self.events("members")[-1][2]
+        self.assertEqual(len(ops), 10)
+        self.assertTrue(all(op[1] == "remove" for op in ops))
+
+    def test_slow_reader_still_answers_ping(self):
+        self.start()
+        self.server.throttle(self.conn, 2000)
+        for i in range(20):
+            self.client.send_message("#slow", "x" * 200 + str(i))
+        self.server.ping(self.conn, "alive")
+        self.assertTrue(wait_for(lambda: "alive" in self.conn.pongs))
+
+
+class TestStampOf(unittest.TestCase):
+    def test_stamp_of(self):
+        self.assertEqual(stamp_of("n5 ts123456 xxx"), 123456)
+        self.assertEqual(stamp_of("n5 ts42"), 42)
+        self.assertIsNone(stamp_of("plain text"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import socket
+import threading
+import time
+import unittest
+from source.irc_async import AsyncIRCClient, EventLoopThread
+
+
+class LineServer:
+    """
+    Простейший сервер на одно подключение: отправляет заданные
+    строки и запоминает полученные.
+    """
+
+    def __init__(self, greeting):
+        self.greeting = greeting
+        self.received = []
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(1)
+        self.port = self.sock.getsockname()[1]
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        conn, _ = self.sock.accept()
+        with conn:
+            conn.sendall(self.greeting)
+            buffer = b""
+            while True:
+                data = conn.recv(4096)
+                if not data:
+                    break
+                buffer += data
+                while b"\r\n" in buffer:
+                    line, buffer = buffer.split(b"\r\n", 1)
+                    self.received.append(line.decode())
+
+    def close(self):
+        self.sock.close()
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestAsyncIRCClient(unittest.TestCase):
+    def setUp(self):
+        self.loop_thread = EventLoopThread()
+        self.messages = []
+
+    def tearDown(self):
+        self.loop_thread.stop()
+
+    def make_client(self):
+        client = AsyncIRCClient(self.loop_thread)
+        client.message_received.connect(self.messages.append)
+        return client
+
+    def test_registers_and_answers_ping(self):
+        server = LineServer(b"PING :abc\r\n")
+        client = self.make_client()
+        client.connect("127.0.0.1", server.port, "tester").result(5)
+
+        self.assertTrue(wait_for(lambda: "PONG :abc" in server.received))
+        self.assertEqual(server.received[:3],
+                         ["CAP LS 302", "NICK tester",
+                          "USER tester 0 * :tester"])
+        self.assertIn("<< PING :abc", self.messages)
+        client.disconnect()
+        self.assertTrue(wait_for(lambda: client.transport is None))
+        server.close()
+
+    def test_many_clients_share_one_loop(self):
+        servers = [LineServer(b":srv 001 tester :hi\r\n"
+                              b":srv 422 tester :MOTD File is missing\r\n")
+                   for _ in range(5)]
+        clients = [self.make_client() for _ in servers]
+        for client, server in zip(clients, servers):
+            client.connect("127.0.0.1", server.port, "tester").result(5)
+        for server in servers:
+            self.assertTrue(wait_for(lambda: "LIST" in server.received))
+        for client in clients:
+            self.assertIs(client.loop_thread, self.loop_thread)
+            client.disconnect()
+        for client in clients:
+            self.assertTrue(wait_for(lambda: client.transport is None))
+        for server in servers:
+            server.close()
+
+    def test_connection_error_is_reported(self):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        client = self.make_client()
+        future = client.connect("127.0.0.1", port, "tester")
+        with self.assertRaises(OSError):
+            future.result(5)
+        self.assertTrue(wait_for(
+            lambda: any("Ошибка" in m for m in self.messages)))
+        self.assertFalse(client.connected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+from source.irc_batch import BatchTracker
+
+
+class TestBatchTracker(unittest.TestCase):
+    def test_messages_wait_for_close(self):
+        batches = BatchTracker()
+        batches.open("r1", "netsplit", ["hub", "leaf"])
+        self.assertTrue(batches.add("r1", "quit a"))
+        self.assertTrue(batches.add("r1", "quit b"))
+        self.assertFalse(batches.add("r2", "other"))
+        batch = batches.close("r1")
+        self.assertEqual(batch.type, "netsplit")
+        self.assertEqual(batch.params, ["hub", "leaf"])
+        self.assertEqual(batch.messages, ["quit a", "quit b"])
+        self.assertIsNone(batches.close("r1"))
+        self.assertEqual(len(batches), 0)
+
+    def test_clear_forgets_open_batches(self):
+        batches = BatchTracker()
+        batches.open("r1", "chathistory", ["#c"])
+        batches.collected = []
+        batches.clear()
+        self.assertFalse(batches.add("r1", "line"))
+        self.assertIsNone(batches.collected)
+
+
+if __name__ == "__main__":
+    unittest.main()
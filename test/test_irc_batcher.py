@@ -0,0 +1,105 @@
+import threading
+import time
+import unittest
+from source.irc_batcher import EventBatcher
+
+
+class Collector:
+    def __init__(self):
+        self.batches = []
+        self.times = []
+        self.event = threading.Event()
+
+    def __call__(self, batch):
+        self.batches.append(batch)
+        self.times.append(time.monotonic())
+        self.event.set()
+
+
+class TestEventBatcher(unittest.TestCase):
+    def setUp(self):
+        self.collector = Collector()
+
+    def make(self, **kwargs):
+        batcher = EventBatcher(self.collector, **kwargs)
+        self.addCleanup(batcher.stop)
+        batcher.flush()
+        return batcher
+
+    def test_consecutive_events_are_merged(self):
+        batcher = self.make(max_rate=1)
+        batcher.extend("message", ["a"])
+        batcher.extend("message", ["b"])
+        batcher.add("joined", "#c")
+        batcher.extend("message", ["c"])
+        batcher.flush()
+        self.assertEqual(self.collector.batches[-1], [
+            ["message", ["a", "b"]], ["joined", ("#c",)],
+            ["message", ["c"]]])
+        self.assertEqual(batcher.stats()["merged"], 1)
+
+    def test_interleaved_kinds_are_merged_separately(self):
+        batcher = self.make(max_rate=1)
+        for i in range(3):
+            batcher.extend("message", [f"<< {i}"])
+            batcher.extend("channels", [f"#{i}"])
+        batcher.flush()
+        self.assertEqual(self.collector.batches[-1], [
+            ["message", ["<< 0", "<< 1", "<< 2"]],
+            ["channels", ["#0", "#1", "#2"]]])
+
+    def test_without_autostart_only_flush_delivers(self):
+        batcher = self.make(autostart=False, max_rate=1000)
+        batcher.extend("message", ["a"], urgent=True)
+        batcher.add("joined", "#c")
+        time.sleep(0.05)
+        self.assertEqual(self.collector.batches, [])
+        self.assertIsNone(batcher._thread)
+        batcher.flush()
+        self.assertEqual(self.collector.batches, [
+            [["message", ["a"]], ["joined", ("#c",)]]])
+
+    def test_batch_size_is_limited(self):
+        batcher = self.make(max_rate=1, max_batch=3)
+        batcher.extend("message", ["1", "2", "3", "4", "5"])
+        batcher.flush()
+        self.assertEqual(self.collector.batches[-1],
+                         [["message", ["1", "2", "3"]]])
+        self.assertEqual(batcher.pending(), 2)
+        batcher.flush()
+        self.assertEqual(self.collector.batches[-1],
+                         [["message", ["4", "5"]]])
+        self.assertEqual(batcher.pending(), 0)
+
+    def test_oldest_messages_are_dropped_over_limit(self):
+        batcher = self.make(max_rate=1, max_pending=3)
+        batcher.extend("message", ["1", "2"])
+        batcher.add("joined", "#c")
+        batcher.extend("message", ["3", "4"])
+        batcher.flush()
+        self.assertEqual(self.collector.batches[-1], [
+            ["joined", ("#c",)], ["message", ["3", "4"]]])
+        self.assertEqual(batcher.stats()["dropped"], 2)
+
+    def test_delivery_rate_is_limited(self):
+        batcher = self.make(max_rate=20)
+        deadline = time.monotonic() + 0.3
+        while time.monotonic() < deadline:
+            batcher.extend("message", ["x"])
+            time.sleep(0.001)
+        time.sleep(0.1)
+        gaps = [b - a for a, b in zip(self.collector.times,
+                                      self.collector.times[1:])]
+        self.assertGreater(len(self.collector.batches), 1)
+        self.assertTrue(all(gap >= 0.04 for gap in gaps))
+        self.assertEqual(batcher.pending(), 0)
+
+    def test_urgent_events_skip_the_interval(self):
+        batcher = self.make(max_rate=0.5)
+        batcher.extend("channels", ["#a"], urgent=True)
+        self.assertTrue(self.collector.event.wait(1))
+        self.assertEqual(self.collector.batches[-1], [["channels", ["#a"]]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from source.irc_buffer import LineReader
+
+
+class TestLineReader(unittest.TestCase):
+
+    def setUp(self):
+        self.reader = LineReader(size=64, min_free=16)
+
+    def test_crlf_and_bare_lf(self):
+        lines = self.reader.feed(b"PING :a\r\nPING :b\nPING :c\r\n")
+        self.assertEqual(lines, ["PING :a", "PING :b", "PING :c"])
+        self.assertEqual(self.reader.pending(), 0)
+
+    def test_partial_line_is_kept(self):
+        self.assertEqual(self.reader.feed(b"PING :ab"), [])
+        self.assertEqual(self.reader.feed(b"c\r"), [])
+        self.assertEqual(self.reader.feed(b"\n"), ["PING :abc"])
+
+    def test_empty_lines_are_skipped(self):
+        self.assertEqual(self.reader.feed(b"\r\n\nA\r\n"), ["A"])
+
+    def test_long_line_grows_buffer(self):
+        text = "x" * 1000
+        lines = self.reader.feed(text.encode() + b"\r\n")
+        self.assertEqual(lines, [text])
+
+    def test_many_lines_across_compactions(self):
+        data = b"".join(b"line %d\r\n" % i for i in range(500))
+        lines = []
+        for i in range(0, len(data), 7):
+            lines.extend(self.reader.feed(data[i:i + 7]))
+        self.assertEqual(lines, [f"line {i}" for i in range(500)])
+
+    def test_recv_into_path(self):
+        payload = "привет\r\n".encode("utf-8")
+        buf = self.reader.get_buffer()
+        buf[:len(payload)] = payload
+        self.assertEqual(self.reader.commit(len(payload)), ["привет"])
+
+    def test_fallback_encoding(self):
+        reader = LineReader(fallback_encoding="cp1251")
+        lines = reader.feed("привет\r\n".encode("cp1251"))
+        self.assertEqual(lines, ["привет"])
+
+    def test_fallback_is_applied_per_line(self):
+        reader = LineReader(fallback_encoding="cp1251")
+        data = "ёж\r\n".encode("utf-8") + "привет\r\n".encode("cp1251")
+        self.assertEqual(reader.feed(data), ["ёж", "привет"])
+
+    def test_utf8_split_across_reads(self):
+        payload = "ёж\r\n".encode("utf-8")
+        self.assertEqual(self.reader.feed(payload[:1]), [])
+        self.assertEqual(self.reader.feed(payload[1:]), ["ёж"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+from source.irc_buffers import BufferSet
+from source.irc_records import ChatLine
+
+
+class TestBufferSet(unittest.TestCase):
+
+    def setUp(self):
+        self.buffers = BufferSet(capacity=3)
+
+    def chat(self, text):
+        return ChatLine(1.5, "#a", "bob", text)
+
+    def test_buffers_are_created_on_first_line(self):
+        self.buffers.append("#A", [self.chat("one")])
+        self.buffers.append("#a", [self.chat("two")])
+        self.assertIn("#a", self.buffers)
+        self.assertEqual(len(self.buffers), 1)
+        self.assertEqual(self.buffers.names(), ["#A"])
+
+    def test_tail_returns_unseen_lines(self):
+        one, two, three = map(self.chat, "123")
+        self.buffers.append("#a", [one, two])
+        lines, total = self.buffers.tail("#a", 0)
+        self.assertEqual((lines, total), ([one, two], 2))
+        self.buffers.append("#a", [three])
+        self.assertEqual(self.buffers.tail("#a", total), ([three], 3))
+        self.assertEqual(self.buffers.tail("#a", 3), ([], 3))
+
+    def test_tail_after_eviction(self):
+        self.buffers.append("#a", [self.chat(str(i)) for i in range(10)])
+        lines, total = self.buffers.tail("#a", 2)
+        self.assertEqual(([line.text for line in lines], total),
+                         (["7", "8", "9"], 10))
+
+    def test_unknown_buffer(self):
+        self.assertEqual(self.buffers.tail("#none", 0), ([], 0))
+
+    def test_names_are_shared(self):
+        self.buffers.append("#a", [self.chat("one")])
+        self.buffers.append("bob", [ChatLine(2.0, "me", "bob", "two")])
+        self.assertEqual(len(self.buffers.table), 3)
+        line = self.buffers.tail("bob", 0)[0][0]
+        self.assertIs(line.sender, self.buffers.table.intern("bob"))
+
+
+if __name__ == '__main__':
+    unittest.main()
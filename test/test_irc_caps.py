@@ -0,0 +1,220 @@
+import socket
+import threading
+import unittest
+from source.irc_caps import CapNegotiator, SaslAuth, server_time
+from source.irc_client import IRCClient
+from source.irc_session import SessionManager
+from test.test_irc_async import wait_for
+from test.test_irc_session import Recorder
+
+ALL_CAPS = ("multi-prefix message-tags server-time batch echo-message "
+            "draft/chathistory")
+
+
+class StandInServer:
+    """
+    Сервер-заглушка с IRCv3 на одно подключение: подтверждает все
+    запрошенные возможности, регистрирует после CAP END, возвращает
+    PRIVMSG с server-time (echo-message), на JOIN отвечает JOIN и
+    NAMES, на CHATHISTORY - пачкой из двух старых сообщений
+    """
+    TIME = "2024-05-01T12:00:00.000Z"
+
+    def __init__(self, caps=ALL_CAPS):
+        self.caps = caps
+        self.received = []
+        self.conn = None
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(1)
+        self.port = self.sock.getsockname()[1]
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def send(self, *lines):
+        self.conn.sendall("".join(line + "\r\n" for line in lines)
+                          .encode("utf-8"))
+
+    def _serve(self):
+        self.conn, _ = self.sock.accept()
+        buffer = b""
+        with self.conn:
+            while True:
+                data = self.conn.recv(4096)
+                if not data:
+                    break
+                buffer += data
+                while b"\r\n" in buffer:
+                    line, buffer = buffer.split(b"\r\n", 1)
+                    line = line.decode("utf-8")
+                    self.received.append(line)
+                    self._reply(line)
+
+    def _reply(self, line):
+        command = line.split(" ", 1)[0]
+        if line.startswith("CAP LS"):
+            self.send(":srv CAP * LS :" + self.caps)
+        elif line.startswith("CAP REQ"):
+            self.send(":srv CAP tester ACK :" + line.split(":", 1)[1])
+        elif line == "CAP END":
+            self.send(":srv 001 tester :Welcome",
+                      ":srv 376 tester :End of /MOTD command.")
+        elif command == "JOIN":
+            channel = line.split()[1]
+            self.send(f":tester!u@h JOIN {channel}",
+                      f":srv 353 tester = {channel} :@tester a b",
+                      f":srv 366 tester {channel} :End")
+        elif command == "PRIVMSG":
+            self.send(f"@time={self.TIME} :tester!u@h {line}")
+        elif command == "CHATHISTORY":
+            target = line.split()[2]
+            self.send(f":srv BATCH +h chathistory {target}",
+                      f"@batch=h;time=2024-05-01T11:00:00.000Z "
+                      f":a!u@h PRIVMSG {target} :earlier",
+                      f"@batch=h;time=2024-05-01T11:30:00.000Z "
+                      f":b!u@h PRIVMSG {target} :later",
+                      ":srv BATCH -h")
+
+    def close(self):
+        self.sock.close()
+
+
+class TestCapNegotiator(unittest.TestCase):
+    def test_requests_only_wanted_and_available(self):
+        caps = CapNegotiator()
+        self.assertEqual(caps.start(), ["CAP LS 302"])
+        self.assertEqual(caps.ls(["*", "sasl=PLAIN batch"]), [])
+        self.assertEqual(caps.ls(["server-time account-tag"]),
+                         ["CAP REQ :batch server-time"])
+        self.assertEqual(caps.available["sasl"], "PLAIN")
+        self.assertEqual(caps.ack(["batch server-time"]), ["CAP END"])
+        self.assertEqual(caps.enabled, {"batch", "server-time"})
+        self.assertTrue(caps.done)
+
+    def test_nothing_to_request_ends_at_once(self):
+        caps = CapNegotiator()
+        caps.start()
+        self.assertEqual(caps.ls(["sasl"]), ["CAP END"])
+
+    def test_nak_retries_one_by_one(self):
+        caps = CapNegotiator()
+        caps.start()
+        caps.ls(["batch server-time"])
+        self.assertEqual(caps.nak(["batch server-time"]),
+                         ["CAP REQ :batch", "CAP REQ :server-time"])
+        self.assertEqual(caps.nak(["batch"]), [])
+        self.assertEqual(caps.ack(["server-time"]), ["CAP END"])
+        self.assertEqual(caps.enabled, {"server-time"})
+
+    def test_new_and_del_after_registration(self):
+        caps = CapNegotiator()
+        caps.start()
+        caps.ls(["batch"])
+        caps.ack(["batch"])
+        self.assertEqual(caps.new(["echo-message away-notify"]),
+                         ["CAP REQ :echo-message"])
+        self.assertEqual(caps.ack(["echo-message"]), [])
+        caps.delete(["batch"])
+        self.assertEqual(caps.enabled, {"echo-message"})
+
+    def test_sasl_holds_cap_end(self):
+        caps = CapNegotiator(sasl=SaslAuth("EXTERNAL"))
+        caps.start()
+        self.assertEqual(caps.ls(["sasl=PLAIN,EXTERNAL batch"]),
+                         ["CAP REQ :batch sasl"])
+        self.assertEqual(caps.ack(["batch sasl"]),
+                         ["AUTHENTICATE EXTERNAL"])
+        self.assertEqual(caps.authenticate(["+"]), ["AUTHENTICATE +"])
+        self.assertEqual(caps.sasl_done(), ["CAP END"])
+        self.assertEqual(caps.sasl_done(), [])
+
+    def test_sasl_needs_our_mechanism(self):
+        caps = CapNegotiator(sasl=SaslAuth("EXTERNAL"))
+        caps.start()
+        self.assertEqual(caps.ls(["sasl=PLAIN"]), ["CAP END"])
+        with self.assertRaises(ValueError):
+            SaslAuth("PLAIN", "user")
+
+    def test_sasl_response_is_split(self):
+        # 300 байт дают ровно 400 символов base64: нужен "+" в конце
+        lines = SaslAuth("PLAIN", "u", "p" * 296).respond("+")
+        self.assertEqual(len(lines[0]), len("AUTHENTICATE ") + 400)
+        self.assertEqual(lines[1:], ["AUTHENTICATE +"])
+        self.assertEqual(SaslAuth("PLAIN", "u", "p").respond("x"),
+                         ["AUTHENTICATE *"])
+
+    def test_server_time(self):
+        self.assertEqual(server_time({"time": "1970-01-01T00:00:01.250Z"}),
+                         1.25)
+        self.assertIsNone(server_time({"time": "yesterday"}))
+        self.assertIsNone(server_time(None))
+
+
+class TestIRCv3Session(unittest.TestCase):
+    """
+    Клиент против сервера-заглушки: согласование, echo-message,
+    нетсплит одной пачкой и ленивая догрузка истории
+    """
+
+    def setUp(self):
+        self.server = StandInServer()
+        self.manager = SessionManager(IRCClient)
+        self.recorder = Recorder()
+        self.manager.add_listener(self.recorder)
+        self.session = self.manager.open("127.0.0.1", self.server.port,
+                                         "tester", "test")
+        self.client = self.session.client
+
+    def tearDown(self):
+        self.manager.close("test")
+        self.server.close()
+
+    def events(self, kind):
+        self.session.batcher.flush()
+        return [e for e in self.recorder.events if e[0] == kind]
+
+    def test_negotiation_happens_before_registration(self):
+        self.assertTrue(wait_for(lambda: "LIST" in self.server.received))
+        self.assertEqual(self.server.received[:5], [
+            "CAP LS 302", "NICK tester", "USER tester 0 * :tester",
+            "CAP REQ :batch draft/chathistory echo-message message-tags "
+            "multi-prefix server-time",
+            "CAP END"])
+        self.assertEqual(self.client.caps.enabled, set(ALL_CAPS.split()))
+
+    def test_echo_history_and_netsplit(self):
+        self.assertTrue(wait_for(lambda: self.client.caps.done))
+        self.client.join_channel("#c")
+        self.assertTrue(wait_for(lambda: self.events("members")))
+        self.assertNotIn("CHATHISTORY", " ".join(self.server.received))
+
+        self.client.send_message("#c", "hi")
+        self.assertTrue(wait_for(
+            lambda: self.session.buffers.tail("#c", 0)[1] == 1))
+        lines, _ = self.session.buffers.tail("#c", 0)
+        self.assertEqual(list(map(str, lines)), ["[#c] <tester>: hi"])
+
+        members = len(self.events("members"))
+        self.server.send(":srv BATCH +n netsplit hub leaf",
+                         "@batch=n :a!u@h QUIT :hub leaf",
+                         "@batch=n :b!u@h QUIT :hub leaf",
+                         ":srv BATCH -n")
+        self.assertTrue(wait_for(
+            lambda: len(self.events("members")) > members))
+        self.assertEqual(self.events("members")[-1][2], [
+            ("#c", "remove", 1, None), ("#c", "remove", 1, None)])
+
+        self.assertTrue(self.client.request_history("#c"))
+        self.assertFalse(self.client.request_history("#c"))
+        self.assertTrue(wait_for(lambda: self.events("history")))
+        self.assertIn(f"CHATHISTORY BEFORE #c "
+                      f"timestamp={StandInServer.TIME} 50",
+                      self.server.received)
+        [(_, network_id, target, lines)] = self.events("history")
+        self.assertEqual((network_id, target, list(map(str, lines))),
+                         ("test", "#c", ["[#c] <a>: earlier",
+                                         "[#c] <b>: later"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
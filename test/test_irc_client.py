@@ -1,7 +1,7 @@
 import unittest
 from unittest.mock import MagicMock, patch
-from PyQt6.QtCore import QCoreApplication
 from source.irc_client import IRCClient
+from source.irc_writer import WriteQueue
 
 
 class SignalCatcher:
@@ -23,10 +23,6 @@ class SignalCatcher:
 
 class TestIRCClient(unittest.TestCase):
     def setUp(self):
-        self.app = QCoreApplication.instance()
-        if self.app is None:
-            self.app = QCoreApplication([])
-
         self.client = IRCClient()
         self.client.sock = MagicMock()
         self.client.connected = True
@@ -34,27 +30,27 @@ class TestIRCClient(unittest.TestCase):
 
     def test_send_message_emits_signal(self):
         catcher = SignalCatcher()
-        self.client.message_received.connect(catcher)
+        self.client.chat_received.connect(catcher)
 
         self.client.send_message("#test", "Hello :)")
 
         self.assertTrue(catcher.received())
         self.assertEqual(catcher.count(), 1)
-        last_msg = catcher.last()[0]
+        last_msg = str(catcher.last()[0])
         self.assertIn("[#test] <tester>:", last_msg)
         self.assertIn("Hello", last_msg)
 
     def test_send_long_message_splits(self):
         catcher = SignalCatcher()
-        self.client.message_received.connect(catcher)
+        self.client.chat_received.connect(catcher)
 
         long_text = "A" * 950
         self.client.send_message("#test", long_text)
 
         self.assertEqual(catcher.count(), 3)
         for msg in catcher.calls:
-            self.assertTrue(msg[0].startswith("[#test] <tester>:"))
-            self.assertTrue(len(msg[0]) < 500)
+            self.assertTrue(str(msg[0]).startswith("[#test] <tester>:"))
+            self.assertTrue(len(str(msg[0])) < 500)
 
     def test_join_channel_sets_current_and_sends_command(self):
         self.client.send_raw = MagicMock()
@@ -70,10 +66,10 @@ class TestIRCClient(unittest.TestCase):
 
     def test_send_raw_not_connected_does_nothing(self):
         self.client.connected = False
-        self.client.sock.send = MagicMock()
+        self.client.sock.sendall = MagicMock()
 
         self.client.send_raw("PING test")
-        self.client.sock.send.assert_not_called()
+        self.client.sock.sendall.assert_not_called()
 
     @patch("source.irc_client.parse_irc_line")
     def test_handle_line_calls_parser(self, mock_parser):
@@ -83,36 +79,54 @@ class TestIRCClient(unittest.TestCase):
 
     def test_send_raw_sends_data_when_connected(self):
         self.client.connected = True
-        self.client.sock.send = MagicMock()
+        self.client.sock.sendall = MagicMock()
         data = "TEST MESSAGE"
         self.client.send_raw(data)
-        self.client.sock.send.assert_called_once_with(
+        self.client.sock.sendall.assert_called_once_with(
             (data + "\r\n").encode("utf-8"))
 
     def test_listen_handles_empty_data_and_stops(self):
-        self.client.sock.recv = MagicMock(side_effect=[""])
+        self.client.sock.recv_into = MagicMock(return_value=0)
         self.client.connected = True
         self.client.listen()
         self.assertFalse(self.client.connected)
 
     def test_send_message_splits_and_emits_multiple_signals(self):
         catcher = SignalCatcher()
-        self.client.message_received.connect(catcher)
+        self.client.chat_received.connect(catcher)
         self.client.send_raw = MagicMock()
         message = "B" * 810
         self.client.send_message("#channel", message)
-        self.assertEqual(catcher.count(), 3)
-        self.assertEqual(self.client.send_raw.call_count, 3)
+        self.assertEqual(catcher.count(), 2)
+        self.assertEqual(self.client.send_raw.call_count, 2)
         for i, call_arg in enumerate(self.client.send_raw.call_args_list):
             sent_str = call_arg.args[0]
             self.assertTrue(sent_str.startswith("PRIVMSG #channel :"))
-            self.assertLessEqual(len(sent_str), 420)
+            self.assertLessEqual(len(self.worst_line(sent_str)), 512)
+
+    def test_send_message_uses_known_userhost(self):
+        self.client.send_raw = MagicMock()
+        self.client.userhost = "~t@h"
+        self.client.send_message("#c", "я" * 300)
+        sent = [c.args[0] for c in self.client.send_raw.call_args_list]
+        self.assertEqual(len(sent), 2)
+        line = f":tester!~t@h {sent[0]}\r\n".encode("utf-8")
+        self.assertLessEqual(len(line), 512)
+        self.assertGreater(len(line), 505)
+        self.assertEqual("".join(s.split(":", 1)[1] for s in sent),
+                         "я" * 300)
+
+    def worst_line(self, sent):
+        """
+        Строка так, как ее разошлет сервер при самом длинном user@host
+        """
+        return f":tester!{'u' * 10}@{'h' * 63} {sent}\r\n".encode("utf-8")
 
     def test_listen_handles_exception_and_emits_error(self):
         def raise_exc(*args, **kwargs):
             raise RuntimeError("Test error")
 
-        self.client.sock.recv = MagicMock(side_effect=raise_exc)
+        self.client.sock.recv_into = MagicMock(side_effect=raise_exc)
         catcher = SignalCatcher()
         self.client.message_received.connect(catcher)
 
@@ -124,7 +138,7 @@ class TestIRCClient(unittest.TestCase):
 
     def test_send_message_emits_multiple_signals_for_multiple_parts(self):
         catcher = SignalCatcher()
-        self.client.message_received.connect(catcher)
+        self.client.chat_received.connect(catcher)
         self.client.send_raw = MagicMock()
         long_message = "X" * 850
         self.client.send_message("#chan", long_message)
@@ -134,9 +148,47 @@ class TestIRCClient(unittest.TestCase):
         for idx, call in enumerate(self.client.send_raw.call_args_list):
             sent = call.args[0]
             self.assertTrue(sent.startswith("PRIVMSG #chan :"))
-            self.assertLessEqual(len(sent), 420)
+            self.assertLessEqual(len(self.worst_line(sent)), 512)
         for call in catcher.calls:
-            self.assertTrue(call[0].startswith("[#chan] <tester>:"))
+            self.assertTrue(str(call[0]).startswith("[#chan] <tester>:"))
+
+    def test_send_message_stops_at_full_queue(self):
+        self.client.send_queue = WriteQueue(max_size=3)
+        self.client.writer = MagicMock()
+        chats, messages, logged = [], [], []
+        self.client.chat_received.connect(chats.append)
+        self.client.message_received.connect(messages.append)
+        self.client.event_log = lambda *args: logged.append(args)
+
+        self.assertFalse(self.client.send_message("#c", "one\ntwo\n"
+                                                  "three\nfour\nfive"))
+        self.assertEqual(len(self.client.send_queue), 3)
+        self.assertEqual([line.text for line in chats],
+                         ["one", "two", "three"])
+        self.assertEqual([args[3] for args in logged],
+                         ["one", "two", "three"])
+        self.assertEqual(messages, [
+            "Ошибка: очередь отправки переполнена, в #c не отправлено "
+            "2 из 5 строк"])
+        self.assertFalse(self.client.send_message("#c", "six"))
+        self.assertEqual(len(chats), 3)
+
+    def test_listen_splits_lines_and_stops_on_eof(self):
+        chunks = [b":a!u@h PRIVMSG #c :one\r\n:a!u@h PRIV",
+                  b"MSG #c :two\n", b""]
+
+        def recv_into(view):
+            data = chunks.pop(0)
+            view[:len(data)] = data
+            return len(data)
+
+        self.client.sock.recv_into = MagicMock(side_effect=recv_into)
+        self.client.handle_lines = MagicMock()
+        self.client.listen()
+        batches = [c.args[0] for c in self.client.handle_lines.call_args_list]
+        self.assertEqual(batches, [[":a!u@h PRIVMSG #c :one"],
+                                   [":a!u@h PRIVMSG #c :two"]])
+        self.assertFalse(self.client.connected)
 
 
 if __name__ == '__main__':
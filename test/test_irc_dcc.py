@@ -0,0 +1,169 @@
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from source.irc_dcc import (
+    CANCELLED, DONE, FAILED, DccManager, ctcp_dcc, dcc_to_ip, ip_to_dcc,
+    parse_dcc
+)
+from test.test_irc_async import wait_for
+
+MiB = 1 << 20
+
+
+class TestParseDcc(unittest.TestCase):
+    def test_send_resume_accept(self):
+        send = parse_dcc("bob", "DCC SEND file.bin 2130706433 5000 42 t1")
+        self.assertEqual(send[1:], ("SEND", "file.bin", "127.0.0.1", 5000,
+                                    42, 0, "t1"))
+        resume = parse_dcc("bob", 'DCC RESUME "a b.txt" 5000 10')
+        self.assertEqual(resume[1:], ("RESUME", "a b.txt", None, 5000, 0,
+                                      10, None))
+        self.assertEqual(parse_dcc("bob", "DCC ACCEPT f 1 2").position, 2)
+
+    def test_garbage_is_ignored(self):
+        for body in ("DCC", "DCC SEND f", "DCC SEND f x y", "DCC CHAT chat",
+                     "VERSION"):
+            self.assertIsNone(parse_dcc("bob", body))
+
+    def test_ctcp_round_trip(self):
+        text = ctcp_dcc("SEND", "a b.txt", ip_to_dcc("10.0.0.1"), 7, 99)
+        self.assertEqual(text, '\x01DCC SEND "a b.txt" 167772161 7 99\x01')
+        request = parse_dcc("me", text.strip("\x01"))
+        self.assertEqual((request.filename, request.host, request.size),
+                         ("a b.txt", "10.0.0.1", 99))
+        self.assertEqual(dcc_to_ip("::1"), "::1")
+
+
+class Peer:
+    """
+    Клиент IRC для DccManager: строки PRIVMSG с CTCP копятся в sent
+    """
+
+    def __init__(self, nick):
+        self.nick = nick
+        self.sent = []
+
+    def local_address(self):
+        return "127.0.0.1"
+
+    def send_raw(self, line):
+        self.sent.append(line)
+
+
+class TestTransfers(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.alice, self.bob = Peer("alice"), Peer("bob")
+        self.sender = DccManager(self.path("out"))
+        self.receiver = DccManager(self.path("in"))
+        self.offers = []
+        self.receiver.offered.connect(
+            lambda client, request: self.offers.append(request))
+        self.states = []
+        self.receiver.progress.connect(self.states.extend)
+
+    def tearDown(self):
+        self.sender.shutdown()
+        self.receiver.shutdown()
+        self.directory.cleanup()
+
+    def path(self, *names):
+        return os.path.join(self.directory.name, *names)
+
+    def make_file(self, size):
+        os.makedirs(self.path("out"), exist_ok=True)
+        data = os.urandom(size)
+        with open(self.path("out", "data.bin"), "wb") as f:
+            f.write(data)
+        return data
+
+    def relay(self, source, target_manager, target_client):
+        # строка PRIVMSG ника source - как ее получит другая сторона
+        line = source.sent.pop(0)
+        body = line.split(" :", 1)[1].strip("\x01")
+        target_manager.handle(target_client, parse_dcc(source.nick, body))
+
+    def received(self):
+        with open(self.path("in", "data.bin"), "rb") as f:
+            return f.read()
+
+    def test_send_over_loopback(self):
+        data = self.make_file(8 * MiB + 3)
+        self.sender.send(self.alice, "bob", self.path("out", "data.bin"))
+        self.relay(self.alice, self.receiver, self.bob)
+        transfer = self.receiver.receive(self.bob, self.offers[0])
+        self.assertTrue(wait_for(lambda: transfer.state == DONE))
+        self.assertEqual(self.received(), data)
+        self.assertEqual(self.states[-1].bytes, len(data))
+        outgoing = list(self.sender.transfers.values())[0]
+        self.assertTrue(wait_for(lambda: outgoing.state == DONE))
+
+    def test_resume_sends_only_the_rest(self):
+        data = self.make_file(6 * MiB)
+        os.makedirs(self.path("in"))
+        with open(self.path("in", "data.bin"), "wb") as f:
+            f.write(data[:2 * MiB])
+        self.sender.send(self.alice, "bob", self.path("out", "data.bin"))
+        self.relay(self.alice, self.receiver, self.bob)
+        transfer = self.receiver.receive(self.bob, self.offers[0])
+        self.assertIn("RESUME", self.bob.sent[0])
+        self.relay(self.bob, self.sender, self.alice)
+        self.assertIn("ACCEPT", self.alice.sent[0])
+        self.relay(self.alice, self.receiver, self.bob)
+        self.assertTrue(wait_for(lambda: transfer.state == DONE))
+        self.assertEqual(transfer.done, 4 * MiB)
+        self.assertEqual(self.received(), data)
+
+    def test_broken_transfer_keeps_received_part(self):
+        listener = socket.create_server(("127.0.0.1", 0))
+        port = listener.getsockname()[1]
+
+        def serve():
+            conn, _ = listener.accept()
+            with conn:
+                conn.sendall(b"x" * 1000)
+        threading.Thread(target=serve, daemon=True).start()
+        request = parse_dcc("alice", f"DCC SEND data.bin 2130706433 {port} "
+                                     f"5000")
+        transfer = self.receiver.receive(self.bob, request)
+        self.assertTrue(wait_for(lambda: transfer.state == FAILED))
+        listener.close()
+        self.assertEqual(os.path.getsize(self.path("in", "data.bin")), 1000)
+
+    def test_existing_file_is_not_overwritten(self):
+        os.makedirs(self.path("in"))
+        with open(self.path("in", "data.bin"), "wb") as f:
+            f.write(b"mine")
+        request = parse_dcc("alice", "DCC SEND data.bin 2130706433 1 4")
+        transfer = self.receiver.receive(self.bob, request)
+        self.assertEqual(transfer.path, self.path("in", "data (1).bin"))
+
+    def test_cancel_waiting_offer(self):
+        self.make_file(10)
+        transfer = self.sender.send(self.alice, "bob",
+                                    self.path("out", "data.bin"))
+        self.sender.cancel(transfer.id)
+        self.assertTrue(wait_for(lambda: transfer.state == CANCELLED))
+
+    def test_concurrent_transfers_with_throttled_progress(self):
+        self.receiver.progress_interval = 60
+        data = self.make_file(4 * MiB)
+        for _ in range(4):
+            self.sender.send(self.alice, "bob", self.path("out", "data.bin"))
+            self.relay(self.alice, self.receiver, self.bob)
+        transfers = [self.receiver.receive(self.bob, offer)
+                     for offer in self.offers]
+        self.assertTrue(wait_for(
+            lambda: all(t.state == DONE for t in transfers)))
+        for transfer in transfers:
+            with open(transfer.path, "rb") as f:
+                self.assertEqual(f.read(), data)
+        # начало и конец каждой передачи, промежуточные - не чаще
+        # progress_interval
+        self.assertEqual(len(self.states), 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
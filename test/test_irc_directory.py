@@ -0,0 +1,140 @@
+import os
+import tempfile
+import unittest
+from source.irc_client import IRCClient
+from source.irc_directory import ChannelCache, list_command
+from source.irc_session import SessionManager
+from test.fake_ircd import FakeIRCd
+from test.test_irc_async import wait_for
+from test.test_irc_session import Recorder
+
+
+class TestListCommand(unittest.TestCase):
+    def test_filters_only_when_server_supports_them(self):
+        self.assertEqual(list_command("", 5, "*py*"), "LIST")
+        self.assertEqual(list_command("U", 5), "LIST >4")
+        self.assertEqual(list_command("MU", 5, "*py*"), "LIST >4,*py*")
+        self.assertEqual(list_command("MNU", None, "*py*"), "LIST *py*")
+        self.assertEqual(list_command("U", 1), "LIST")
+
+    def test_client_remembers_request(self):
+        client = IRCClient()
+        client.connected = True
+        sent = []
+        client.send_raw = sent.append
+        client.elist = "U"
+        client.list_min_users = 3
+        client.list_channels()
+        client.list_channels(10, "#a*")
+        self.assertEqual(sent, ["LIST >2", "LIST >9"])
+        self.assertEqual(client.list_request, (10, "#a*"))
+
+
+class TestChannelCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ChannelCache(self.directory.name, ttl=60)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_rows_replace_cache_only_on_commit(self):
+        writer = self.cache.writer("irc.example.org", 3)
+        writer.write([("#a", 5, "topic\twith tab"), ("#b", 4, "")])
+        writer.commit()
+        header, rows = self.cache.load("irc.example.org")
+        self.assertEqual(rows, [("#a", 5, "topic with tab"), ("#b", 4, "")])
+        self.assertEqual(header["min_users"], 3)
+
+        writer = self.cache.writer("irc.example.org", 3)
+        writer.write([("#c", 9, "")])
+        writer.abort()
+        self.assertEqual(len(self.cache.load("irc.example.org")[1]), 2)
+
+    def test_freshness(self):
+        writer = self.cache.writer("net", 3)
+        writer.commit()
+        header, _ = self.cache.load("net")
+        fetched = header["fetched"]
+        self.assertTrue(self.cache.is_fresh(header, 3))
+        self.assertFalse(self.cache.is_fresh(header, 5))
+        self.assertFalse(self.cache.is_fresh(header, 3, now=fetched + 61))
+        self.assertFalse(self.cache.is_fresh(None))
+
+    def test_missing_or_broken_cache(self):
+        self.assertEqual(self.cache.load("nothing"), (None, []))
+        os.makedirs(self.directory.name, exist_ok=True)
+        with open(self.cache.file("bad"), "w", encoding="utf-8") as f:
+            f.write("not json\n")
+        self.assertEqual(self.cache.load("bad"), (None, []))
+        self.assertTrue(self.cache.file("a/../b").endswith("a_.._b.channels"))
+
+
+class TestCachedDirectory(unittest.TestCase):
+    """
+    Сессии против FakeIRCd с ELIST: первый раз каталог приходит
+    фильтрованным LIST и ложится в кэш, потом - из кэша без LIST
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.server = FakeIRCd(list_size=3000)
+        self.managers = []
+
+    def tearDown(self):
+        for manager in self.managers:
+            manager.close("fake")
+        self.server.close()
+        self.directory.cleanup()
+
+    def connect(self, ttl=3600):
+        manager = SessionManager(
+            IRCClient, channel_cache=ChannelCache(self.directory.name, ttl),
+            list_min_users=990)
+        recorder = Recorder()
+        manager.add_listener(recorder)
+        self.managers.append(manager)
+        session = manager.open("127.0.0.1", self.server.port, "tester",
+                               "fake")
+        conn = self.server.wait_client(len(self.managers) - 1)
+        return session, recorder, conn
+
+    def ended(self, session, recorder):
+        session.batcher.flush()
+        return ("channels_end", "fake") in recorder.events
+
+    def channels(self, session, recorder):
+        session.batcher.flush()
+        return [c for e in recorder.events if e[0] == "channels"
+                for c in e[2]]
+
+    def test_list_is_filtered_then_cached(self):
+        session, recorder, conn = self.connect()
+        self.assertTrue(wait_for(lambda: self.ended(session, recorder)))
+        self.assertIn("LIST >989", conn.received)
+        self.assertEqual(len(self.channels(session, recorder)), 30)
+        self.assertTrue(wait_for(lambda: os.path.exists(
+            self.managers[0].channel_cache.file("fake"))))
+
+        session, recorder, conn = self.connect()
+        channels = self.channels(session, recorder)
+        self.assertEqual(len(channels), 30)
+        self.assertEqual(channels[0], ("#channel-990", 990,
+                                       "[+nt] topic of channel number 990"))
+        self.assertTrue(wait_for(lambda: conn.registered.is_set()))
+        self.server.send(conn, "PING :sync")
+        self.assertTrue(wait_for(lambda: "PONG :sync" in conn.received))
+        self.assertFalse([line for line in conn.received
+                          if line.startswith("LIST")])
+
+    def test_stale_cache_is_shown_and_refreshed(self):
+        session, recorder, conn = self.connect(ttl=0)
+        self.assertTrue(wait_for(lambda: os.path.exists(
+            self.managers[0].channel_cache.file("fake"))))
+        session, recorder, conn = self.connect(ttl=0)
+        self.assertEqual(len(self.channels(session, recorder)), 30)
+        self.assertTrue(wait_for(lambda: "LIST >989" in conn.received))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,198 @@
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+from source.irc_async import AsyncIRCClient
+from source.irc_client import IRCClient
+from source.irc_headless import HeadlessRunner, load_config, run_headless
+from source.irc_log import LogStore
+from source.irc_reconnect import Backoff
+from source.irc_tls import TlsOptions
+from test.fake_ircd import FakeIRCd
+from test.test_irc_async import LineServer, wait_for
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestHeadless(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write_config(self, text):
+        path = os.path.join(self.dir.name, "irclient.ini")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def test_load_config(self):
+        path = self.write_config(
+            "[client]\nnick = bot\necho = no\nrules = rules.txt\n\n"
+            "[network libera]\nserver = irc.libera.chat\n"
+            "channels = #python, #rust\n\n"
+            "[network oftc]\nserver = irc.oftc.net\nport = 6697\n"
+            "nick = other\n\n"
+            "[network tilde]\nserver = irc.tilde.chat\ntls = yes\n"
+            "tls_verify = no\nsasl_username = bot\nsasl_password = pw\n")
+        config = load_config(path)
+        self.assertEqual(config.nick, "bot")
+        self.assertFalse(config.echo)
+        self.assertEqual(config.rules, "rules.txt")
+        self.assertEqual(config.backend, "threads")
+        self.assertEqual(
+            [tuple(network) for network in config.networks],
+            [("libera", "irc.libera.chat", 6667, "bot",
+              ["#python", "#rust"], None, None),
+             ("oftc", "irc.oftc.net", 6697, "other", [], TlsOptions(),
+              None),
+             ("tilde", "irc.tilde.chat", 6697, "bot", [],
+              TlsOptions(verify=False), config.networks[2].sasl)])
+        sasl = config.networks[2].sasl
+        self.assertEqual((sasl.mechanism, sasl.username, sasl.password),
+                         ("PLAIN", "bot", "pw"))
+
+    def test_load_config_errors(self):
+        with self.assertRaises(ValueError):
+            load_config(os.path.join(self.dir.name, "missing.ini"))
+        with self.assertRaises(ValueError):
+            load_config(self.write_config("[client]\nnick = bot\n"))
+        with self.assertRaises(ValueError):
+            load_config(self.write_config("[network x]\nserver = h\n"))
+        with self.assertRaises(ValueError):
+            load_config(self.write_config(
+                "[client]\nnick = bot\n[network x]\nserver = h\n"
+                "sasl_username = bot\n"))
+        with self.assertRaises(ValueError):
+            load_config(self.write_config(
+                "[client]\nnick = bot\nbackend = twisted\n"
+                "[network x]\nserver = h\n"))
+
+    def test_connects_joins_and_logs(self):
+        server = LineServer(b":srv 001 bot :Welcome\r\n"
+                            b":bot!u@h JOIN :#c\r\n"
+                            b":spam!u@h PRIVMSG #c :buy now\r\n"
+                            b":x!u@h PRIVMSG #c :hello\r\n")
+        log = os.path.join(self.dir.name, "log.db")
+        rules = os.path.join(self.dir.name, "rules.txt")
+        with open(rules, "w", encoding="utf-8") as f:
+            f.write("ignore spam\n")
+        config = load_config(self.write_config(
+            f"[client]\nnick = bot\nlog = {log}\nrules = {rules}\n\n"
+            f"[network test]\nserver = 127.0.0.1\nport = {server.port}\n"
+            "channels = #c #d\n"))
+        out = io.StringIO()
+        runner = HeadlessRunner(config, out=out)
+        try:
+            self.assertEqual(runner.start(), 1)
+            self.assertTrue(wait_for(
+                lambda: "JOIN #c,#d" in server.received))
+            self.assertTrue(wait_for(lambda: "hello" in out.getvalue()))
+        finally:
+            runner.stop()
+            server.close()
+        self.assertEqual([line for line in server.received
+                          if line.startswith("JOIN")], ["JOIN #c,#d"])
+        self.assertNotIn("LIST", server.received)
+        self.assertEqual(out.getvalue().splitlines(),
+                         ["test joined #c", "test [#c] <x>: hello"])
+        store = LogStore(log)
+        try:
+            self.assertEqual(
+                [(hit.kind, hit.nick, hit.text)
+                 for hit in store.history("test", "#c")],
+                [("JOIN", "bot", ""), ("PRIVMSG", "x", "hello")])
+        finally:
+            store.close()
+
+    def test_asyncio_backend(self):
+        server = LineServer(b":srv 001 bot :Welcome\r\n"
+                            b":bot!u@h JOIN :#c\r\n")
+        config = load_config(self.write_config(
+            f"[client]\nnick = bot\nbackend = asyncio\n\n"
+            f"[network test]\nserver = 127.0.0.1\nport = {server.port}\n"
+            "channels = #c\n"))
+        self.assertEqual(config.backend, "asyncio")
+        out = io.StringIO()
+        runner = HeadlessRunner(config, out=out)
+        try:
+            runner.start()
+            client = runner.sessions.get("test").client
+            self.assertIsInstance(client, AsyncIRCClient)
+            # connect уже вернулся, подключение идет в цикле
+            self.assertTrue(client.alive())
+            self.assertTrue(wait_for(lambda: "JOIN #c" in server.received))
+            self.assertTrue(wait_for(
+                lambda: "test joined #c" in out.getvalue()))
+        finally:
+            runner.stop()
+            server.close()
+        self.assertFalse(client.alive())
+
+    def test_backend_flag_overrides_config(self):
+        path = self.write_config(
+            "[client]\nnick = bot\nbackend = asyncio\n\n"
+            "[network test]\nserver = 127.0.0.1\nport = 1\n")
+        used = []
+
+        class Runner(HeadlessRunner):
+            def __init__(self, config):
+                used.append(config.backend)
+                super().__init__(config, client_class=IRCClient)
+
+            def run(self):
+                self.stop()
+                return 0
+
+        with unittest.mock.patch("source.irc_headless.HeadlessRunner",
+                                 Runner):
+            run_headless(path, "threads")
+            run_headless(path)
+        self.assertEqual(used, ["threads", "asyncio"])
+
+    def test_keeps_running_while_reconnecting(self):
+        server = FakeIRCd()
+        config = load_config(self.write_config(
+            f"[client]\nnick = bot\necho = no\n\n"
+            f"[network test]\nserver = 127.0.0.1\nport = {server.port}\n"))
+        runner = HeadlessRunner(config)
+        codes = []
+        thread = threading.Thread(
+            target=lambda: codes.append(runner.run(poll_interval=0.01)))
+        try:
+            thread.start()
+            conn = server.wait_client()
+            client = runner.sessions.get("test").client
+            client.reconnect = Backoff(base=0.5, rand=lambda: 1.0)
+            server.drop(conn)
+            # полсекунды ожидания клиент не подключен, но раннер жив
+            self.assertTrue(wait_for(lambda: not client.connected))
+            self.assertTrue(client.alive())
+            time.sleep(0.1)
+            self.assertTrue(thread.is_alive())
+            server.wait_client(1)
+            self.assertTrue(thread.is_alive())
+        finally:
+            runner.stop()
+            thread.join(5)
+            server.close()
+        self.assertEqual(codes, [0])
+        self.assertEqual(client.reconnects, 1)
+        self.assertFalse(client.alive())
+
+    def test_headless_does_not_import_qt(self):
+        code = ("import sys, source.main, source.irc_headless; "
+                "print(any(m.startswith('PyQt6') for m in sys.modules))")
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT,
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
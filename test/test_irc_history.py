@@ -0,0 +1,43 @@
+import unittest
+from source.irc_history import ChatHistory
+
+
+class TestChatHistory(unittest.TestCase):
+    def test_first_request_without_known_messages(self):
+        history = ChatHistory(page_size=20)
+        self.assertEqual(history.request("#c"),
+                         "CHATHISTORY LATEST #c * 20")
+
+    def test_pages_go_back_from_oldest_seen(self):
+        history = ChatHistory()
+        history.seen("#C", "2024-01-01T10:00:00.000Z")
+        history.seen("#c", "2024-01-01T11:00:00.000Z")
+        self.assertEqual(
+            history.request("#c"),
+            "CHATHISTORY BEFORE #c timestamp=2024-01-01T10:00:00.000Z 50")
+        self.assertIsNone(history.request("#c"))
+        history.received("#c", 50, "2024-01-01T09:00:00.000Z")
+        self.assertIn("timestamp=2024-01-01T09:00:00.000Z",
+                      history.request("#c"))
+
+    def test_empty_page_stops_requests(self):
+        history = ChatHistory()
+        history.request("#c")
+        history.received("#c", 0, None)
+        self.assertTrue(history.exhausted("#c"))
+        self.assertIsNone(history.request("#c"))
+
+    def test_server_limit_caps_page(self):
+        history = ChatHistory(page_size=100)
+        history.max_limit = 30
+        self.assertTrue(history.request("#c").endswith(" 30"))
+
+    def test_reset_allows_new_request(self):
+        history = ChatHistory()
+        history.request("#c")
+        history.reset()
+        self.assertIsNotNone(history.request("#c"))
+
+
+if __name__ == "__main__":
+    unittest.main()
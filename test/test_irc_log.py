@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+import zlib
+from source.irc_log import LogStore, fts_query, scope_token
+
+
+class TestLogStore(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.store = LogStore(os.path.join(self.dir.name, "log.db"),
+                              flush_interval=0.05)
+
+    def tearDown(self):
+        self.store.close()
+        self.dir.cleanup()
+
+    def test_events_are_group_committed(self):
+        for i in range(100):
+            self.store.record("libera", "#c", "PRIVMSG", "bob", f"line {i}",
+                              ts=i)
+        self.assertTrue(self.store.flush(5))
+        self.assertEqual(self.store.written, 100)
+        self.assertLess(self.store.commits, 10)
+
+    def test_search_ranks_and_filters(self):
+        self.store.record("libera", "#py", "PRIVMSG", "a",
+                          "asyncio is nice", ts=1)
+        self.store.record("libera", "#py", "PRIVMSG", "b",
+                          "asyncio asyncio asyncio everywhere", ts=2)
+        self.store.record("oftc", "#debian", "NOTICE", "c",
+                          "asyncio in debian", ts=3)
+        self.store.record("libera", "#py", "JOIN", "d", "", ts=4)
+        self.store.flush(5)
+        hits = self.store.search("asyncio")
+        self.assertEqual(len(hits), 3)
+        self.assertEqual(hits[0].nick, "b")
+        self.assertIn("[asyncio]", hits[0].snippet)
+        hits = self.store.search("asyncio", network="oftc")
+        self.assertEqual([h.channel for h in hits], ["#debian"])
+        self.assertEqual(self.store.search("deb*", channel="#py"), [])
+
+    def test_channel_filter_ignores_case(self):
+        self.store.record("libera", "#Python", "PRIVMSG", "a", "hello", ts=1)
+        self.store.record("libera", "#python", "PRIVMSG", "b", "hello", ts=2)
+        self.store.record("libera", "#rust", "PRIVMSG", "c", "hello", ts=3)
+        self.store.flush(5)
+        hits = self.store.search("hello", channel="#PYTHON")
+        self.assertEqual(sorted(h.nick for h in hits), ["a", "b"])
+
+    def test_old_scope_tokens_are_migrated(self):
+        self.store.record("libera", "#Python", "PRIVMSG", "a", "hello", ts=1)
+        self.store.flush(5)
+        self.store.close()
+        path = os.path.join(self.dir.name, "log.db")
+        conn = sqlite3.connect(path)
+        with conn:
+            # как писала версия 0: слово канала - по имени как есть
+            old = "%s c%08x" % (scope_token("n", "libera"),
+                                zlib.crc32(b"#Python"))
+            conn.execute("INSERT INTO events_fts (events_fts, rowid, text, "
+                         "scope) SELECT 'delete', id, text, scope "
+                         "FROM events")
+            conn.execute("UPDATE events SET scope = ?", (old,))
+            conn.execute("INSERT INTO events_fts (rowid, text, scope) "
+                         "SELECT id, text, scope FROM events")
+            conn.execute("PRAGMA user_version = 0")
+        conn.close()
+        self.store = LogStore(path)
+        hits = self.store.search("hello", channel="#python")
+        self.assertEqual([h.nick for h in hits], ["a"])
+
+    def test_query_cannot_escape_text_column(self):
+        self.store.record("libera", "#py", "PRIVMSG", "a", "scope: x", ts=1)
+        self.store.record("libera", "#rust", "PRIVMSG", "b", "rust", ts=2)
+        self.store.flush(5)
+        scope = self.store.search("x", channel="#py")[0].text
+        self.assertEqual(scope, "scope: x")
+        for query in ('scope : n', 'x) OR (rust', '"unclosed', '^x',
+                      'a AND', 'OR', 'NEAR(a b)', ':'):
+            hits = self.store.search(query, channel="#py")
+            self.assertTrue(all(h.channel == "#py" for h in hits), query)
+        self.assertEqual(fts_query('deb* OR "a b" x"y'),
+                         '"deb"* OR "a b" "x""y"')
+        self.assertEqual(fts_query("OR AND"), "")
+
+    def test_history_is_oldest_first(self):
+        for i in range(5):
+            self.store.record("libera", "#c", "PRIVMSG", "bob", str(i), ts=i)
+        self.store.flush(5)
+        history = self.store.history("libera", "#c", limit=3)
+        self.assertEqual([h.text for h in history], ["2", "3", "4"])
+        history = self.store.history("libera", "#c", limit=3, before=2)
+        self.assertEqual([h.text for h in history], ["0", "1"])
+
+    def test_history_ignores_channel_case(self):
+        self.store.record("libera", "#Python", "PRIVMSG", "a", "1", ts=1)
+        self.store.record("libera", "#python", "PRIVMSG", "b", "2", ts=2)
+        self.store.record("libera", "#rust", "PRIVMSG", "c", "3", ts=3)
+        self.store.flush(5)
+        history = self.store.history("libera", "#PYTHON")
+        self.assertEqual([h.nick for h in history], ["a", "b"])
+        hits = self.store.search("1 OR 2", channel="#PyThOn")
+        self.assertEqual(sorted(h.nick for h in hits), ["a", "b"])
+
+    def test_full_queue_drops_oldest_instead_of_blocking(self):
+        self.store.close()
+        self.store = LogStore(os.path.join(self.dir.name, "small.db"),
+                              flush_interval=60, max_pending=10,
+                              batch_size=1000)
+        for i in range(25):
+            self.store.record("n", "#c", "PRIVMSG", "x", str(i), ts=i)
+        self.assertEqual(self.store.dropped, 15)
+        self.store.flush(5)
+        self.assertEqual([h.text for h in
+                          self.store.history("n", "#c", limit=100)],
+                         [str(i) for i in range(15, 25)])
+
+
+if __name__ == '__main__':
+    unittest.main()
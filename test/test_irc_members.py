@@ -0,0 +1,120 @@
+import random
+import unittest
+from source.irc_members import ChannelMembers, MembershipTracker, \
+    parse_prefix
+
+
+class TestChannelMembers(unittest.TestCase):
+    def setUp(self):
+        self.members = ChannelMembers("#c", "~@+")
+
+    def test_bulk_load_orders_by_prefix_then_nick(self):
+        self.members.bulk_load(["zed", "@Bob", "+carl", "~q", "alice", "@+x"])
+        self.assertEqual(self.members.items(),
+                         ["~q", "@Bob", "@x", "+carl", "alice", "zed"])
+
+    def test_add_remove_return_rows(self):
+        self.members.bulk_load(["@op", "b", "d"])
+        self.assertEqual(self.members.add("c"), 2)
+        self.assertIsNone(self.members.add("C"))
+        self.assertEqual(self.members.remove("B"), 1)
+        self.assertIsNone(self.members.remove("nobody"))
+        self.assertEqual(self.members.items(), ["@op", "c", "d"])
+
+    def test_rename_keeps_prefixes(self):
+        self.members.bulk_load(["@op", "b"])
+        self.assertEqual(self.members.rename("op", "zz"), (0, 0))
+        self.assertEqual(self.members.items(), ["@zz", "b"])
+
+    def test_rows_match_a_full_resort(self):
+        rng = random.Random(7)
+        expected = {}
+        for step in range(2000):
+            nick = f"n{rng.randrange(300)}"
+            if rng.random() < 0.6:
+                prefix = rng.choice(["", "", "+", "@"])
+                row = self.members.add(nick, prefix)
+                if row is not None:
+                    expected[nick] = prefix
+            else:
+                self.members.remove(nick)
+                expected.pop(nick, None)
+        ranked = sorted(expected.items(), key=lambda kv: (
+            "~@+".index(kv[1]) if kv[1] else 3, kv[0]))
+        self.assertEqual(self.members.items(),
+                         [prefix + nick for nick, prefix in ranked])
+
+
+class TestMembershipTracker(unittest.TestCase):
+    def setUp(self):
+        self.tracker = MembershipTracker()
+        self.tracker.names_chunk("#a", ["@me", "bob"])
+        self.tracker.names_chunk("#a", ["carol"])
+        self.tracker.names_end("#a")
+        self.tracker.names_chunk("#b", ["bob"])
+        self.tracker.names_end("#b")
+
+    def test_names_chunks_are_accumulated(self):
+        self.assertEqual(self.tracker.get("#A").items(),
+                         ["@me", "bob", "carol"])
+
+    def test_quit_removes_from_every_channel(self):
+        ops = self.tracker.quit("bob")
+        self.assertEqual(sorted(ops), [("#a", "remove", 1, None),
+                                       ("#b", "remove", 0, None)])
+
+    def test_mode_skips_parameters_of_other_modes(self):
+        ops = self.tracker.mode("#a", "+kov-b", ["key", "carol", "bob",
+                                                 "*!*@x"])
+        self.assertEqual(self.tracker.get("#a").items(),
+                         ["@carol", "@me", "+bob"])
+        self.assertEqual(len(ops), 4)
+
+    def test_leave_forgets_channel(self):
+        self.assertEqual(self.tracker.leave("#b"), [("#b", "reset", None, [])])
+        self.assertIsNone(self.tracker.get("#b"))
+        self.assertEqual(self.tracker.join("#b", "x"), [])
+
+    def test_repeated_names_is_applied_as_diff(self):
+        self.tracker.names_chunk("#a", ["@me", "bob", "carol", "dave",
+                                        "eve", "fred"])
+        self.tracker.names_end("#a")
+        self.tracker.names_chunk("#a", ["@me", "@bob", "carol", "dave",
+                                        "fred", "gus"])
+        self.assertEqual(self.tracker.names_end("#a"), [
+            ("#a", "remove", 1, None), ("#a", "remove", 3, None),
+            ("#a", "insert", 0, "@bob"), ("#a", "insert", 5, "gus")])
+        self.assertEqual(self.tracker.get("#a").items(),
+                         ["@bob", "@me", "carol", "dave", "fred", "gus"])
+
+    def test_diff_rows_replay_onto_view(self):
+        rng = random.Random(3)
+        nicks = [f"n{i}" for i in range(400)]
+        self.tracker.names_chunk("#big", nicks[:300])
+        view = self.tracker.names_end("#big")[0][3]
+        fresh = [("+" if rng.random() < 0.1 else "") + nick
+                 for nick in rng.sample(nicks[:300], 250) + nicks[300:330]]
+        self.tracker.names_chunk("#big", fresh)
+        for _, op, row, value in self.tracker.names_end("#big"):
+            self.assertNotEqual(op, "reset")
+            if op == "insert":
+                view.insert(row, value)
+            else:
+                del view[row]
+        expected = ChannelMembers("#big", "@+")
+        expected.bulk_load(fresh)
+        self.assertEqual(view, expected.items())
+        self.assertEqual(self.tracker.get("#big").items(), view)
+
+    def test_mostly_new_names_resets_list(self):
+        self.tracker.names_chunk("#b", ["x", "y", "z"])
+        self.assertEqual(self.tracker.names_end("#b"),
+                         [("#b", "reset", None, ["x", "y", "z"])])
+
+    def test_parse_prefix(self):
+        self.assertEqual(parse_prefix("(qaohv)~&@%+"), ("qaohv", "~&@%+"))
+        self.assertEqual(parse_prefix("bogus"), ("", ""))
+
+
+if __name__ == "__main__":
+    unittest.main()
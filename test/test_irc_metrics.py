@@ -0,0 +1,155 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from source.irc_metrics import METRICS, Histogram, JsonDumper, Metrics, \
+    Sampler, format_snapshot, metrics_from_env, rates
+from source.irc_parser import parse_irc_line
+from source.irc_session import SessionManager
+from test.test_irc_parser import MockClient
+from test.test_irc_session import OfflineClient, Recorder
+
+
+class TestHistogram(unittest.TestCase):
+    def test_percentiles_use_power_of_two_buckets(self):
+        histogram = Histogram()
+        for _ in range(98):
+            histogram.add(0.000010)
+        histogram.add(0.003)
+        histogram.add(0.5)
+        self.assertEqual(histogram.count, 100)
+        self.assertEqual(histogram.percentile(0.5), 16e-6)
+        self.assertEqual(histogram.percentile(0.99), 4096e-6)
+        self.assertEqual(histogram.percentile(1.0), 0.5)
+        self.assertEqual(histogram.as_dict()["max_ms"], 500.0)
+
+    def test_empty(self):
+        self.assertEqual(Histogram().percentile(0.5), 0.0)
+        self.assertEqual(Histogram().as_dict()["mean_ms"], 0.0)
+
+
+class TestMetrics(unittest.TestCase):
+    def test_snapshot_counters_histograms_and_gauges(self):
+        metrics = Metrics()
+        metrics.count("recv.lines", 3)
+        metrics.count("recv.lines")
+        metrics.observe("parse.PING", 0.001)
+        metrics.add_gauge("net.queue", lambda: {"depth": 2, "sent": 5})
+        metrics.add_gauge("net.lag", lambda: 0.25)
+        metrics.add_gauge("other", lambda: 1)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["counters"], {"recv.lines": 4})
+        self.assertEqual(snapshot["histograms"]["parse.PING"]["count"], 1)
+        self.assertEqual(snapshot["gauges"], {
+            "net.queue.depth": 2, "net.queue.sent": 5, "net.lag": 0.25,
+            "other": 1})
+        metrics.remove_gauges("net.")
+        self.assertEqual(list(metrics.gauges), ["other"])
+        self.assertIn("recv.lines", format_snapshot(snapshot))
+
+    def test_rates_between_snapshots(self):
+        before = {"time": 10.0, "counters": {"recv.bytes": 100}}
+        after = {"time": 12.0, "counters": {"recv.bytes": 500,
+                                            "recv.lines": 8}}
+        self.assertEqual(rates(before, after),
+                         {"recv.bytes": 200.0, "recv.lines": 4.0})
+        self.assertEqual(rates(None, after), {})
+
+    def test_json_dump(self):
+        metrics = Metrics()
+        metrics.count("recv.lines", 7)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "metrics.json")
+            dumper = JsonDumper(metrics, path)
+            dumper.dump()
+            dumper.dump()
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        self.assertEqual(data["counters"], {"recv.lines": 7})
+        self.assertEqual(data["rates"], {"recv.lines": 0.0})
+
+    def test_env_without_path_does_nothing(self):
+        self.assertIsNone(metrics_from_env({}))
+
+
+class TestSampler(unittest.TestCase):
+    def test_counts_own_and_cumulative_samples(self):
+        sampler = Sampler()
+        frame = sys._getframe()
+        sampler.sample({1: frame}, {1: "reader"})
+        sampler.sample({1: frame}, {1: "reader"})
+        self.assertEqual(sampler.samples, 2)
+        self.assertEqual(sampler.threads, {"reader": 2})
+        report = sampler.report()
+        self.assertIn("test_counts_own_and_cumulative_samples", report)
+        self.assertIn("      2       2", report)
+
+    def test_sees_other_threads(self):
+        sampler = Sampler(interval=0.001)
+        done = threading.Event()
+        worker = threading.Thread(target=done.wait, name="busy-worker")
+        worker.start()
+        sampler.start()
+        try:
+            while sampler.samples < 5:
+                done.wait(0.005)
+        finally:
+            sampler.stop()
+            done.set()
+            worker.join()
+        self.assertIn("busy-worker", sampler.threads)
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        METRICS.reset()
+
+    def tearDown(self):
+        METRICS.enable(False)
+        METRICS.reset()
+
+    def test_disabled_parser_records_nothing(self):
+        parse_irc_line(":a!u@h PRIVMSG #c :hi", MockClient())
+        self.assertEqual(METRICS.snapshot()["histograms"], {})
+
+    def test_parse_time_per_command(self):
+        METRICS.enable()
+        client = MockClient()
+        parse_irc_line(":a!u@h PRIVMSG #c :hi", client)
+        parse_irc_line(":a!u@h PRIVMSG #c :again", client)
+        parse_irc_line("PING :srv", client)
+        histograms = METRICS.snapshot()["histograms"]
+        self.assertEqual(histograms["parse.PRIVMSG"]["count"], 2)
+        self.assertEqual(histograms["parse.PING"]["count"], 1)
+
+    def test_handler_errors_are_kept(self):
+        parse_irc_line(None, MockClient())
+        snapshot = METRICS.snapshot()
+        self.assertEqual(snapshot["errors"], 1)
+        self.assertIn("Traceback", snapshot["last_error"])
+
+    def test_sessions_register_gauges(self):
+        manager = SessionManager(OfflineClient,
+                                 dispatch=lambda func, *args: func(*args))
+        manager.add_listener(Recorder())
+        session = manager.open("irc.example.org", 6667, "me", "net")
+        gauges = METRICS.snapshot()["gauges"]
+        self.assertEqual(gauges["net.send_queue.depth"], 0)
+        self.assertEqual(gauges["net.batcher.batches"], 0)
+
+        METRICS.enable()
+        session.client.message_received.emit(":srv NOTICE me :hi")
+        session.batcher.flush()
+        histograms = METRICS.snapshot()["histograms"]
+        self.assertEqual(histograms["session.dispatch_lag"]["count"], 1)
+        self.assertEqual(histograms["session.deliver"]["count"], 1)
+
+        manager.close("net")
+        self.assertNotIn("net.batcher.batches",
+                         METRICS.snapshot()["gauges"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,242 @@
+import tempfile
+import unittest
+from PyQt6.QtCore import QCoreApplication, Qt
+from source.irc_models import ChannelDirectoryModel, ChannelFilterProxy, \
+    ScrollbackModel, TransferModel, UserListModel
+from source.irc_dcc import TransferState
+from source.irc_scrollback import Scrollback
+from source.irc_text import Rendered
+
+
+class TestChannelDirectoryModel(unittest.TestCase):
+    def setUp(self):
+        self.app = QCoreApplication.instance()
+        if self.app is None:
+            self.app = QCoreApplication([])
+        self.model = ChannelDirectoryModel()
+        self.proxy = ChannelFilterProxy()
+        self.proxy.setSourceModel(self.model)
+
+    def names(self):
+        return [self.proxy.index(row, 0).data()
+                for row in range(self.proxy.rowCount())]
+
+    def test_bulk_insert_emits_one_notification(self):
+        inserts = []
+        self.model.rowsInserted.connect(
+            lambda parent, first, last: inserts.append((first, last)))
+        self.model.add_rows([(f"#c{i}", i, "") for i in range(1000)])
+        self.assertEqual(inserts, [(0, 999)])
+        self.assertEqual(self.model.rowCount(), 1000)
+
+    def test_duplicates_update_existing_row(self):
+        self.model.add_rows([("#python", 10, "old")])
+        self.model.add_rows([("#python", 12, "new"), ("#rust", 3, "")])
+        self.assertEqual(self.model.rowCount(), 2)
+        self.assertEqual(self.model.index(0, 1).data(), 12)
+        self.assertEqual(self.model.index(0, 2).data(), "new")
+
+    def test_queued_rows_wait_for_flush(self):
+        self.model.queue_rows([("#a", 1, ""), ("#b", 2, "")])
+        self.assertEqual(self.model.rowCount(), 0)
+        self.model.flush()
+        self.assertEqual(self.model.rowCount(), 2)
+
+    def test_sort_by_user_count(self):
+        self.model.add_rows([("#small", 2, ""), ("#big", 900, ""),
+                             ("#mid", 50, "")])
+        self.proxy.sort(ChannelDirectoryModel.USERS,
+                        Qt.SortOrder.DescendingOrder)
+        self.assertEqual(self.names(), ["#big", "#mid", "#small"])
+
+    def test_rows_streamed_during_list_are_sorted_at_the_end(self):
+        self.proxy.sort(ChannelDirectoryModel.USERS,
+                        Qt.SortOrder.DescendingOrder)
+        self.model.queue_rows([("#small", 2, ""), ("#big", 900, "")])
+        self.model.flush()
+        self.model.queue_rows([("#mid", 50, "")])
+        self.model.finish()
+        self.assertEqual(self.names(), ["#big", "#mid", "#small"])
+
+    def test_channels_missing_from_new_list_are_dropped(self):
+        self.model.queue_rows([("#old", 1, ""), ("#kept", 2, "")])
+        self.model.finish()
+        self.model.queue_rows([("#kept", 5, ""), ("#new", 3, "")])
+        self.model.finish()
+        users = {self.model.index(row, 0).data():
+                 self.model.index(row, 1).data()
+                 for row in range(self.model.rowCount())}
+        self.assertEqual(users, {"#kept": 5, "#new": 3})
+
+    def test_substring_and_glob_filter(self):
+        self.model.add_rows([("#python", 1, ""), ("#python-ru", 1, ""),
+                             ("#rust", 1, "")])
+        self.proxy.set_pattern("PYTH")
+        self.assertEqual(sorted(self.names()), ["#python", "#python-ru"])
+        self.proxy.set_pattern("#*-ru")
+        self.assertEqual(self.names(), ["#python-ru"])
+        self.proxy.set_pattern("")
+        self.assertEqual(len(self.names()), 3)
+
+
+class TestUserListModel(unittest.TestCase):
+    def setUp(self):
+        self.app = QCoreApplication.instance()
+        if self.app is None:
+            self.app = QCoreApplication([])
+        self.model = UserListModel()
+
+    def test_row_level_notifications(self):
+        events = []
+        self.model.rowsInserted.connect(
+            lambda parent, first, last: events.append(("ins", first)))
+        self.model.rowsRemoved.connect(
+            lambda parent, first, last: events.append(("rem", first)))
+        self.model.apply("reset", None, ["@a", "b", "d"])
+        self.model.apply("insert", 2, "c")
+        self.model.apply("remove", 1, None)
+        self.assertEqual(self.model.items(), ["@a", "c", "d"])
+        self.assertEqual(events, [("ins", 2), ("rem", 1)])
+
+
+class TestTransferModel(unittest.TestCase):
+    def setUp(self):
+        self.app = QCoreApplication.instance()
+        if self.app is None:
+            self.app = QCoreApplication([])
+        self.model = TransferModel()
+
+    @staticmethod
+    def state(transfer_id, done, state="active"):
+        return TransferState(transfer_id, "receive", "bob", "a.iso",
+                             4 << 20, done, 2 << 20, state, None)
+
+    def test_progress_updates_rows_in_place(self):
+        inserted, changed = [], []
+        self.model.rowsInserted.connect(
+            lambda parent, first, last: inserted.append(first))
+        self.model.dataChanged.connect(
+            lambda first, last: changed.append(first.row()))
+        self.model.update([self.state(1, 0), self.state(2, 0)])
+        self.model.update([self.state(2, 1 << 20)])
+        self.model.update([self.state(1, 4 << 20, "done")])
+        self.assertEqual(inserted, [0, 1])
+        self.assertEqual(changed, [1, 0])
+        self.assertEqual(self.model.rowCount(), 2)
+        self.assertEqual(self.model.transfer_id(1), 2)
+        text = self.model.index(1, TransferModel.PROGRESS).data()
+        self.assertEqual(text, "25% of 4.0 MiB")
+        self.assertEqual(self.model.index(0, TransferModel.STATE).data(),
+                         "done")
+        self.assertEqual(self.model.index(0, TransferModel.RATE).data(),
+                         "2.0 MiB/s")
+
+
+class TestScrollbackModel(unittest.TestCase):
+    def setUp(self):
+        self.app = QCoreApplication.instance()
+        if self.app is None:
+            self.app = QCoreApplication([])
+        self.model = ScrollbackModel(Scrollback(
+            capacity=10, page_size=5, spill_file=tempfile.TemporaryFile()))
+        self.ops = []
+        self.model.rowsInserted.connect(
+            lambda parent, first, last: self.ops.append(("+", first, last)))
+        self.model.rowsRemoved.connect(
+            lambda parent, first, last: self.ops.append(("-", first, last)))
+
+    def tearDown(self):
+        self.model.scrollback.close()
+
+    def push(self, start, stop):
+        self.model.append([Rendered(f"m{i}", False, [])
+                           for i in range(start, stop)])
+
+    def rows(self):
+        return [self.model.index(row, 0).data()
+                for row in range(self.model.rowCount())]
+
+    def test_append_evicts_from_top(self):
+        self.push(0, 8)
+        self.push(8, 12)
+        self.assertEqual(self.ops, [("+", 0, 7), ("-", 0, 1), ("+", 6, 9)])
+        self.assertEqual(self.rows(), [f"m{i}" for i in range(2, 12)])
+
+    def test_load_older_pages_in_from_disk(self):
+        self.push(0, 22)
+        self.assertTrue(self.model.can_load_older())
+        self.assertEqual(self.model.load_older(), 5)
+        self.assertEqual(self.model.load_older(), 5)
+        self.assertEqual(self.rows()[:3], ["m2", "m3", "m4"])
+        self.assertEqual(self.model.load_older(), 2)
+        self.assertFalse(self.model.can_load_older())
+        self.assertEqual(self.rows(), [f"m{i}" for i in range(22)])
+
+    def test_rows_stay_in_place_while_history_is_shown(self):
+        self.push(0, 15)
+        self.model.load_older()
+        self.ops.clear()
+        self.push(15, 18)
+        self.assertEqual(self.ops, [("+", 15, 17)])
+        self.assertEqual(self.rows(), [f"m{i}" for i in range(18)])
+        self.model.drop_older()
+        self.assertEqual(self.rows(), [f"m{i}" for i in range(8, 18)])
+
+    def test_older_rows_are_capped_while_scrolled_up(self):
+        self.model.max_older = 8
+        self.push(0, 15)
+        self.model.load_older()
+        self.ops.clear()
+        self.push(15, 21)
+        # m0..m10 над буфером, три самых старых убраны
+        self.assertEqual(self.ops, [("+", 15, 20), ("-", 0, 2)])
+        self.assertEqual(self.rows(), [f"m{i}" for i in range(3, 21)])
+        self.push(21, 60)
+        self.assertEqual(len(self.model._older), 8)
+        self.assertEqual(self.rows(), [f"m{i}" for i in range(42, 60)])
+        # убранное возвращается из файла
+        self.assertEqual(self.model.load_older(), 5)
+        self.assertEqual(self.rows()[0], "m37")
+
+    def test_capped_rows_take_server_history_with_them(self):
+        self.model.max_older = 4
+        self.push(0, 4)
+        self.model.prepend_history(self.history(0, 2))
+        self.ops.clear()
+        self.assertEqual(self.model.append(
+            [Rendered(f"m{i}", False, []) for i in range(4, 16)]), 4)
+        self.assertEqual(self.ops, [("+", 6, 17), ("-", 0, 3)])
+        self.assertEqual(self.rows(), [f"m{i}" for i in range(2, 16)])
+        self.assertEqual(self.model.load_older(), 2)
+        self.assertEqual(self.model.load_older(), 2)
+        self.assertEqual(self.rows()[:3], ["h0", "h1", "m0"])
+
+    def history(self, start, stop):
+        return [Rendered(f"h{i}", False, []) for i in range(start, stop)]
+
+    def test_server_history_goes_on_top(self):
+        self.push(0, 4)
+        self.assertEqual(self.model.prepend_history(self.history(3, 5)), 2)
+        self.assertEqual(self.model.prepend_history(self.history(0, 3)), 3)
+        self.assertEqual(self.ops, [("+", 0, 3), ("+", 0, 1), ("+", 0, 2)])
+        self.assertEqual(self.rows()[:6], ["h0", "h1", "h2", "h3", "h4",
+                                           "m0"])
+        self.ops.clear()
+        self.push(4, 12)
+        self.assertEqual(self.ops, [("+", 9, 16)])
+        self.assertEqual(len(self.rows()), 17)
+        self.model.drop_older()
+        self.assertEqual(self.rows(), [f"m{i}" for i in range(2, 12)])
+
+    def test_server_history_waits_for_spilled_lines(self):
+        self.push(0, 12)
+        self.assertEqual(self.model.prepend_history(self.history(0, 2)), 0)
+        self.assertEqual(self.model.load_older(), 2)
+        self.assertTrue(self.model.can_load_older())
+        self.assertEqual(self.model.load_older(), 2)
+        self.assertFalse(self.model.can_load_older())
+        self.assertEqual(self.rows()[:4], ["h0", "h1", "m0", "m1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,11 @@
 import unittest
-from source.irc_parser import parse_irc_line
+from source.irc_batch import BatchTracker
+from source.irc_caps import CapNegotiator
+from source.irc_history import ChatHistory
+from source.irc_members import MembershipTracker
+from source.irc_parser import parse_irc_line, parse_message
+from source.irc_records import InternTable
+from source.irc_rules import Rule, RuleSet
 
 
 class MockClient:
@@ -8,19 +14,47 @@ class MockClient:
         self.received_msgs = []
         self.channels = []
         self.users_list = []
+        self.joined = []
         self.nick = "tester"
         self.current_channel = None
 
         self.message_received = self._make_signal(self.received_msgs)
+        self.chats = []
+        self.chat_received = self._make_signal(self.chats)
+        self.names = InternTable()
         self.channels_received = self._make_signal(self.channels)
-        self.users_updated = self._make_signal(self.users_list)
+        self.list_ends = []
+        self.channels_end = self._make_signal(self.list_ends)
+        self.members_changed = self._make_signal(self.users_list)
+        self.membership = MembershipTracker()
+        self.event_log = None
+        self.auto_list = True
+        self.list_request = None
+        self.listing = False
+        self.elist = ""
+        self.joined_channels = {}
+        self.rejoining = {}
+        self.ready_calls = 0
+        self.channel_joined = self._make_signal(self.joined)
+        self.registrations = []
+        self.registered = self._make_signal(self.registrations)
+        self.histories = []
+        self.history_received = self._make_signal(self.histories)
+        self.dcc_requests = []
+        self.dcc_received = self._make_signal(self.dcc_requests)
+        self.caps = CapNegotiator()
+        self.batches = BatchTracker()
+        self.history = ChatHistory()
+        self.rules = None
 
     class Signal:
         def __init__(self, store):
             self.store = store
 
         def emit(self, *args):
-            if len(args) == 1 and isinstance(args[0], list):
+            if not args:
+                self.store.append(None)
+            elif len(args) == 1 and isinstance(args[0], list):
                 self.store.extend(args[0])
             else:
                 self.store.append(args[0] if len(args) == 1 else args)
@@ -31,6 +65,13 @@ class MockClient:
     def send_raw(self, data):
         self.sent_raw.append(data)
 
+    def ready(self):
+        self.ready_calls += 1
+
+    def list_channels(self):
+        self.list_request = (None, None)
+        self.send_raw("LIST")
+
 
 class TestIRCParser(unittest.TestCase):
 
@@ -42,36 +83,295 @@ class TestIRCParser(unittest.TestCase):
         self.assertIn("PONG :server", self.client.sent_raw)
         self.assertIn("<< PING :server", self.client.received_msgs)
 
-    def test_welcome_triggers_list(self):
+    def test_motd_end_triggers_list_once(self):
         parse_irc_line(":server 001 tester :Welcome", self.client)
-        self.assertIn("LIST", self.client.sent_raw)
+        self.assertEqual(self.client.registrations, [None])
+        self.assertEqual(self.client.sent_raw, [])
+        parse_irc_line(":server 376 tester :End of /MOTD", self.client)
+        parse_irc_line(":server 376 tester :End of /MOTD", self.client)
+        self.assertEqual(self.client.sent_raw, ["LIST"])
+
+    def test_motd_end_without_auto_list(self):
+        self.client.auto_list = False
+        parse_irc_line(":server 001 tester :Welcome", self.client)
+        parse_irc_line(":server 422 tester :MOTD File is missing",
+                       self.client)
+        self.assertNotIn("LIST", self.client.sent_raw)
+        self.assertEqual(self.client.registrations, [None])
+
+    def test_elist_is_learned(self):
+        parse_irc_line(":server 005 tester ELIST=mnu SAFELIST "
+                       ":are supported by this server", self.client)
+        self.assertEqual(self.client.elist, "MNU")
 
     def test_list_channel_emits_channel(self):
         parse_irc_line(":server 322 tester #channel 10 :desc", self.client)
-        self.assertEqual(self.client.channels, ["#channel"])
+        self.assertEqual(self.client.channels, [("#channel", 10, "desc")])
 
-    def test_join_updates_channel_and_sends_names(self):
+    def test_list_end_is_signalled(self):
+        parse_irc_line(":server 323 tester :End of /LIST", self.client)
+        self.assertEqual(self.client.list_ends, [None])
+
+    def test_join_updates_channel_without_extra_names(self):
         parse_irc_line(":tester!user@host JOIN :#testchan", self.client)
         self.assertEqual(self.client.current_channel, "#testchan")
-        self.assertIn("NAMES #testchan", self.client.sent_raw)
+        self.assertEqual(self.client.sent_raw, [])
+        self.assertEqual(self.client.joined, ["#testchan"])
+
+    def test_events_are_logged(self):
+        events = []
+        self.client.event_log = lambda *event: events.append(event)
+        parse_irc_line(":bob!u@h JOIN #c", self.client)
+        parse_irc_line(":bob!u@h PRIVMSG #c :hello", self.client)
+        parse_irc_line(":bob!u@h PRIVMSG tester :psst", self.client)
+        parse_irc_line(":bob!u@h NOTICE #c :note", self.client)
+        parse_irc_line(":bob!u@h PART #c :bye", self.client)
+        self.assertEqual(events, [
+            ("#c", "JOIN", "bob", "", None),
+            ("#c", "PRIVMSG", "bob", "hello", None),
+            ("bob", "PRIVMSG", "bob", "psst", None),
+            ("#c", "NOTICE", "bob", "note", None),
+            ("#c", "PART", "bob", "bye", None)])
+
+    def test_server_time_is_logged_and_remembered(self):
+        events = []
+        self.client.event_log = lambda *event: events.append(event)
+        parse_irc_line("@time=2024-05-01T12:00:00.500Z :bob!u@h "
+                       "PRIVMSG #c :hello", self.client)
+        parse_irc_line("@time=2024-05-01T12:00:01.000Z :bob!u@h "
+                       "PRIVMSG #c :again", self.client)
+        self.assertEqual(events[0][4], 1714564800.5)
+        self.assertEqual(
+            self.client.history.request("#c"),
+            "CHATHISTORY BEFORE #c timestamp=2024-05-01T12:00:00.500Z 50")
+
+    def test_cap_negotiation(self):
+        parse_irc_line(":srv CAP * LS * :multi-prefix sasl", self.client)
+        self.assertEqual(self.client.sent_raw, [])
+        parse_irc_line(":srv CAP * LS :server-time batch=x draft/chathistory",
+                       self.client)
+        self.assertEqual(self.client.sent_raw, [
+            "CAP REQ :batch draft/chathistory multi-prefix server-time"])
+        parse_irc_line(":srv CAP * ACK :batch draft/chathistory "
+                       "multi-prefix server-time", self.client)
+        self.assertEqual(self.client.sent_raw[-1], "CAP END")
+        self.assertIn("server-time", self.client.caps)
+        self.assertNotIn("sasl", self.client.caps)
+
+    def test_netsplit_batch_is_one_members_update(self):
+        parse_irc_line(":server 353 tester = #chan :a b c d", self.client)
+        parse_irc_line(":server 366 tester #chan :End", self.client)
+        calls = []
+        self.client.members_changed = MockClient.Signal(calls)
+        parse_irc_line(":srv BATCH +s1 netsplit hub.net leaf.net",
+                       self.client)
+        for nick in "abc":
+            parse_irc_line(f"@batch=s1 :{nick}!u@h QUIT :hub.net leaf.net",
+                           self.client)
+        self.assertEqual(calls, [])
+        parse_irc_line(":srv BATCH -s1", self.client)
+        self.assertEqual(calls, [
+            ("#chan", "remove", 0, None),
+            ("#chan", "remove", 0, None),
+            ("#chan", "remove", 0, None)])
+        self.assertEqual(len(self.client.batches), 0)
+        self.assertIsNone(self.client.batches.collected)
+
+    def test_chathistory_batch_is_delivered_as_history(self):
+        self.client.history.request("#c")
+        parse_irc_line(":srv BATCH +h1 chathistory #c", self.client)
+        parse_irc_line("@batch=h1;time=2024-05-01T10:00:00.000Z "
+                       ":bob!u@h PRIVMSG #c :old one", self.client)
+        parse_irc_line("@batch=h1;time=2024-05-01T10:00:05.000Z "
+                       ":ann!u@h PRIVMSG #c :old two", self.client)
+        parse_irc_line(":srv BATCH -h1", self.client)
+        self.assertEqual(self.client.chats, [])
+        target, lines = self.client.histories[0]
+        self.assertEqual(target, "#c")
+        self.assertEqual(list(map(str, lines)),
+                         ["[#c] <bob>: old one", "[#c] <ann>: old two"])
+        self.assertEqual(lines[1].time - lines[0].time, 5.0)
+        self.assertEqual(
+            self.client.history.request("#c"),
+            "CHATHISTORY BEFORE #c timestamp=2024-05-01T10:00:00.000Z 50")
+
+    def test_own_userhost_is_learned(self):
+        self.client.userhost = None
+        parse_irc_line(":tester!~user@host JOIN :#testchan", self.client)
+        self.assertEqual(self.client.userhost, "~user@host")
+        parse_irc_line(":server 396 tester cloak.example :is now your "
+                       "displayed host", self.client)
+        self.assertEqual(self.client.userhost, "~user@cloak.example")
 
     def test_users_list_parsing(self):
-        line = ":server 353 tester = #chan :alice bob charlie"
-        parse_irc_line(line, self.client)
-        self.assertEqual(self.client.users_list, ["alice",
-                                                  "bob", "charlie"])
+        parse_irc_line(":server 353 tester = #chan :charlie @bob", self.client)
+        parse_irc_line(":server 353 tester = #chan :alice", self.client)
+        self.assertEqual(self.client.users_list, [])
+        parse_irc_line(":server 366 tester #chan :End of /NAMES list.",
+                       self.client)
+        self.assertEqual(self.client.users_list, [
+            ("#chan", "reset", None, ["@bob", "alice", "charlie"])])
+
+    def test_membership_deltas(self):
+        parse_irc_line(":server 353 tester = #chan :@tester bob", self.client)
+        parse_irc_line(":server 366 tester #chan :End", self.client)
+        del self.client.users_list[:]
+        parse_irc_line(":alice!u@h JOIN #chan", self.client)
+        parse_irc_line(":server MODE #chan +o alice", self.client)
+        parse_irc_line(":bob!u@h NICK :robert", self.client)
+        parse_irc_line(":robert!u@h QUIT :bye", self.client)
+        self.assertEqual(self.client.users_list, [
+            ("#chan", "insert", 1, "alice"),
+            ("#chan", "remove", 1, None),
+            ("#chan", "insert", 0, "@alice"),
+            ("#chan", "remove", 2, None),
+            ("#chan", "insert", 2, "robert"),
+            ("#chan", "remove", 2, None),
+        ])
+
+    def test_isupport_prefix_is_applied(self):
+        parse_irc_line(":server 005 tester PREFIX=(qov)~@+ CHANTYPES=# "
+                       ":are supported by this server", self.client)
+        parse_irc_line(":server 353 tester = #c :+v ~q @o", self.client)
+        parse_irc_line(":server 366 tester #c :End", self.client)
+        self.assertEqual(self.client.users_list[-1][3], ["~q", "@o", "+v"])
 
     def test_privmsg_parsing(self):
         line = ":alice!user@host PRIVMSG #chan :hello everyone"
         parse_irc_line(line, self.client)
-        self.assertIn("[#chan] <alice>: hello everyone",
-                      self.client.received_msgs)
+        line = self.client.chats[0]
+        self.assertEqual(str(line), "[#chan] <alice>: hello everyone")
+        self.assertIs(line.sender, self.client.names.intern("alice"))
 
     def test_error_handling(self):
         parse_irc_line(None, self.client)
         self.assertTrue(any("Error" in msg for msg in
                             self.client.received_msgs))
 
+    def test_privmsg_with_numeric_text_does_not_trigger_names(self):
+        line = ":alice!user@host PRIVMSG #chan :look at 353 and 322 here"
+        parse_irc_line(line, self.client)
+        self.assertEqual(self.client.users_list, [])
+        self.assertEqual(self.client.channels, [])
+
+    def test_join_of_other_user_is_ignored(self):
+        parse_irc_line(":bob!user@host JOIN :#testchan", self.client)
+        self.assertIsNone(self.client.current_channel)
+        self.assertEqual(self.client.sent_raw, [])
+
+    def test_rejoin_after_reconnect_is_silent(self):
+        self.client.rejoining = {"#c": "#c"}
+        parse_irc_line(":tester!u@h JOIN #C", self.client)
+        self.assertEqual(self.client.rejoining, {})
+        self.assertEqual(self.client.joined_channels, {"#c": "#C"})
+        self.assertEqual(self.client.joined, [])
+        self.assertEqual(self.client.sent_raw, [])
+        self.assertIsNone(self.client.current_channel)
+
+    def test_failed_rejoin_forgets_channel(self):
+        parse_irc_line(":tester!u@h JOIN #c", self.client)
+        parse_irc_line(":srv 366 tester #c :End", self.client)
+        self.client.rejoining = {"#c": "#c"}
+        parse_irc_line(":srv 474 tester #c :Cannot join (+b)", self.client)
+        self.assertEqual(self.client.users_list[-1],
+                         ("#c", "reset", None, []))
+        self.assertEqual(self.client.joined_channels, {})
+        self.assertEqual(self.client.rejoining, {})
+
+    def test_ctcp_dcc_is_not_a_chat_line(self):
+        parse_irc_line(":bob!u@h PRIVMSG tester :\x01DCC SEND "
+                       "\"my log.txt\" 2130706433 5000 1234\x01",
+                       self.client)
+        request = self.client.dcc_requests[0]
+        self.assertEqual((request.nick, request.command, request.filename,
+                          request.host, request.port, request.size),
+                         ("bob", "SEND", "my log.txt", "127.0.0.1", 5000,
+                          1234))
+        self.assertEqual(self.client.chats, [])
+
+    def test_nick_in_use_before_registration(self):
+        parse_irc_line(":srv 433 * tester :Nickname is already in use",
+                       self.client)
+        parse_irc_line(":srv 433 tester_ other :in use", self.client)
+        self.assertEqual(self.client.nick, "tester_")
+        self.assertEqual(self.client.sent_raw, ["NICK tester_"])
+
+
+class TestRules(unittest.TestCase):
+    def setUp(self):
+        self.client = MockClient()
+        self.client.rules = RuleSet([
+            Rule("ignore", "spambot"),
+            Rule("ignore", "*", channels=("#big",),
+                 commands=("JOIN", "PART", "QUIT")),
+            Rule("highlight", "*", text=r"\bdeploy\b"),
+        ])
+
+    def test_ignored_message_is_dropped_before_any_signal(self):
+        parse_irc_line(":SpamBot!~s@host PRIVMSG #a :buy now", self.client)
+        parse_irc_line(":SpamBot!~s@host PRIVMSG tester :\x01DCC SEND "
+                       "x 2130706433 5000 10\x01", self.client)
+        self.assertEqual(self.client.received_msgs, [])
+        self.assertEqual(self.client.chats, [])
+        self.assertEqual(self.client.dcc_requests, [])
+
+    def test_ignored_join_still_updates_members(self):
+        self.client.membership.names_chunk("#big", ["tester"])
+        self.client.membership.names_end("#big")
+        parse_irc_line(":alice!~a@host JOIN #big", self.client)
+        self.assertEqual(self.client.received_msgs, [])
+        self.assertIn("alice", self.client.membership.get("#big"))
+
+    def test_highlight_is_flagged_once(self):
+        parse_irc_line(":bob!~b@host PRIVMSG #a :Deploy starts now",
+                       self.client)
+        parse_irc_line(":bob!~b@host PRIVMSG #a :redeployed", self.client)
+        self.assertEqual([(line.text, line.highlight)
+                          for line in self.client.chats],
+                         [("Deploy starts now", True), ("redeployed", False)])
+
+    def test_server_lines_are_never_ignored(self):
+        self.client.rules = RuleSet([Rule("ignore", "*")])
+        parse_irc_line("PING :irc.example.org", self.client)
+        self.assertEqual(self.client.sent_raw, ["PONG :irc.example.org"])
+
+
+class TestParseMessage(unittest.TestCase):
+
+    def test_prefix_command_and_params(self):
+        msg = parse_message(":nick!user@host PRIVMSG #chan :hello there")
+        self.assertEqual(msg.prefix, "nick!user@host")
+        self.assertEqual(msg.nick, "nick")
+        self.assertEqual(msg.command, "PRIVMSG")
+        self.assertEqual(msg.params, ["#chan", "hello there"])
+        self.assertIsNone(msg.tags)
+
+    def test_no_prefix(self):
+        msg = parse_message("PING :irc.example.org")
+        self.assertIsNone(msg.prefix)
+        self.assertEqual(msg.command, "PING")
+        self.assertEqual(msg.params, ["irc.example.org"])
+
+    def test_tags_are_unescaped(self):
+        msg = parse_message(
+            "@time=2024-01-01T00:00:00Z;msgid=a\\sb\\:c;flag "
+            ":srv NOTICE me :hi")
+        self.assertEqual(msg.tags, {"time": "2024-01-01T00:00:00Z",
+                                    "msgid": "a b;c", "flag": ""})
+        self.assertEqual(msg.command, "NOTICE")
+
+    def test_empty_trailing_and_lowercase_command(self):
+        msg = parse_message(":srv topic #chan :")
+        self.assertEqual(msg.command, "TOPIC")
+        self.assertEqual(msg.params, ["#chan", ""])
+
+    def test_empty_line(self):
+        self.assertIsNone(parse_message(""))
+
+    def test_tags_or_prefix_only(self):
+        for line in ("@a=b", "@a=b ", "@a=b   ", ":srv", ":srv "):
+            self.assertIsNone(parse_message(line), line)
+
 
 if __name__ == "__main__":
     unittest.main()
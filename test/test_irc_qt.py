@@ -0,0 +1,33 @@
+import threading
+import unittest
+from PyQt6.QtCore import QCoreApplication
+from source.irc_qt import QtDispatcher
+
+
+class TestQtDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.app = QCoreApplication.instance()
+        if self.app is None:
+            self.app = QCoreApplication([])
+
+    def test_call_from_own_thread_runs_at_once(self):
+        calls = []
+        QtDispatcher()(calls.append, 1)
+        self.assertEqual(calls, [1])
+
+    def test_call_from_other_thread_is_queued(self):
+        dispatcher = QtDispatcher()
+        calls = []
+
+        def record(value):
+            calls.append((value, threading.current_thread()))
+        worker = threading.Thread(target=dispatcher, args=(record, 2))
+        worker.start()
+        worker.join()
+        self.assertEqual(calls, [])
+        self.app.processEvents()
+        self.assertEqual(calls, [(2, threading.current_thread())])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+from source.irc_async import AsyncIRCClient, EventLoopThread
+from source.irc_client import IRCClient
+from source.irc_reconnect import Backoff
+from source.irc_session import SessionManager
+from test.fake_ircd import FakeIRCd
+from test.test_irc_async import wait_for
+from test.test_irc_session import Recorder
+
+
+class TestBackoff(unittest.TestCase):
+    def test_ceiling_grows_to_cap(self):
+        backoff = Backoff(base=1.0, cap=10.0, rand=lambda: 1.0)
+        self.assertEqual([backoff.next() for _ in range(6)],
+                         [1.0, 2.0, 4.0, 8.0, 10.0, 10.0])
+        backoff.reset()
+        self.assertEqual(backoff.next(), 1.0)
+
+    def test_delay_is_jittered_below_ceiling(self):
+        backoff = Backoff(base=0.5, cap=30.0)
+        for _ in range(200):
+            ceiling = backoff.ceiling()
+            self.assertTrue(0 <= backoff.next() <= ceiling)
+        self.assertEqual(backoff.ceiling(), 30.0)
+
+
+class TestReconnect(unittest.TestCase):
+    """
+    Обрыв связи с FakeIRCd посреди сессии в 120 каналах
+    """
+    CHANNELS = [f"#room-{i}" for i in range(120)]
+
+    def setUp(self):
+        self.server = FakeIRCd(names_size=30)
+        self.manager = SessionManager(IRCClient, reconnect=True)
+        self.recorder = Recorder()
+        self.manager.add_listener(self.recorder)
+        self.session = self.manager.open(
+            "127.0.0.1", self.server.port, "tester", "fake",
+            setup=self.fast_backoff)
+        self.client = self.session.client
+        self.conn = self.server.wait_client()
+
+    def tearDown(self):
+        self.manager.close("fake")
+        self.server.close()
+
+    @staticmethod
+    def fast_backoff(session):
+        session.client.reconnect = Backoff(base=0.01)
+
+    def events(self, kind):
+        self.session.batcher.flush()
+        return [e for e in self.recorder.events if e[0] == kind]
+
+    def members(self):
+        return [op for e in self.events("members") for op in e[2]]
+
+    def test_session_is_restored_with_few_lines(self):
+        self.client.join_channels(self.CHANNELS)
+        self.assertTrue(wait_for(lambda: len(self.members()) == 120))
+        joins = [line for line in self.conn.received
+                 if line.split(" ", 1)[0] in ("JOIN", "NAMES")]
+        self.assertLessEqual(len(joins), 3)
+        before = len(self.members())
+        current = self.client.current_channel
+
+        # пока нас не было, по пять человек из каждого канала ушли
+        self.server.names_size = 25
+        self.server.drop(self.conn)
+        conn = self.server.wait_client(1)
+        self.assertTrue(wait_for(lambda: len(conn.channels) == 120))
+        self.assertTrue(wait_for(
+            lambda: len(self.members()) == before + 120 * 5))
+
+        sent = [line for line in conn.received
+                if line.split(" ", 1)[0] in ("JOIN", "NAMES", "LIST")]
+        self.assertEqual(sent, joins)
+        ops = self.members()[before:]
+        self.assertTrue(all(op[1] == "remove" for op in ops))
+        self.assertEqual(len(self.events("joined")), 120)
+        self.assertEqual(self.client.current_channel, current)
+        self.assertEqual(self.client.reconnects, 1)
+        self.assertEqual(self.client.reconnect.attempts, 0)
+        members = self.client.membership.get("#room-7")
+        self.assertEqual(len(members), 26)
+        self.assertNotIn("user25", members)
+
+    def test_disconnect_stops_reconnecting(self):
+        self.client.reconnect = Backoff(base=60.0, rand=lambda: 1.0)
+        self.server.drop(self.conn)
+        self.assertTrue(wait_for(lambda: not self.client.connected))
+        self.client.disconnect()
+        self.client.read_thread.join(5)
+        self.assertFalse(self.client.read_thread.is_alive())
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_interrupted_list_is_requested_again(self):
+        self.client.listing = True
+        self.client.list_request = (None, None)
+        self.client.rejoining = {}
+        self.client.joined_channels = {"#a": "#A"}
+        self.client.prepare_rejoin()
+        self.assertEqual(self.client.rejoining, {"#a": "#A"})
+        self.assertIsNone(self.client.list_request)
+        self.assertFalse(self.client.listing)
+
+
+class TestAsyncReconnect(unittest.TestCase):
+    def test_rejoins_after_drop(self):
+        server = FakeIRCd(names_size=5)
+        loop_thread = EventLoopThread()
+        client = AsyncIRCClient(loop_thread)
+        client.reconnect = Backoff(base=0.01)
+        try:
+            client.connect("127.0.0.1", server.port, "tester").result(5)
+            conn = server.wait_client()
+            client.join_channels(["#a", "#b"])
+            self.assertTrue(wait_for(lambda: len(client.joined_channels) == 2))
+            server.drop(conn)
+            conn = server.wait_client(1)
+            self.assertTrue(wait_for(lambda: conn.channels == {"#a", "#b"}))
+            self.assertIn("JOIN #a,#b", conn.received)
+            client.disconnect()
+            self.assertTrue(wait_for(lambda: conn.closed.is_set()))
+            self.assertEqual(len(server.connections), 2)
+        finally:
+            client.disconnect()
+            server.close()
+            loop_thread.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
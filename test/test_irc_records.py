@@ -0,0 +1,64 @@
+import unittest
+from unittest import mock
+from source import irc_records
+from source.irc_records import ChatLine, InternTable, RecordBuffer
+
+
+class TestInternTable(unittest.TestCase):
+    def test_one_copy_per_name(self):
+        table = InternTable()
+        first = "".join(["#", "python"])
+        second = "".join(["#py", "thon"])
+        self.assertIsNot(first, second)
+        self.assertIs(table.intern(first), table.intern(second))
+        self.assertEqual(table.id(first), 1)
+        self.assertEqual(table.id("bob"), 2)
+        self.assertEqual(table.name(2), "bob")
+        self.assertEqual((table.id(None), table.name(0)), (0, None))
+        self.assertEqual(len(table), 2)
+
+
+class TestChatLine(unittest.TestCase):
+    def test_formatting_happens_on_str(self):
+        line = ChatLine(1.0, "#c", "bob", "hi")
+        self.assertEqual(str(line), "[#c] <bob>: hi")
+        self.assertEqual(str(ChatLine.status("<< PING :x")), "<< PING :x")
+        self.assertEqual(line, ChatLine(1.0, "#c", "bob", "hi"))
+        self.assertNotEqual(line, ChatLine(1.0, "#c", "bob", "hi", True))
+
+
+class TestRecordBuffer(unittest.TestCase):
+    def setUp(self):
+        self.table = InternTable()
+
+    def lines(self, buffer):
+        return [buffer.line(number, self.table)
+                for number in range(buffer.total - len(buffer),
+                                    buffer.total)]
+
+    def test_round_trip(self):
+        buffer = RecordBuffer("#c", 10)
+        sent = [ChatLine(1.25, "#c", "bob", "привет 👋"),
+                ChatLine(2.5, "#c", "ann", "", True),
+                ChatLine.status("Ошибка: timeout")]
+        for line in sent:
+            buffer.append(line, self.table)
+        self.assertEqual(self.lines(buffer), sent)
+        self.assertIs(self.lines(buffer)[0].sender, self.table.intern("bob"))
+
+    def test_ring_frees_old_text_chunks(self):
+        with mock.patch.object(irc_records, "TEXT_CHUNK", 8):
+            buffer = RecordBuffer("#c", 4)
+            for i in range(98):
+                buffer.append(ChatLine(float(i), "#c", "bob", f"{i:02}"),
+                              self.table)
+            self.assertEqual([line.text for line in self.lines(buffer)],
+                             ["94", "95", "96", "97"])
+            self.assertEqual(buffer.total, 98)
+            # по четыре строки в куске: живые 94-97 лежат в двух кусках
+            self.assertEqual(len(buffer._chunks), 2)
+            self.assertEqual(len(buffer._times), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import contextlib
+import gzip
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+from source import irc_replay
+from source.irc_metrics import METRICS
+from source.irc_replay import ReplayClient, format_report, guess_nick, \
+    main, replay
+
+CAPTURE = (
+    b":srv 001 me :Welcome\r\n"
+    b":srv 376 me :End of MOTD\r\n"
+    b"@time=2024-01-01T00:00:00.000Z :me!u@h JOIN #a\r\n"
+    b":srv 353 me = #a :me @op alice\r\n"
+    b":srv 366 me #a :End\r\n"
+    b"@time=2024-01-01T00:00:02.000Z :bob!u@h JOIN #a\r\n"
+    b"PING :srv\r\n"
+    b"@time=2024-01-01T00:00:04.000Z :alice!u@h PART #a :bye\r\n"
+    b":me!u@h JOIN :#b\r\n"
+    b":srv 353 me = #b :me carol\r\n"
+    b":srv 366 me #b :End\r\n"
+    b":carol!u@h PRIVMSG #b :caf\xc3\xa9 \xe9\r\n"
+)
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = self.write("capture.log", CAPTURE)
+
+    def tearDown(self):
+        self.dir.cleanup()
+        METRICS.reset()
+
+    def write(self, name, data):
+        path = os.path.join(self.dir.name, name)
+        opener = gzip.open if name.endswith(".gz") else open
+        with opener(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_state_after_replay(self):
+        with mock.patch.object(irc_replay, "CHUNK", 7):
+            report = replay(self.path)
+        self.assertEqual(report.nick, "me")
+        self.assertEqual(report.channels, {"#a": 3, "#b": 2})
+        self.assertEqual(report.lines, 12)
+        self.assertEqual(report.bytes, len(CAPTURE))
+        self.assertEqual(report.commands["353"]["count"], 2)
+        self.assertEqual(report.sent, {"PONG": 1})
+        self.assertEqual(report.errors, 0)
+        self.assertFalse(METRICS.enabled)
+        self.assertIn("#a", format_report(report))
+
+    def test_gzip_and_given_client(self):
+        path = self.write("capture.log.gz", CAPTURE)
+        client = ReplayClient("me")
+        messages = []
+        client.chat_received.connect(
+            lambda line: messages.append(str(line)))
+        report = replay(path, client, profile=False)
+        self.assertEqual(report.channels, {"#a": 3, "#b": 2})
+        self.assertEqual(report.commands, {})
+        # строка не в UTF-8 декодируется запасной кодировкой
+        self.assertIn("[#b] <carol>: caf\xc3\xa9 \xe9", messages)
+
+    def test_real_time_pacing(self):
+        now = [100.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(round(seconds, 3))
+            now[0] += seconds
+
+        replay(self.path, speed=2.0, clock=lambda: now[0], sleep=sleep)
+        self.assertEqual(sleeps, [1.0, 1.0])
+
+    def test_empty_capture_and_unknown_nick(self):
+        path = self.write("empty.log", b"")
+        self.assertIsNone(guess_nick(path))
+        report = replay(path)
+        self.assertEqual((report.lines, report.channels), (0, {}))
+
+    def test_cli(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            main([self.path, "--top", "3"])
+        self.assertIn("lines/sec", out.getvalue())
+        self.assertIn("nick me, 2 channels, 5 members", out.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
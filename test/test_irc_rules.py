@@ -0,0 +1,127 @@
+import os
+import tempfile
+import unittest
+from source.irc_members import MembershipTracker
+from source.irc_parser import parse_message
+from source.irc_rules import HIGHLIGHT, IGNORE, Rule, RuleSet, load_rules, \
+    parse_rule
+
+
+def check(rules, line, membership=None):
+    return rules.check(parse_message(line), membership)
+
+
+class TestParseRule(unittest.TestCase):
+    def test_options_and_text_to_end_of_line(self):
+        rule = parse_rule("ignore *!*@bots channel=#a,#b command=JOIN,PART "
+                          "text=^!(help|ping) now")
+        self.assertEqual(rule, Rule("ignore", "*!*@bots", ("#a", "#b"),
+                                    ("JOIN", "PART"), "^!(help|ping) now"))
+
+    def test_comments_and_errors(self):
+        self.assertIsNone(parse_rule("  # comment"))
+        self.assertIsNone(parse_rule(""))
+        with self.assertRaises(ValueError):
+            parse_rule("mute bob")
+        with self.assertRaises(ValueError):
+            parse_rule("ignore bob level=3")
+
+    def test_load_rules(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "rules.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("# spam\nignore spambot\n\nhighlight * text=ping\n")
+            rules = load_rules(path)
+        self.assertEqual(len(rules), 2)
+
+    def test_bad_pattern_is_rejected(self):
+        with self.assertRaises(ValueError):
+            RuleSet([Rule("highlight", "*", text="(unclosed")])
+        with self.assertRaises(ValueError):
+            RuleSet([Rule("highlight", "*", text="(?P<word>x)")])
+
+
+class TestRuleSet(unittest.TestCase):
+    def test_nick_host_and_domain_masks(self):
+        rules = RuleSet([Rule("ignore", "Troll"),
+                         Rule("ignore", "*!*@10.0.0.1"),
+                         Rule("ignore", "*!*@*.bots.example")])
+        self.assertEqual(check(rules, ":troll!~t@a PRIVMSG #a :hi"), IGNORE)
+        self.assertEqual(check(rules, ":x!~x@10.0.0.1 PRIVMSG #a :hi"),
+                         IGNORE)
+        self.assertEqual(
+            check(rules, ":x!~x@node7.BOTS.example PRIVMSG #a :hi"), IGNORE)
+        self.assertIsNone(check(rules, ":trolley!~t@a PRIVMSG #a :hi"))
+        self.assertIsNone(check(rules, ":x!~x@bots.example.org NOTICE #a :x"))
+
+    def test_glob_masks(self):
+        rules = RuleSet([Rule("ignore", "guest?*!*@*"),
+                         Rule("ignore", "*!~bot*@*")])
+        self.assertEqual(check(rules, ":Guest42!~g@h PRIVMSG #a :x"), IGNORE)
+        self.assertEqual(check(rules, ":x!~bot1@h PRIVMSG #a :x"), IGNORE)
+        self.assertIsNone(check(rules, ":guest!~g@h PRIVMSG #a :x"))
+        self.assertIsNone(check(rules, ":x!~robot@h PRIVMSG #a :x"))
+
+    def test_channels_and_commands(self):
+        rules = RuleSet([Rule("ignore", "*", channels=("#Big",),
+                              commands=("join", "part")),
+                         Rule("ignore", "*", commands=("QUIT",))])
+        self.assertEqual(check(rules, ":a!~a@h JOIN #big"), IGNORE)
+        self.assertEqual(check(rules, ":a!~a@h PART #BIG :bye"), IGNORE)
+        self.assertEqual(check(rules, ":a!~a@h QUIT :gone"), IGNORE)
+        self.assertIsNone(check(rules, ":a!~a@h JOIN #small"))
+        self.assertIsNone(check(rules, ":a!~a@h PRIVMSG #big :hi"))
+
+    def test_quit_and_nick_use_shared_channels(self):
+        membership = MembershipTracker()
+        for channel, names in (("#Python", ["a", "b"]), ("#dev", ["b"])):
+            membership.names_chunk(channel, names)
+            membership.names_end(channel)
+        rules = RuleSet([Rule("ignore", "*", channels=("#python",),
+                              commands=("JOIN", "QUIT", "NICK")),
+                         Rule("highlight", "*", channels=("#python",),
+                              commands=("QUIT",))])
+        self.assertEqual(check(rules, ":a!~a@h QUIT :bye", membership),
+                         IGNORE)
+        self.assertEqual(check(rules, ":a!~a@h NICK a2", membership),
+                         IGNORE)
+        # b виден еще и в #dev
+        self.assertEqual(check(rules, ":b!~b@h QUIT :bye", membership),
+                         HIGHLIGHT)
+        self.assertIsNone(check(rules, ":b!~b@h NICK b2", membership))
+        self.assertIsNone(check(rules, ":a!~a@h QUIT :bye"))
+        # текст QUIT и новый ник - не каналы
+        self.assertIsNone(check(rules, ":c!~c@h QUIT :#python", membership))
+        self.assertIsNone(check(rules, ":c!~c@h NICK #python", membership))
+
+    def test_text_patterns(self):
+        rules = RuleSet([
+            Rule("ignore", "*", channels=("#dev",), text="^!"),
+            Rule("highlight", "*", commands=("PRIVMSG",),
+                 text=r"\b(deploy|rollback)\b"),
+            Rule("highlight", "boss", channels=("#dev",), text="."),
+        ])
+        self.assertEqual(check(rules, ":a!~a@h PRIVMSG #dev :!help"), IGNORE)
+        self.assertIsNone(check(rules, ":a!~a@h PRIVMSG #dev :see !help"))
+        self.assertEqual(check(rules, ":a!~a@h PRIVMSG #x :ROLLBACK now"),
+                         HIGHLIGHT)
+        self.assertIsNone(check(rules, ":a!~a@h NOTICE #x :rollback now"))
+        self.assertEqual(check(rules, ":Boss!~b@h PRIVMSG #dev :hi"),
+                         HIGHLIGHT)
+        self.assertIsNone(check(rules, ":boss!~b@h PRIVMSG #ops :hi"))
+
+    def test_ignore_wins_and_server_lines_pass(self):
+        rules = RuleSet([Rule("ignore", "*!*@*"),
+                         Rule("highlight", "*", text="x")])
+        self.assertEqual(check(rules, ":a!~a@h PRIVMSG #a :x"), IGNORE)
+        self.assertIsNone(check(rules, ":irc.example.org 001 me :Welcome"))
+        self.assertIsNone(check(rules, "PING :irc.example.org"))
+
+    def test_rules_can_be_replaced(self):
+        rules = RuleSet([Rule("ignore", "bob")])
+        rules.set_rules([Rule("highlight", "bob")])
+        self.assertEqual(check(rules, ":bob!~b@h PRIVMSG #a :x"), HIGHLIGHT)
+
+
+if __name__ == "__main__":
+    unittest.main()
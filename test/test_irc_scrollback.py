@@ -0,0 +1,56 @@
+import tempfile
+import unittest
+from source.irc_scrollback import Scrollback
+from source.irc_text import Rendered
+
+
+def lines(start, stop):
+    return [Rendered(f"line {i}", i % 5 == 0, []) for i in range(start, stop)]
+
+
+class TestScrollback(unittest.TestCase):
+
+    def test_keeps_last_capacity_lines(self):
+        scrollback = Scrollback(capacity=10)
+        evicted = scrollback.append(lines(0, 25))
+        self.assertEqual(len(scrollback), 10)
+        self.assertEqual([r.html for r in scrollback],
+                         [f"line {i}" for i in range(15, 25)])
+        self.assertEqual(len(evicted), 15)
+        self.assertEqual(scrollback.dropped, 15)
+        self.assertEqual(scrollback.total, 25)
+
+    def test_ring_wraps(self):
+        scrollback = Scrollback(capacity=4)
+        for i in range(10):
+            scrollback.append(lines(i, i + 1))
+        self.assertEqual(scrollback[0].html, "line 6")
+        self.assertEqual(scrollback[-1].html, "line 9")
+        with self.assertRaises(IndexError):
+            scrollback[4]
+
+    def test_overflow(self):
+        scrollback = Scrollback(capacity=4)
+        scrollback.append(lines(0, 3))
+        self.assertEqual(scrollback.overflow(1), 0)
+        self.assertEqual(scrollback.overflow(2), 1)
+        self.assertEqual(scrollback.overflow(100), 3)
+
+    def test_spilled_lines_are_read_back(self):
+        scrollback = Scrollback(capacity=8, page_size=4,
+                                spill_file=tempfile.TemporaryFile())
+        for i in range(0, 50, 7):
+            scrollback.append(lines(i, min(i + 7, 50)))
+        self.assertEqual(scrollback.spilled, 42)
+        self.assertEqual(scrollback.dropped, 0)
+        records = scrollback.read_spilled(9, 15)
+        self.assertEqual([r.html for r in records],
+                         [f"line {i}" for i in range(9, 15)])
+        self.assertEqual([r.highlight for r in records],
+                         [i % 5 == 0 for i in range(9, 15)])
+        self.assertEqual(len(scrollback.read_spilled(40, 100)), 2)
+        scrollback.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+import unittest
+from source.irc_client import IRCClient
+from source.irc_session import SessionManager
+from source.irc_text import TextPipeline
+
+
+class OfflineClient(IRCClient):
+    def connect(self, server, port, nick):
+        self.nick = nick
+        self.connected = True
+
+    def disconnect(self):
+        self.connected = False
+
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+
+    def on_messages(self, network_id, messages):
+        self.events.append(("messages", network_id, messages))
+
+    def on_channels(self, network_id, channels):
+        self.events.append(("channels", network_id, channels))
+
+    def on_channels_end(self, network_id):
+        self.events.append(("channels_end", network_id))
+
+    def on_members(self, network_id, ops):
+        self.events.append(("members", network_id, ops))
+
+    def on_joined(self, network_id, channel):
+        self.events.append(("joined", network_id, channel))
+
+    def on_history(self, network_id, target, lines):
+        self.events.append(("history", network_id, target, lines))
+
+    def on_rendered(self, network_id, name, first, rendered):
+        self.events.append(("rendered", network_id, name, first, rendered))
+
+
+class TestSessionManager(unittest.TestCase):
+    def setUp(self):
+        self.manager = SessionManager(OfflineClient, batch_thread=False)
+        self.recorder = Recorder()
+        self.manager.add_listener(self.recorder)
+
+    def tearDown(self):
+        for session in list(self.manager):
+            self.manager.close(session.network_id)
+
+    def deliver(self, *sessions):
+        for session in sessions:
+            session.batcher.flush()
+
+    def test_open_creates_independent_sessions(self):
+        libera = self.manager.open("irc.libera.chat", 6667, "a")
+        oftc = self.manager.open("irc.oftc.net", 6667, "b")
+        self.assertEqual(len(self.manager), 2)
+        self.assertIsNot(libera.client, oftc.client)
+        self.assertEqual(libera.client.nick, "a")
+        self.assertEqual(oftc.client.nick, "b")
+
+    def test_open_existing_network_does_not_reconnect(self):
+        first = self.manager.open("irc.libera.chat", 6667, "a")
+        first.client.connected = False
+        second = self.manager.open("irc.libera.chat", 6667, "a")
+        self.assertIs(first, second)
+        self.assertFalse(second.client.connected)
+
+    def test_events_are_routed_by_network(self):
+        libera = self.manager.open("irc.libera.chat", 6667, "a")
+        oftc = self.manager.open("irc.oftc.net", 6667, "b")
+
+        libera.client.handle_line(":srv 322 a #python 10 :topic")
+        libera.client.handle_line(":srv 322 a #rust 5 :other")
+        libera.client.handle_line(":srv 323 a :End of /LIST")
+        oftc.client.handle_line(":b!u@h JOIN :#debian")
+        oftc.client.handle_line(":srv 353 b = #debian :@b c")
+        oftc.client.handle_line(":srv 366 b #debian :End")
+        self.deliver(libera, oftc)
+
+        self.assertIn(("joined", "irc.oftc.net", "#debian"),
+                      self.recorder.events)
+        self.assertEqual(list(oftc.client.joined_channels), ["#debian"])
+        self.assertIn(("members", "irc.oftc.net",
+                       [("#debian", "reset", None, ["@b", "c"])]),
+                      self.recorder.events)
+        self.assertFalse(any(e[0] == "members" and e[1] == "irc.libera.chat"
+                             for e in self.recorder.events))
+
+        channel_events = [e for e in self.recorder.events
+                          if e[0] == "channels"]
+        self.assertEqual(channel_events, [
+            ("channels", "irc.libera.chat",
+             [("#python", 10, "topic"), ("#rust", 5, "other")])])
+        self.assertIn(("channels_end", "irc.libera.chat"),
+                      self.recorder.events)
+        self.assertIn(("joined", "irc.oftc.net", "#debian"),
+                      self.recorder.events)
+
+    def test_messages_arrive_as_one_batch(self):
+        session = self.manager.open("irc.libera.chat", 6667, "a")
+        session.client.handle_line(":b!u@h PRIVMSG #c :one")
+        session.client.handle_line(":b!u@h PRIVMSG #c :two")
+        self.deliver(session)
+        batches = [e for e in self.recorder.events if e[0] == "messages"]
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(batches[0][2], [
+            ("*", False), ("#c", False), ("*", False), ("#c", False)])
+        lines, total = session.buffers.tail("#c", 0)
+        self.assertEqual((list(map(str, lines)), total),
+                         (["[#c] <b>: one", "[#c] <b>: two"], 2))
+        lines, total = session.buffers.tail("*", 1)
+        self.assertEqual((list(map(str, lines)), total),
+                         (["<< :b!u@h PRIVMSG #c :two"], 2))
+
+    def test_private_messages_go_to_the_other_side(self):
+        session = self.manager.open("irc.libera.chat", 6667, "a")
+        session.client.send_raw = lambda data: True
+        session.client.handle_line(":B!u@h PRIVMSG A :psst")
+        session.client.send_message("B", "hello")
+        self.deliver(session)
+        lines, total = session.buffers.tail("b", 0)
+        self.assertEqual([str(line) for line in lines],
+                         ["[A] <B>: psst", "[B] <a>: hello"])
+
+    def test_pipeline_only_flags_highlight_in_reader_thread(self):
+        manager = SessionManager(
+            OfflineClient, batch_thread=False,
+            pipeline_factory=lambda nick: TextPipeline(highlights=[nick]))
+        recorder = Recorder()
+        manager.add_listener(recorder)
+        session = manager.open("irc.libera.chat", 6667, "a")
+        session.client.handle_line(":b!u@h PRIVMSG #c :\x02hi\x02 A :)")
+        session.client.handle_line(":a!u@h PRIVMSG #c :bye")
+        self.deliver(session)
+        manager.close("irc.libera.chat")
+        self.assertEqual(
+            [item for item in recorder.events[0][2] if item[0] == "#c"],
+            [("#c", True), ("#c", False)])
+        line = session.buffers.tail("#c", 0)[0][0]
+        self.assertTrue(line.highlight)
+        self.assertEqual(line.text, "\x02hi\x02 A :)")
+        self.assertEqual(session.pipeline.render(str(line)).html,
+                         '[#c] &lt;b&gt;: '
+                         '<span style="font-weight:bold">hi</span> '
+                         '<b>A</b> ☺')
+
+    def test_visible_buffer_is_rendered_before_delivery(self):
+        manager = SessionManager(
+            OfflineClient, dispatch=lambda func, *args: func(*args),
+            batch_thread=False,
+            pipeline_factory=lambda nick: TextPipeline(highlights=[nick]))
+        recorder = Recorder()
+        manager.add_listener(recorder)
+        session = manager.open("irc.libera.chat", 6667, "a")
+        session.client.handle_line(":b!u@h PRIVMSG #c :one")
+        session.show("#C", 1)
+        session.client.handle_line(":b!u@h PRIVMSG #c :two a")
+        session.client.handle_line(":b!u@h PRIVMSG #d :hidden")
+        self.deliver(session)
+        session.client.handle_line(":b!u@h PRIVMSG #d :hidden")
+        self.deliver(session)
+        manager.close("irc.libera.chat")
+        rendered = [e for e in recorder.events if e[0] == "rendered"]
+        self.assertEqual(len(rendered), 1)
+        self.assertIs(recorder.events[0], rendered[0])
+        _, _, name, first, records = rendered[0]
+        self.assertEqual((name, first, len(records)), ("#C", 1, 1))
+        self.assertIn("two <b>a</b>", records[0].html)
+        self.assertTrue(records[0].highlight)
+        self.assertEqual(session.visible, ("#C", 2))
+
+    def test_close_disconnects_and_forgets(self):
+        session = self.manager.open("irc.libera.chat", 6667, "a")
+        self.manager.close("irc.libera.chat")
+        self.assertFalse(session.client.connected)
+        self.assertNotIn("irc.libera.chat", self.manager)
+        self.assertIsNone(self.manager.get("irc.libera.chat"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from source.irc_signal import Signal
+
+
+class Emitter:
+    changed = Signal(str)
+
+
+class TestSignal(unittest.TestCase):
+    def test_each_instance_has_own_slots(self):
+        first, second = Emitter(), Emitter()
+        calls = []
+        first.changed.connect(calls.append)
+        first.changed.emit("a")
+        second.changed.emit("b")
+        self.assertEqual(calls, ["a"])
+        self.assertIs(first.changed, first.changed)
+        self.assertIsInstance(Emitter.changed, Signal)
+
+    def test_slots_called_in_order(self):
+        emitter = Emitter()
+        calls = []
+        emitter.changed.connect(lambda v: calls.append(("one", v)))
+        emitter.changed.connect(lambda v: calls.append(("two", v)))
+        emitter.changed.emit("x")
+        self.assertEqual(calls, [("one", "x"), ("two", "x")])
+
+    def test_disconnect(self):
+        emitter = Emitter()
+        calls = []
+        emitter.changed.connect(calls.append)
+        emitter.changed.connect(print)
+        emitter.changed.disconnect(print)
+        emitter.changed.emit("x")
+        self.assertEqual(calls, ["x"])
+        emitter.changed.disconnect()
+        emitter.changed.emit("y")
+        self.assertEqual(calls, ["x"])
+        self.assertEqual(len(emitter.changed), 0)
+
+    def test_connect_during_emit_applies_to_next_emit(self):
+        emitter = Emitter()
+        calls = []
+
+        def first(value):
+            calls.append(value)
+            emitter.changed.connect(calls.append)
+        emitter.changed.connect(first)
+        emitter.changed.emit("a")
+        self.assertEqual(calls, ["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+from source.irc_split import MAX_LINE_BYTES, line_budget, pack_joins, \
+    split_message
+
+
+class TestLineBudget(unittest.TestCase):
+
+    def test_known_userhost(self):
+        prefix = ":nick!~u@host PRIVMSG #chan :"
+        self.assertEqual(line_budget("#chan", "nick", "~u@host"),
+                         MAX_LINE_BYTES - 2 - len(prefix))
+
+    def test_unknown_userhost_is_worst_case(self):
+        self.assertLess(line_budget("#chan", "nick"),
+                        line_budget("#chan", "nick", "~u@host"))
+
+    def test_target_counts_bytes(self):
+        self.assertEqual(line_budget("#ж", "n", "u@h"),
+                         line_budget("#ab", "n", "u@h"))
+
+
+class TestSplitMessage(unittest.TestCase):
+
+    def check(self, text, budget):
+        parts = split_message(text, budget)
+        for part in parts:
+            self.assertLessEqual(len(part.encode("utf-8")), budget)
+        total = len(text.encode("utf-8"))
+        self.assertEqual(len(parts), -(-total // budget))
+        return parts
+
+    def test_multibyte_lines_are_filled(self):
+        for text in ("я" * 501, "😀" * 333, "aя😀" * 200):
+            parts = split_message(text, 101)
+            self.assertEqual("".join(parts), text)
+            for part in parts[:-1]:
+                size = len(part.encode("utf-8"))
+                self.assertGreater(size, 101 - 4)
+                self.assertLessEqual(size, 101)
+
+    def test_short_message_is_single_part(self):
+        self.assertEqual(split_message("hello world", 100), ["hello world"])
+
+    def test_ascii_fills_lines(self):
+        parts = self.check("A" * 950, 400)
+        self.assertEqual([len(p) for p in parts], [400, 400, 150])
+
+    def test_never_cuts_inside_codepoint(self):
+        text = "ab" + "я" * 100
+        parts = split_message(text, 9)
+        self.assertEqual(parts[0], "abяяя")
+        self.assertEqual("".join(parts), text)
+
+    def test_prefers_word_boundary_without_extra_lines(self):
+        text = " ".join(["word"] * 100)
+        parts = self.check(text, 50)
+        for part in parts[:-1]:
+            self.assertFalse(part.startswith(" ") or part.endswith(" "))
+        self.assertEqual(" ".join(parts), text)
+
+    def test_hard_cut_when_words_would_cost_a_line(self):
+        text = "x" * 45 + " " + "y" * 54
+        self.assertEqual(split_message(text, 50),
+                         ["x" * 45 + " " + "y" * 4, "y" * 50])
+
+    def test_newlines_start_new_lines(self):
+        self.assertEqual(split_message("one\r\ntwo\n\nthree", 100),
+                         ["one", "two", "three"])
+
+    def test_formatting_codes_do_not_break_lines(self):
+        text = "\x1ditalic\x1d and \x1estrike\x1e \x0bx\x0cy\u2028z"
+        self.assertEqual(split_message(text, 400), [text])
+        self.assertEqual(split_message("a\r\nb\rc", 400), ["a", "b", "c"])
+
+    def test_tiny_budget_is_rejected(self):
+        with self.assertRaises(ValueError):
+            split_message("text", 2)
+
+
+class TestPackJoins(unittest.TestCase):
+
+    def test_lines_are_filled_up_to_limit(self):
+        channels = [f"#канал-{i}" for i in range(150)]
+        lines = pack_joins(channels)
+        self.assertEqual(len(lines), 5)
+        for line in lines:
+            self.assertLessEqual(len(line.encode("utf-8")),
+                                 MAX_LINE_BYTES - 2)
+        for line in lines[:-1]:
+            self.assertGreater(len(line.encode("utf-8")),
+                               MAX_LINE_BYTES - 2 - 20)
+        self.assertEqual(",".join(line[5:] for line in lines),
+                         ",".join(channels))
+
+    def test_small_and_empty(self):
+        self.assertEqual(pack_joins(["#a", "#b"]), ["JOIN #a,#b"])
+        self.assertEqual(pack_joins([]), [])
+        self.assertEqual(pack_joins(["#abc", "#de"], limit=9),
+                         ["JOIN #abc", "JOIN #de"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import re
+import time
+import unittest
+from source.irc_records import ChatLine
+from source.irc_text import ChatRenderer, TextPipeline, nick_fragment, \
+    trie_pattern
+
+
+class TestTriePattern(unittest.TestCase):
+
+    def test_matches_exactly_the_words(self):
+        words = [":)", ":-)", ":-(", ":D", "<3", "xD", "x"]
+        regex = re.compile(f"(?:{trie_pattern(words)})$")
+        for word in words:
+            self.assertTrue(regex.match(word), word)
+        for other in (":", ":-", "x)", "3"):
+            self.assertIsNone(regex.match(other), other)
+
+    def test_prefers_longest(self):
+        regex = re.compile(trie_pattern(["a", "ab", "abc"]))
+        self.assertEqual(regex.match("abcd").group(), "abc")
+
+
+class TestTextPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.pipeline = TextPipeline(highlights=["tester"])
+
+    def test_plain_text_is_escaped(self):
+        rendered = self.pipeline.render("a <b> & c")
+        self.assertEqual(rendered.html, "a &lt;b&gt; &amp; c")
+        self.assertFalse(rendered.highlight)
+
+    def test_emoticons_only_between_spaces(self):
+        self.assertEqual(self.pipeline.render(":) ok x:) :D").html,
+                         "☺ ok x:) 😃")
+
+    def test_mirc_formatting(self):
+        html = self.pipeline.render("\x02b\x02 \x034,1r\x03 \x1di\x0f.").html
+        self.assertEqual(
+            html,
+            '<span style="font-weight:bold">b</span> '
+            '<span style="color:#ff0000;background-color:#000000">r'
+            '</span> <span style="font-style:italic">i</span>.')
+
+    def test_unclosed_formatting_is_closed(self):
+        html = self.pipeline.render("\x1fu").html
+        self.assertEqual(html,
+                         '<span style="text-decoration:underline">u</span>')
+
+    def test_urls(self):
+        rendered = self.pipeline.render("see https://a.org/x?y=1&z=2, "
+                                        "or (www.b.net).")
+        self.assertEqual(rendered.urls,
+                         ["https://a.org/x?y=1&z=2", "www.b.net"])
+        self.assertIn('<a href="https://a.org/x?y=1&amp;z=2">',
+                      rendered.html)
+        self.assertIn('<a href="http://www.b.net">www.b.net</a>).',
+                      rendered.html)
+
+    def test_highlight_is_whole_word_case_insensitive(self):
+        self.assertTrue(self.pipeline.render("hi TESTER!").highlight)
+        self.assertFalse(self.pipeline.render("testers").highlight)
+
+    def test_highlighted_agrees_with_render(self):
+        for text in ("hi TESTER!", "testers", "\x02tester\x02", "x",
+                     "tester_ and tester"):
+            self.assertEqual(self.pipeline.highlighted(text),
+                             self.pipeline.render(text).highlight, text)
+        self.assertFalse(TextPipeline().highlighted("tester"))
+
+    def test_config_change_recompiles(self):
+        self.pipeline.set_emoticons({"(y)": "👍"})
+        self.pipeline.set_highlights(["bob"])
+        rendered = self.pipeline.render("bob (y) :)")
+        self.assertEqual(rendered.html, "<b>bob</b> 👍 :)")
+        self.assertTrue(rendered.highlight)
+
+
+class TestChatRenderer(unittest.TestCase):
+
+    def setUp(self):
+        self.renderer = ChatRenderer(TextPipeline(highlights=["me"]),
+                                     cache_size=2)
+        self.when = time.mktime((2024, 5, 1, 9, 7, 30, 0, 0, -1))
+
+    def test_chat_line(self):
+        rendered = self.renderer.render(
+            ChatLine(self.when, "#c", "<b>", "hi \x02me\x02"))
+        self.assertEqual(
+            rendered.html,
+            '<span class="ts">09:07</span> ' + nick_fragment("<b>") +
+            ' hi <span style="font-weight:bold"><b>me</b></span>')
+        self.assertIn("&lt;&lt;b&gt;&gt;", nick_fragment("<b>"))
+        self.assertTrue(rendered.highlight)
+
+    def test_status_line_keeps_its_highlight_flag(self):
+        rendered = self.renderer.render(
+            ChatLine(self.when, None, None, "<< x", True))
+        self.assertEqual(rendered.html, '<span class="ts">09:07</span> '
+                                        '<span class="st">&lt;&lt; x</span>')
+        self.assertTrue(rendered.highlight)
+
+    def test_nick_color_ignores_case_and_is_cached(self):
+        self.assertEqual(nick_fragment("Bob").split(">")[0],
+                         nick_fragment("bob").split(">")[0])
+        for nick in ("a", "b", "a", "a", "c"):
+            self.renderer.render(ChatLine(self.when, "#c", nick, "x"))
+        info = self.renderer.nick_fragment.cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (2, 3, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
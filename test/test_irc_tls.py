@@ -0,0 +1,189 @@
+import base64
+import os
+import socket
+import ssl
+import threading
+import unittest
+from source.irc_caps import SaslAuth
+from source.irc_client import IRCClient
+from source.irc_reconnect import Backoff
+from source.irc_tls import TlsOptions, TlsTransport, shared_context
+from test.test_irc_async import wait_for
+
+# самоподписанный сертификат localhost и 127.0.0.1 вместе с ключом
+CERT = os.path.join(os.path.dirname(__file__), "localhost.pem")
+
+
+class TlsServer:
+    """
+    IRC-сервер-заглушка по TLS: принимает подключения по одному,
+    регистрирует после CAP END, при заданных учетных данных
+    принимает SASL PLAIN. drop() обрывает текущее подключение
+    """
+
+    def __init__(self, caps="server-time", account=None):
+        self.caps = caps
+        self.account = account
+        self.received = []
+        self.resumed = []
+        self.conn = None
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(CERT)
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(5)
+        self.port = self.sock.getsockname()[1]
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def send(self, *lines):
+        self.conn.sendall("".join(line + "\r\n" for line in lines)
+                          .encode("utf-8"))
+
+    def drop(self):
+        self.conn.shutdown(socket.SHUT_RDWR)
+
+    def _serve(self):
+        while True:
+            try:
+                raw, _ = self.sock.accept()
+            except OSError:
+                return
+            try:
+                conn = self.context.wrap_socket(raw, server_side=True)
+            except OSError:
+                raw.close()
+                continue
+            self.conn = conn
+            self.resumed.append(conn.session_reused)
+            self._read(conn)
+
+    def _read(self, conn):
+        buffer = b""
+        with conn:
+            while True:
+                try:
+                    data = conn.recv(4096)
+                except OSError:
+                    return
+                if not data:
+                    return
+                buffer += data
+                while b"\r\n" in buffer:
+                    line, buffer = buffer.split(b"\r\n", 1)
+                    line = line.decode("utf-8")
+                    self.received.append(line)
+                    self._reply(line)
+
+    def _reply(self, line):
+        if line.startswith("CAP LS"):
+            self.send(":srv CAP * LS :" + self.caps)
+        elif line.startswith("CAP REQ"):
+            self.send(":srv CAP tester ACK :" + line.split(":", 1)[1])
+        elif line == "AUTHENTICATE PLAIN":
+            self.send("AUTHENTICATE +")
+        elif line.startswith("AUTHENTICATE "):
+            user, password = self.account
+            if line[13:] == base64.b64encode(
+                    f"{user}\0{user}\0{password}".encode()).decode():
+                self.send(f":srv 900 tester tester!u@h {user} :Logged in",
+                          ":srv 903 tester :SASL authentication successful")
+            else:
+                self.send(":srv 904 tester :SASL authentication failed")
+        elif line == "CAP END":
+            self.send(":srv 001 tester :Welcome",
+                      ":srv 376 tester :End of /MOTD command.")
+
+    def close(self):
+        self.sock.close()
+        if self.conn is not None:
+            self.conn.close()
+
+
+class TestTls(unittest.TestCase):
+    def setUp(self):
+        self.server = None
+        self.client = IRCClient()
+        self.client.auto_list = False
+        self.client.tls = TlsTransport(TlsOptions(cafile=CERT))
+        self.messages = []
+        self.client.message_received.connect(self.messages.append)
+
+    def tearDown(self):
+        self.client.disconnect()
+        if self.server is not None:
+            self.server.close()
+
+    def start(self, **options):
+        self.server = TlsServer(**options)
+        return self.server
+
+    def test_context_is_shared(self):
+        self.assertIs(shared_context(cafile=CERT), self.client.tls.context)
+        self.assertIs(TlsTransport().context, shared_context())
+        self.assertIsNot(shared_context(verify=False), shared_context())
+
+    def test_reconnect_resumes_session(self):
+        server = self.start()
+        self.client.reconnect = Backoff(base=0.01)
+        self.client.connect("127.0.0.1", server.port, "tester")
+        self.assertTrue(wait_for(lambda: "CAP END" in server.received))
+        self.assertTrue(wait_for(lambda: self.client.caps.done))
+        server.drop()
+        self.assertTrue(wait_for(lambda: self.client.reconnects == 1))
+        self.assertTrue(wait_for(
+            lambda: server.received.count("CAP END") == 2))
+        self.assertEqual(server.resumed, [False, True])
+        self.assertEqual((self.client.tls.handshakes,
+                          self.client.tls.resumed), (2, 1))
+        self.assertIn("server-time", self.client.caps)
+
+    def test_untrusted_certificate_is_rejected(self):
+        server = self.start()
+        self.client.tls = TlsTransport()
+        with self.assertRaises(ssl.SSLCertVerificationError):
+            self.client.connect("127.0.0.1", server.port, "tester")
+        self.assertFalse(self.client.connected)
+
+    def test_connect_without_wait_handshakes_in_reader(self):
+        server = self.start()
+        self.client.connect("127.0.0.1", server.port, "tester", wait=False)
+        self.assertTrue(wait_for(lambda: "CAP END" in server.received))
+        self.assertTrue(self.client.connected)
+
+        refused = IRCClient()
+        errors = []
+        refused.message_received.connect(errors.append)
+        port = socket.socket()
+        port.bind(("127.0.0.1", 0))
+        address = port.getsockname()
+        port.close()
+        refused.connect(*address, "tester", wait=False)
+        self.assertTrue(wait_for(lambda: errors))
+        self.assertTrue(errors[0].startswith("Ошибка: "))
+        refused.read_thread.join(5)
+        self.assertFalse(refused.read_thread.is_alive())
+
+    def test_sasl_plain_before_cap_end(self):
+        server = self.start(caps="sasl=PLAIN,EXTERNAL server-time",
+                            account=("tester", "secret"))
+        self.client.caps.sasl = SaslAuth("PLAIN", "tester", "secret")
+        self.client.connect("127.0.0.1", server.port, "tester")
+        self.assertTrue(wait_for(lambda: self.client.caps.done))
+        self.assertEqual(server.received[3:], [
+            "CAP REQ :sasl server-time", "AUTHENTICATE PLAIN",
+            "AUTHENTICATE dGVzdGVyAHRlc3RlcgBzZWNyZXQ=", "CAP END"])
+
+    def test_failed_sasl_still_registers(self):
+        server = self.start(caps="sasl server-time",
+                            account=("tester", "secret"))
+        self.client.caps.sasl = SaslAuth("PLAIN", "tester", "wrong")
+        self.client.connect("127.0.0.1", server.port, "tester")
+        self.assertTrue(wait_for(lambda: self.client.caps.done))
+        self.assertEqual(server.received[-1], "CAP END")
+        self.assertIn("Ошибка SASL: SASL authentication failed",
+                      self.messages)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import socket
+import threading
+import time
+import unittest
+from source.irc_writer import TokenBucket, WriteQueue, Writer, \
+    command_priority, PRIORITY_CONTROL, PRIORITY_COMMAND, PRIORITY_MESSAGE
+
+
+class FloodCheckingServer:
+    """
+    Принимающая сторона socketpair: запоминает время каждой строки и
+    "отключает" клиента, если тот превысил лимит сервера.
+    """
+
+    def __init__(self, sock, rate, burst):
+        self.sock = sock
+        self.rate = rate
+        self.burst = burst
+        self.lines = []
+        self.reads = 0
+        self.killed = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        buffer = b""
+        allowance = float(self.burst)
+        last = time.monotonic()
+        while True:
+            data = self.sock.recv(65536)
+            if not data:
+                return
+            self.reads += 1
+            buffer += data
+            while b"\r\n" in buffer:
+                line, buffer = buffer.split(b"\r\n", 1)
+                now = time.monotonic()
+                allowance = min(self.burst,
+                                allowance + (now - last) * self.rate)
+                last = now
+                if not line.startswith(b"PONG"):
+                    allowance -= 1
+                    if allowance < -1:
+                        self.killed = True
+                self.lines.append(line.decode())
+
+
+class TestWriteQueue(unittest.TestCase):
+
+    def test_command_priority(self):
+        self.assertEqual(command_priority("PONG :x"), PRIORITY_CONTROL)
+        self.assertEqual(command_priority("JOIN #a"), PRIORITY_COMMAND)
+        self.assertEqual(command_priority("privmsg #a :x"), PRIORITY_MESSAGE)
+
+    def test_control_lines_jump_ahead(self):
+        queue = WriteQueue(rate=1, burst=1)
+        queue.put("PRIVMSG #a :1")
+        queue.put("PRIVMSG #a :2")
+        queue.put("JOIN #b")
+        queue.put("PONG :srv")
+        items, delay = queue.take()
+        self.assertEqual([p for _, p in items],
+                         [b"PONG :srv\r\n", b"JOIN #b\r\n"])
+        self.assertGreater(delay, 0)
+        self.assertEqual(len(queue), 2)
+
+    def test_queue_is_bounded_for_messages_only(self):
+        queue = WriteQueue(max_size=2)
+        self.assertTrue(queue.put("PRIVMSG #a :1"))
+        self.assertTrue(queue.put("PRIVMSG #a :2"))
+        self.assertFalse(queue.put("PRIVMSG #a :3"))
+        self.assertTrue(queue.put("PONG :x"))
+        self.assertEqual(queue.stats()["dropped"], 1)
+        self.assertEqual(queue.stats()["depth"], 3)
+
+    def test_restart_drops_lines_and_refills_bucket(self):
+        queue = WriteQueue(rate=1, burst=2)
+        for i in range(4):
+            queue.put(f"PRIVMSG #a :{i}")
+        queue.take()
+        self.assertEqual(queue.restart(), 2)
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(queue.bucket.available(queue.bucket.updated), 2)
+        self.assertEqual(queue.stats()["dropped"], 2)
+
+    def test_token_bucket_refills(self):
+        bucket = TokenBucket(rate=2, burst=3)
+        now = bucket.updated
+        self.assertEqual(bucket.available(now), 3)
+        bucket.take(3)
+        self.assertEqual(bucket.available(now + 0.5), 1)
+        self.assertEqual(bucket.available(now + 10), 3)
+
+
+class TestWriter(unittest.TestCase):
+
+    def test_paced_throughput_over_socketpair(self):
+        rate, burst, total = 100.0, 10, 150
+        client_sock, server_sock = socket.socketpair()
+        self.addCleanup(client_sock.close)
+        self.addCleanup(server_sock.close)
+        server = FloodCheckingServer(server_sock, rate, burst)
+        queue = WriteQueue(rate=rate, burst=burst, max_size=total)
+        writer = Writer(queue, client_sock.sendall)
+        writer.start()
+
+        start = time.monotonic()
+        for i in range(total):
+            queue.put(f"PRIVMSG #bench :line {i}")
+        queue.put("PONG :urgent")
+        deadline = start + 10
+        while len(server.lines) < total + 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        elapsed = time.monotonic() - start
+        writer.stop()
+
+        self.assertEqual(len(server.lines), total + 1)
+        self.assertFalse(server.killed)
+        self.assertLess(server.lines.index("PONG :urgent"), burst + 1)
+        messages = [line for line in server.lines if line.startswith("PRIV")]
+        self.assertEqual(messages,
+                         [f"PRIVMSG #bench :line {i}" for i in range(total)])
+        expected = (total - burst) / rate
+        self.assertGreater(elapsed, expected * 0.8)
+        self.assertLess(elapsed, expected * 3)
+        stats = queue.stats()
+        self.assertEqual(stats["depth"], 0)
+        self.assertLess(stats["writes"], total)
+        self.assertGreater(stats["latency_max_ms"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
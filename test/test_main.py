@@ -5,8 +5,8 @@ from source import main as main_module
 
 class TestMain(unittest.TestCase):
 
-    @patch("source.main.IRCWindow")
-    @patch("source.main.QApplication")
+    @patch("source.irc_gui.IRCWindow")
+    @patch("PyQt6.QtWidgets.QApplication")
     @patch("source.main.sys")
     def test_main_creates_and_shows_window(
             self, mock_sys, mock_qapp, mock_window_class):
@@ -20,8 +20,8 @@ class TestMain(unittest.TestCase):
         mock_window_instance.show.assert_called_once()
         mock_app_instance.exec.assert_called_once()
 
-    @patch("source.main.QApplication")
-    @patch("source.main.IRCWindow")
+    @patch("PyQt6.QtWidgets.QApplication")
+    @patch("source.irc_gui.IRCWindow")
     @patch("source.main.sys.exit")
     @patch("source.main.sys")
     def test_main_keyboard_interrupt(
@@ -30,6 +30,31 @@ class TestMain(unittest.TestCase):
         main_module.main()
         mock_exit.assert_not_called()
 
+    @patch("source.irc_headless.run_headless", return_value=0)
+    @patch("PyQt6.QtWidgets.QApplication")
+    @patch("source.main.sys")
+    def test_main_headless_skips_gui(self, mock_sys, mock_qapp,
+                                     mock_run):
+        main_module.main(["--headless", "--config", "bot.ini"])
+        mock_run.assert_called_once_with("bot.ini", None)
+        mock_sys.exit.assert_called_once_with(0)
+        mock_qapp.assert_not_called()
+
+    @patch("source.irc_headless.run_headless", return_value=0)
+    @patch("source.main.sys")
+    def test_main_backend_flag(self, mock_sys, mock_run):
+        main_module.main(["--headless", "--backend", "asyncio"])
+        mock_run.assert_called_once_with("irclient.ini", "asyncio")
+
+    @patch("source.irc_gui.IRCWindow")
+    @patch("PyQt6.QtWidgets.QApplication")
+    @patch("source.main.sys")
+    def test_main_gui_backend(self, mock_sys, mock_qapp, mock_window_class):
+        from source.irc_async import AsyncIRCClient
+        main_module.main(["--backend", "asyncio"])
+        self.assertIs(mock_window_class.call_args.kwargs["client_class"],
+                      AsyncIRCClient)
+
 
 if __name__ == "__main__":
     unittest.main()